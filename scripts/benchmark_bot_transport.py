@@ -0,0 +1,58 @@
+"""
+Benchmark the bot's API client over HTTP against the in-process ASGI
+transport.
+
+The HTTP mode needs the API running at TELEGRAM_BOT_API_BASE_URL; it is
+skipped when nothing answers there. The path must not need authentication:
+
+    PYTHONPATH=src python scripts/benchmark_bot_transport.py 1000
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from bots.telegram import api_helper
+from config import config
+
+
+async def time_requests(mode: str, path: str, count: int) -> float:
+    """Average latency in milliseconds of count sequential GETs of path."""
+    config.TELEGRAM_BOT_API_TRANSPORT = mode
+    client = await api_helper.start_client()
+    url = f"{config.TELEGRAM_BOT_API_BASE_URL}{path}"
+    try:
+        # Warm up connections and lazily initialised state
+        (await client.get(url)).raise_for_status()
+        started = time.perf_counter()
+        for _ in range(count):
+            await client.get(url)
+        return (time.perf_counter() - started) / count * 1000
+    finally:
+        await api_helper.close_client()
+
+
+async def main(count: int, path: str) -> None:
+    for mode in api_helper.TRANSPORTS:
+        try:
+            latency = await time_requests(mode, path, count)
+        except httpx.HTTPError as e:
+            print(f"{mode:>5}  skipped: {e!r}")
+            continue
+        print(f"{mode:>5}  {count} requests  {latency:8.3f} ms/request")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the bot's API transports"
+    )
+    parser.add_argument(
+        "count", nargs="?", type=int, default=1000, help="requests per mode"
+    )
+    parser.add_argument(
+        "--path", default="/health/pool", help="API path to request"
+    )
+    args = parser.parse_args()
+    asyncio.run(main(args.count, args.path))
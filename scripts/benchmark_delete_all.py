@@ -0,0 +1,116 @@
+"""
+Benchmark DELETE /expenses/all against the per-expense account lookups it
+replaced.
+
+Needs a running MongoDB (MONGO_URI) and TOKEN_SECRET_KEY. A throwaway user
+is created through the API, its expenses are seeded directly and the user is
+deleted afterwards. Run from the repository root:
+
+    PYTHONPATH=src python scripts/benchmark_delete_all.py 10000 100000
+
+--skip-lookups only times the endpoint.
+"""
+
+import argparse
+import asyncio
+import datetime
+import time
+import uuid
+
+from httpx import ASGITransport, AsyncClient
+
+from api.app import app
+from api.utils.db import accounts_collection, expenses_collection
+
+SEED_BATCH_SIZE = 10000
+
+
+async def seed_expenses(user_id: str, count: int) -> None:
+    """Insert count expenses split over two currencies."""
+    now = datetime.datetime.now(datetime.timezone.utc)
+    for start in range(0, count, SEED_BATCH_SIZE):
+        await expenses_collection.insert_many(
+            [
+                {
+                    "user_id": user_id,
+                    "amount": 1.0,
+                    "currency": "USD" if i % 2 else "EUR",
+                    "category": "Food",
+                    "description": f"Benchmark {i}",
+                    "account_name": "Checking",
+                    "date": now - datetime.timedelta(minutes=i),
+                }
+                for i in range(start, min(start + SEED_BATCH_SIZE, count))
+            ]
+        )
+
+
+async def per_expense_lookups(user_id: str) -> None:
+    """The previous implementation: one account lookup per expense."""
+    expenses = await expenses_collection.find({"user_id": user_id}).to_list(
+        None
+    )
+    for expense in expenses:
+        await accounts_collection.find_one(
+            {"name": expense["account_name"], "user_id": user_id}
+        )
+
+
+async def benchmark(count: int, lookups: bool = True) -> None:
+    """Time both strategies for a user with count expenses."""
+    username = f"benchmark-{uuid.uuid4().hex[:8]}"
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://benchmark"
+    ) as client:
+        await client.post(
+            "/users/", json={"username": username, "password": username}
+        )
+        response = await client.post(
+            "/users/token/", data={"username": username, "password": username}
+        )
+        client.headers.update({"token": response.json()["result"]["token"]})
+        user_id = (await client.get("/users/")).json()["_id"]
+
+        try:
+            await seed_expenses(user_id, count)
+
+            line = f"{count:>8} expenses  "
+            if lookups:
+                started = time.perf_counter()
+                await per_expense_lookups(user_id)
+                elapsed = time.perf_counter() - started
+                line += f"per-expense lookups {elapsed:8.2f}s  "
+
+            started = time.perf_counter()
+            response = await client.delete("/expenses/all")
+            elapsed = time.perf_counter() - started
+            response.raise_for_status()
+            print(f"{line}DELETE /expenses/all {elapsed:8.2f}s")
+        finally:
+            await expenses_collection.delete_many({"user_id": user_id})
+            await client.delete("/users/")
+
+
+async def main(counts, lookups: bool) -> None:
+    for count in counts:
+        await benchmark(count, lookups)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark deleting all expenses of a user"
+    )
+    parser.add_argument(
+        "counts",
+        nargs="*",
+        type=int,
+        default=[10000, 100000],
+        help="numbers of expenses to benchmark",
+    )
+    parser.add_argument(
+        "--skip-lookups",
+        action="store_true",
+        help="do not time the per-expense account lookups",
+    )
+    args = parser.parse_args()
+    asyncio.run(main(args.counts, not args.skip_lookups))
@@ -2,6 +2,7 @@
 This module defines the main FastAPI application for Money Manager.
 """
 
+import asyncio
 from contextlib import asynccontextmanager
 
 import uvicorn
@@ -14,17 +15,34 @@ from api.routers import (
     categories,
     expenses,
     exports,
+    health,
+    ledger,
     users,
 )
+from api.utils.currency import currency_service
+from api.utils.db import db
+from api.utils.export_jobs import export_jobs
+from api.utils.indexes import API_COLLECTIONS, ensure_indexes
+from api.utils.render import renderer
 from config.config import API_BIND_HOST, API_BIND_PORT
 
 
 @asynccontextmanager
 async def lifespan(_app: FastAPI):
     """Lifespan function that handles app startup and shutdown"""
+    await ensure_indexes(db, API_COLLECTIONS)
+    # Load the exchange rates before the first conversion needs them
+    await asyncio.to_thread(currency_service.reload)
+    currency_service.start()
+    # Start the chart workers before requests need them
+    renderer.start()
+    export_jobs.start()
     yield
-    # Handles the shutdown event to close the MongoDB client
+    # Handles the shutdown event to close the shared MongoDB client
     await users.shutdown_db_client()
+    renderer.shutdown()
+    await export_jobs.shutdown()
+    await currency_service.shutdown()
 
 
 app = FastAPI(
@@ -47,8 +65,10 @@ app.include_router(users.router)
 app.include_router(accounts.router)
 app.include_router(categories.router)
 app.include_router(expenses.router)
+app.include_router(ledger.router)
 app.include_router(analytics.router)
 app.include_router(exports.router)
+app.include_router(health.router)
 
 if __name__ == "__main__":
     uvicorn.run("app:app", host=API_BIND_HOST, port=API_BIND_PORT, reload=True)
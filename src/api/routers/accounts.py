@@ -6,19 +6,13 @@ from typing import Optional
 
 from bson import ObjectId
 from fastapi import APIRouter, Header, HTTPException
-from motor.motor_asyncio import AsyncIOMotorClient
 from pydantic import BaseModel
 
 from api.utils.auth import verify_token
-from config.config import MONGO_URI
+from api.utils.db import accounts_collection
 
 router = APIRouter(prefix="/accounts", tags=["Accounts"])
 
-# MongoDB setup
-client: AsyncIOMotorClient = AsyncIOMotorClient(MONGO_URI)
-db = client.mmdb
-accounts_collection = db.accounts
-
 
 class AccountCreate(BaseModel):
     """Schema for creating a new account."""
@@ -3,116 +3,294 @@ This module provides analytics endpoints for retrieving and visualizing expense
 """
 
 import datetime
-from typing import Optional
+from typing import Optional, Tuple
 
+from bson import ObjectId
 from fastapi import APIRouter, Header, HTTPException, Response
 
+from api.utils.aggregations import (
+    aggregate_totals,
+    check_base_currency,
+    convert_budgets,
+    expense_date_bounds,
+)
 from api.utils.auth import verify_token
-from api.utils.db import calculate_days_in_range, fetch_data
+from api.utils.chart_cache import (
+    chart_etag,
+    chart_key,
+    etag_matches,
+    get_chart,
+    put_chart,
+)
+from api.utils.currency import currency_service
+from api.utils.db import (
+    calculate_days_in_range,
+    get_data_version,
+    users_collection,
+)
 from api.utils.plots import (
+    BudgetChartOptions,
     create_budget_vs_actual,
     create_category_bar,
     create_category_pie,
     create_expense_bar,
     create_monthly_line,
 )
+from api.utils.render import renderer
 
 router = APIRouter(prefix="/analytics", tags=["Analytics"])
 
 
+def png_response(key: str, content: bytes) -> Response:
+    """Build a PNG response whose ETag identifies the chart version."""
+    return Response(
+        content=content,
+        media_type="image/png",
+        headers={
+            "ETag": chart_etag(key),
+            "Cache-Control": "private, no-cache",
+        },
+    )
+
+
+def chart_name(chart: str, base_currency: Optional[str]) -> str:
+    """
+    Name a chart for the cache.
+
+    Charts in a base currency are cached apart from unconverted ones, and
+    per version of the exchange rates they were converted with.
+    """
+    if base_currency:
+        return f"{chart}:{base_currency}:{currency_service.version}"
+    return chart
+
+
+async def lookup_chart(
+    user_id: str,
+    chart: str,
+    from_date: Optional[datetime.date],
+    to_date: Optional[datetime.date],
+    if_none_match: Optional[str],
+) -> Tuple[str, Optional[Response]]:
+    """
+    Look up a rendered chart for the user's current data version.
+
+    Args:
+        user_id (str): Owner of the chart.
+        chart (str): Name of the chart from chart_name.
+        from_date (Optional[datetime.date]): Start of the charted range.
+        to_date (Optional[datetime.date]): End of the charted range.
+        if_none_match (Optional[str]): If-None-Match header of the request.
+
+    Returns:
+        Tuple[str, Optional[Response]]: The cache key and either a 304 or
+        cached PNG response, or None if the chart has to be rendered.
+    """
+    data_version = await get_data_version(user_id)
+    key = chart_key(user_id, chart, from_date, to_date, data_version)
+    etag = chart_etag(key)
+    if etag_matches(if_none_match, etag):
+        return key, Response(status_code=304, headers={"ETag": etag})
+
+    content = await get_chart(key)
+    if content is not None:
+        return key, png_response(key, content)
+    return key, None
+
+
+async def store_chart(key: str, content: bytes) -> Response:
+    """Cache a rendered chart and build its response."""
+    await put_chart(key, content)
+    return png_response(key, content)
+
+
 @router.get("/expense/bar")
 async def expense_bar(
     from_date: Optional[datetime.date] = None,
     to_date: Optional[datetime.date] = None,
+    base_currency: Optional[str] = None,
     token: str = Header(None),
+    if_none_match: Optional[str] = Header(None),
 ):
     """Generate bar chart of daily expenses."""
     user_id = await verify_token(token)
-    expenses, _, _ = await fetch_data(user_id, from_date, to_date)
+    base_currency = check_base_currency(base_currency)
+    key, cached = await lookup_chart(
+        user_id,
+        chart_name("expense_bar", base_currency),
+        from_date,
+        to_date,
+        if_none_match,
+    )
+    if cached is not None:
+        return cached
+
+    days, totals = await aggregate_totals(
+        user_id,
+        "day",
+        from_date=from_date,
+        to_date=to_date,
+        base_currency=base_currency,
+    )
 
-    if not expenses:
+    if not days:
         raise HTTPException(status_code=404, detail="No expenses found")
 
-    buf = create_expense_bar(expenses, from_date, to_date)
-    return Response(content=buf.getvalue(), media_type="image/png")
+    buf = await renderer.render(
+        create_expense_bar, days, totals, from_date, to_date, base_currency
+    )
+    return await store_chart(key, buf.getvalue())
 
 
 @router.get("/category/pie")
 async def category_pie(
     from_date: Optional[datetime.date] = None,
     to_date: Optional[datetime.date] = None,
+    base_currency: Optional[str] = None,
     token: str = Header(None),
+    if_none_match: Optional[str] = Header(None),
 ):
     """
     Endpoint to generate a pie chart of categories categorized by type.
     Returns a PNG image file directly.
     """
     user_id = await verify_token(token)
+    base_currency = check_base_currency(base_currency)
     if not user_id:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    expenses, _, _ = await fetch_data(user_id, from_date, to_date)
+    key, cached = await lookup_chart(
+        user_id,
+        chart_name("category_pie", base_currency),
+        from_date,
+        to_date,
+        if_none_match,
+    )
+    if cached is not None:
+        return cached
+
+    categories, totals = await aggregate_totals(
+        user_id,
+        "category",
+        from_date=from_date,
+        to_date=to_date,
+        base_currency=base_currency,
+    )
 
-    if not expenses:
+    if not categories:
         raise HTTPException(
             status_code=404,
             detail="No expenses found for the specified period",
         )
 
-    buf = create_category_pie(expenses, from_date, to_date)
-    return Response(content=buf.getvalue(), media_type="image/png")
+    buf = await renderer.render(
+        create_category_pie,
+        categories,
+        totals,
+        from_date,
+        to_date,
+        base_currency,
+    )
+    return await store_chart(key, buf.getvalue())
 
 
 @router.get("/expense/line-monthly", response_class=Response)
 async def expense_line_monthly(
     from_date: Optional[datetime.date] = None,
     to_date: Optional[datetime.date] = None,
+    base_currency: Optional[str] = None,
     token: str = Header(None),
+    if_none_match: Optional[str] = Header(None),
 ):
     """
     Endpoint to generate a line chart of monthly expenses within a date range.
     Returns a PNG image file directly.
     """
     user_id = await verify_token(token)
+    base_currency = check_base_currency(base_currency)
     if not user_id:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    expenses, _, _ = await fetch_data(user_id, from_date, to_date)
+    key, cached = await lookup_chart(
+        user_id,
+        chart_name("monthly_line", base_currency),
+        from_date,
+        to_date,
+        if_none_match,
+    )
+    if cached is not None:
+        return cached
+
+    months, totals = await aggregate_totals(
+        user_id,
+        "month",
+        from_date=from_date,
+        to_date=to_date,
+        base_currency=base_currency,
+    )
 
-    if not expenses:
+    if not months:
         raise HTTPException(
             status_code=404,
             detail="No expenses found for the specified period",
         )
 
-    buf = create_monthly_line(expenses, from_date, to_date)
-    return Response(content=buf.getvalue(), media_type="image/png")
+    buf = await renderer.render(
+        create_monthly_line, months, totals, from_date, to_date, base_currency
+    )
+    return await store_chart(key, buf.getvalue())
 
 
 @router.get("/category/bar", response_class=Response)
 async def category_bar(
     from_date: Optional[datetime.date] = None,
     to_date: Optional[datetime.date] = None,
+    base_currency: Optional[str] = None,
     token: str = Header(None),
+    if_none_match: Optional[str] = Header(None),
 ):
     """
     Endpoint to generate a bar chart of expenses categorized by type within a date range.
     Returns a PNG image file directly.
     """
     user_id = await verify_token(token)
+    base_currency = check_base_currency(base_currency)
     if not user_id:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    expenses, _, _ = await fetch_data(user_id, from_date, to_date)
+    key, cached = await lookup_chart(
+        user_id,
+        chart_name("category_bar", base_currency),
+        from_date,
+        to_date,
+        if_none_match,
+    )
+    if cached is not None:
+        return cached
+
+    categories, totals = await aggregate_totals(
+        user_id,
+        "category",
+        from_date=from_date,
+        to_date=to_date,
+        base_currency=base_currency,
+    )
 
-    if not expenses:
+    if not categories:
         raise HTTPException(
             status_code=404,
             detail="No expenses found for the specified period",
         )
 
-    buf = create_category_bar(expenses, from_date, to_date)
-    return Response(content=buf.getvalue(), media_type="image/png")
+    buf = await renderer.render(
+        create_category_bar,
+        categories,
+        totals,
+        from_date,
+        to_date,
+        base_currency,
+    )
+    return await store_chart(key, buf.getvalue())
 
 
 def prorate_budget(
@@ -134,26 +312,62 @@ def prorate_budget(
 async def budget_vs_actual(
     from_date: Optional[datetime.date] = None,
     to_date: Optional[datetime.date] = None,
+    base_currency: Optional[str] = None,
     token: str = Header(None),
+    if_none_match: Optional[str] = Header(None),
 ):
     """
     Endpoint to generate a bar chart comparing budgeted vs actual expenses within a date range.
     Returns a PNG image file directly.
     """
     user_id = await verify_token(token)
+    base_currency = check_base_currency(base_currency)
     if not user_id:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    expenses, _, user = await fetch_data(user_id, from_date, to_date)
+    key, cached = await lookup_chart(
+        user_id,
+        chart_name("budget_vs_actual", base_currency),
+        from_date,
+        to_date,
+        if_none_match,
+    )
+    if cached is not None:
+        return cached
+
+    categories, totals = await aggregate_totals(
+        user_id,
+        "category",
+        from_date=from_date,
+        to_date=to_date,
+        base_currency=base_currency,
+    )
 
-    if not expenses:
+    if not categories:
         raise HTTPException(
             status_code=404,
             detail="No expenses found for the specified period",
         )
 
-    buf = create_budget_vs_actual(
-        expenses, user["categories"] if user else {}, from_date, to_date
+    first_expense_date, last_expense_date = None, None
+    if not (from_date and to_date):
+        first_expense_date, last_expense_date = await expense_date_bounds(
+            user_id, from_date, to_date
+        )
+    user = await users_collection.find_one({"_id": ObjectId(user_id)}) or {}
+    budgets = convert_budgets(user, base_currency)
+
+    buf = await renderer.render(
+        create_budget_vs_actual,
+        categories,
+        totals,
+        BudgetChartOptions(
+            budgets,
+            from_date,
+            to_date,
+            first_expense_date,
+            last_expense_date,
+            base_currency,
+        ),
     )
-
-    return Response(content=buf.getvalue(), media_type="image/png")
+    return await store_chart(key, buf.getvalue())
@@ -2,27 +2,37 @@
 This module provides endpoints for managing categories of a particular user.
 """
 
+import calendar
+import datetime
+from typing import Optional, Tuple
+
 from bson import ObjectId
 from fastapi import APIRouter, Header, HTTPException
-from motor.motor_asyncio import AsyncIOMotorClient
 from pydantic import BaseModel
 
+from api.utils.aggregations import (
+    aggregate_totals,
+    budget_currency,
+    check_base_currency,
+    convert_budgets,
+)
 from api.utils.auth import verify_token
-from config.config import MONGO_URI
+from api.utils.db import users_collection
 
 router = APIRouter(prefix="/categories", tags=["Categories"])
 
-# MongoDB setup
-client: AsyncIOMotorClient = AsyncIOMotorClient(MONGO_URI)
-db = client.mmdb
-users_collection = db.users
-
 
 class CategoryCreate(BaseModel):
-    """Schema for creating a new category."""
+    """
+    Schema for creating a new category.
+
+    The monthly budget is in currency, by default the first currency of the
+    user.
+    """
 
     name: str
     monthly_budget: float
+    currency: Optional[str] = None
 
 
 class CategoryUpdate(BaseModel):
@@ -55,13 +65,24 @@ async def create_category(category: CategoryCreate, token: str = Header(None)):
     if category.name in user["categories"]:
         raise HTTPException(status_code=400, detail="Category already exists")
 
+    currency = budget_currency(user, category.dict()).upper()
+    if currency not in user.get("currencies", [currency]):
+        raise HTTPException(
+            status_code=400,
+            detail="Currency type is not added to user account",
+        )
+
     user["categories"][category.name] = {
-        "monthly_budget": category.monthly_budget
+        "monthly_budget": category.monthly_budget,
+        "currency": currency,
     }
 
     await users_collection.update_one(
         {"_id": ObjectId(user_id)},
-        {"$set": {"categories": user["categories"]}},
+        {
+            "$set": {"categories": user["categories"]},
+            "$inc": {"data_version": 1},
+        },
     )
 
     return {"message": "Category created successfully"}
@@ -105,7 +126,10 @@ async def update_category(
 
     await users_collection.update_one(
         {"_id": ObjectId(user_id)},
-        {"$set": {"categories": user["categories"]}},
+        {
+            "$set": {"categories": user["categories"]},
+            "$inc": {"data_version": 1},
+        },
     )
 
     return {"message": "Category updated successfully"}
@@ -156,6 +180,90 @@ async def get_category(category_name: str, token: str = Header(None)):
     return {"category": user["categories"][category_name]}
 
 
+def month_range(
+    month: Optional[str],
+) -> Tuple[datetime.date, datetime.date]:
+    """
+    First and last day of a "YYYY-MM" month, the current month if None.
+
+    Raises:
+        HTTPException: If the month is not formatted as "YYYY-MM".
+    """
+    if month is None:
+        first_day = datetime.date.today().replace(day=1)
+    else:
+        try:
+            first_day = datetime.datetime.strptime(month, "%Y-%m").date()
+        except ValueError as e:
+            raise HTTPException(
+                status_code=422, detail="Invalid month, expected YYYY-MM"
+            ) from e
+    _, days = calendar.monthrange(first_day.year, first_day.month)
+    return first_day, first_day.replace(day=days)
+
+
+@router.get("/{category_name}/budget-status")
+async def get_budget_status(
+    category_name: str,
+    month: Optional[str] = None,
+    currency: Optional[str] = None,
+    token: str = Header(None),
+):
+    """
+    Get how much of a category's monthly budget has been spent.
+
+    The spending is summed by the database, so only the total of the month
+    is returned instead of its expenses.
+
+    Args:
+        category_name (str): The name of the category.
+        month (Optional[str]): Month as "YYYY-MM", defaults to this month.
+        currency (Optional[str]): Currency to convert the expenses and the
+            budget to, amounts are summed as they are if None.
+        token (str): Authentication token.
+
+    Returns:
+        dict: The budget, spent and remaining amounts and the percentage of
+        the budget spent, which is None without a budget.
+    """
+    user_id = await verify_token(token)
+    first_day, last_day = month_range(month)
+    currency = check_base_currency(currency)
+
+    user = await users_collection.find_one(
+        {"_id": ObjectId(user_id)}, {"categories": 1, "currencies": 1}
+    )
+    if (
+        not user
+        or "categories" not in user
+        or category_name not in user["categories"]
+    ):
+        raise HTTPException(status_code=404, detail="Category not found")
+
+    budget = float(
+        convert_budgets(user, currency)[category_name]["monthly_budget"]
+    )
+    _, totals = await aggregate_totals(
+        user_id,
+        "category",
+        from_date=first_day,
+        to_date=last_day,
+        base_currency=currency,
+        category=category_name,
+    )
+    spent = sum(totals)
+
+    return {
+        "category": category_name,
+        "month": first_day.strftime("%Y-%m"),
+        "currency": currency,
+        "budget": budget,
+        "spent": spent,
+        "remaining": budget - spent,
+        "percentage": spent / budget * 100 if budget else None,
+    }
+
+
 @router.delete("/{category_name}")
 async def delete_category(category_name: str, token: str = Header(None)):
     """
@@ -182,7 +290,10 @@ async def delete_category(category_name: str, token: str = Header(None)):
 
     await users_collection.update_one(
         {"_id": ObjectId(user_id)},
-        {"$set": {"categories": user["categories"]}},
+        {
+            "$set": {"categories": user["categories"]},
+            "$inc": {"data_version": 1},
+        },
     )
 
     return {"message": "Category deleted successfully"}
@@ -2,28 +2,42 @@
 This module provides endpoints for managing user expenses in the Money Manager application.
 """
 
+import base64
 import datetime
-from typing import Optional
+from collections import defaultdict
+from typing import Annotated, Any, Dict, List, Optional, Tuple
 
 from bson import ObjectId
-from currency_converter import CurrencyConverter  # type: ignore
-from fastapi import APIRouter, Header, HTTPException
-from motor.motor_asyncio import AsyncIOMotorClient
-from pydantic import BaseModel
+from bson.errors import InvalidId
+from fastapi import APIRouter, Header, HTTPException, Query
+from pydantic import BaseModel, Field, field_validator
+from pymongo import DESCENDING, UpdateOne
+from pymongo.errors import PyMongoError
 
 from api.utils.auth import verify_token
-from config.config import MONGO_URI
-
-currency_converter = CurrencyConverter()
+from api.utils.currency import currency_service
+from api.utils.db import (
+    accounts_collection,
+    adjust_balance,
+    bump_data_version,
+    expenses_collection,
+    run_transaction,
+    users_collection,
+)
+from api.utils.rollups import apply_rollup_deltas, update_rollups
 
 router = APIRouter(prefix="/expenses", tags=["Expenses"])
 
-# MongoDB setup
-client: AsyncIOMotorClient = AsyncIOMotorClient(MONGO_URI)
-db = client.mmdb
-users_collection = db.users
-expenses_collection = db.expenses
-accounts_collection = db.accounts
+MAX_PAGE_SIZE = 1000
+MAX_BULK_SIZE = 1000
+EXPENSE_FIELDS = {
+    "amount",
+    "currency",
+    "category",
+    "description",
+    "account_name",
+    "date",
+}
 
 
 def format_id(document):
@@ -33,17 +47,34 @@ def format_id(document):
 
 
 def convert_currency(amount, from_cur, to_cur):
-    """Convert currency using the CurrencyConverter library."""
+    """Convert currency using the latest exchange rates."""
     if from_cur == to_cur:
         return amount
     try:
-        return currency_converter.convert(amount, from_cur, to_cur)
+        return currency_service.convert(amount, from_cur, to_cur)
     except Exception as e:
         raise HTTPException(
             status_code=400, detail=f"Currency conversion failed: {str(e)}"
         ) from e
 
 
+def encode_cursor(expense: dict) -> str:
+    """Encode the (date, _id) position of an expense as a page cursor."""
+    position = f"{expense['date'].isoformat()}|{expense['_id']}"
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime.datetime, ObjectId]:
+    """Decode a page cursor created by encode_cursor."""
+    try:
+        date, expense_id = (
+            base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        )
+        return datetime.datetime.fromisoformat(date), ObjectId(expense_id)
+    except (ValueError, TypeError, InvalidId) as e:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from e
+
+
 class ExpenseCreate(BaseModel):
     """Model for creating an expense."""
 
@@ -66,29 +97,65 @@ class ExpenseUpdate(BaseModel):
     date: Optional[datetime.datetime] = None
 
 
-@router.post("/")
-async def add_expense(expense: ExpenseCreate, token: str = Header(None)):
+class ExpenseBulkCreate(BaseModel):
+    """Model for adding a batch of expenses."""
+
+    expenses: List[ExpenseCreate]
+
+
+class ExpenseListQuery(BaseModel):
+    """Query parameters for listing expenses."""
+
+    limit: int = Field(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+    cursor: Optional[str] = None
+    offset: int = Field(0, ge=0)
+    from_date: Optional[datetime.datetime] = None
+    to_date: Optional[datetime.datetime] = None
+    start_date: Optional[datetime.datetime] = None
+    end_date: Optional[datetime.datetime] = None
+    category: Optional[str] = None
+    account_name: Optional[str] = None
+    currency: Optional[str] = None
+    fields: Optional[str] = None
+    include_total: bool = False
+
+    @field_validator("to_date", "end_date", mode="before")
+    @classmethod
+    def include_whole_day(cls, value: Any) -> Any:
+        """Make a date-only upper bound the end of that day."""
+        if isinstance(value, str):
+            try:
+                value = datetime.date.fromisoformat(value)
+            except ValueError:
+                return value
+        if isinstance(value, datetime.date) and not isinstance(
+            value, datetime.datetime
+        ):
+            return datetime.datetime.combine(value, datetime.time.max)
+        return value
+
+
+def check_expense(
+    expense: ExpenseCreate, user: dict, account: dict, balance: float
+) -> float:
     """
-    Add a new expense for the user.
+    Validate an expense against the user and the account it is paid from.
+
+    The currency of the expense is normalised to upper case.
 
     Args:
         expense (ExpenseCreate): Expense details.
-        token (str): Authentication token.
+        user (dict): User document.
+        account (dict): Account document.
+        balance (float): Balance of the account available to the expense.
 
     Returns:
-        dict: Message with expense details and updated balance.
-    """
-    user_id = await verify_token(token)
-    account = await accounts_collection.find_one(
-        {"user_id": user_id, "name": expense.account_name}
-    )
-    if not account:
-        raise HTTPException(status_code=400, detail="Invalid account type")
-
-    user = await users_collection.find_one({"_id": ObjectId(user_id)})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+        float: Amount of the expense in the currency of the account.
 
+    Raises:
+        HTTPException: If the currency or category is not added to the user
+            or the balance is insufficient.
+    """
     expense.currency = expense.currency.upper()
     if expense.currency not in user["currencies"]:
         raise HTTPException(
@@ -102,7 +169,7 @@ async def add_expense(expense: ExpenseCreate, token: str = Header(None)):
         expense.amount, expense.currency, account["currency"]
     )
 
-    if account["balance"] < converted_amount:
+    if balance < converted_amount:
         raise HTTPException(
             status_code=400,
             detail=f"Insufficient balance in {expense.account_name} account",
@@ -116,16 +183,38 @@ async def add_expense(expense: ExpenseCreate, token: str = Header(None)):
                 f"Available categories are {list(user['categories'])}"
             ),
         )
+    return converted_amount
+
+
+@router.post("/")
+async def add_expense(expense: ExpenseCreate, token: str = Header(None)):
+    """
+    Add a new expense for the user.
+
+    Args:
+        expense (ExpenseCreate): Expense details.
+        token (str): Authentication token.
+
+    Returns:
+        dict: Message with expense details and updated balance.
+    """
+    user_id = await verify_token(token)
+    account = await accounts_collection.find_one(
+        {"user_id": user_id, "name": expense.account_name}
+    )
+    if not account:
+        raise HTTPException(status_code=400, detail="Invalid account type")
 
-    # Deduct amount from user's account balance
-    new_balance = account["balance"] - converted_amount
-    await accounts_collection.update_one(
-        {"_id": account["_id"]}, {"$set": {"balance": new_balance}}
+    user = await users_collection.find_one({"_id": ObjectId(user_id)})
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    converted_amount = check_expense(
+        expense, user, account, account["balance"]
     )
 
     # Convert date to datetime object or use current datetime if none is provided
     expense_date = expense.date or datetime.datetime.now(datetime.timezone.utc)
-    # Record the expense
     expense_data = expense.dict()
     expense_data.update(
         {
@@ -133,37 +222,313 @@ async def add_expense(expense: ExpenseCreate, token: str = Header(None)):
             "date": expense_date,
         }
     )
-    result = await expenses_collection.insert_one(expense_data)
+
+    async def record(session):
+        # Deduct amount from user's account balance
+        updated = await adjust_balance(
+            account["_id"], -converted_amount, session
+        )
+        if not updated:
+            raise HTTPException(
+                status_code=400,
+                detail=(
+                    f"Insufficient balance in {expense.account_name} account"
+                ),
+            )
+
+        # Record the expense
+        try:
+            inserted = await expenses_collection.insert_one(
+                expense_data, session=session
+            )
+        except PyMongoError:
+            if session is None:
+                await adjust_balance(account["_id"], converted_amount)
+            raise
+        await update_rollups(user_id, added=[expense_data], session=session)
+        return updated, inserted
+
+    account, result = await run_transaction(record)
 
     if result.inserted_id:
+        await bump_data_version(user_id)
         expense_data[
             "date"
         ] = expense_date  # Ensure consistent formatting for response
         return {
             "message": "Expense added successfully",
             "expense": format_id(expense_data),
-            "balance": new_balance,
+            "balance": account["balance"],
         }
     raise HTTPException(status_code=500, detail="Failed to add expense")
 
 
+def prepare_batch(
+    expenses: List[ExpenseCreate], user: dict, accounts: Dict[str, dict]
+) -> Tuple[List[dict], Dict[str, float], List[dict]]:
+    """
+    Validate a batch of expenses against one snapshot of the accounts.
+
+    Args:
+        expenses (List[ExpenseCreate]): Expenses of the batch.
+        user (dict): Owner of the expenses.
+        accounts (Dict[str, dict]): Accounts of the user by name.
+
+    Returns:
+        Tuple: Documents of the valid expenses, the amount to debit per
+        account name and the errors of the invalid expenses by index.
+    """
+    balances = {name: account["balance"] for name, account in accounts.items()}
+    deductions: Dict[str, float] = defaultdict(float)
+    expense_docs = []
+    errors = []
+    now = datetime.datetime.now(datetime.timezone.utc)
+    for index, expense in enumerate(expenses):
+        try:
+            account = accounts.get(expense.account_name)
+            if not account:
+                raise HTTPException(
+                    status_code=400, detail="Invalid account type"
+                )
+            converted_amount = check_expense(
+                expense, user, account, balances[expense.account_name]
+            )
+        except HTTPException as e:
+            errors.append(
+                {
+                    "index": index,
+                    "status_code": e.status_code,
+                    "detail": e.detail,
+                }
+            )
+            continue
+        balances[expense.account_name] -= converted_amount
+        deductions[expense.account_name] += converted_amount
+        expense_data = expense.dict()
+        expense_data.update(
+            {"user_id": str(user["_id"]), "date": expense.date or now}
+        )
+        expense_docs.append(expense_data)
+    return expense_docs, deductions, errors
+
+
+async def insert_expenses(
+    user_id: str,
+    expense_docs: List[dict],
+    accounts: Dict[str, dict],
+    deductions: Dict[str, float],
+) -> Dict[str, float]:
+    """
+    Insert validated expenses and debit the accounts they are paid from.
+
+    Every account is debited once with the guarded update of
+    adjust_balance, so a balance spent by a concurrent request is never
+    overdrawn. Without transactions, the debits made and the expenses
+    inserted are undone when a later write fails.
+
+    Args:
+        user_id (str): Owner of the expenses.
+        expense_docs (List[dict]): Expense documents to insert.
+        accounts (Dict[str, dict]): Accounts of the user by name.
+        deductions (Dict[str, float]): Amount to debit per account name.
+
+    Returns:
+        Dict[str, float]: Updated balance per account name.
+    """
+
+    async def record(session):
+        balances: Dict[str, float] = {}
+        try:
+            for name, amount in deductions.items():
+                account = await adjust_balance(
+                    accounts[name]["_id"], -amount, session=session
+                )
+                if not account:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Insufficient balance in {name} account",
+                    )
+                balances[name] = account["balance"]
+            await expenses_collection.insert_many(
+                expense_docs, session=session
+            )
+        except (HTTPException, PyMongoError):
+            if session is None:
+                # insert_many sets the ids, remove what was inserted
+                inserted = [doc["_id"] for doc in expense_docs if "_id" in doc]
+                if inserted:
+                    await expenses_collection.delete_many(
+                        {"_id": {"$in": inserted}}
+                    )
+                for name in balances:
+                    await adjust_balance(
+                        accounts[name]["_id"], deductions[name]
+                    )
+            raise
+        await update_rollups(user_id, added=expense_docs, session=session)
+        return balances
+
+    return await run_transaction(record)
+
+
+@router.post("/bulk")
+async def add_expenses_bulk(
+    batch: ExpenseBulkCreate, token: str = Header(None)
+):
+    """
+    Add a batch of expenses for the user.
+
+    The batch is validated against one snapshot of the user and accounts.
+    Expenses failing validation are reported and skipped, the others are
+    inserted together and each account balance is updated once.
+
+    Args:
+        batch (ExpenseBulkCreate): Expenses to add.
+        token (str): Authentication token.
+
+    Returns:
+        dict: Added expenses, per-item errors and updated balances.
+    """
+    user_id = await verify_token(token)
+    if len(batch.expenses) > MAX_BULK_SIZE:
+        raise HTTPException(
+            status_code=422,
+            detail=f"A batch may contain at most {MAX_BULK_SIZE} expenses",
+        )
+
+    user = await users_collection.find_one({"_id": ObjectId(user_id)})
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    account_names = {expense.account_name for expense in batch.expenses}
+    accounts = {
+        account["name"]: account
+        async for account in accounts_collection.find(
+            {"user_id": user_id, "name": {"$in": list(account_names)}}
+        )
+    }
+
+    expense_docs, deductions, errors = prepare_batch(
+        batch.expenses, user, accounts
+    )
+    balances: Dict[str, float] = {}
+    if expense_docs:
+        balances = await insert_expenses(
+            user_id, expense_docs, accounts, deductions
+        )
+        await bump_data_version(user_id)
+
+    return {
+        "message": (
+            f"Added {len(expense_docs)} of {len(batch.expenses)} expenses"
+        ),
+        "expenses": [format_id(expense) for expense in expense_docs],
+        "errors": errors,
+        "balances": {name: balances[name] for name in deductions},
+    }
+
+
+def build_list_query(user_id: str, params: ExpenseListQuery) -> Dict[str, Any]:
+    """Build the MongoDB filter of the expenses matching the list filters."""
+    query: Dict[str, Any] = {"user_id": user_id}
+    date_filter = {}
+    if params.from_date or params.start_date:
+        date_filter["$gte"] = params.from_date or params.start_date
+    if params.to_date or params.end_date:
+        date_filter["$lte"] = params.to_date or params.end_date
+    if date_filter:
+        query["date"] = date_filter
+    for field in ("category", "account_name", "currency"):
+        value = getattr(params, field)
+        if value is not None:
+            query[field] = value
+    return query
+
+
 @router.get("/")
-async def get_expenses(token: str = Header(None)):
+async def get_expenses(
+    params: Annotated[ExpenseListQuery, Query()], token: str = Header(None)
+):
     """
-    Get all expenses for a user.
+    Get a page of expenses for a user, newest first.
+
+    Pages are keyed on (date, _id): pass the returned next_cursor to get the
+    following page. offset skips expenses, for jumping to a page number.
 
     Args:
+        params (ExpenseListQuery): Query parameters:
+
+            - limit: Maximum number of expenses to return.
+            - cursor: next_cursor of the previous page.
+            - offset: Number of expenses to skip.
+            - from_date: Earliest expense date (inclusive); start_date is
+              accepted as an alias.
+            - to_date: Latest expense date (inclusive); end_date is
+              accepted as an alias.
+            - category: Only expenses of this category.
+            - account_name: Only expenses of this account.
+            - currency: Only expenses in this currency.
+            - fields: Comma separated fields to return.
+            - include_total: Also count all expenses matching the filters.
         token (str): Authentication token.
 
     Returns:
-        dict: List of expenses.
+        dict: List of expenses, the next cursor and optionally the total.
     """
     user_id = await verify_token(token)
-    expenses = await expenses_collection.find({"user_id": user_id}).to_list(
-        1000
+    query = build_list_query(user_id, params)
+
+    total = (
+        await expenses_collection.count_documents(query)
+        if params.include_total
+        else None
     )
-    formatted_expenses = [format_id(expense) for expense in expenses]
-    return {"expenses": formatted_expenses}
+
+    if params.cursor:
+        last_date, last_id = decode_cursor(params.cursor)
+        query = {
+            "$and": [
+                query,
+                {
+                    "$or": [
+                        {"date": {"$lt": last_date}},
+                        {"date": last_date, "_id": {"$lt": last_id}},
+                    ]
+                },
+            ]
+        }
+
+    projection = None
+    if params.fields:
+        requested = {field.strip() for field in params.fields.split(",")}
+        unknown = requested - EXPENSE_FIELDS
+        if unknown:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Unknown fields: {', '.join(sorted(unknown))}",
+            )
+        # The date is always returned because pages are keyed on it
+        projection = dict.fromkeys(requested | {"date"}, 1)
+
+    expenses = (
+        await expenses_collection.find(query, projection)
+        .sort([("date", DESCENDING), ("_id", DESCENDING)])
+        .skip(params.offset)
+        .limit(params.limit + 1)
+        .to_list(params.limit + 1)
+    )
+    next_cursor = None
+    if len(expenses) > params.limit:
+        expenses = expenses[: params.limit]
+        next_cursor = encode_cursor(expenses[-1])
+
+    result: Dict[str, Any] = {
+        "expenses": [format_id(expense) for expense in expenses],
+        "next_cursor": next_cursor,
+    }
+    if total is not None:
+        result["total"] = total
+    return result
 
 
 @router.get("/{expense_id}")
@@ -200,43 +565,101 @@ async def delete_all_expenses(token: str = Header(None)):
     """
     user_id = await verify_token(token)
 
-    # Retrieve all expenses for the user before deletion
-    expenses = await expenses_collection.find({"user_id": user_id}).to_list(
-        None
-    )
-    if not expenses:
-        raise HTTPException(
-            status_code=404, detail="No expenses found to delete"
-        )
-
-    # Organize expenses by account name to sum them for each account
-    account_adjustments: dict[str, float] = {}
-    for expense in expenses:
-        account_name = expense.get("account_name")
-        amount = expense.get("amount", 0)
+    async def delete_all(session):
+        # Sum the expenses per account, currency, day and category inside
+        # MongoDB and collect their ids, so only the summed expenses are
+        # deleted even if others are added meanwhile
+        groups = await expenses_collection.aggregate(
+            [
+                {"$match": {"user_id": user_id}},
+                {
+                    "$group": {
+                        "_id": {
+                            "account_name": "$account_name",
+                            "currency": "$currency",
+                            "day": {
+                                "$dateTrunc": {"date": "$date", "unit": "day"}
+                            },
+                            "category": "$category",
+                        },
+                        "total": {"$sum": "$amount"},
+                        "count": {"$sum": 1},
+                        "ids": {"$push": "$_id"},
+                    }
+                },
+            ],
+            session=session,
+        ).to_list(None)
+        if not groups:
+            raise HTTPException(
+                status_code=404, detail="No expenses found to delete"
+            )
 
-        # Find the account ID by name
-        account = await accounts_collection.find_one(
-            {"name": account_name, "user_id": user_id}
+        account_names = list(
+            {group["_id"]["account_name"] for group in groups}
         )
-        if account:
-            account_id = account["_id"]
-            if account_id in account_adjustments:
-                account_adjustments[account_id] += amount
-            else:
-                account_adjustments[account_id] = amount
-
-    # Update each account's balance
-    for account_id, total_expense_amount in account_adjustments.items():
-        await accounts_collection.update_one(
-            {"_id": account_id, "user_id": user_id},
-            {"$inc": {"balance": total_expense_amount}},
+        accounts = {
+            account["name"]: account
+            async for account in accounts_collection.find(
+                {"user_id": user_id, "name": {"$in": account_names}},
+                session=session,
+            )
+        }
+
+        # Refund every account in its own currency
+        refunds: Dict[ObjectId, float] = defaultdict(float)
+        rollup_deltas: Dict[Tuple[Any, ...], List[float]] = defaultdict(
+            lambda: [0, 0]
         )
+        for group in groups:
+            key = group["_id"]
+            account = accounts.get(key["account_name"])
+            if account:
+                refunds[account["_id"]] += convert_currency(
+                    group["total"], key["currency"], account["currency"]
+                )
+            delta = rollup_deltas[
+                (user_id, key["day"], key["category"], key["currency"])
+            ]
+            delta[0] -= group["total"]
+            delta[1] -= group["count"]
+
+        def refund_operations(sign):
+            return [
+                UpdateOne(
+                    {"_id": account_id, "user_id": user_id},
+                    {"$inc": {"balance": sign * amount}},
+                )
+                for account_id, amount in refunds.items()
+            ]
 
-    # Delete all expenses
-    result = await expenses_collection.delete_many({"user_id": user_id})
+        # Refund before deleting, so a failed refund leaves the expenses
+        if refunds:
+            await accounts_collection.bulk_write(
+                refund_operations(1), ordered=False, session=session
+            )
+        try:
+            result = await expenses_collection.delete_many(
+                {
+                    "user_id": user_id,
+                    "_id": {"$in": [i for g in groups for i in g["ids"]]},
+                },
+                session=session,
+            )
+        except PyMongoError:
+            # Without a transaction, take the refunds back
+            if session is None and refunds:
+                await accounts_collection.bulk_write(
+                    refund_operations(-1), ordered=False
+                )
+            raise
+        await apply_rollup_deltas(user_id, rollup_deltas, session=session)
+        return result.deleted_count
 
-    return {"message": f"{result.deleted_count} expenses deleted successfully"}
+    deleted_count = await run_transaction(delete_all)
+    await bump_data_version(user_id)
+
+    return {"message": f"{deleted_count} expenses deleted successfully"}
 
 
 @router.delete("/{expense_id}")
@@ -268,23 +691,84 @@ async def delete_expense(expense_id: str, token: str = Header(None)):
         expense["amount"], expense["currency"], account["currency"]
     )
 
-    # Refund the amount to user's account
-    new_balance = account["balance"] + amount
-    await accounts_collection.update_one(
-        {"_id": account["_id"]}, {"$set": {"balance": new_balance}}
-    )
+    async def refund(session):
+        # Delete the expense first so that concurrent deletes refund it once
+        result = await expenses_collection.delete_one(
+            {"_id": ObjectId(expense_id)}, session=session
+        )
+        if result.deleted_count != 1:
+            raise HTTPException(
+                status_code=500, detail="Failed to delete expense"
+            )
 
-    # Delete the expense
-    result = await expenses_collection.delete_one(
-        {"_id": ObjectId(expense_id)}
-    )
+        # Refund the amount to user's account
+        updated = await adjust_balance(account["_id"], amount, session)
+        await update_rollups(user_id, removed=[expense], session=session)
+        return updated
 
-    if result.deleted_count == 1:
-        return {
-            "message": "Expense deleted successfully",
-            "balance": new_balance,
-        }
-    raise HTTPException(status_code=500, detail="Failed to delete expense")
+    account = await run_transaction(refund)
+
+    await bump_data_version(user_id)
+    return {
+        "message": "Expense deleted successfully",
+        "balance": account["balance"] if account else None,
+    }
+
+
+async def write_expense_update(
+    expense: dict, account: dict, update_fields: dict, difference: float
+) -> float:
+    """
+    Apply a validated expense update and its balance change together.
+
+    Args:
+        expense (dict): Expense before the update.
+        account (dict): Account the expense is paid from.
+        update_fields (dict): Fields to set on the expense.
+        difference (float): Increase of the amount in the account currency.
+
+    Returns:
+        float: Balance of the account after the update.
+    """
+
+    async def apply_update(session):
+        new_balance = account["balance"]
+        if difference:
+            updated = await adjust_balance(
+                account["_id"], -difference, session
+            )
+            if not updated:
+                raise HTTPException(
+                    status_code=400,
+                    detail="Insufficient balance to update the expense",
+                )
+            new_balance = updated["balance"]
+
+        # Only apply the update if the amount was not changed meanwhile
+        result = await expenses_collection.update_one(
+            {
+                "_id": expense["_id"],
+                "amount": expense["amount"],
+                "currency": expense["currency"],
+            },
+            {"$set": update_fields},
+            session=session,
+        )
+        if result.modified_count != 1:
+            if session is None and difference:
+                await adjust_balance(account["_id"], difference)
+            raise HTTPException(
+                status_code=500, detail="Failed to update expense"
+            )
+        await update_rollups(
+            expense["user_id"],
+            added=[{**expense, **update_fields}],
+            removed=[expense],
+            session=session,
+        )
+        return new_balance
+
+    return await run_transaction(apply_update)
 
 
 @router.put("/{expense_id}")
@@ -327,8 +811,8 @@ async def update_expense(
                 )
             update_fields["currency"] = expense_update.currency
 
-    async def validate_amount():
-        nonlocal new_balance
+    def validate_amount():
+        nonlocal difference
         if expense_update.amount is not None:
             update_fields["amount"] = expense_update.amount
 
@@ -344,16 +828,6 @@ async def update_expense(
             )
 
             difference = new_amount_converted - original_amount_converted
-            new_balance = account["balance"] - difference
-
-            if new_balance < 0:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Insufficient balance to update the expense",
-                )
-            await accounts_collection.update_one(
-                {"_id": account["_id"]}, {"$set": {"balance": new_balance}}
-            )
 
     def validate_category():
         if expense_update.category:
@@ -384,8 +858,8 @@ async def update_expense(
     if not account:
         raise HTTPException(status_code=404, detail="Account not found")
 
-    new_balance = account["balance"]
-    await validate_amount()
+    difference = 0.0
+    validate_amount()
     validate_category()
     validate_description()
     validate_date()
@@ -393,16 +867,15 @@ async def update_expense(
     if not update_fields:
         raise HTTPException(status_code=400, detail="No fields to update")
 
-    result = await expenses_collection.update_one(
-        {"_id": ObjectId(expense_id)}, {"$set": update_fields}
+    new_balance = await write_expense_update(
+        expense, account, update_fields, difference
     )
-    if result.modified_count == 1:
-        updated_expense = await expenses_collection.find_one(
-            {"_id": ObjectId(expense_id)}
-        )
-        return {
-            "message": "Expense updated successfully",
-            "updated_expense": format_id(updated_expense),
-            "balance": new_balance,
-        }
-    raise HTTPException(status_code=500, detail="Failed to update expense")
+    await bump_data_version(user_id)
+    updated_expense = await expenses_collection.find_one(
+        {"_id": ObjectId(expense_id)}
+    )
+    return {
+        "message": "Expense updated successfully",
+        "updated_expense": format_id(updated_expense),
+        "balance": new_balance,
+    }
@@ -2,24 +2,39 @@
 This module contains the API routes for exporting data in various formats.
 """
 
+import asyncio
 import csv
 import datetime
 import os
+import tempfile
+import time
 from enum import Enum
+from functools import lru_cache, partial
 from io import BytesIO, StringIO
-from typing import Optional
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
 
 from bson import ObjectId
 from fastapi import APIRouter, Header, HTTPException, Query, Response
-from motor.motor_asyncio import AsyncIOMotorClient
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from motor.motor_asyncio import AsyncIOMotorCursor
 from openpyxl import Workbook
 from openpyxl.worksheet.worksheet import Worksheet
+from pydantic import BaseModel
 from pytz import timezone  # type: ignore
 from reportlab.lib import colors  # type: ignore
 from reportlab.lib.pagesizes import letter  # type: ignore
 from reportlab.lib.styles import ParagraphStyle  # type: ignore
-from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.styles import StyleSheet1, getSampleStyleSheet
 from reportlab.lib.units import inch  # type: ignore
+from reportlab.lib.utils import ImageReader  # type: ignore
 from reportlab.platypus import Paragraph  # type: ignore
 from reportlab.platypus import (
     Image,
@@ -29,25 +44,38 @@ from reportlab.platypus import (
     Table,
     TableStyle,
 )
-
+from starlette.background import BackgroundTask
+
+from api.utils.aggregations import (
+    aggregate_totals,
+    build_expense_query,
+    check_base_currency,
+    convert_budgets,
+    expense_date_bounds,
+)
 from api.utils.auth import verify_token
+from api.utils.db import (
+    accounts_collection,
+    expenses_collection,
+    users_collection,
+)
+from api.utils.export_jobs import DONE, FAILED, export_jobs, job_status
 from api.utils.plots import (
+    BudgetChartOptions,
     create_budget_vs_actual,
     create_category_bar,
     create_category_pie,
     create_expense_bar,
     create_monthly_line,
 )
-from config.config import MONGO_URI, TIME_ZONE
+from api.utils.render import renderer
+from config.config import EXPORT_BATCH_SIZE, TIME_ZONE
 
 router = APIRouter(prefix="/exports", tags=["Exports"])
 
-# MongoDB setup
-client: AsyncIOMotorClient = AsyncIOMotorClient(MONGO_URI)
-db = client.mmdb
-expenses_collection = db.expenses
-accounts_collection = db.accounts
-users_collection = db.users
+XLSX_MEDIA_TYPE = (
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+)
 
 
 class ExportType(str, Enum):
@@ -58,76 +86,69 @@ class ExportType(str, Enum):
     CATEGORIES = "categories"
 
 
-# Utility function to fetch data
-async def fetch_user_data(
-    user_id: str,
-    from_date: Optional[datetime.date],
-    to_date: Optional[datetime.date],
-):
-    """Fetch data from the database based on user ID and date range."""
-    if from_date and to_date and from_date > to_date:
-        raise HTTPException(
-            status_code=422,
-            detail="Invalid date range: 'from_date' must be before 'to_date'",
-        )
+class ExportFormat(str, Enum):
+    """Enum for export job formats."""
 
-    from_dt = (
-        datetime.datetime.combine(from_date, datetime.time.min)
-        if from_date
-        else None
-    )
-    to_dt = (
-        datetime.datetime.combine(to_date, datetime.time.max)
-        if to_date
-        else None
-    )
+    PDF = "pdf"
+    XLSX = "xlsx"
+    CSV = "csv"
 
-    query = {"user_id": user_id}
-    if from_dt and to_dt:
-        query["date"] = {"$gte": from_dt, "$lte": to_dt}  # type: ignore
-    elif from_dt:
-        query["date"] = {"$gte": from_dt}  # type: ignore
-    elif to_dt:
-        query["date"] = {"$lte": to_dt}  # type: ignore
 
-    expenses = await expenses_collection.find(query).to_list(1000)
-    accounts = await accounts_collection.find({"user_id": user_id}).to_list(
-        100
-    )
-    user = await users_collection.find_one({"_id": ObjectId(user_id)})
+class ExportJobCreate(BaseModel):
+    """Model for creating an export job."""
 
-    return expenses, accounts, user
+    format: ExportFormat
+    export_type: Optional[ExportType] = None
+    from_date: Optional[datetime.date] = None
+    to_date: Optional[datetime.date] = None
+    base_currency: Optional[str] = None
 
 
-def write_expenses_to_sheet(sheet: Worksheet, expenses: list):
-    """Write expenses data to the given worksheet."""
-    sheet.append(
-        [
-            "date",
-            "amount",
-            "currency",
-            "category",
-            "description",
-            "account_name",
-            "_id",
-        ]
+async def fetch_user_data(
+    user_id: str, query: dict
+) -> Tuple[Optional[dict], AsyncIOMotorCursor, List[dict], Optional[dict]]:
+    """
+    Fetch the data of an export based on user ID and expense query.
+
+    Expenses are not loaded at once. Only the first one is read, to tell
+    whether there are any, the rest is left on a cursor to be read in
+    batches of EXPORT_BATCH_SIZE.
+
+    Returns:
+        Tuple: The first expense or None, a cursor over the remaining
+        expenses, the accounts and the user.
+    """
+    cursor = expenses_collection.find(query).batch_size(EXPORT_BATCH_SIZE)
+    first, accounts, user = await asyncio.gather(
+        anext(cursor, None),
+        accounts_collection.find({"user_id": user_id}).to_list(100),
+        users_collection.find_one({"_id": ObjectId(user_id)}),
     )
-    for expense in expenses:
-        sheet.append(
-            [
-                (
-                    expense["date"].strftime("%Y-%m-%d")
-                    if expense.get("date")
-                    else ""
-                ),
-                expense["amount"],
-                expense["currency"],
-                expense["category"],
-                expense.get("description", ""),
-                expense["account_name"],
-                str(expense["_id"]),
-            ]
-        )
+    return first, cursor, accounts, user
+
+
+EXPENSE_COLUMNS = [
+    "date",
+    "amount",
+    "currency",
+    "category",
+    "description",
+    "account_name",
+    "_id",
+]
+
+
+def expense_row(expense: dict) -> list:
+    """Convert an expense document to a row of EXPENSE_COLUMNS values."""
+    return [
+        expense["date"].strftime("%Y-%m-%d") if expense.get("date") else "",
+        expense["amount"],
+        expense["currency"],
+        expense["category"],
+        expense.get("description", ""),
+        expense["account_name"],
+        str(expense["_id"]),
+    ]
 
 
 def write_accounts_to_sheet(sheet: Worksheet, accounts: list):
@@ -151,6 +172,42 @@ def write_categories_to_sheet(sheet: Worksheet, categories: dict):
         sheet.append([category_name, category_data["monthly_budget"]])
 
 
+def append_rows(sheet: Worksheet, rows: List[list]):
+    """Append rows to a worksheet."""
+    for row in rows:
+        sheet.append(row)
+
+
+async def write_expense_cursor_to_sheet(
+    sheet: Worksheet, first: Optional[dict], cursor: AsyncIOMotorCursor
+):
+    """
+    Write expenses from a cursor to the given worksheet.
+
+    Rows are collected in batches of EXPORT_BATCH_SIZE and each batch is
+    appended in a worker thread, so building the sheet does not block the
+    event loop.
+    """
+    sheet.append(EXPENSE_COLUMNS)
+    if first is None:
+        return
+    rows = [expense_row(first)]
+    async for expense in cursor:
+        rows.append(expense_row(expense))
+        if len(rows) == EXPORT_BATCH_SIZE:
+            await asyncio.to_thread(append_rows, sheet, rows)
+            rows = []
+    await asyncio.to_thread(append_rows, sheet, rows)
+
+
+def remove_file(path: str):
+    """Remove a temporary export file, ignoring files that are gone."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
 @router.get("/xlsx")
 async def data_to_xlsx(
     token: str = Header(None),
@@ -167,45 +224,99 @@ async def data_to_xlsx(
         Response: XLSX file containing expenses, accounts, and categories data.
     """
     user_id = await verify_token(token)
-    expenses, accounts, user = await fetch_user_data(
-        user_id, from_date, to_date
+    query = build_expense_query(user_id, from_date, to_date)
+    return await export_xlsx(user_id, query)
+
+
+async def export_xlsx(user_id: str, query: dict) -> Response:
+    """
+    Export the expenses matching a query, accounts and categories to XLSX.
+
+    Expenses are read from a cursor into a write-only workbook, which is
+    spooled to a temporary file and streamed back, so memory use does not
+    grow with the size of the history.
+    """
+    cursor = expenses_collection.find(query).batch_size(EXPORT_BATCH_SIZE)
+    first = await anext(cursor, None)
+    accounts = await accounts_collection.find({"user_id": user_id}).to_list(
+        100
     )
+    user = await users_collection.find_one({"_id": ObjectId(user_id)})
 
-    if not expenses and not accounts and not user:
+    if not first and not accounts and not user:
         raise HTTPException(status_code=404, detail="No data found")
 
-    workbook = Workbook()
+    workbook = Workbook(write_only=True)
+    await write_expense_cursor_to_sheet(
+        workbook.create_sheet(title="Expenses"), first, cursor
+    )
+    write_accounts_to_sheet(workbook.create_sheet(title="Accounts"), accounts)
+    categories_sheet = workbook.create_sheet(title="Categories")
+    if user and user.get("categories"):
+        write_categories_to_sheet(categories_sheet, user["categories"])
+
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        await asyncio.to_thread(workbook.save, path)
+    except Exception:
+        remove_file(path)
+        raise
+
+    return FileResponse(
+        path,
+        media_type=XLSX_MEDIA_TYPE,
+        headers={"Content-Disposition": "attachment; filename=data.xlsx"},
+        background=BackgroundTask(remove_file, path),
+    )
+
 
-    # Write expenses
-    expenses_sheet: Optional[Worksheet] = workbook.active
-    if expenses_sheet is not None:
-        expenses_sheet.title = "Expenses"
-        write_expenses_to_sheet(expenses_sheet, expenses)
+@lru_cache(maxsize=1)
+def get_pdf_styles() -> Tuple[StyleSheet1, ParagraphStyle, ParagraphStyle]:
+    """Build the PDF stylesheet and custom styles once per process."""
+    styles = getSampleStyleSheet()
 
-    # Write accounts
-    accounts_sheet: Optional[Worksheet] = workbook.create_sheet(
-        title="Accounts"
+    # Define a custom style for the title
+    title_style = ParagraphStyle(
+        name="Title",
+        parent=styles["Title"],
+        fontSize=32,  # Increase font size
+        spaceAfter=12,
     )
-    if accounts_sheet is not None:
-        write_accounts_to_sheet(accounts_sheet, accounts)
 
-    # Write categories
-    categories_sheet: Optional[Worksheet] = workbook.create_sheet(
-        title="Categories"
+    # Define a custom style for the centered description
+    centered_style = ParagraphStyle(
+        name="Centered",
+        parent=styles["Normal"],
+        alignment=1,  # Center alignment
     )
-    if categories_sheet is not None and user and user.get("categories"):
-        write_categories_to_sheet(categories_sheet, user["categories"])
+    return styles, title_style, centered_style
 
-    output = BytesIO()
-    workbook.save(output)
-    output.seek(0)
 
-    response = Response(
-        content=output.getvalue(),
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+@lru_cache(maxsize=1)
+def load_logo() -> Tuple[bytes, float, float]:
+    """
+    Read the logo file and return its bytes and size scaled to 3 inch.
+
+    Only the file read and the size are kept; reportlab still decodes the
+    image for every document it is drawn in.
+    """
+    logo_path = os.path.abspath(
+        os.path.join(os.path.dirname(__file__), "../../../docs/logo/logo.png")
+    )
+    reader = ImageReader(logo_path)
+    width, height = reader.getSize()
+    with open(logo_path, "rb") as file:
+        data = file.read()
+    return data, 3.0 * inch, 3.0 * inch * height / width
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    """Format stage durations in seconds as a Server-Timing header."""
+    return ", ".join(
+        f"{stage};dur={seconds * 1000:.1f}"
+        for stage, seconds in timings.items()
     )
-    response.headers["Content-Disposition"] = "attachment; filename=data.xlsx"
-    return response
 
 
 def create_paragraph(text: str, style: ParagraphStyle) -> Paragraph:
@@ -220,6 +331,171 @@ def create_table(data: list, col_widths: list, styles: TableStyle) -> Table:
     return table
 
 
+PDF_TABLE_STYLE = TableStyle(
+    [
+        ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
+        ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("BOTTOMPADDING", (0, 0), (-1, 0), 12),
+        ("BACKGROUND", (0, 1), (-1, -1), colors.beige),
+        ("GRID", (0, 0), (-1, -1), 1, colors.black),
+    ]
+)
+
+PDF_EXPENSE_HEADER = [
+    "Date",
+    "Amount",
+    "Currency",
+    "Category",
+    "Description",
+    "Account Name",
+]
+
+
+def wrap_text(data: list, style: ParagraphStyle) -> list:
+    """Wrap text in table cells into paragraphs; numbers need no wrapping."""
+    return [
+        [
+            (
+                cell
+                if isinstance(cell, (int, float))
+                else Paragraph(str(cell), style)
+            )
+            for cell in row
+        ]
+        for row in data
+    ]
+
+
+async def create_expense_tables(
+    first: Optional[dict], cursor: AsyncIOMotorCursor, style: ParagraphStyle
+) -> List[Table]:
+    """
+    Build the expenses of a PDF export as tables of EXPORT_BATCH_SIZE rows.
+
+    Expenses are read from the cursor batch by batch, so the whole history
+    is exported rather than the first page of it.
+
+    Args:
+        first (Optional[dict]): First expense, already read from the cursor.
+        cursor (AsyncIOMotorCursor): Cursor over the remaining expenses.
+        style (ParagraphStyle): Style of the cell text.
+
+    Returns:
+        List[Table]: The tables, at least one even without expenses.
+    """
+    tables: List[Table] = []
+
+    def add_table(rows: list) -> None:
+        tables.append(
+            create_table(
+                wrap_text([PDF_EXPENSE_HEADER, *rows], style),
+                [60, 60, 60, 60, 120, 80, 80],
+                PDF_TABLE_STYLE,
+            )
+        )
+
+    rows = []
+    if first is not None:
+        # The account name is the last column shown, the ID is left out
+        rows.append(expense_row(first)[:-1])
+        async for expense in cursor:
+            rows.append(expense_row(expense)[:-1])
+            if len(rows) == EXPORT_BATCH_SIZE:
+                add_table(rows)
+                rows = []
+    if rows or not tables:
+        add_table(rows)
+    return tables
+
+
+async def fetch_chart_data(
+    user_id: str,
+    from_date: Optional[datetime.date],
+    to_date: Optional[datetime.date],
+    base_currency: Optional[str],
+) -> List[tuple]:
+    """
+    Aggregate the totals the PDF charts are drawn from.
+
+    Returns:
+        Tuple: Per-day, per-month and per-category labels and totals, and
+        the dates of the first and last expense.
+    """
+    filters = {
+        "from_date": from_date,
+        "to_date": to_date,
+        "base_currency": base_currency,
+    }
+    return await asyncio.gather(
+        aggregate_totals(user_id, "day", **filters),
+        aggregate_totals(user_id, "month", **filters),
+        aggregate_totals(user_id, "category", **filters),
+        expense_date_bounds(user_id, from_date, to_date),
+    )
+
+
+async def stream_expenses_csv(
+    first: dict, cursor: AsyncIOMotorCursor
+) -> AsyncIterator[str]:
+    """
+    Yield the expenses CSV in chunks of EXPORT_BATCH_SIZE rows.
+
+    Args:
+        first (dict): First expense, already read from the cursor.
+        cursor (AsyncIOMotorCursor): Cursor over the remaining expenses.
+    """
+    output = StringIO()
+    writer = csv.writer(output)
+    writer.writerow(EXPENSE_COLUMNS)
+    writer.writerow(expense_row(first))
+    rows = 1
+    async for expense in cursor:
+        writer.writerow(expense_row(expense))
+        rows += 1
+        if rows % EXPORT_BATCH_SIZE == 0:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+    yield output.getvalue()
+
+
+async def accounts_to_csv(user_id: str) -> str:
+    """Render the accounts of a user as CSV, or raise a 404 if none."""
+    accounts = await accounts_collection.find({"user_id": user_id}).to_list(
+        100
+    )
+    if not accounts:
+        raise HTTPException(status_code=404, detail="No accounts found")
+    output = StringIO()
+    writer = csv.writer(output)
+    writer.writerow(["name", "balance", "currency", "_id"])
+    for account in accounts:
+        writer.writerow(
+            [
+                account["name"],
+                account["balance"],
+                account["currency"],
+                str(account["_id"]),
+            ]
+        )
+    return output.getvalue()
+
+
+async def categories_to_csv(user_id: str) -> str:
+    """Render the categories of a user as CSV, or raise a 404 if none."""
+    user = await users_collection.find_one({"_id": ObjectId(user_id)})
+    if not user or not user.get("categories"):
+        raise HTTPException(status_code=404, detail="No categories found")
+    output = StringIO()
+    writer = csv.writer(output)
+    writer.writerow(["name", "monthly_budget"])
+    for category_name, category_data in user["categories"].items():
+        writer.writerow([category_name, category_data["monthly_budget"]])
+    return output.getvalue()
+
+
 @router.get("/csv")
 async def data_to_csv(
     token: str = Header(None),
@@ -238,67 +514,36 @@ async def data_to_csv(
         Response: CSV file containing the selected data.
     """
     user_id = await verify_token(token)
-    expenses, accounts, user = await fetch_user_data(
-        user_id, from_date, to_date
-    )
-    output = StringIO()
-    writer = csv.writer(output)
+    query = build_expense_query(user_id, from_date, to_date)
+    return await export_csv(user_id, export_type, query)
+
+
+async def export_csv(
+    user_id: str, export_type: ExportType, query: dict
+) -> Response:
+    """Export the expenses matching a query, accounts or categories to CSV."""
+    headers = {
+        "Content-Disposition": f"attachment; filename={export_type.value}.csv"
+    }
 
     if export_type == ExportType.EXPENSES:
-        if not expenses:
+        cursor = expenses_collection.find(query).batch_size(EXPORT_BATCH_SIZE)
+        # Read the first document before streaming so that a missing
+        # history can still be answered with a 404
+        first = await anext(cursor, None)
+        if first is None:
             raise HTTPException(status_code=404, detail="No expenses found")
-        writer.writerow(
-            [
-                "date",
-                "amount",
-                "currency",
-                "category",
-                "description",
-                "account_name",
-                "_id",
-            ]
+        return StreamingResponse(
+            stream_expenses_csv(first, cursor),
+            media_type="text/csv",
+            headers=headers,
         )
-        for expense in expenses:
-            writer.writerow(
-                [
-                    (
-                        expense["date"].strftime("%Y-%m-%d")
-                        if expense.get("date")
-                        else ""
-                    ),
-                    expense["amount"],
-                    expense["currency"],
-                    expense["category"],
-                    expense.get("description", ""),
-                    expense["account_name"],
-                    str(expense["_id"]),
-                ]
-            )
-    elif export_type == ExportType.ACCOUNTS:
-        if not accounts:
-            raise HTTPException(status_code=404, detail="No accounts found")
-        writer.writerow(["name", "balance", "currency", "_id"])
-        for account in accounts:
-            writer.writerow(
-                [
-                    account["name"],
-                    account["balance"],
-                    account["currency"],
-                    str(account["_id"]),
-                ]
-            )
-    elif export_type == ExportType.CATEGORIES:
-        if not user or not user.get("categories"):
-            raise HTTPException(status_code=404, detail="No categories found")
-        writer.writerow(["name", "monthly_budget"])
-        for category_name, category_data in user["categories"].items():
-            writer.writerow([category_name, category_data["monthly_budget"]])
 
-    response = Response(content=output.getvalue(), media_type="text/csv")
-    response.headers[
-        "Content-Disposition"
-    ] = f"attachment; filename={export_type.value}.csv"
-    return response
+    if export_type == ExportType.ACCOUNTS:
+        content = await accounts_to_csv(user_id)
+    else:
+        content = await categories_to_csv(user_id)
+    return Response(content=content, media_type="text/csv", headers=headers)
 
 
 @router.get("/pdf")
@@ -306,6 +551,7 @@ async def data_to_pdf(
     token: str = Header(None),
     from_date: Optional[datetime.date] = Query(None),
     to_date: Optional[datetime.date] = Query(None),
+    base_currency: Optional[str] = Query(None),
 ) -> Response:
     """
     Export all expenses, accounts, and categories for a user to a PDF file within a date range.
@@ -314,19 +560,41 @@ async def data_to_pdf(
         token (str): Authentication token.
         from_date (datetime.date, optional): Start date for filtering expenses (inclusive).
         to_date (datetime.date, optional): End date for filtering expenses (inclusive).
+        base_currency (str, optional): Currency the chart totals are converted to.
 
     Returns:
         Response: PDF file containing expenses, accounts, and categories data.
     """
-    # pylint: disable=too-many-locals, too-many-statements, too-many-branches
     user_id = await verify_token(token)
-    expenses, accounts, user = await fetch_user_data(
-        user_id, from_date, to_date
+    query = build_expense_query(user_id, from_date, to_date)
+    return await export_pdf(
+        user_id, query, from_date, to_date, check_base_currency(base_currency)
     )
 
-    if not expenses and not accounts and not user:
+
+async def export_pdf(
+    user_id: str,
+    query: dict,
+    from_date: Optional[datetime.date],
+    to_date: Optional[datetime.date],
+    base_currency: str,
+) -> Response:
+    """
+    Export the expenses matching a query, accounts and categories to PDF.
+
+    The date range and base currency select and convert the chart totals.
+    """
+    # pylint: disable=too-many-locals, too-many-statements, too-many-branches
+    timings = {}
+    stage_start = time.perf_counter()
+    first, cursor, accounts, user = await fetch_user_data(user_id, query)
+    timings["fetch"] = time.perf_counter() - stage_start
+
+    if not first and not accounts and not user:
         raise HTTPException(status_code=404, detail="No data found")
 
+    stage_start = time.perf_counter()
+
     buffer = BytesIO()
     doc = SimpleDocTemplate(
         buffer,
@@ -334,34 +602,16 @@ async def data_to_pdf(
         title=f"MM PDF Export - {user['username'] if user else 'Unknown'}",
         lang="en-gb",
     )
-    styles = getSampleStyleSheet()
+    styles, title_style, centered_style = get_pdf_styles()
     elements = []
 
-    # Define a custom style for the title
-    title_style = ParagraphStyle(
-        name="Title",
-        parent=styles["Title"],
-        fontSize=32,  # Increase font size
-        spaceAfter=12,
-    )
-
-    # Define a custom style for the centered description
-    centered_style = ParagraphStyle(
-        name="Centered",
-        parent=styles["Normal"],
-        alignment=1,  # Center alignment
-    )
-
     # Add heading, logo, application description, and TOC on the first page
     elements.append(create_paragraph("MONEY MANAGER", title_style))
     elements.append(Spacer(1, 12))
-    logo_path = os.path.abspath(
-        os.path.join(os.path.dirname(__file__), "../../../docs/logo/logo.png")
+    logo_data, logo_width, logo_height = load_logo()
+    elements.append(
+        Image(BytesIO(logo_data), width=logo_width, height=logo_height)
     )
-    logo = Image(logo_path)
-    logo.drawHeight = 3.0 * inch * logo.drawHeight / logo.drawWidth
-    logo.drawWidth = 3.0 * inch
-    elements.append(logo)
     elements.append(Spacer(1, 18))
     app_description = """
     <b>Money Manager</b> is a comprehensive financial management tool designed to help you track your expenses, manage your accounts, and set budgets for various categories.
@@ -416,16 +666,6 @@ async def data_to_pdf(
     elements.extend(toc)
     elements.append(PageBreak())
 
-    # Helper function to wrap text in table cells
-    def wrap_text(data):
-        wrapped_data = []
-        for row in data:
-            wrapped_row = []
-            for cell in row:
-                wrapped_row.append(Paragraph(str(cell), styles["Normal"]))
-            wrapped_data.append(wrapped_row)
-        return wrapped_data
-
     # Expenses
     elements.append(
         create_paragraph("<a name='expenses'/>Expenses", styles["Title"])
@@ -444,47 +684,9 @@ async def data_to_pdf(
         date_range_text = "Date Range: All"
     elements.append(create_paragraph(date_range_text, styles["Normal"]))
     elements.append(Spacer(1, 12))
-    expenses_data = [
-        [
-            "Date",
-            "Amount",
-            "Currency",
-            "Category",
-            "Description",
-            "Account Name",
-        ]
-    ]
-    for expense in expenses:
-        expenses_data.append(
-            [
-                (
-                    expense["date"].strftime("%Y-%m-%d")
-                    if expense.get("date")
-                    else ""
-                ),
-                expense["amount"],
-                expense["currency"],
-                expense["category"],
-                expense.get("description", ""),
-                expense["account_name"],
-            ]
-        )
-    expenses_table = create_table(
-        wrap_text(expenses_data),
-        [60, 60, 60, 60, 120, 80, 80],
-        TableStyle(
-            [
-                ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
-                ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
-                ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-                ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-                ("BOTTOMPADDING", (0, 0), (-1, 0), 12),
-                ("BACKGROUND", (0, 1), (-1, -1), colors.beige),
-                ("GRID", (0, 0), (-1, -1), 1, colors.black),
-            ]
-        ),
+    elements.extend(
+        await create_expense_tables(first, cursor, styles["Normal"])
     )
-    elements.append(expenses_table)
     elements.append(PageBreak())
 
     # Accounts
@@ -498,19 +700,9 @@ async def data_to_pdf(
             [account["name"], account["balance"], account["currency"]]
         )
     accounts_table = create_table(
-        wrap_text(accounts_data),
+        wrap_text(accounts_data, styles["Normal"]),
         [100, 100, 100, 100],
-        TableStyle(
-            [
-                ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
-                ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
-                ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-                ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-                ("BOTTOMPADDING", (0, 0), (-1, 0), 12),
-                ("BACKGROUND", (0, 1), (-1, -1), colors.beige),
-                ("GRID", (0, 0), (-1, -1), 1, colors.black),
-            ]
-        ),
+        PDF_TABLE_STYLE,
     )
     elements.append(accounts_table)
     elements.append(PageBreak())
@@ -527,22 +719,14 @@ async def data_to_pdf(
                 [category_name, category_data["monthly_budget"]]
             )
     categories_table = create_table(
-        wrap_text(categories_data),
+        wrap_text(categories_data, styles["Normal"]),
         [200, 200],
-        TableStyle(
-            [
-                ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
-                ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
-                ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-                ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-                ("BOTTOMPADDING", (0, 0), (-1, 0), 12),
-                ("BACKGROUND", (0, 1), (-1, -1), colors.beige),
-                ("GRID", (0, 0), (-1, -1), 1, colors.black),
-            ]
-        ),
+        PDF_TABLE_STYLE,
     )
     elements.append(categories_table)
 
+    timings["tables"] = time.perf_counter() - stage_start
+
     # Add analytics graphs
     elements.append(PageBreak())
     elements.append(
@@ -550,19 +734,65 @@ async def data_to_pdf(
     )
     elements.append(Spacer(1, 12))
 
-    # Replace graph fetching section with direct plot generation
+    # Charts are drawn from per-day, per-month and per-category totals,
+    # aggregated by MongoDB over all expenses of the range
+    stage_start = time.perf_counter()
+    daily, monthly, by_category, expense_bounds = await fetch_chart_data(
+        user_id, from_date, to_date, base_currency
+    )
+    timings["aggregate"] = time.perf_counter() - stage_start
     plot_generators = {
-        "<a name='expense-chart'/>Expense Chart": create_expense_bar,
-        "<a name='category-pie'/>Category Distribution": create_category_pie,
-        "<a name='monthly-line'/>Monthly Expenses": create_monthly_line,
-        "<a name='category-bar'/>Category Comparison": create_category_bar,
-        "<a name='budget-actual'/>Budget vs Actual": lambda e, f, t: create_budget_vs_actual(
-            e, user["categories"] if user else {}, f, t
+        "<a name='expense-chart'/>Expense Chart": (
+            create_expense_bar,
+            *daily,
+            from_date,
+            to_date,
+            base_currency,
+        ),
+        "<a name='category-pie'/>Category Distribution": (
+            create_category_pie,
+            *by_category,
+            from_date,
+            to_date,
+            base_currency,
+        ),
+        "<a name='monthly-line'/>Monthly Expenses": (
+            create_monthly_line,
+            *monthly,
+            from_date,
+            to_date,
+            base_currency,
+        ),
+        "<a name='category-bar'/>Category Comparison": (
+            create_category_bar,
+            *by_category,
+            from_date,
+            to_date,
+            base_currency,
+        ),
+        "<a name='budget-actual'/>Budget vs Actual": (
+            create_budget_vs_actual,
+            *by_category,
+            BudgetChartOptions(
+                convert_budgets(user or {}, base_currency),
+                from_date,
+                to_date,
+                *expense_bounds,
+                base_currency,
+            ),
         ),
     }
 
-    for title, generator in plot_generators.items():
-        image_data = generator(expenses, from_date, to_date)  # type: ignore
+    stage_start = time.perf_counter()
+    images = await asyncio.gather(
+        *(
+            renderer.render(generator, *args)
+            for generator, *args in plot_generators.values()
+        )
+    )
+    timings["charts"] = time.perf_counter() - stage_start
+
+    for title, image_data in zip(plot_generators, images):
         if image_data:
             elements.append(create_paragraph(title, styles["Heading2"]))
             elements.append(Spacer(1, 12))
@@ -586,11 +816,100 @@ async def data_to_pdf(
         canvas.drawRightString(7.5 * inch, 0.75 * inch, f"Page {doc.page}")
         canvas.restoreState()
 
-    doc.build(elements, onFirstPage=footer, onLaterPages=footer)
+    stage_start = time.perf_counter()
+    await asyncio.to_thread(
+        doc.build, elements, onFirstPage=footer, onLaterPages=footer
+    )
+    timings["build"] = time.perf_counter() - stage_start
     buffer.seek(0)
 
     response = Response(
         content=buffer.getvalue(), media_type="application/pdf"
     )
     response.headers["Content-Disposition"] = "attachment; filename=data.pdf"
+    response.headers["Server-Timing"] = server_timing(timings)
     return response
+
+
+@router.post("/jobs", status_code=202)
+async def create_export_job(
+    job: ExportJobCreate, token: str = Header(None)
+) -> dict:
+    """
+    Start an export in the background.
+
+    Args:
+        job (ExportJobCreate): Format, CSV export type, date range and
+            base currency of PDF charts.
+        token (str): Authentication token.
+
+    Returns:
+        dict: The job id and status, to be polled at GET /exports/jobs/{id}.
+    """
+    user_id = await verify_token(token)
+    query = build_expense_query(user_id, job.from_date, job.to_date)
+    base_currency = check_base_currency(job.base_currency)
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    run: Callable[[], Awaitable[Response]]
+    if job.format == ExportFormat.PDF:
+        filename, media_type = f"data_{timestamp}.pdf", "application/pdf"
+        run = partial(
+            export_pdf,
+            user_id,
+            query,
+            job.from_date,
+            job.to_date,
+            base_currency,
+        )
+    elif job.format == ExportFormat.XLSX:
+        filename = f"data_{timestamp}.xlsx"
+        media_type = XLSX_MEDIA_TYPE
+        run = partial(export_xlsx, user_id, query)
+    else:
+        if job.export_type is None:
+            raise HTTPException(
+                status_code=422,
+                detail="export_type is required for CSV exports",
+            )
+        filename = f"{job.export_type.value}_{timestamp}.csv"
+        media_type = "text/csv"
+        run = partial(export_csv, user_id, job.export_type, query)
+
+    export_job = await export_jobs.submit(
+        user_id, job.format.value, filename, media_type, run
+    )
+    return job_status(export_job)
+
+
+@router.get("/jobs/{job_id}")
+async def get_export_job(job_id: str, token: str = Header(None)):
+    """
+    Get the status of an export job, or its file once it is done.
+
+    Args:
+        job_id (str): ID returned by POST /exports/jobs.
+        token (str): Authentication token.
+
+    Returns:
+        Response: 202 with the job status while it runs, the exported file
+        when it is done, or the export error.
+    """
+    user_id = await verify_token(token)
+    job = await export_jobs.get(job_id, user_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Export job not found")
+
+    if job["status"] == FAILED:
+        raise HTTPException(
+            status_code=job["status_code"], detail=job["detail"]
+        )
+    if job["status"] != DONE:
+        return JSONResponse(status_code=202, content=job_status(job))
+    return FileResponse(
+        job["path"],
+        media_type=job["media_type"],
+        headers={
+            "Content-Disposition": f"attachment; filename={job['filename']}"
+        },
+    )
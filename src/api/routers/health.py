@@ -0,0 +1,69 @@
+"""
+This module provides health and connection pool endpoints for the Money Manager API.
+"""
+
+from fastapi import APIRouter, Depends, HTTPException
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from api.utils.auth import token_cache
+from api.utils.chart_cache import chart_cache
+from api.utils.db import get_client, pool_stats
+from api.utils.render import renderer
+
+router = APIRouter(prefix="/health", tags=["Health"])
+
+
+@router.get("/")
+async def health(client: AsyncIOMotorClient = Depends(get_client)):
+    """
+    Check that the API can reach MongoDB.
+
+    Args:
+        client (AsyncIOMotorClient): Shared MongoDB client.
+
+    Returns:
+        dict: Health status with connection pool statistics.
+    """
+    try:
+        await client.admin.command("ping")
+    except Exception as e:
+        raise HTTPException(
+            status_code=503, detail="Database unavailable"
+        ) from e
+    return {"status": "ok", "pool": pool_stats.snapshot()}
+
+
+@router.get("/pool")
+async def pool():
+    """
+    Get connection pool statistics of the shared MongoDB client.
+
+    Returns:
+        dict: Open and checked-out connections per server.
+    """
+    return {"pool": pool_stats.snapshot()}
+
+
+@router.get("/caches")
+async def caches():
+    """
+    Get hit/miss counters of the in-process caches.
+
+    Returns:
+        dict: Statistics per cache.
+    """
+    return {
+        "token_cache": token_cache.stats(),
+        "chart_cache": chart_cache.stats(),
+    }
+
+
+@router.get("/render")
+async def render():
+    """
+    Get queue depth and render time metrics of the chart renderer.
+
+    Returns:
+        dict: Renderer metrics.
+    """
+    return {"render": renderer.stats()}
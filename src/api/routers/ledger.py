@@ -0,0 +1,292 @@
+"""
+This module provides an endpoint applying debits and credits across several
+users and accounts atomically, e.g. for group bill splits and transfers.
+"""
+
+import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import APIRouter, Header, HTTPException
+from pydantic import BaseModel
+
+from api.utils.auth import verify_token
+from api.utils.currency import currency_service
+from api.utils.db import accounts_collection, users_collection
+from api.utils.ledger import Posting, apply_postings, find_result
+
+router = APIRouter(prefix="/ledger", tags=["Ledger"])
+
+MAX_ENTRIES = 100
+# Largest difference between debits and credits put down to rounding
+ROUNDING = 0.01
+
+
+class LedgerEntry(BaseModel):
+    """
+    Schema for one debit or credit.
+
+    The entry belongs to the user of token, or for credits to the user with
+    user_id, and defaults to the authenticated user. Debits with a category
+    are recorded as expenses of their user.
+    """
+
+    amount: float
+    currency: str
+    account_name: str = "Checking"
+    token: Optional[str] = None
+    user_id: Optional[str] = None
+    category: Optional[str] = None
+    description: Optional[str] = None
+
+
+class LedgerOperation(BaseModel):
+    """Schema for a set of debits and credits applied together."""
+
+    debits: List[LedgerEntry] = []
+    credits: List[LedgerEntry] = []
+    date: Optional[datetime.datetime] = None
+
+
+async def entry_user_id(entry: LedgerEntry, side: str, user_id: str) -> str:
+    """Get the ID of the user an entry belongs to."""
+    if entry.token:
+        return await verify_token(entry.token)
+    if entry.user_id:
+        if side == "debits":
+            raise HTTPException(
+                status_code=403,
+                detail="Debits of other users need their token",
+            )
+        return entry.user_id
+    return user_id
+
+
+def convert_amount(amount: float, from_cur: str, to_cur: str) -> float:
+    """Convert an entry amount to the currency of its account."""
+    if from_cur == to_cur:
+        return amount
+    try:
+        return currency_service.convert(amount, from_cur, to_cur)
+    except Exception as e:
+        raise HTTPException(
+            status_code=400, detail=f"Currency conversion failed: {str(e)}"
+        ) from e
+
+
+def check_balanced(operation: LedgerOperation) -> None:
+    """
+    Check that the debits of an operation cover its credits exactly.
+
+    Amounts are compared in the currency of the first entry. Debits recorded
+    as expenses leave the ledger as spending, so only they may exceed the
+    credits.
+
+    Raises:
+        HTTPException: If credits are not covered by debits, or debits not
+            recorded as expenses are not matched by credits.
+    """
+    entries = operation.debits + operation.credits
+    currency = entries[0].currency.upper()
+
+    def total(side: List[LedgerEntry]) -> float:
+        return sum(
+            convert_amount(entry.amount, entry.currency.upper(), currency)
+            for entry in side
+        )
+
+    debited = total(operation.debits)
+    credited = total(operation.credits)
+    spent = total([entry for entry in operation.debits if entry.category])
+    if credited - debited > ROUNDING:
+        raise HTTPException(
+            status_code=400, detail="Credits must be covered by debits"
+        )
+    if debited - credited - spent > ROUNDING:
+        raise HTTPException(
+            status_code=400,
+            detail=(
+                "Debits and credits must net to zero, apart from debits "
+                "recorded as expenses"
+            ),
+        )
+
+
+async def fetch_owners(
+    entries: List[Tuple[str, int, LedgerEntry]], user_ids: List[str]
+) -> Tuple[Dict[str, Any], Dict[Tuple[str, str], Dict[str, Any]]]:
+    """
+    Fetch the users and accounts of entries with one query each.
+
+    Returns:
+        Tuple: Users by ID and accounts by user ID and account name.
+    """
+    try:
+        object_ids = [ObjectId(entry_user) for entry_user in set(user_ids)]
+    except (InvalidId, TypeError) as e:
+        raise HTTPException(status_code=404, detail="User not found") from e
+    users = {
+        str(user["_id"]): user
+        async for user in users_collection.find({"_id": {"$in": object_ids}})
+    }
+    accounts: Dict[Tuple[str, str], Dict[str, Any]] = {
+        (account["user_id"], account["name"]): account
+        async for account in accounts_collection.find(
+            {
+                "user_id": {"$in": list(set(user_ids))},
+                "name": {
+                    "$in": list({entry.account_name for *_, entry in entries})
+                },
+            }
+        )
+    }
+    return users, accounts
+
+
+def entry_expense(
+    where: str, entry: LedgerEntry, user: Dict[str, Any], date: Any
+) -> Dict[str, Any]:
+    """Validate a debit recorded as an expense and build the expense."""
+    currency = entry.currency.upper()
+    if currency not in user["currencies"]:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{where}: Currency type is not added to user account",
+        )
+    if entry.category not in user["categories"]:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{where}: Category is not present in the user account",
+        )
+    return {
+        "amount": entry.amount,
+        "currency": currency,
+        "category": entry.category,
+        "description": entry.description,
+        "date": date,
+    }
+
+
+def list_entries(
+    operation: LedgerOperation,
+) -> List[Tuple[str, int, LedgerEntry]]:
+    """
+    Validate the amounts of an operation and list its entries.
+
+    Returns:
+        List[Tuple[str, int, LedgerEntry]]: Side, index and entry of the
+        debits followed by the credits.
+    """
+    entries: List[Tuple[str, int, LedgerEntry]] = [
+        (side, index, entry)
+        for side in ("debits", "credits")
+        for index, entry in enumerate(getattr(operation, side))
+    ]
+    if not entries:
+        raise HTTPException(status_code=400, detail="Nothing to apply")
+    if len(entries) > MAX_ENTRIES:
+        raise HTTPException(
+            status_code=422,
+            detail=f"An operation may contain at most {MAX_ENTRIES} entries",
+        )
+    for side, index, entry in entries:
+        if entry.amount <= 0:
+            raise HTTPException(
+                status_code=400,
+                detail=f"{side}[{index}]: Amount must be positive",
+            )
+        if entry.category is not None and side == "credits":
+            raise HTTPException(
+                status_code=400,
+                detail=(
+                    f"{side}[{index}]: Only debits can be recorded as "
+                    f"expenses"
+                ),
+            )
+    return entries
+
+
+async def resolve_postings(
+    operation: LedgerOperation, user_id: str
+) -> List[Posting]:
+    """
+    Validate the entries of an operation and turn them into postings.
+
+    Users and accounts of all entries are fetched with one query each.
+
+    Args:
+        operation (LedgerOperation): Debits and credits to apply.
+        user_id (str): Authenticated user.
+
+    Returns:
+        List[Posting]: Postings of the debits followed by the credits.
+    """
+    entries = list_entries(operation)
+    user_ids = [
+        await entry_user_id(entry, side, user_id) for side, _, entry in entries
+    ]
+    check_balanced(operation)
+    users, accounts = await fetch_owners(entries, user_ids)
+
+    date = operation.date or datetime.datetime.now(datetime.timezone.utc)
+    postings = []
+    for (side, index, entry), entry_user in zip(entries, user_ids):
+        where = f"{side}[{index}]"
+        user = users.get(entry_user)
+        if not user:
+            raise HTTPException(
+                status_code=404, detail=f"{where}: User not found"
+            )
+        account = accounts.get((entry_user, entry.account_name))
+        if not account:
+            raise HTTPException(
+                status_code=404,
+                detail=f"{where}: {entry.account_name} account not found",
+            )
+        postings.append(
+            Posting(
+                entry_user,
+                account,
+                convert_amount(
+                    -entry.amount if side == "debits" else entry.amount,
+                    entry.currency.upper(),
+                    account["currency"],
+                ),
+                (
+                    entry_expense(where, entry, user, date)
+                    if entry.category is not None
+                    else None
+                ),
+            )
+        )
+    return postings
+
+
+@router.post("/multi")
+async def apply_operation(
+    operation: LedgerOperation,
+    idempotency_key: str = Header(...),
+    token: str = Header(None),
+):
+    """
+    Apply debits and credits across users, accounts and currencies at once.
+
+    Either every entry is applied or none is. Repeating a request with the
+    same Idempotency-Key returns the first result without applying it again.
+
+    Args:
+        operation (LedgerOperation): Debits and credits to apply.
+        idempotency_key (str): Client-chosen key of the operation.
+        token (str): Authentication token.
+
+    Returns:
+        dict: Message, key and IDs of the expenses recorded for debits.
+    """
+    user_id = await verify_token(token)
+    # Answer repetitions before validating, balances have changed since
+    stored = await find_result(user_id, idempotency_key)
+    if stored is not None:
+        return stored
+    postings = await resolve_postings(operation, user_id)
+    return await apply_postings(user_id, idempotency_key, postings)
@@ -7,15 +7,30 @@ from typing import Optional
 from uuid import uuid4
 
 from bson import ObjectId
+from bson.errors import InvalidId
 from fastapi import APIRouter, Depends, Header, HTTPException
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import jwt
 from loguru import logger
-from motor.motor_asyncio import AsyncIOMotorClient
 from pydantic import BaseModel
 
-from api.utils.auth import verify_token
-from config.config import MONGO_URI, TOKEN_ALGORITHM, TOKEN_SECRET_KEY
+from api.utils.auth import (
+    invalidate_token,
+    invalidate_user_tokens,
+    verify_token,
+)
+from api.utils.currency import currency_service
+from api.utils.db import (
+    accounts_collection,
+    close_client,
+    expenses_collection,
+    ledger_collection,
+    tokens_collection,
+    users_collection,
+)
+from api.utils.ledger import Posting, apply_postings, find_result
+from api.utils.rollups import delete_rollups
+from config.config import TOKEN_ALGORITHM, TOKEN_SECRET_KEY
 
 ACCESS_TOKEN_EXPIRE_MINUTES = 30 * 24 * 60
 
@@ -23,14 +38,6 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/token")
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
-# MongoDB setup
-client: AsyncIOMotorClient = AsyncIOMotorClient(MONGO_URI)
-db = client.mmdb
-users_collection = db.users
-tokens_collection = db.tokens
-accounts_collection = db.accounts
-expenses_collection = db.expenses
-
 
 class UserCreate(BaseModel):
     """Schema for creating a user."""
@@ -53,10 +60,12 @@ def format_id(document):
 
 
 class TransferRequest(BaseModel):
-    """Schema for updating transfer request"""
+    """Schema for a transfer to another user"""
 
-    source_account: str
+    source_account: str = "Checking"
+    # ID of the recipient user
     destination_account: str
+    destination_account_name: str = "Checking"
     amount: float
 
 
@@ -194,8 +203,11 @@ async def delete_user(token: str = Header(None)):
     """Delete a user and all associated accounts, tokens, and expenses."""
     user_id = await verify_token(token)
     await tokens_collection.delete_many({"user_id": user_id})
+    invalidate_user_tokens(user_id)
     await accounts_collection.delete_many({"user_id": user_id})
     await expenses_collection.delete_many({"user_id": user_id})
+    await delete_rollups(user_id)
+    await ledger_collection.delete_many({"user_id": user_id})
     result = await users_collection.delete_one({"_id": ObjectId(user_id)})
     if result.deleted_count == 1:
         return {"message": "User deleted successfully"}
@@ -323,12 +335,13 @@ async def update_token(
     new_expiry_time = datetime.datetime.now(datetime.UTC) + updated_expiry
 
     # Correct the filter to use _id for the token document
-    result = await tokens_collection.update_one(
+    updated_token = await tokens_collection.find_one_and_update(
         {"user_id": user_id, "_id": ObjectId(token_id)},
         {"$set": {"expires_at": new_expiry_time}},
     )
 
-    if result.modified_count == 1:
+    if updated_token:
+        invalidate_token(updated_token.get("token"))
         return {"message": "Token expiration updated successfully"}
 
     raise HTTPException(
@@ -349,11 +362,12 @@ async def delete_token(token_id: str, token: str = Header(None)):
         dict: Message indicating whether the token was successfully deleted.
     """
     user_id = await verify_token(token)
-    result = await tokens_collection.delete_one(
+    deleted_token = await tokens_collection.find_one_and_delete(
         {"user_id": user_id, "_id": ObjectId(token_id)}
     )
 
-    if result.deleted_count == 1:
+    if deleted_token:
+        invalidate_token(deleted_token.get("token"))
         return {"message": "Token deleted successfully"}
 
     raise HTTPException(status_code=404, detail="Token not found")
@@ -361,29 +375,39 @@ async def delete_token(token_id: str, token: str = Header(None)):
 
 @router.post("/transfer-to-user")
 async def transfer_to_user(
-    transfer: TransferRequest, token: str = Header(None)
+    transfer: TransferRequest,
+    token: str = Header(None),
+    idempotency_key: Optional[str] = Header(None),
 ):
     """
-    Transfer funds from the authenticated user's checking
-    account to another user's checking account.
+    Transfer funds from an account of the authenticated user to an account
+    of another user, converting between their currencies.
 
     Args:
-        transfer (TransferRequest): Contains destination_user_id and amount.
+        transfer (TransferRequest): Contains the source account name, the
+            ID of the recipient, the recipient account name and the amount
+            in the currency of the source account.
         token (str): Authentication token.
+        idempotency_key (str, optional): Key making retries of the transfer
+            apply it only once.
 
     Returns:
         dict: A message confirming the transfer.
     """
     user_id = await verify_token(token)
+    # Answer retries before validating, the balance has changed since
+    if idempotency_key and (
+        await find_result(user_id, idempotency_key) is not None
+    ):
+        return {"message": "Transfer successful"}
 
     if transfer.amount <= 0:
         raise HTTPException(
             status_code=400, detail="Transfer amount must be positive"
         )
 
-    # Source account - Checking account of the sender
     source = await accounts_collection.find_one(
-        {"user_id": user_id, "name": "Checking"}
+        {"user_id": user_id, "name": transfer.source_account}
     )
     if not source:
         raise HTTPException(status_code=404, detail="Source account not found")
@@ -393,36 +417,50 @@ async def transfer_to_user(
             status_code=400, detail="Insufficient funds in source account"
         )
 
-    # Destination account - Checking account of the recipient
-    recipient_user = await users_collection.find_one(
-        {"_id": ObjectId(transfer.destination_account)}
-    )
+    try:
+        recipient_user = await users_collection.find_one(
+            {"_id": ObjectId(transfer.destination_account)}
+        )
+    except InvalidId:
+        recipient_user = None
     if not recipient_user:
         raise HTTPException(status_code=404, detail="Recipient user not found")
 
     destination = await accounts_collection.find_one(
-        {"user_id": str(recipient_user["_id"]), "name": "Checking"}
+        {
+            "user_id": str(recipient_user["_id"]),
+            "name": transfer.destination_account_name,
+        }
     )
     if not destination:
         raise HTTPException(
-            status_code=404, detail="Recipient checking account not found"
+            status_code=404, detail="Recipient account not found"
         )
 
-    # Perform the transfer
-    async with await client.start_session() as session:
-        async with session.start_transaction():
-            await accounts_collection.update_one(
-                {"_id": source["_id"]}, {"$inc": {"balance": -transfer.amount}}
-            )
-            await accounts_collection.update_one(
-                {"_id": destination["_id"]},
-                {"$inc": {"balance": transfer.amount}},
+    credit = transfer.amount
+    if destination["currency"] != source["currency"]:
+        try:
+            credit = currency_service.convert(
+                transfer.amount, source["currency"], destination["currency"]
             )
-
+        except Exception as e:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Currency conversion failed: {str(e)}",
+            ) from e
+
+    await apply_postings(
+        user_id,
+        idempotency_key,
+        [
+            Posting(user_id, source, -transfer.amount),
+            Posting(destination["user_id"], destination, credit),
+        ],
+    )
     return {"message": "Transfer successful"}
 
 
 @router.on_event("shutdown")
 async def shutdown_db_client():
     """Shutdown event for MongoDB client."""
-    client.close()
+    close_client()
@@ -0,0 +1,308 @@
+"""
+Server-side aggregations of expense data for analytics and exports.
+
+Totals are grouped by MongoDB so only one row per day, month or category
+leaves the database instead of every matching expense document. When a base
+currency is requested the groups are split further by currency and day, and
+converted in one batch at the rates of each day before they are summed.
+
+With ANALYTICS_ROLLUPS enabled the totals are read from the per-day rollups
+in api.utils.rollups instead of the expenses themselves.
+"""
+
+import datetime
+from collections import defaultdict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+
+from api.utils.currency import currency_service
+from api.utils.db import expenses_collection, rollups_collection
+from config.config import ANALYTICS_ROLLUPS
+
+
+def group_keys(date_field: str) -> Dict[str, Any]:
+    """Group keys per day, month and category of a date field."""
+    return {
+        "day": {"$dateToString": {"format": "%Y-%m-%d", "date": date_field}},
+        "month": {"$dateToString": {"format": "%Y-%m", "date": date_field}},
+        "category": "$category",
+    }
+
+
+GROUP_KEYS = group_keys("$date")
+ROLLUP_GROUP_KEYS = group_keys("$day")
+
+
+class TotalsSource(NamedTuple):
+    """Where totals are aggregated from and how its fields are named."""
+
+    collection: Any
+    query: Dict[str, Any]
+    group_keys: Dict[str, Any]
+    date_field: str
+    amount_field: str
+
+
+def build_expense_query(
+    user_id: str,
+    from_date: Optional[datetime.date],
+    to_date: Optional[datetime.date],
+) -> Dict[str, Any]:
+    """
+    Build the expense filter for a user and an optional date range.
+
+    Raises:
+        HTTPException: If 'from_date' is after 'to_date'.
+    """
+    if from_date and to_date and from_date > to_date:
+        raise HTTPException(
+            status_code=422,
+            detail="Invalid date range: 'from_date' must be before 'to_date'",
+        )
+
+    query: Dict[str, Any] = {"user_id": user_id}
+    date_filter = {}
+    if from_date:
+        date_filter["$gte"] = datetime.datetime.combine(
+            from_date, datetime.time.min
+        )
+    if to_date:
+        date_filter["$lte"] = datetime.datetime.combine(
+            to_date, datetime.time.max
+        )
+    if date_filter:
+        query["date"] = date_filter
+    return query
+
+
+def totals_source(
+    user_id: str,
+    from_date: Optional[datetime.date],
+    to_date: Optional[datetime.date],
+    category: Optional[str] = None,
+) -> TotalsSource:
+    """Pick the expenses or, if enabled, their rollups to aggregate."""
+    query = build_expense_query(user_id, from_date, to_date)
+    if category is not None:
+        query["category"] = category
+    if not ANALYTICS_ROLLUPS:
+        return TotalsSource(
+            expenses_collection, query, GROUP_KEYS, "$date", "$amount"
+        )
+    if "date" in query:
+        query["day"] = query.pop("date")
+    return TotalsSource(
+        rollups_collection, query, ROLLUP_GROUP_KEYS, "$day", "$total"
+    )
+
+
+def check_base_currency(base_currency: Optional[str]) -> Optional[str]:
+    """
+    Normalise a requested base currency code.
+
+    Raises:
+        HTTPException: If the currency has no exchange rates.
+    """
+    if not base_currency:
+        return None
+    base_currency = base_currency.upper()
+    if base_currency not in currency_service.currencies:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported base currency: {base_currency}",
+        )
+    return base_currency
+
+
+def to_base_currency(
+    amounts: List[float],
+    currencies: List[str],
+    base_currency: str,
+    dates: Optional[List[Optional[datetime.date]]] = None,
+) -> np.ndarray:
+    """
+    Convert amounts to the base currency in one vectorised batch.
+
+    Raises:
+        HTTPException: If an amount is in a currency without rates.
+    """
+    try:
+        return currency_service.convert_many(
+            amounts, currencies, base_currency, dates
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400, detail=f"Currency conversion failed: {e}"
+        ) from e
+
+
+def budget_currency(user: Dict[str, Any], category: Dict[str, Any]) -> str:
+    """
+    Currency the monthly budget of a category is in.
+
+    Categories store the currency of their budget. Those created before it
+    was stored are in the first currency of the user.
+    """
+    return category.get("currency") or (user.get("currencies") or ["USD"])[0]
+
+
+def convert_budgets(
+    user: Dict[str, Any], base_currency: Optional[str]
+) -> Dict[str, Any]:
+    """
+    Get the categories of a user with their budgets in a base currency.
+
+    Args:
+        user (Dict[str, Any]): User document.
+        base_currency (Optional[str]): Currency to convert the budgets to,
+            they are returned as they are if None.
+
+    Returns:
+        Dict[str, Any]: Copies of the categories by name.
+
+    Raises:
+        HTTPException: If a budget is in a currency without rates.
+    """
+    categories = user.get("categories") or {}
+    if not base_currency:
+        return categories
+    names = list(categories)
+    budgets = to_base_currency(
+        [float(categories[name].get("monthly_budget", 0)) for name in names],
+        [budget_currency(user, categories[name]) for name in names],
+        base_currency,
+    )
+    return {
+        name: {**categories[name], "monthly_budget": float(budget)}
+        for name, budget in zip(names, budgets)
+    }
+
+
+def sum_by_label(
+    labels: List[str], amounts: List[float]
+) -> Tuple[List[str], List[float]]:
+    """Sum amounts sharing a label, sorted by label."""
+    totals: Dict[str, float] = defaultdict(float)
+    for label, amount in zip(labels, amounts):
+        totals[label] += float(amount)
+    sorted_labels = sorted(totals)
+    return sorted_labels, [totals[label] for label in sorted_labels]
+
+
+async def aggregate_totals(  # pylint: disable=too-many-arguments
+    user_id: str,
+    group_by: str,
+    *,
+    from_date: Optional[datetime.date] = None,
+    to_date: Optional[datetime.date] = None,
+    base_currency: Optional[str] = None,
+    category: Optional[str] = None,
+) -> Tuple[List[str], List[float]]:
+    """
+    Sum expense amounts per day, month or category inside MongoDB.
+
+    Args:
+        user_id (str): Owner of the expenses.
+        group_by (str): One of "day", "month" or "category".
+        from_date (Optional[datetime.date]): Start of the range.
+        to_date (Optional[datetime.date]): End of the range.
+        base_currency (Optional[str]): Currency to convert amounts to,
+            amounts are summed as they are if None.
+        category (Optional[str]): Only sum expenses of this category.
+
+    Returns:
+        Tuple[List[str], List[float]]: Sorted group labels and their totals.
+    """
+    source = totals_source(user_id, from_date, to_date, category)
+    group_key = source.group_keys[group_by]
+    if base_currency:
+        group_key = {
+            "label": group_key,
+            "currency": "$currency",
+            "day": source.group_keys["day"],
+        }
+    pipeline = [
+        {"$match": source.query},
+        {
+            "$group": {
+                "_id": group_key,
+                "total": {"$sum": source.amount_field},
+            }
+        },
+        {"$sort": {"_id": 1}},
+    ]
+    rows = await source.collection.aggregate(pipeline).to_list(None)
+    if not base_currency:
+        return [str(row["_id"]) for row in rows], [
+            float(row["total"]) for row in rows
+        ]
+
+    amounts = to_base_currency(
+        [row["total"] for row in rows],
+        [row["_id"]["currency"] for row in rows],
+        base_currency,
+        [datetime.date.fromisoformat(row["_id"]["day"]) for row in rows],
+    )
+    return sum_by_label([str(row["_id"]["label"]) for row in rows], amounts)
+
+
+async def expense_date_bounds(
+    user_id: str,
+    from_date: Optional[datetime.date] = None,
+    to_date: Optional[datetime.date] = None,
+) -> Tuple[Optional[datetime.date], Optional[datetime.date]]:
+    """
+    Get the dates of the first and last expense in a range.
+
+    Returns:
+        Tuple[Optional[datetime.date], Optional[datetime.date]]: First and
+        last expense dates, or (None, None) if there are no expenses.
+    """
+    source = totals_source(user_id, from_date, to_date)
+    pipeline = [
+        {"$match": source.query},
+        {
+            "$group": {
+                "_id": None,
+                "first": {"$min": source.date_field},
+                "last": {"$max": source.date_field},
+            }
+        },
+    ]
+    rows = await source.collection.aggregate(pipeline).to_list(1)
+    if not rows:
+        return None, None
+    return rows[0]["first"].date(), rows[0]["last"].date()
+
+
+def group_expenses(
+    expenses: List[Dict[str, Any]],
+    group_by: str,
+    base_currency: Optional[str] = None,
+) -> Tuple[List[str], List[float]]:
+    """
+    Sum already fetched expenses the same way as aggregate_totals.
+
+    Used where the expense documents are loaded anyway.
+    """
+    labels = []
+    for expense in expenses:
+        if group_by == "category":
+            labels.append(str(expense["category"]))
+        elif group_by == "month":
+            labels.append(expense["date"].strftime("%Y-%m"))
+        else:
+            labels.append(expense["date"].strftime("%Y-%m-%d"))
+    amounts = [float(expense["amount"]) for expense in expenses]
+    if base_currency:
+        amounts = list(
+            to_base_currency(
+                amounts,
+                [expense["currency"] for expense in expenses],
+                base_currency,
+                [expense.get("date") for expense in expenses],
+            )
+        )
+    return sum_by_label(labels, amounts)
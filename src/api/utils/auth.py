@@ -1,21 +1,53 @@
 """Utilities to manage authentication"""
 
+import datetime
+from typing import Optional
+
 from fastapi import HTTPException
 from jose import JWTError, jwt
-from motor.motor_asyncio import AsyncIOMotorClient
 
-from config.config import MONGO_URI, TOKEN_ALGORITHM, TOKEN_SECRET_KEY
+from api.utils.cache import TTLCache
+from api.utils.db import tokens_collection
+from config.config import (
+    TOKEN_ALGORITHM,
+    TOKEN_CACHE_SIZE,
+    TOKEN_CACHE_TTL,
+    TOKEN_SECRET_KEY,
+)
+
+# token -> user_id for tokens verified against the tokens collection
+token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL)
+
+
+def _timestamp(value) -> Optional[float]:
+    """Convert a JWT exp claim or a stored datetime to a UTC timestamp."""
+    if value is None:
+        return None
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=datetime.timezone.utc)
+        return value.timestamp()
+    return float(value)
 
-client: AsyncIOMotorClient = AsyncIOMotorClient(MONGO_URI)
-db = client.mmdb
-users_collection = db.users
-tokens_collection = db.tokens
+
+def invalidate_token(token: Optional[str]) -> None:
+    """Drop a token from the verification cache."""
+    if token:
+        token_cache.pop(token)
+
+
+def invalidate_user_tokens(user_id: str) -> None:
+    """Drop all cached tokens of a user from the verification cache."""
+    token_cache.evict_if(lambda _, cached_user_id: cached_user_id == user_id)
 
 
 async def verify_token(token: str):
     """Verify the validity of an access token."""
     if token is None:
         raise HTTPException(status_code=401, detail="Token is missing")
+    cached_user_id = token_cache.get(token)
+    if cached_user_id is not None:
+        return cached_user_id
     try:
         payload = jwt.decode(
             token, TOKEN_SECRET_KEY, algorithms=[TOKEN_ALGORITHM]
@@ -26,6 +58,17 @@ async def verify_token(token: str):
         )
         if not token_exists:
             raise HTTPException(status_code=401, detail="Token does not exist")
+        expiries = [
+            expiry
+            for expiry in (
+                _timestamp(payload.get("exp")),
+                _timestamp(token_exists.get("expires_at")),
+            )
+            if expiry is not None
+        ]
+        token_cache.set(
+            token, user_id, expires_at=min(expiries) if expiries else None
+        )
         return user_id
     except JWTError as e:
         if "Signature has expired" in str(e):
@@ -0,0 +1,101 @@
+"""
+In-process caches shared by the API.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """
+    Size-bounded LRU cache whose entries expire after a time-to-live.
+
+    Entries may carry their own, shorter expiry. Lookups count hits and
+    misses so the effect of the cache can be observed.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, count=False) is not None
+
+    def get(self, key: Hashable, count: bool = True) -> Optional[Any]:
+        """Return the cached value or None if it is missing or expired."""
+        entry = self._data.get(key)
+        if entry is not None and entry[1] > time.monotonic():
+            self._data.move_to_end(key)
+            if count:
+                self.hits += 1
+            return entry[0]
+        if entry is not None:
+            del self._data[key]
+        if count:
+            self.misses += 1
+        return None
+
+    def set(
+        self, key: Hashable, value: Any, expires_at: Optional[float] = None
+    ) -> None:
+        """
+        Store a value.
+
+        Args:
+            key (Hashable): Cache key.
+            value (Any): Value to store.
+            expires_at (float, optional): Wall-clock timestamp after which the
+                entry must not be served, capped by the cache TTL.
+        """
+        lifetime = self.ttl
+        if expires_at is not None:
+            lifetime = min(lifetime, expires_at - time.time())
+        if lifetime <= 0 or self.maxsize <= 0:
+            self._data.pop(key, None)
+            return
+        self._data[key] = (value, time.monotonic() + lifetime)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        """Remove a key and return its value, if any."""
+        entry = self._data.pop(key, None)
+        return entry[0] if entry is not None else None
+
+    def evict_if(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """Remove all entries matching predicate(key, value)."""
+        keys = [
+            key
+            for key, (value, _) in self._data.items()
+            if predicate(key, value)
+        ]
+        for key in keys:
+            del self._data[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return size and hit/miss counters."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
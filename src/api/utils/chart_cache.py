@@ -0,0 +1,134 @@
+"""
+Cache of rendered analytics charts.
+
+Charts are keyed by user, chart type, date range and the user's data
+version, so any expense or category change makes older entries unreachable
+instead of requiring explicit invalidation. Unreachable entries leave the
+memory tier as they expire; the disk tier is swept on write.
+"""
+
+import asyncio
+import datetime
+import hashlib
+import os
+import time
+from typing import Optional
+
+from api.utils.cache import TTLCache
+from config.config import (
+    CHART_CACHE_DIR,
+    CHART_CACHE_DISK_SIZE,
+    CHART_CACHE_SIZE,
+    CHART_CACHE_TTL,
+)
+
+chart_cache = TTLCache(maxsize=CHART_CACHE_SIZE, ttl=CHART_CACHE_TTL)
+
+# Seconds between sweeps of the disk tier
+SWEEP_INTERVAL = 60.0
+
+_last_sweep = {"at": 0.0}
+
+
+def chart_key(
+    user_id: str,
+    chart: str,
+    from_date: Optional[datetime.date],
+    to_date: Optional[datetime.date],
+    data_version: int,
+) -> str:
+    """Build the cache key of a chart."""
+    return f"{user_id}:{chart}:{from_date}:{to_date}:{data_version}"
+
+
+def chart_etag(key: str) -> str:
+    """Build the ETag of a chart from its cache key."""
+    return '"' + hashlib.sha1(key.encode()).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def _disk_path(key: str) -> str:
+    return os.path.join(
+        CHART_CACHE_DIR, hashlib.sha256(key.encode()).hexdigest() + ".png"
+    )
+
+
+def _read_disk(key: str) -> Optional[bytes]:
+    path = _disk_path(key)
+    try:
+        if time.time() - os.path.getmtime(path) > CHART_CACHE_TTL:
+            os.remove(path)
+            return None
+        with open(path, "rb") as file:
+            return file.read()
+    except OSError:
+        return None
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _sweep_disk() -> None:
+    """
+    Remove expired charts from the disk tier, then the least recently
+    written ones beyond CHART_CACHE_DISK_SIZE files.
+    """
+    now = time.time()
+    charts = []
+    with os.scandir(CHART_CACHE_DIR) as entries:
+        for entry in entries:
+            try:
+                mtime = entry.stat().st_mtime
+            except OSError:
+                continue
+            if now - mtime > CHART_CACHE_TTL:
+                # Also temporary files left by interrupted writes
+                _remove(entry.path)
+            elif entry.name.endswith(".png"):
+                charts.append((mtime, entry.path))
+    charts.sort()
+    for _, path in charts[: max(0, len(charts) - CHART_CACHE_DISK_SIZE)]:
+        _remove(path)
+
+
+def _write_disk(key: str, content: bytes) -> None:
+    os.makedirs(CHART_CACHE_DIR, exist_ok=True)
+    path = _disk_path(key)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(content)
+    os.replace(tmp_path, path)
+    if time.time() - _last_sweep["at"] >= SWEEP_INTERVAL:
+        _last_sweep["at"] = time.time()
+        _sweep_disk()
+
+
+async def get_chart(key: str) -> Optional[bytes]:
+    """Look a chart up in memory, then on disk if a directory is set."""
+    content = chart_cache.get(key)
+    if content is None and CHART_CACHE_DIR:
+        content = await asyncio.to_thread(_read_disk, key)
+        if content is not None:
+            chart_cache.set(key, content)
+    return content
+
+
+async def put_chart(key: str, content: bytes) -> None:
+    """Store a rendered chart in memory and, if configured, on disk."""
+    chart_cache.set(key, content)
+    if CHART_CACHE_DIR:
+        try:
+            await asyncio.to_thread(_write_disk, key, content)
+        except OSError:
+            pass
@@ -0,0 +1,278 @@
+"""
+Currency conversion backed by a dense matrix of daily exchange rates.
+
+Rates are read once from an ECB style rate file (a CSV of EUR reference
+rates, optionally zipped) into a NumPy matrix indexed by date and currency
+code, so thousands of amounts can be converted in a single call. A
+background task checks the rate file periodically and swaps in new rates
+without a restart; conversions only read the current table.
+"""
+
+import asyncio
+import datetime
+import os
+import threading
+import zipfile
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+from currency_converter import CURRENCY_FILE  # type: ignore
+from loguru import logger
+
+from config.config import CURRENCY_RATES_CHECK_INTERVAL, CURRENCY_RATES_FILE
+
+REFERENCE_CURRENCY = "EUR"
+
+Codes = Union[str, Sequence[str]]
+Dates = Union[None, datetime.date, Sequence[Optional[datetime.date]]]
+
+
+def read_rate_lines(path: str) -> List[str]:
+    """Read the lines of a rate file, unzipping it if needed."""
+    if path.endswith(".zip"):
+        with zipfile.ZipFile(path) as archive:
+            content = archive.read(archive.namelist()[0])
+    else:
+        with open(path, "rb") as file:
+            content = file.read()
+    return content.decode("utf-8").splitlines()
+
+
+class RateTable:
+    """
+    Immutable matrix of exchange rates against the reference currency.
+
+    ``rates[d, c]`` is the amount of currency ``c`` worth one EUR on the
+    ``d``-th day after ``first_date``. Days without a published rate, such
+    as weekends, carry the last known rate.
+    """
+
+    def __init__(self, lines: List[str]):
+        header = [code.strip() for code in lines[0].strip().split(",")[1:]]
+        columns = [index for index, code in enumerate(header) if code]
+        codes = [header[index] for index in columns]
+
+        rows = {}
+        for line in lines[1:]:
+            values = line.strip().split(",")
+            if not values[0]:
+                continue
+            date = datetime.date.fromisoformat(values[0])
+            rows[date] = [
+                _parse_rate(values[index + 1]) if index + 1 < len(values)
+                # Short rows have no rate for the trailing currencies
+                else np.nan
+                for index in columns
+            ]
+        if not rows:
+            raise ValueError("Rate file contains no rates")
+
+        self.first_date = min(rows)
+        self.last_date = max(rows)
+        days = (self.last_date - self.first_date).days + 1
+        rates = np.full((days, len(codes) + 1), np.nan)
+        for date, values in rows.items():
+            rates[(date - self.first_date).days, :-1] = values
+        rates[:, -1] = 1.0
+
+        # Carry rates forward over missing days, and backward before the
+        # first published rate of a currency
+        filled = np.where(np.isnan(rates), 0, np.arange(days)[:, None])
+        np.maximum.accumulate(filled, axis=0, out=filled)
+        rates = rates[filled, np.arange(rates.shape[1])]
+        first_valid = np.argmax(~np.isnan(rates), axis=0)
+        missing = np.isnan(rates)
+        rates[missing] = rates[first_valid, np.arange(rates.shape[1])][
+            np.nonzero(missing)[1]
+        ]
+
+        known = ~np.isnan(rates).all(axis=0)
+        self.currencies: Dict[str, int] = {
+            code: index
+            for index, code in enumerate(codes + [REFERENCE_CURRENCY])
+            if known[index]
+        }
+        self.rates = rates
+
+    def currency_index(self, codes: Codes) -> np.ndarray:
+        """Map currency codes to matrix columns."""
+        codes = np.atleast_1d(np.asarray(codes, dtype=str))
+        unique, inverse = np.unique(np.char.upper(codes), return_inverse=True)
+        try:
+            columns = np.array(
+                [self.currencies[code] for code in unique], dtype=int
+            )
+        except KeyError as e:
+            raise ValueError(f"{e.args[0]} is not a supported currency") from e
+        return columns[inverse].reshape(codes.shape)
+
+    def date_index(self, dates: Dates, size: int) -> np.ndarray:
+        """Map dates to matrix rows; None and dates out of range clip."""
+        if dates is None or isinstance(dates, datetime.date):
+            dates = [dates] * size
+        days = np.array(
+            [
+                (
+                    (_as_date(date) - self.first_date).days
+                    if date is not None
+                    else len(self.rates) - 1
+                )
+                for date in dates
+            ],
+            dtype=int,
+        )
+        return np.clip(days, 0, len(self.rates) - 1)
+
+
+def _parse_rate(value: str) -> float:
+    value = value.strip()
+    return float(value) if value and value != "N/A" else np.nan
+
+
+def _as_date(value: datetime.date) -> datetime.date:
+    return value.date() if isinstance(value, datetime.datetime) else value
+
+
+class CurrencyService:
+    """Convert amounts between currencies using a hot-swappable RateTable."""
+
+    def __init__(self, path: str, check_interval: float):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._table: Optional[RateTable] = None
+        self._mtime = 0.0
+        self._watcher: Optional[asyncio.Task] = None
+
+    @property
+    def table(self) -> RateTable:
+        """
+        The current rates, loaded on first use.
+
+        Changes of the rate file are picked up by the task started with
+        start(), so this never touches the file once the rates are loaded.
+        """
+        if self._table is None:
+            self.reload()
+        assert self._table is not None
+        return self._table
+
+    @property
+    def version(self) -> float:
+        """
+        Identify the loaded rates, e.g. in cache keys of converted amounts.
+
+        This is the modification time of the rate file, so it is the same
+        in every process that loaded the same rates.
+        """
+        _ = self.table  # loads the rates on first use
+        return self._mtime
+
+    @property
+    def currencies(self) -> List[str]:
+        """Supported currency codes."""
+        return sorted(self.table.currencies)
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        Load the rate file again if it changed since it was last loaded.
+
+        The new table is built before it replaces the current one, so
+        conversions running meanwhile keep using the old rates.
+
+        Args:
+            force (bool): Reload even if the file did not change.
+
+        Returns:
+            bool: Whether new rates were loaded.
+        """
+        with self._lock:
+            mtime = os.stat(self.path).st_mtime
+            if self._table is not None and not force and mtime == self._mtime:
+                return False
+            self._table = RateTable(read_rate_lines(self.path))
+            self._mtime = mtime
+            return True
+
+    def start(self) -> None:
+        """Start checking the rate file for changes every check_interval."""
+        if self._watcher is None and self.check_interval > 0:
+            self._watcher = asyncio.create_task(self._watch())
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                if await asyncio.to_thread(self.reload):
+                    logger.info(f"Reloaded exchange rates from {self.path}")
+            except (OSError, ValueError) as e:
+                # Keep the current rates, e.g. while the file is rewritten
+                logger.warning(f"Could not reload exchange rates: {e}")
+
+    async def shutdown(self) -> None:
+        """Stop checking the rate file."""
+        if self._watcher is not None:
+            self._watcher.cancel()
+            await asyncio.gather(self._watcher, return_exceptions=True)
+            self._watcher = None
+
+    def convert_many(
+        self,
+        amounts: Sequence[float],
+        from_currencies: Codes,
+        to_currencies: Codes,
+        dates: Dates = None,
+    ) -> np.ndarray:
+        """
+        Convert many amounts at once.
+
+        Args:
+            amounts (Sequence[float]): Amounts to convert.
+            from_currencies (str | Sequence[str]): Currency of every amount,
+                or one currency for all of them.
+            to_currencies (str | Sequence[str]): Target currency of every
+                amount, or one currency for all of them.
+            dates (date | Sequence[date], optional): Date of the rate to use
+                per amount, or one date for all. None uses the latest rates.
+
+        Returns:
+            np.ndarray: The converted amounts.
+
+        Raises:
+            ValueError: If a currency is not supported.
+        """
+        table = self.table
+        amounts = np.asarray(amounts, dtype=float)
+        if not amounts.size:
+            return amounts
+        rows = table.date_index(dates, amounts.size)
+        from_columns = np.broadcast_to(
+            table.currency_index(from_currencies), amounts.shape
+        )
+        to_columns = np.broadcast_to(
+            table.currency_index(to_currencies), amounts.shape
+        )
+        return (
+            amounts
+            / table.rates[rows, from_columns]
+            * table.rates[rows, to_columns]
+        )
+
+    def convert(
+        self,
+        amount: float,
+        from_currency: str,
+        to_currency: str,
+        date: Optional[datetime.date] = None,
+    ) -> float:
+        """Convert a single amount, see convert_many."""
+        if from_currency.upper() == to_currency.upper():
+            return amount
+        return float(
+            self.convert_many([amount], from_currency, to_currency, date)[0]
+        )
+
+
+currency_service = CurrencyService(
+    CURRENCY_RATES_FILE or CURRENCY_FILE, CURRENCY_RATES_CHECK_INTERVAL
+)
@@ -3,21 +3,221 @@ Utility functions for database operations.
 """
 
 import datetime
-from typing import Any, Dict, List, Optional, Tuple
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
 
 from bson import ObjectId
 from fastapi import HTTPException
-from motor.motor_asyncio import AsyncIOMotorClient
+from motor.motor_asyncio import (
+    AsyncIOMotorClient,
+    AsyncIOMotorClientSession,
+    AsyncIOMotorDatabase,
+)
+from pymongo import ReturnDocument, monitoring
 
-from config.config import MONGO_URI
+from config.config import (
+    MONGO_CONNECT_TIMEOUT_MS,
+    MONGO_MAX_IDLE_TIME_MS,
+    MONGO_MAX_POOL_SIZE,
+    MONGO_MIN_POOL_SIZE,
+    MONGO_READ_PREFERENCE,
+    MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    MONGO_TRANSACTIONS,
+    MONGO_URI,
+)
 
-# Shared MongoDB client
-client: AsyncIOMotorClient = AsyncIOMotorClient(MONGO_URI)
+T = TypeVar("T")
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Track connection pool usage of the shared MongoDB client."""
+
+    def __init__(self):
+        self.pools: Dict[str, Dict[str, int]] = {}
+
+    def _pool(self, address) -> Dict[str, int]:
+        key = f"{address[0]}:{address[1]}"
+        if key not in self.pools:
+            self.pools[key] = {
+                "open": 0,
+                "checked_out": 0,
+                "created": 0,
+                "closed": 0,
+                "check_out_failed": 0,
+                "cleared": 0,
+            }
+        return self.pools[key]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return a copy of the current pool counters."""
+        return {
+            "max_pool_size": MONGO_MAX_POOL_SIZE,
+            "min_pool_size": MONGO_MIN_POOL_SIZE,
+            "checked_out": sum(
+                pool["checked_out"] for pool in self.pools.values()
+            ),
+            "pools": {key: dict(pool) for key, pool in self.pools.items()},
+        }
+
+    def pool_created(self, event):
+        self._pool(event.address)
+
+    def pool_ready(self, event):
+        self._pool(event.address)
+
+    def pool_cleared(self, event):
+        self._pool(event.address)["cleared"] += 1
+
+    def pool_closed(self, event):
+        self.pools.pop(f"{event.address[0]}:{event.address[1]}", None)
+
+    def connection_created(self, event):
+        pool = self._pool(event.address)
+        pool["created"] += 1
+        pool["open"] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pool = self._pool(event.address)
+        pool["closed"] += 1
+        pool["open"] = max(pool["open"] - 1, 0)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._pool(event.address)["check_out_failed"] += 1
+
+    def connection_checked_out(self, event):
+        self._pool(event.address)["checked_out"] += 1
+
+    def connection_checked_in(self, event):
+        pool = self._pool(event.address)
+        pool["checked_out"] = max(pool["checked_out"] - 1, 0)
+
+
+pool_stats = PoolStatsListener()
+
+# Shared MongoDB client, one connection pool for the whole API process.
+# Motor connects lazily on the first operation, the lifespan in api.app
+# closes it on shutdown.
+client: AsyncIOMotorClient = AsyncIOMotorClient(
+    MONGO_URI,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+    connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    readPreference=MONGO_READ_PREFERENCE,
+    event_listeners=[pool_stats],
+)
 db = client.mmdb
 users_collection = db.users
 expenses_collection = db.expenses
 accounts_collection = db.accounts
 tokens_collection = db.tokens
+rollups_collection = db.expense_rollups
+ledger_collection = db.ledger
+export_jobs_collection = db.export_jobs
+
+
+def get_client() -> AsyncIOMotorClient:
+    """Dependency returning the shared MongoDB client."""
+    return client
+
+
+def get_db() -> AsyncIOMotorDatabase:
+    """Dependency returning the application database."""
+    return db
+
+
+def close_client() -> None:
+    """Close the shared MongoDB client and its connection pool."""
+    client.close()
+
+
+async def run_transaction(
+    callback: Callable[[Optional[AsyncIOMotorClientSession]], Awaitable[T]],
+) -> T:
+    """
+    Run writes in one MongoDB transaction.
+
+    The callback receives the session to pass to every operation of the
+    transaction, which is committed when the callback returns and aborted
+    when it raises. The driver retries transactions failing with a
+    TransientTransactionError and commits with an
+    UnknownTransactionCommitResult for up to two minutes, so the callback
+    may run more than once and must start from scratch every time. With
+    MONGO_TRANSACTIONS disabled, e.g. on a standalone server, the callback
+    runs once with None and compensates failed writes itself.
+
+    Returns:
+        The result of the callback.
+    """
+    if not MONGO_TRANSACTIONS:
+        return await callback(None)
+    async with await client.start_session() as session:
+        return await session.with_transaction(callback)
+
+
+async def adjust_balance(
+    account_id: ObjectId,
+    amount: float,
+    session: Optional[AsyncIOMotorClientSession] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Atomically add an amount to an account balance.
+
+    Debits only apply if the balance covers them, so concurrent requests
+    can never overdraw an account.
+
+    Args:
+        account_id (ObjectId): ID of the account.
+        amount (float): Amount to add, negative to debit the account.
+        session (AsyncIOMotorClientSession, optional): Transaction session.
+
+    Returns:
+        Optional[Dict[str, Any]]: The updated account, or None if the
+        balance is insufficient or the account does not exist.
+    """
+    query: Dict[str, Any] = {"_id": account_id}
+    if amount < 0:
+        query["balance"] = {"$gte": -amount}
+    return await accounts_collection.find_one_and_update(
+        query,
+        {"$inc": {"balance": amount}},
+        return_document=ReturnDocument.AFTER,
+        session=session,
+    )
+
+
+async def get_data_version(user_id: str) -> int:
+    """
+    Get the version of a user's expense and category data.
+
+    The version changes whenever anything that charts are drawn from changes.
+    """
+    user = await users_collection.find_one(
+        {"_id": ObjectId(user_id)}, {"data_version": 1}
+    )
+    return user.get("data_version", 0) if user else 0
+
+
+async def bump_data_version(user_id: str) -> None:
+    """Mark a user's expense and category data as changed."""
+    await users_collection.update_one(
+        {"_id": ObjectId(user_id)}, {"$inc": {"data_version": 1}}
+    )
 
 
 async def fetch_data(
@@ -55,7 +255,7 @@ async def fetch_data(
     elif to_dt:
         query["date"] = {"$lte": to_dt}  # type: ignore
 
-    expenses = await expenses_collection.find(query).to_list(1000)
+    expenses = await expenses_collection.find(query).to_list(None)
     accounts = await accounts_collection.find({"user_id": user_id}).to_list(
         100
     )
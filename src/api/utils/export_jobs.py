@@ -0,0 +1,228 @@
+"""
+Background export jobs.
+
+Exports are produced by asyncio tasks limited to a fixed number of
+concurrent jobs per process. The state of every job is kept in MongoDB and
+the resulting files in EXPORT_JOB_DIR, so any API worker sharing that
+directory can report on and serve a job started by another one. Jobs and
+files are removed once they expire.
+"""
+
+import asyncio
+import datetime
+import os
+import shutil
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from fastapi import HTTPException, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from api.utils.db import export_jobs_collection
+from config.config import EXPORT_JOB_DIR, EXPORT_JOB_TTL, EXPORT_JOB_WORKERS
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Seconds between sweeps of expired export files
+SWEEP_INTERVAL = 60.0
+
+
+def job_status(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Public view of a job document."""
+    status = {
+        "job_id": job["_id"],
+        "status": job["status"],
+        "format": job["format"],
+        "created_at": job["created_at"],
+    }
+    if job.get("detail"):
+        status["detail"] = job["detail"]
+    return status
+
+
+async def save_response(response: Response, path: str) -> None:
+    """Write the body of an export endpoint response to a file."""
+    if isinstance(response, FileResponse):
+        await asyncio.to_thread(shutil.move, response.path, path)
+        return
+    with open(path, "wb") as file:
+        if isinstance(response, StreamingResponse):
+            async for chunk in response.body_iterator:
+                file.write(chunk.encode() if isinstance(chunk, str) else chunk)
+        else:
+            file.write(response.body)
+
+
+def _expires_at(ttl: float) -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(
+        seconds=ttl
+    )
+
+
+class ExportJobManager:
+    """Run export jobs in the background and keep their artifacts."""
+
+    def __init__(
+        self,
+        collection: AsyncIOMotorCollection,
+        directory: str,
+        workers: int,
+        ttl: float,
+    ):
+        self.collection = collection
+        self.directory = directory
+        self.workers = workers
+        self.ttl = ttl
+        self._tasks: Set[asyncio.Task] = set()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._sweeper: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start removing expired export files periodically."""
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep())
+
+    async def _sweep(self) -> None:
+        while True:
+            await asyncio.to_thread(self.cleanup)
+            await asyncio.sleep(SWEEP_INTERVAL)
+
+    async def submit(
+        self,
+        user_id: str,
+        export_format: str,
+        filename: str,
+        media_type: str,
+        run: Callable[[], Awaitable[Response]],
+    ) -> Dict[str, Any]:
+        """
+        Queue an export job.
+
+        Args:
+            user_id (str): Owner of the job.
+            export_format (str): Format name reported in the job status.
+            filename (str): Filename offered on download.
+            media_type (str): Media type of the artifact.
+            run (Callable): Coroutine function producing the export response.
+
+        Returns:
+            Dict[str, Any]: The queued job.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.workers)
+        job = {
+            "_id": uuid.uuid4().hex,
+            "user_id": user_id,
+            "format": export_format,
+            "filename": filename,
+            "media_type": media_type,
+            "status": PENDING,
+            "created_at": time.time(),
+            # Also drops jobs of a worker that stopped while running them
+            "expires_at": _expires_at(self.ttl),
+        }
+        await self.collection.insert_one(job)
+        task = asyncio.create_task(self._run(job["_id"], run))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _update(self, job_id: str, **fields: Any) -> None:
+        await self.collection.update_one({"_id": job_id}, {"$set": fields})
+
+    async def _run(
+        self, job_id: str, run: Callable[[], Awaitable[Response]]
+    ) -> None:
+        assert self._semaphore is not None
+        async with self._semaphore:
+            await self._update(job_id, status=RUNNING)
+            path = os.path.join(self.directory, f"{job_id}.export")
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                await save_response(await run(), path)
+            except HTTPException as e:
+                result = {
+                    "status": FAILED,
+                    "status_code": e.status_code,
+                    "detail": str(e.detail),
+                }
+            except asyncio.CancelledError:
+                await self._update(
+                    job_id,
+                    status=FAILED,
+                    status_code=503,
+                    detail="Export interrupted, please retry",
+                )
+                raise
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                result = {
+                    "status": FAILED,
+                    "status_code": 500,
+                    "detail": f"Export failed: {e}",
+                }
+            else:
+                result = {"status": DONE, "path": path}
+            await self._update(
+                job_id, expires_at=_expires_at(self.ttl), **result
+            )
+
+    async def get(self, job_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job of a user, or None if it is unknown or expired."""
+        job = await self.collection.find_one(
+            {
+                "_id": job_id,
+                "user_id": user_id,
+                # MongoDB removes expired jobs about once a minute
+                "expires_at": {
+                    "$gt": datetime.datetime.now(datetime.timezone.utc)
+                },
+            }
+        )
+        if job and job.get("path") and not os.path.exists(job["path"]):
+            return None
+        return job
+
+    def cleanup(self) -> int:
+        """
+        Remove export files older than the job TTL.
+
+        Returns:
+            int: Number of removed files.
+        """
+        if not os.path.isdir(self.directory):
+            return 0
+        removed = 0
+        now = time.time()
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    if (
+                        entry.name.endswith(".export")
+                        and now - entry.stat().st_mtime > self.ttl
+                    ):
+                        os.remove(entry.path)
+                        removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+    async def shutdown(self) -> None:
+        """Stop the sweeper and cancel jobs that are still running."""
+        tasks = list(self._tasks)
+        if self._sweeper is not None:
+            tasks.append(self._sweeper)
+            self._sweeper = None
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+export_jobs = ExportJobManager(
+    export_jobs_collection, EXPORT_JOB_DIR, EXPORT_JOB_WORKERS, EXPORT_JOB_TTL
+)
@@ -0,0 +1,226 @@
+"""
+Index management for the Money Manager collections.
+
+Indexes are declared here and created at API and bot startup. Running this
+module reports how often each index is used:
+
+    python -m api.utils.indexes stats
+"""
+
+import argparse
+import asyncio
+from typing import Any, Dict, Iterable, List, Optional
+
+from loguru import logger
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import PyMongoError
+
+from api.utils.db import close_client, get_db
+from config.config import LEDGER_KEY_TTL, MONGO_INDEX_TIMEOUT
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("username", ASCENDING)], name="username", unique=True),
+    ],
+    "expenses": [
+        IndexModel(
+            [("user_id", ASCENDING), ("date", DESCENDING)],
+            name="user_id_date",
+        ),
+        IndexModel(
+            [("user_id", ASCENDING), ("account_name", ASCENDING)],
+            name="user_id_account_name",
+        ),
+        IndexModel(
+            [
+                ("user_id", ASCENDING),
+                ("category", ASCENDING),
+                ("date", DESCENDING),
+            ],
+            name="user_id_category_date",
+        ),
+    ],
+    "expense_rollups": [
+        IndexModel(
+            [
+                ("user_id", ASCENDING),
+                ("day", ASCENDING),
+                ("category", ASCENDING),
+                ("currency", ASCENDING),
+            ],
+            name="user_id_day_category_currency",
+            unique=True,
+        ),
+    ],
+    "accounts": [
+        IndexModel(
+            [("user_id", ASCENDING), ("name", ASCENDING)],
+            name="user_id_name",
+            unique=True,
+        ),
+    ],
+    "tokens": [
+        IndexModel(
+            [("user_id", ASCENDING), ("token", ASCENDING)],
+            name="user_id_token",
+        ),
+        # Expired tokens are removed by MongoDB
+        IndexModel(
+            [("expires_at", ASCENDING)],
+            name="expires_at_ttl",
+            expireAfterSeconds=0,
+        ),
+    ],
+    "ledger": [
+        IndexModel(
+            [("user_id", ASCENDING), ("key", ASCENDING)],
+            name="user_id_key",
+            unique=True,
+        ),
+        # Operation keys are forgotten after LEDGER_KEY_TTL
+        IndexModel(
+            [("created_at", ASCENDING)],
+            name="created_at_ttl",
+            expireAfterSeconds=LEDGER_KEY_TTL,
+        ),
+    ],
+    "export_jobs": [
+        # Finished and abandoned export jobs are removed by MongoDB
+        IndexModel(
+            [("expires_at", ASCENDING)],
+            name="expires_at_ttl",
+            expireAfterSeconds=0,
+        ),
+    ],
+    "telegram_bot": [
+        IndexModel(
+            [("telegram_id", ASCENDING)], name="telegram_id", unique=True
+        ),
+        IndexModel([("token", ASCENDING)], name="token"),
+    ],
+    "telegram_state": [
+        IndexModel([("namespace", ASCENDING)], name="namespace"),
+        # Expired bot conversation state is removed by MongoDB
+        IndexModel(
+            [("expires_at", ASCENDING)],
+            name="expires_at_ttl",
+            expireAfterSeconds=0,
+        ),
+    ],
+}
+
+API_COLLECTIONS = [
+    "users",
+    "expenses",
+    "expense_rollups",
+    "accounts",
+    "tokens",
+    "ledger",
+    "export_jobs",
+]
+BOT_COLLECTIONS = ["telegram_bot", "telegram_state"]
+
+
+async def _create_indexes(
+    db: AsyncIOMotorDatabase, name: str
+) -> Optional[List[str]]:
+    try:
+        return await db[name].create_indexes(INDEXES[name])
+    except PyMongoError as e:
+        logger.warning(f"Could not create indexes on {name}: {e}")
+        return None
+
+
+async def ensure_indexes(
+    db: AsyncIOMotorDatabase,
+    collections: Optional[Iterable[str]] = None,
+    timeout: float = MONGO_INDEX_TIMEOUT,
+) -> Dict[str, List[str]]:
+    """
+    Create the declared indexes that do not exist yet.
+
+    The collections are indexed concurrently, and startup waits at most
+    timeout seconds for all of them. Failures are logged instead of raised,
+    so that a conflicting or unreachable database does not prevent the
+    service from starting.
+
+    Args:
+        db (AsyncIOMotorDatabase): Database holding the collections.
+        collections (Iterable[str], optional): Collections to index,
+            defaults to all declared collections.
+        timeout (float): Seconds to wait for all collections.
+
+    Returns:
+        Dict[str, List[str]]: Names of the indexes ensured per collection.
+    """
+    names = list(collections or INDEXES)
+    try:
+        results = await asyncio.wait_for(
+            asyncio.gather(*(_create_indexes(db, name) for name in names)),
+            timeout,
+        )
+    except asyncio.TimeoutError:
+        logger.warning(f"Creating indexes timed out after {timeout}s")
+        return {}
+    return {
+        name: indexes
+        for name, indexes in zip(names, results)
+        if indexes is not None
+    }
+
+
+async def index_stats(
+    db: AsyncIOMotorDatabase, collections: Optional[Iterable[str]] = None
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Get usage counters of every index via $indexStats.
+
+    Returns:
+        Dict[str, List[Dict[str, Any]]]: Index name, key and number of
+        operations since the counters were reset, per collection.
+    """
+    stats = {}
+    for name in collections or INDEXES:
+        rows = await db[name].aggregate([{"$indexStats": {}}]).to_list(None)
+        stats[name] = [
+            {
+                "name": row["name"],
+                "key": dict(row["key"]),
+                "ops": row["accesses"]["ops"],
+                "since": row["accesses"]["since"],
+            }
+            for row in rows
+        ]
+    return stats
+
+
+async def _main(command: str) -> None:
+    database = get_db()
+    try:
+        if command == "ensure":
+            for name, indexes in (await ensure_indexes(database)).items():
+                print(f"{name}: {', '.join(indexes)}")
+        else:
+            for name, rows in (await index_stats(database)).items():
+                print(name)
+                for row in sorted(rows, key=lambda row: -row["ops"]):
+                    print(
+                        f"  {row['name']:<24} {row['ops']:>10} ops"
+                        f"  since {row['since']:%Y-%m-%d %H:%M}"
+                        f"  {row['key']}"
+                    )
+    finally:
+        close_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Manage Money Manager MongoDB indexes"
+    )
+    parser.add_argument(
+        "command",
+        choices=["stats", "ensure"],
+        help="report index usage or create missing indexes",
+    )
+    asyncio.run(_main(parser.parse_args().command))
@@ -0,0 +1,282 @@
+"""
+Atomic ledger operations across users and accounts.
+
+A ledger operation is a set of postings, each adding to or taking from the
+balance of one account and optionally recording an expense. All balances
+change with one bulk write and all expenses are inserted together, in one
+MongoDB transaction, so an operation applies completely or not at all.
+
+Every operation is stored in the ledger collection under a key chosen by
+the client. Repeating a key returns the stored result instead of moving
+money twice, until the key expires after LEDGER_KEY_TTL seconds. The key is
+claimed before the operation is applied and released if it fails; a key
+claimed by a request that crashed can be taken over after LEDGER_KEY_LEASE
+seconds.
+"""
+
+import datetime
+from collections import defaultdict
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+)
+
+from bson import ObjectId
+from fastapi import HTTPException
+from motor.motor_asyncio import AsyncIOMotorClientSession
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from api.utils.db import (
+    accounts_collection,
+    adjust_balance,
+    bump_data_version,
+    expenses_collection,
+    ledger_collection,
+    run_transaction,
+)
+from api.utils.rollups import update_rollups
+from config.config import LEDGER_KEY_LEASE
+
+Undo = Callable[[], Awaitable[Any]]
+
+
+class Posting(NamedTuple):
+    """
+    A change of one account balance within a ledger operation.
+
+    Attributes:
+        user_id (str): Owner of the account.
+        account (dict): Account document.
+        amount (float): Amount to add in the account currency, negative
+            for debits.
+        expense (dict, optional): Expense to record for a debit.
+    """
+
+    user_id: str
+    account: Dict[str, Any]
+    amount: float
+    expense: Optional[Dict[str, Any]] = None
+
+
+async def find_result(user_id: str, key: str) -> Optional[Dict[str, Any]]:
+    """Get the result of an applied operation of a user, if any."""
+    record = await ledger_collection.find_one({"user_id": user_id, "key": key})
+    return record.get("result") if record else None
+
+
+async def claim_key(user_id: str, key: str) -> ObjectId:
+    """
+    Claim the key of an operation for the current request.
+
+    The claim is written outside of any transaction, so a concurrent request
+    with the same key fails at once instead of on a write conflict.
+
+    Returns:
+        ObjectId: ID of the ledger record holding the key.
+
+    Raises:
+        HTTPException: If another request holds the key or has already
+            applied the operation.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    lease_until = now + datetime.timedelta(seconds=LEDGER_KEY_LEASE)
+    try:
+        record = await ledger_collection.insert_one(
+            {
+                "user_id": user_id,
+                "key": key,
+                "created_at": now,
+                "lease_until": lease_until,
+            }
+        )
+        return record.inserted_id
+    except DuplicateKeyError as e:
+        # The request holding the key died without applying or releasing it
+        record = await ledger_collection.find_one_and_update(
+            {
+                "user_id": user_id,
+                "key": key,
+                "result": {"$exists": False},
+                "lease_until": {"$lte": now},
+            },
+            {"$set": {"created_at": now, "lease_until": lease_until}},
+        )
+        if record is not None:
+            return record["_id"]
+        raise HTTPException(
+            status_code=409,
+            detail="An operation with this key is still in progress",
+        ) from e
+
+
+async def apply_balances(
+    postings: Sequence[Posting],
+    session: Optional[AsyncIOMotorClientSession],
+    undo: List[Undo],
+) -> None:
+    """
+    Apply the net balance change of every account of the postings.
+
+    Debits only apply if the balance covers them. In a transaction all
+    accounts are updated with one bulk write. Without one, accounts are
+    updated one at a time and the changes applied so far are added to
+    undo.
+
+    Raises:
+        HTTPException: If an account balance is insufficient.
+    """
+    deltas: Dict[ObjectId, float] = defaultdict(float)
+    accounts: Dict[ObjectId, Dict[str, Any]] = {}
+    for posting in postings:
+        deltas[posting.account["_id"]] += posting.amount
+        accounts[posting.account["_id"]] = posting.account
+    # Name the account when the balance read before is already too low
+    for account_id, delta in deltas.items():
+        if accounts[account_id]["balance"] + delta < 0:
+            raise HTTPException(
+                status_code=400,
+                detail=(
+                    f"Insufficient balance in "
+                    f"{accounts[account_id]['name']} account"
+                ),
+            )
+
+    if session is None:
+        for account_id, delta in deltas.items():
+            if await adjust_balance(account_id, delta) is None:
+                raise HTTPException(
+                    status_code=400,
+                    detail="Insufficient balance in some accounts",
+                )
+            undo.append(
+                lambda account_id=account_id, delta=delta: adjust_balance(
+                    account_id, -delta
+                )
+            )
+        return
+
+    result = await accounts_collection.bulk_write(
+        [
+            UpdateOne(
+                (
+                    {"_id": account_id, "balance": {"$gte": -delta}}
+                    if delta < 0
+                    else {"_id": account_id}
+                ),
+                {"$inc": {"balance": delta}},
+            )
+            for account_id, delta in deltas.items()
+        ],
+        ordered=False,
+        session=session,
+    )
+    if result.matched_count < len(deltas):
+        raise HTTPException(
+            status_code=400, detail="Insufficient balance in some accounts"
+        )
+
+
+async def apply_postings(
+    user_id: str, key: Optional[str], postings: Sequence[Posting]
+) -> Dict[str, Any]:
+    """
+    Apply a ledger operation once per key.
+
+    With MONGO_TRANSACTIONS disabled the writes cannot be atomic, so the
+    ones already made are undone when a later one fails.
+
+    Args:
+        user_id (str): User requesting the operation.
+        key (Optional[str]): Client-chosen key of the operation, operations
+            without one are applied without being recorded.
+        postings (Sequence[Posting]): Balance changes to apply.
+
+    Returns:
+        dict: Result of the operation, the same for every repetition of
+        the key: the IDs of the recorded expenses in posting order.
+
+    Raises:
+        HTTPException: If a balance is insufficient, or another request
+            with the same key has not finished yet.
+    """
+    expenses = []
+    for posting in postings:
+        if posting.expense is not None:
+            expenses.append(
+                {
+                    "_id": ObjectId(),
+                    "user_id": posting.user_id,
+                    "account_name": posting.account["name"],
+                    **posting.expense,
+                }
+            )
+    result = {
+        "message": "Ledger operation applied",
+        "key": key,
+        "expense_ids": [str(expense["_id"]) for expense in expenses],
+    }
+
+    record_id = None
+    if key is not None:
+        try:
+            record_id = await claim_key(user_id, key)
+        except HTTPException:
+            stored = await find_result(user_id, key)
+            if stored is not None:
+                return stored
+            raise
+
+    undo: List[Undo] = []
+
+    async def apply(session):
+        await apply_balances(postings, session, undo)
+
+        if expenses:
+            await expenses_collection.insert_many(expenses, session=session)
+            if session is None:
+                undo.append(
+                    lambda: expenses_collection.delete_many(
+                        {"_id": {"$in": [e["_id"] for e in expenses]}}
+                    )
+                )
+            by_user = defaultdict(list)
+            for expense in expenses:
+                by_user[expense["user_id"]].append(expense)
+            for expense_user_id, added in by_user.items():
+                await update_rollups(
+                    expense_user_id, added=added, session=session
+                )
+                if session is None:
+                    undo.append(
+                        lambda user=expense_user_id, added=added: (
+                            update_rollups(user, removed=added)
+                        )
+                    )
+
+        if record_id is not None:
+            await ledger_collection.update_one(
+                {"_id": record_id},
+                {"$set": {"result": result}},
+                session=session,
+            )
+
+    try:
+        await run_transaction(apply)
+    except Exception:
+        for step in reversed(undo):
+            await step()
+        if record_id is not None:
+            # Release the key for a retry
+            await ledger_collection.delete_one({"_id": record_id})
+        raise
+
+    for expense_user_id in {expense["user_id"] for expense in expenses}:
+        await bump_data_version(expense_user_id)
+    return result
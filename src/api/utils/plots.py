@@ -1,38 +1,57 @@
-"""Shared plotting utilities for analytics and exports."""
+"""
+Shared plotting utilities for analytics and exports.
+
+Charts are drawn on standalone Figure objects rather than the global pyplot
+state, so they can be rendered concurrently and in worker processes.
+"""
 
 import datetime
 import io
-from typing import Optional
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from matplotlib.figure import Figure
+
+
+class BudgetChartOptions(NamedTuple):
+    """
+    Budgets and date range of a budget vs actual chart.
+
+    Budgets are prorated to the date range, or where it is open, to the
+    dates of the first and last expense.
+    """
 
-import matplotlib.pyplot as plt
-import pandas as pd
+    budgets: Dict[str, Any]
+    from_date: Optional[datetime.date] = None
+    to_date: Optional[datetime.date] = None
+    first_expense_date: Optional[datetime.date] = None
+    last_expense_date: Optional[datetime.date] = None
+    currency: Optional[str] = None
 
 
 def create_expense_bar(
-    expenses: list,
+    days: List[str],
+    totals: List[float],
     from_date: Optional[datetime.date] = None,
     to_date: Optional[datetime.date] = None,
+    currency: Optional[str] = None,
 ) -> io.BytesIO:
-    """Generate expense bar chart."""
-    df = pd.DataFrame(expenses)
-    df["date"] = pd.to_datetime(df["date"])
-    daily_expenses = df.groupby(df["date"].dt.date)["amount"].sum()
-
-    plt.figure(figsize=(10, 6))
-    ax = daily_expenses.plot(kind="bar", color="skyblue")
+    """Generate expense bar chart from daily totals."""
+    fig = Figure(figsize=(10, 6))
+    ax = fig.add_subplot()
+    ax.bar(days, totals, color="skyblue")
 
     date_range_text = get_date_range_text(from_date, to_date)
-    total_spend = daily_expenses.sum()
-    plt.title(
-        f"Total Expenses per Day\n{date_range_text}\nTotal Spend: ${total_spend:,.2f}"
+    total_spend = format_amount(sum(totals), currency)
+    ax.set_title(
+        f"Total Expenses per Day\n{date_range_text}\nTotal Spend: {total_spend}"
     )
 
-    plt.xlabel("Date")
-    plt.ylabel("Total Expense Amount")
-    plt.xticks(rotation=45)
-    plt.tight_layout()
+    ax.set_xlabel("Date")
+    ax.set_ylabel(amount_label("Total Expense Amount", currency))
+    ax.tick_params(axis="x", labelrotation=45)
+    fig.tight_layout()
 
-    for i, value in enumerate(daily_expenses):
+    for i, value in enumerate(totals):
         ax.text(
             i,
             value + 0.5,
@@ -42,26 +61,24 @@ def create_expense_bar(
             fontsize=10,
         )
 
-    return save_plot_to_buffer()
+    return save_plot_to_buffer(fig)
 
 
 def create_category_pie(
-    expenses: list,
+    categories: List[str],
+    totals: List[float],
     from_date: Optional[datetime.date] = None,
     to_date: Optional[datetime.date] = None,
+    currency: Optional[str] = None,
 ) -> io.BytesIO:
-    """Generate category pie chart."""
-    df = pd.DataFrame(expenses)
-    df["date"] = pd.to_datetime(df["date"])
-
-    category_expenses = df.groupby("category")["amount"].sum()
-
-    plt.figure(figsize=(8, 8))
+    """Generate category pie chart from per-category totals."""
+    fig = Figure(figsize=(8, 8))
+    ax = fig.add_subplot()
 
     date_range_text = get_date_range_text(from_date, to_date)
-    total_spend = category_expenses.sum()
-    plt.title(
-        f"Expense Distribution by Category\n{date_range_text}\nTotal Spend: ${total_spend:,.2f}",
+    total_spend = format_amount(sum(totals), currency)
+    ax.set_title(
+        f"Expense Distribution by Category\n{date_range_text}\nTotal Spend: {total_spend}",
         pad=20,
     )
 
@@ -79,73 +96,72 @@ def create_category_pie(
     ]
 
     labels = [
-        f"{cat}\n(${amount:,.2f})" for cat, amount in category_expenses.items()
+        f"{cat}\n({format_amount(amount, currency)})"
+        for cat, amount in zip(categories, totals)
     ]
 
-    plt.pie(
-        category_expenses,
+    ax.pie(
+        totals,
         labels=labels,
         autopct="%1.1f%%",
         startangle=140,
         colors=colors,
     )
-    plt.axis("equal")
+    ax.axis("equal")
 
-    return save_plot_to_buffer()
+    return save_plot_to_buffer(fig)
 
 
 def create_monthly_line(
-    expenses: list,
+    months: List[str],
+    totals: List[float],
     from_date: Optional[datetime.date] = None,
     to_date: Optional[datetime.date] = None,
+    currency: Optional[str] = None,
 ) -> io.BytesIO:
-    """Generate monthly expense line chart."""
-    df = pd.DataFrame(expenses)
-    df["date"] = pd.to_datetime(df["date"])
-    monthly_expenses = df.groupby(df["date"].dt.to_period("M"))["amount"].sum()
-
-    plt.figure(figsize=(10, 6))
+    """Generate monthly expense line chart from monthly totals."""
+    fig = Figure(figsize=(10, 6))
+    ax = fig.add_subplot()
+    ax.plot(months, totals, marker="o", color="skyblue")
 
     date_range_text = get_date_range_text(from_date, to_date)
-    total_spend = monthly_expenses.sum()
-    plt.title(
-        f"Monthly Expenses\n{date_range_text}\nTotal Spend: ${total_spend:,.2f}"
+    total_spend = format_amount(sum(totals), currency)
+    ax.set_title(
+        f"Monthly Expenses\n{date_range_text}\nTotal Spend: {total_spend}"
     )
 
-    plt.xlabel("Month")
-    plt.ylabel("Total Expense Amount")
-    plt.xticks(rotation=45)
-    plt.tight_layout()
+    ax.set_xlabel("Month")
+    ax.set_ylabel(amount_label("Total Expense Amount", currency))
+    ax.tick_params(axis="x", labelrotation=45)
+    fig.tight_layout()
 
-    return save_plot_to_buffer()
+    return save_plot_to_buffer(fig)
 
 
 def create_category_bar(
-    expenses: list,
+    categories: List[str],
+    totals: List[float],
     from_date: Optional[datetime.date] = None,
     to_date: Optional[datetime.date] = None,
+    currency: Optional[str] = None,
 ) -> io.BytesIO:
-    """Generate category bar chart."""
-    df = pd.DataFrame(expenses)
-    df["date"] = pd.to_datetime(df["date"])
-
-    category_expenses = df.groupby("category")["amount"].sum()
-
-    plt.figure(figsize=(10, 6))
-    ax = category_expenses.plot(kind="bar", color="skyblue")
+    """Generate category bar chart from per-category totals."""
+    fig = Figure(figsize=(10, 6))
+    ax = fig.add_subplot()
+    ax.bar(categories, totals, color="skyblue")
 
     date_range_text = get_date_range_text(from_date, to_date)
-    total_spend = category_expenses.sum()
-    plt.title(
-        f"Expenses by Category\n{date_range_text}\nTotal Spend: ${total_spend:,.2f}"
+    total_spend = format_amount(sum(totals), currency)
+    ax.set_title(
+        f"Expenses by Category\n{date_range_text}\nTotal Spend: {total_spend}"
     )
 
-    plt.xlabel("Category")
-    plt.ylabel("Total Expense Amount")
-    plt.xticks(rotation=45)
-    plt.tight_layout()
+    ax.set_xlabel("Category")
+    ax.set_ylabel(amount_label("Total Expense Amount", currency))
+    ax.tick_params(axis="x", labelrotation=45)
+    fig.tight_layout()
 
-    for i, value in enumerate(category_expenses):
+    for i, value in enumerate(totals):
         ax.text(
             i,
             value + 0.5,
@@ -155,57 +171,65 @@ def create_category_bar(
             fontsize=10,
         )
 
-    return save_plot_to_buffer()
+    return save_plot_to_buffer(fig)
 
 
 def create_budget_vs_actual(
-    expenses: list,
-    categories: dict,
-    from_date: Optional[datetime.date] = None,
-    to_date: Optional[datetime.date] = None,
+    categories: List[str],
+    totals: List[float],
+    options: BudgetChartOptions,
 ) -> io.BytesIO:
-    """Generate budget vs actual comparison chart."""
-    df = pd.DataFrame(expenses)
-    df["date"] = pd.to_datetime(df["date"])
-    category_expenses = df.groupby("category")["amount"].sum()
-    first_expense_date = (
-        df["date"].min().date() if not from_date else from_date
-    )
-    last_expense_date = df["date"].max().date() if not to_date else to_date
+    """Generate budget vs actual comparison chart from per-category totals."""
+    category_expenses = dict(zip(categories, totals))
+    budgets = options.budgets
+    first_expense_date = options.from_date or options.first_expense_date
+    last_expense_date = options.to_date or options.last_expense_date
 
     category_names = list(
-        set(category_expenses.index).union(set(categories.keys()))
+        set(category_expenses.keys()).union(set(budgets.keys()))
     )
     actuals = [category_expenses.get(cat, 0) for cat in category_names]
     budgeted = [
         (
             prorate_budget(
-                categories[cat]["monthly_budget"],
-                from_date,
-                to_date,
+                budgets[cat]["monthly_budget"],
+                options.from_date,
+                options.to_date,
                 first_expense_date,
                 last_expense_date,
             )
-            if cat in categories
+            if cat in budgets
             else 0
         )
         for cat in category_names
     ]
-
-    plt.figure(figsize=(10, 6))
+    fig = Figure(figsize=(10, 6))
+    ax = fig.add_subplot()
     x = range(len(category_names))
-    plt.bar(x, budgeted, width=0.4, label="Budgeted", align="center")
-    plt.bar(x, actuals, width=0.4, label="Actual", align="edge")
-    plt.xticks(x, category_names, rotation=45)
+    ax.bar(x, budgeted, width=0.4, label="Budgeted", align="center")
+    ax.bar(x, actuals, width=0.4, label="Actual", align="edge")
+    ax.set_xticks(x, category_names, rotation=45)
+
+    date_range_text = get_date_range_text(options.from_date, options.to_date)
+    ax.set_title(f"Budget vs Actual Expenses\n{date_range_text}")
+    ax.set_xlabel("Category")
+    ax.set_ylabel(amount_label("Amount", options.currency))
+    ax.legend()
+    fig.tight_layout()
+
+    return save_plot_to_buffer(fig)
+
+
+def format_amount(amount: float, currency: Optional[str]) -> str:
+    """Format an amount in a currency, or in dollars if none is given."""
+    if currency:
+        return f"{amount:,.2f} {currency}"
+    return f"${amount:,.2f}"
 
-    date_range_text = get_date_range_text(from_date, to_date)
-    plt.title(f"Budget vs Actual Expenses\n{date_range_text}")
-    plt.xlabel("Category")
-    plt.ylabel("Amount")
-    plt.legend()
-    plt.tight_layout()
 
-    return save_plot_to_buffer()
+def amount_label(label: str, currency: Optional[str]) -> str:
+    """Add the currency to an axis label."""
+    return f"{label} ({currency})" if currency else label
 
 
 def get_date_range_text(
@@ -225,11 +249,10 @@ def get_date_range_text(
     return "Date Range: All"
 
 
-def save_plot_to_buffer() -> io.BytesIO:
-    """Save current plot to BytesIO buffer."""
+def save_plot_to_buffer(fig: Figure) -> io.BytesIO:
+    """Save a figure to a BytesIO buffer."""
     buf = io.BytesIO()
-    plt.savefig(buf, format="png", bbox_inches="tight")
-    plt.close()
+    fig.savefig(buf, format="png", bbox_inches="tight")
     buf.seek(0)
     return buf
 
@@ -0,0 +1,125 @@
+"""
+Executor for rendering charts off the event loop.
+
+Chart functions from api.utils.plots are CPU bound, so they run in a pool
+of worker processes and the async handlers only await the result.
+
+The workers are spawned rather than forked: the server process already runs
+the MongoDB driver's and other threads, and forking a multi-threaded process
+can leave locks held in the child.
+"""
+
+import asyncio
+import io
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from config.config import RENDER_WORKERS
+
+
+def _timed_render(
+    func: Callable[..., io.BytesIO], *args: Any
+) -> Tuple[bytes, float]:
+    """Run a chart function and return its PNG bytes and render time."""
+    start = time.perf_counter()
+    buf = func(*args)
+    return buf.getvalue(), time.perf_counter() - start
+
+
+class RenderExecutor:
+    """
+    Run chart functions in a process pool and keep render metrics.
+
+    With zero workers, charts are rendered in the default thread pool,
+    which still keeps the event loop free.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor: Optional[Executor] = None
+        self.in_flight = 0
+        self.max_in_flight = 0
+        # Totals of finished renders
+        self.totals: Dict[str, float] = {
+            "completed": 0,
+            "failed": 0,
+            "render_seconds": 0.0,
+            "wait_seconds": 0.0,
+        }
+
+    def start(self) -> None:
+        """Start the worker processes, called once from the app lifespan."""
+        if self.workers > 0 and self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+    def _get_executor(self) -> Optional[Executor]:
+        """Get the process pool, starting it if the lifespan has not."""
+        self.start()
+        return self._executor
+
+    async def render(
+        self, func: Callable[..., io.BytesIO], *args: Any
+    ) -> io.BytesIO:
+        """
+        Render a chart without blocking the event loop.
+
+        Args:
+            func (Callable): Module level chart function returning BytesIO.
+            *args: Picklable arguments for the chart function.
+
+        Returns:
+            io.BytesIO: The rendered PNG.
+        """
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        start = time.perf_counter()
+        try:
+            content, elapsed = await loop.run_in_executor(
+                self._get_executor(), _timed_render, func, *args
+            )
+        except Exception:
+            self.totals["failed"] += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+        self.totals["completed"] += 1
+        self.totals["render_seconds"] += elapsed
+        self.totals["wait_seconds"] += time.perf_counter() - start - elapsed
+        return io.BytesIO(content)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get queue depth and render time metrics."""
+        completed = self.totals["completed"]
+        return {
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "completed": completed,
+            "failed": self.totals["failed"],
+            "avg_render_ms": (
+                round(self.totals["render_seconds"] / completed * 1000, 2)
+                if completed
+                else 0.0
+            ),
+            "avg_wait_ms": (
+                round(self.totals["wait_seconds"] / completed * 1000, 2)
+                if completed
+                else 0.0
+            ),
+        }
+
+    def shutdown(self):
+        """Stop the worker processes."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+renderer = RenderExecutor(RENDER_WORKERS)
@@ -0,0 +1,175 @@
+"""
+Per-day expense rollups.
+
+The expense_rollups collection holds one document per user, day, category
+and currency with the sum and number of matching expenses. Expense
+mutations keep it up to date with $inc, so analytics can read a few
+rollups instead of every expense. Existing expenses are backfilled with:
+
+    python -m api.utils.rollups rebuild [--user USER_ID]
+"""
+
+import argparse
+import asyncio
+import datetime
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorClientSession
+from pymongo import UpdateOne
+
+from api.utils.db import (
+    close_client,
+    expenses_collection,
+    rollups_collection,
+)
+
+ROLLUP_FIELDS = ("user_id", "day", "category", "currency")
+
+
+def rollup_day(date: datetime.datetime) -> datetime.datetime:
+    """Midnight UTC of the day an expense date falls on."""
+    if date.tzinfo is not None:
+        date = date.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return datetime.datetime.combine(date.date(), datetime.time.min)
+
+
+def rollup_key(user_id: str, expense: Dict[str, Any]) -> Tuple[Any, ...]:
+    """Values of ROLLUP_FIELDS identifying the rollup of an expense."""
+    return (
+        user_id,
+        rollup_day(expense["date"]),
+        expense["category"],
+        expense["currency"],
+    )
+
+
+async def update_rollups(
+    user_id: str,
+    added: Iterable[Dict[str, Any]] = (),
+    removed: Iterable[Dict[str, Any]] = (),
+    session: Optional[AsyncIOMotorClientSession] = None,
+) -> None:
+    """
+    Apply added and removed expenses to their rollups.
+
+    Changes to the same rollup are merged, and all rollups are updated
+    with one bulk write. Rollups left without expenses are deleted.
+
+    Args:
+        user_id (str): Owner of the expenses.
+        added (Iterable[dict]): Expenses that were stored.
+        removed (Iterable[dict]): Expenses that were deleted.
+        session (AsyncIOMotorClientSession, optional): Transaction session.
+    """
+    deltas: Dict[Tuple[Any, ...], List[float]] = defaultdict(lambda: [0, 0])
+    for expenses, sign in ((added, 1), (removed, -1)):
+        for expense in expenses:
+            delta = deltas[rollup_key(user_id, expense)]
+            delta[0] += sign * float(expense["amount"])
+            delta[1] += sign
+    await apply_rollup_deltas(user_id, deltas, session)
+
+
+async def apply_rollup_deltas(
+    user_id: str,
+    deltas: Dict[Tuple[Any, ...], List[float]],
+    session: Optional[AsyncIOMotorClientSession] = None,
+) -> None:
+    """
+    Add to the total and count of rollups with one bulk write.
+
+    Args:
+        user_id (str): Owner of the rollups.
+        deltas (dict): Total and count to add by values of ROLLUP_FIELDS.
+        session (AsyncIOMotorClientSession, optional): Transaction session.
+    """
+    operations = [
+        UpdateOne(
+            dict(zip(ROLLUP_FIELDS, key)),
+            {"$inc": {"total": total, "count": count}},
+            upsert=True,
+        )
+        for key, (total, count) in deltas.items()
+        if total or count
+    ]
+    if not operations:
+        return
+    await rollups_collection.bulk_write(
+        operations, ordered=False, session=session
+    )
+    if any(count < 0 for _, count in deltas.values()):
+        await rollups_collection.delete_many(
+            {"user_id": user_id, "count": {"$lte": 0}}, session=session
+        )
+
+
+async def delete_rollups(
+    user_id: str, session: Optional[AsyncIOMotorClientSession] = None
+) -> None:
+    """Delete all rollups of a user."""
+    await rollups_collection.delete_many({"user_id": user_id}, session=session)
+
+
+async def rebuild_rollups(user_id: Optional[str] = None) -> int:
+    """
+    Recompute rollups from the expenses, for one user or everyone.
+
+    Expenses written while the rebuild runs may be counted twice or not at
+    all, so run it while the API is idle.
+
+    Returns:
+        int: Number of rollups written.
+    """
+    match = {"user_id": user_id} if user_id else {}
+    await rollups_collection.delete_many(match)
+    await expenses_collection.aggregate(
+        [
+            {"$match": match},
+            {
+                "$group": {
+                    "_id": {
+                        "user_id": "$user_id",
+                        "day": {
+                            "$dateTrunc": {"date": "$date", "unit": "day"}
+                        },
+                        "category": "$category",
+                        "currency": "$currency",
+                    },
+                    "total": {"$sum": "$amount"},
+                    "count": {"$sum": 1},
+                }
+            },
+            {
+                "$project": {
+                    "_id": 0,
+                    **{field: f"$_id.{field}" for field in ROLLUP_FIELDS},
+                    "total": 1,
+                    "count": 1,
+                }
+            },
+            {"$merge": {"into": rollups_collection.name}},
+        ]
+    ).to_list(None)
+    return await rollups_collection.count_documents(match)
+
+
+async def _main(user_id: Optional[str]) -> None:
+    try:
+        count = await rebuild_rollups(user_id)
+        print(f"{count} rollups written")
+    finally:
+        close_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Manage Money Manager expense rollups"
+    )
+    parser.add_argument(
+        "command",
+        choices=["rebuild"],
+        help="recompute the rollups from the expenses",
+    )
+    parser.add_argument("--user", help="only rebuild the rollups of a user")
+    asyncio.run(_main(parser.parse_args().user))
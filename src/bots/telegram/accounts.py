@@ -1,6 +1,5 @@
 """Account management handlers for the Telegram bot."""
 
-import requests
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import (
     CallbackQueryHandler,
@@ -12,13 +11,11 @@ from telegram.ext import (
 )
 from telegram_bot_pagination import InlineKeyboardPaginator
 
+from bots.telegram.api_helper import get_client
 from bots.telegram.auth import authenticate
 from bots.telegram.utils import private_chat_cancel
 from config.config import TELEGRAM_BOT_API_BASE_URL
 
-# Constants
-TIMEOUT = 10  # seconds
-
 # States for account conversation
 (
     ACCOUNT_NAME,
@@ -41,10 +38,9 @@ async def accounts_view(
 ) -> None:
     """View the list of accounts with pagination."""
     headers = {"token": token}
-    response = requests.get(
+    response = await get_client().get(
         f"{TELEGRAM_BOT_API_BASE_URL}/accounts/",
         headers=headers,
-        timeout=TIMEOUT,
     )
 
     if response.status_code == 200:
@@ -141,10 +137,9 @@ async def handle_initial_balance(
 
         # Fetch available currencies
         headers = {"token": token}
-        response = requests.get(
+        response = await get_client().get(
             f"{TELEGRAM_BOT_API_BASE_URL}/users/",
             headers=headers,
-            timeout=TIMEOUT,
         )
         if response.status_code == 200:
             currencies = response.json().get("currencies", [])
@@ -193,11 +188,10 @@ async def handle_currency_selection(
         "currency": context.user_data.get("currency", "USD"),
     }
 
-    response = requests.post(
+    response = await get_client().post(
         f"{TELEGRAM_BOT_API_BASE_URL}/accounts/",
         json=account_data,
         headers={"token": token},
-        timeout=TIMEOUT,
     )
 
     if response.status_code == 200:
@@ -218,10 +212,9 @@ async def accounts_delete(
 ) -> int:
     """Start the account deletion process."""
     headers = {"token": token}
-    response = requests.get(
+    response = await get_client().get(
         f"{TELEGRAM_BOT_API_BASE_URL}/accounts/",
         headers=headers,
-        timeout=TIMEOUT,
     )
 
     if response.status_code == 200:
@@ -278,10 +271,9 @@ async def confirm_delete_account(
     elif query.data == "confirm_delete":
         account_id = context.user_data["account_name"]
         headers = {"token": token}
-        response = requests.delete(
+        response = await get_client().delete(
             f"{TELEGRAM_BOT_API_BASE_URL}/accounts/{account_id}",
             headers=headers,
-            timeout=TIMEOUT,
         )
 
         if response.status_code == 200:
@@ -309,10 +301,9 @@ async def accounts_update(
 ) -> int:
     """Start the account update process."""
     headers = {"token": token}
-    response = requests.get(
+    response = await get_client().get(
         f"{TELEGRAM_BOT_API_BASE_URL}/accounts/",
         headers=headers,
-        timeout=TIMEOUT,
     )
 
     if response.status_code == 200:
@@ -394,11 +385,10 @@ async def handle_name_update(
     account_id = context.user_data["account_id"]
 
     headers = {"token": token}
-    response = requests.put(
+    response = await get_client().put(
         f"{TELEGRAM_BOT_API_BASE_URL}/accounts/{account_id}",
         json={"name": new_name},
         headers=headers,
-        timeout=TIMEOUT,
     )
 
     if response.status_code == 200:
@@ -425,11 +415,10 @@ async def handle_balance_update(
         account_id = context.user_data["account_id"]
 
         headers = {"token": token}
-        response = requests.put(
+        response = await get_client().put(
             f"{TELEGRAM_BOT_API_BASE_URL}/accounts/{account_id}",
             json={"balance": str(new_balance)},
             headers=headers,
-            timeout=TIMEOUT,
         )
 
         if response.status_code == 200:
@@ -1,13 +1,15 @@
+import asyncio
 import calendar
 import json
 import smtplib
+import time
 from datetime import datetime
 from email.mime.application import MIMEApplication
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from io import BytesIO
 
-import requests
+import httpx
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import (
     CallbackQueryHandler,
@@ -18,6 +20,7 @@ from telegram.ext import (
     filters,
 )
 
+from bots.telegram.api_helper import get_client
 from bots.telegram.auth import authenticate
 from bots.telegram.utils import private_chat_cancel
 from config.config import (
@@ -30,7 +33,9 @@ from config.config import (
     TIME_ZONE,
 )
 
-TIMEOUT = 10
+# Exports run as background jobs on the API; poll until they finish
+EXPORT_POLL_INTERVAL = 1
+EXPORT_POLL_TIMEOUT = 120
 
 # States for the conversation
 (
@@ -102,10 +107,9 @@ async def button_callback(
     if query.data in plot_endpoints:
         try:
             headers = {"token": token}
-            response = requests.get(
+            response = await get_client().get(
                 f"{TELEGRAM_BOT_API_BASE_URL}/{plot_endpoints[query.data]}",
                 headers=headers,
-                timeout=TIMEOUT,
             )
 
             if response.status_code == 200:
@@ -391,6 +395,36 @@ async def send_email(email: str, files: list, context: dict) -> bool:
         return False
 
 
+async def fetch_export(token: str, job: dict) -> httpx.Response:
+    """
+    Start an export job on the API and wait for its result.
+
+    Args:
+        token (str): Authentication token.
+        job (dict): Export job parameters (format, export_type, dates).
+
+    Returns:
+        httpx.Response: The exported file, or the error response.
+    """
+    headers = {"token": token}
+    response = await get_client().post(
+        f"{TELEGRAM_BOT_API_BASE_URL}/exports/jobs",
+        headers=headers,
+        json=job,
+    )
+    if response.status_code != 202:
+        return response
+
+    job_url = (
+        f"{TELEGRAM_BOT_API_BASE_URL}/exports/jobs/{response.json()['job_id']}"
+    )
+    deadline = time.monotonic() + EXPORT_POLL_TIMEOUT
+    while response.status_code == 202 and time.monotonic() < deadline:
+        await asyncio.sleep(EXPORT_POLL_INTERVAL)
+        response = await get_client().get(job_url, headers=headers)
+    return response
+
+
 @authenticate
 async def handle_export(
     update: Update, context: ContextTypes.DEFAULT_TYPE, token: str
@@ -413,47 +447,36 @@ async def handle_export(
         params["to_date"] = to_date
 
     try:
-        headers = {"token": token, "Accept": "application/octet-stream"}
-
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 
         if export_type.startswith("csv_"):
             export_subtype = export_type[4:]  # get expenses, accounts, etc
-            endpoint = f"exports/csv?export_type={export_subtype}"
-            mime_type = "text/csv"
+            job = {"format": "csv", "export_type": export_subtype}
             filename = f"{export_subtype}_{timestamp}.csv"
         elif export_type == "export_pdf":
-            endpoint = "exports/pdf"
-            mime_type = "application/pdf"
+            job = {"format": "pdf"}
             filename = f"ultimate_analytics_{timestamp}.pdf"
         elif export_type == "export_excel":
-            endpoint = "exports/xlsx"
-            mime_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            job = {"format": "xlsx"}
             filename = f"all_data_{timestamp}.xlsx"
-        elif export_type == "export_email":
-            endpoint = "exports/email"
-
-        response = requests.get(
-            f"{TELEGRAM_BOT_API_BASE_URL}/{endpoint}",
-            headers=headers,
-            params=params,  # Now only includes dates if they were selected
-            timeout=TIMEOUT,
-        )
+
+        await query.message.edit_text("⏳ Preparing your export...")
+        # Now only includes dates if they were selected
+        response = await fetch_export(token, {**job, **params})
 
         if response.status_code == 200:
-            if export_type == "export_email":
-                await query.message.reply_text(
-                    "✅ Exports have been sent to your email!"
-                )
-            else:
-                await query.message.reply_document(
-                    document=BytesIO(response.content),
-                    filename=filename,
-                    caption="Here's your exported file 📎",
-                    read_timeout=30,
-                    write_timeout=30,
-                    connect_timeout=30,
-                )
+            await query.message.reply_document(
+                document=BytesIO(response.content),
+                filename=filename,
+                caption="Here's your exported file 📎",
+                read_timeout=30,
+                write_timeout=30,
+                connect_timeout=30,
+            )
+        elif response.status_code == 202:
+            await query.message.reply_text(
+                "⌛ Export is taking longer than expected, please try again later."
+            )
         else:
             await query.message.reply_text(f"❌ Export failed: {response.text}")
 
@@ -477,7 +500,6 @@ async def handle_email_input(
         return WAITING_EMAIL
 
     try:
-        headers = {"token": token}
         params = {}
         from_date = context.user_data.get("from_date")
         to_date = context.user_data.get("to_date")
@@ -490,24 +512,14 @@ async def handle_email_input(
         export_files = []
 
         # Get PDF
-        response = requests.get(
-            f"{TELEGRAM_BOT_API_BASE_URL}/exports/pdf",
-            headers=headers,
-            params=params,
-            timeout=TIMEOUT,
-        )
+        response = await fetch_export(token, {"format": "pdf", **params})
         if response.status_code == 200:
             export_files.append(
                 (f"analytics_{timestamp}.pdf", response.content)
             )
 
         # Get Excel
-        response = requests.get(
-            f"{TELEGRAM_BOT_API_BASE_URL}/exports/xlsx",
-            headers=headers,
-            params=params,
-            timeout=TIMEOUT,
-        )
+        response = await fetch_export(token, {"format": "xlsx", **params})
         if response.status_code == 200:
             export_files.append(
                 (f"all_data_{timestamp}.xlsx", response.content)
@@ -516,11 +528,8 @@ async def handle_email_input(
         # Get CSV files
         csv_types = ["expenses", "accounts", "categories"]
         for csv_type in csv_types:
-            response = requests.get(
-                f"{TELEGRAM_BOT_API_BASE_URL}/exports/csv",
-                headers=headers,
-                params={**params, "export_type": csv_type},
-                timeout=TIMEOUT,
+            response = await fetch_export(
+                token, {"format": "csv", "export_type": csv_type, **params}
             )
             if response.status_code == 200:
                 export_files.append(
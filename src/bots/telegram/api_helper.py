@@ -1,9 +1,145 @@
-from datetime import datetime
+"""
+HTTP access to the Money Manager API for the Telegram bot.
 
-import aiohttp
+All handlers share one httpx.AsyncClient, so API calls do not block the
+event loop and reuse pooled keep-alive connections. The client is opened
+and closed with the bot application in bots.telegram.main.
+
+With TELEGRAM_BOT_API_TRANSPORT set to "asgi" the client calls the FastAPI
+app inside the bot process instead of going over HTTP, for installs running
+the bot and the API on the same node.
+"""
+
+import asyncio
+from contextlib import AsyncExitStack
+from typing import Any, Awaitable, Iterable, List, Optional
+
+import httpx
 
 from config import config
 
+TRANSPORTS = ("http", "asgi")
+
+_client: Optional[httpx.AsyncClient] = None
+_app_lifespan: Optional[AsyncExitStack] = None
+
+
+def create_transport(mode: str) -> httpx.AsyncBaseTransport:
+    """
+    Create the transport the API client sends requests through.
+
+    Args:
+        mode (str): "http" for a pooled network transport, or "asgi" to
+            call the API app in-process.
+
+    Returns:
+        httpx.AsyncBaseTransport: The transport.
+
+    Raises:
+        ValueError: If the mode is unknown.
+    """
+    if mode == "http":
+        limits = httpx.Limits(
+            max_connections=config.TELEGRAM_BOT_API_MAX_CONNECTIONS,
+            max_keepalive_connections=config.TELEGRAM_BOT_API_MAX_CONNECTIONS,
+        )
+        return httpx.AsyncHTTPTransport(
+            limits=limits, retries=config.TELEGRAM_BOT_API_RETRIES
+        )
+    if mode == "asgi":
+        # Only imported in-process, split deployments do not need the API
+        from api.app import app
+
+        # Errors in the app become 500 responses, as they would over HTTP
+        return httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    raise ValueError(
+        f"Unknown TELEGRAM_BOT_API_TRANSPORT {mode!r}, "
+        f"expected one of {', '.join(TRANSPORTS)}"
+    )
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Get the shared API client, creating it on first use.
+
+    Over HTTP, failed connection attempts are retried by the transport;
+    requests that reached the API are never sent twice.
+
+    Returns:
+        httpx.AsyncClient: The client used for all API calls.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            transport=create_transport(config.TELEGRAM_BOT_API_TRANSPORT),
+            timeout=config.TELEGRAM_BOT_API_TIMEOUT,
+            follow_redirects=True,
+        )
+    return _client
+
+
+async def start_client() -> httpx.AsyncClient:
+    """
+    Open the shared API client when the bot starts.
+
+    In "asgi" mode the startup of the API app, which the ASGI transport
+    does not run, happens here as well, and its shutdown in close_client.
+
+    Returns:
+        httpx.AsyncClient: The client used for all API calls.
+    """
+    global _app_lifespan
+    client = get_client()
+    if config.TELEGRAM_BOT_API_TRANSPORT == "asgi" and _app_lifespan is None:
+        from api.app import app
+
+        _app_lifespan = AsyncExitStack()
+        await _app_lifespan.enter_async_context(
+            app.router.lifespan_context(app)
+        )
+    return client
+
+
+async def close_client() -> None:
+    """Close the shared API client and shut down an in-process API app."""
+    global _client, _app_lifespan
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    if _app_lifespan is not None:
+        await _app_lifespan.aclose()
+        _app_lifespan = None
+
+
+async def gather_bounded(
+    awaitables: Iterable[Awaitable[Any]],
+    limit: Optional[int] = None,
+    return_exceptions: bool = False,
+) -> List[Any]:
+    """
+    Await API calls concurrently, at most limit of them at a time.
+
+    Args:
+        awaitables (Iterable[Awaitable]): Calls to await.
+        limit (int, optional): Maximum number of calls in flight, defaults
+            to TELEGRAM_BOT_API_CONCURRENCY.
+        return_exceptions (bool): Return exceptions as results instead of
+            raising the first one, as in asyncio.gather.
+
+    Returns:
+        List[Any]: The results, in the order of the calls.
+    """
+    semaphore = asyncio.Semaphore(limit or config.TELEGRAM_BOT_API_CONCURRENCY)
+
+    async def bounded(awaitable: Awaitable[Any]) -> Any:
+        async with semaphore:
+            return await awaitable
+
+    return await asyncio.gather(
+        *(bounded(awaitable) for awaitable in awaitables),
+        return_exceptions=return_exceptions,
+    )
+
 
 class APIHelper:
     BASE_URL = config.TELEGRAM_BOT_API_BASE_URL
@@ -11,41 +147,40 @@ class APIHelper:
     @staticmethod
     async def save_expense(token: str, expense_data: dict) -> dict:
         """Save expense via API following the Telegram bot pattern"""
-        async with aiohttp.ClientSession() as session:
-            headers = {"Content-Type": "application/json", "token": token}
-
-            # Ensure date is in correct ISO format
-            try:
-                if not expense_data["date"].endswith("Z"):
-                    expense_data["date"] = f"{expense_data['date']}Z"
-            except (KeyError, AttributeError):
-                return {"success": False, "message": "Invalid date format"}
-
-            # Use the expense data directly as it matches the API format
-            payload = {
-                "amount": expense_data["amount"],
-                "description": expense_data["description"],
-                "category": expense_data["category"],
-                "currency": expense_data["currency"],
-                "account": expense_data["account"],
-                "date": expense_data["date"],
-            }
-
-            try:
-                async with session.post(
-                    f"{APIHelper.BASE_URL}/expenses/",
-                    json=payload,
-                    headers=headers,
-                ) as response:
-                    if response.status == 200:
-                        return {"success": True, "data": await response.json()}
-                    else:
-                        error_data = await response.json()
-                        return {
-                            "success": False,
-                            "message": error_data.get(
-                                "detail", "Failed to save expense"
-                            ),
-                        }
-            except Exception as e:
-                return {"success": False, "message": str(e)}
+        headers = {"Content-Type": "application/json", "token": token}
+
+        # Ensure date is in correct ISO format
+        try:
+            if not expense_data["date"].endswith("Z"):
+                expense_data["date"] = f"{expense_data['date']}Z"
+        except (KeyError, AttributeError):
+            return {"success": False, "message": "Invalid date format"}
+
+        # Use the expense data directly as it matches the API format
+        payload = {
+            "amount": expense_data["amount"],
+            "description": expense_data["description"],
+            "category": expense_data["category"],
+            "currency": expense_data["currency"],
+            "account": expense_data["account"],
+            "date": expense_data["date"],
+        }
+
+        try:
+            response = await get_client().post(
+                f"{APIHelper.BASE_URL}/expenses/",
+                json=payload,
+                headers=headers,
+            )
+            if response.status_code == 200:
+                return {"success": True, "data": response.json()}
+            else:
+                error_data = response.json()
+                return {
+                    "success": False,
+                    "message": error_data.get(
+                        "detail", "Failed to save expense"
+                    ),
+                }
+        except Exception as e:
+            return {"success": False, "message": str(e)}
@@ -1,8 +1,8 @@
 """Authentication handlers and utilities for the Telegram bot."""
 
-from typing import Any, Optional
+import datetime
+from typing import Any, Iterable, List, Optional
 
-import requests
 from loguru import logger
 from motor.motor_asyncio import AsyncIOMotorClient
 from telegram import Update
@@ -14,15 +14,14 @@ from telegram.ext import (
     filters,
 )
 
+from api.utils.cache import TTLCache
+from bots.telegram.api_helper import get_client
 from bots.telegram.utils import (
     get_private_chat_menu_commands,
     private_chat_cancel,
 )
 from config import config
 
-# Constants
-TIMEOUT = 10  # seconds
-
 # States for conversation
 USERNAME, PASSWORD, LOGIN_PASSWORD, SIGNUP_CONFIRM = range(4)
 
@@ -30,6 +29,122 @@ USERNAME, PASSWORD, LOGIN_PASSWORD, SIGNUP_CONFIRM = range(4)
 mongodb_client = AsyncIOMotorClient(config.MONGO_URI)
 telegram_collection = mongodb_client.mmdb.telegram_bot
 
+# telegram_id -> telegram_bot document of logged in users. Logouts in other
+# bot processes show here after the TTL at the latest; expired tokens are
+# never used, see session_expired.
+session_cache = TTLCache(
+    maxsize=config.TELEGRAM_SESSION_CACHE_SIZE,
+    ttl=config.TELEGRAM_SESSION_CACHE_TTL,
+)
+
+
+def session_expired(session: dict) -> bool:
+    """Whether the API token of a stored login has expired."""
+    expires_at = session.get("expires_at")
+    if expires_at is None:
+        return False
+    if expires_at.tzinfo is None:
+        # MongoDB returns naive UTC datetimes
+        expires_at = expires_at.replace(tzinfo=datetime.timezone.utc)
+    return expires_at <= datetime.datetime.now(datetime.timezone.utc)
+
+
+async def find_session(telegram_id: int) -> Optional[dict]:
+    """
+    Get the stored login of a Telegram user, cached for repeated updates.
+
+    Args:
+        telegram_id (int): Telegram user id.
+
+    Returns:
+        Optional[dict]: The telegram_bot document, None if not logged in.
+    """
+    session = session_cache.get(telegram_id)
+    if session is not None and session_expired(session):
+        forget_session(telegram_id)
+        session = None
+    if session is None:
+        session = await telegram_collection.find_one(
+            {"telegram_id": telegram_id}
+        )
+        if session is None or session_expired(session):
+            return None
+        session_cache.set(telegram_id, session)
+    return session
+
+
+async def prefetch_sessions(telegram_ids: Iterable[int]) -> None:
+    """Load the logins of several Telegram users missing from the cache."""
+    missing = [
+        telegram_id
+        for telegram_id in set(telegram_ids)
+        if telegram_id not in session_cache
+    ]
+    if not missing:
+        return
+    async for session in telegram_collection.find(
+        {"telegram_id": {"$in": missing}}
+    ):
+        if not session_expired(session):
+            session_cache.set(session["telegram_id"], session)
+
+
+async def find_sessions(
+    users: Iterable[Optional[dict]],
+) -> List[Optional[dict]]:
+    """
+    Get the current logins of users kept in the state of a conversation.
+
+    Stored conversations only keep the Telegram id of their users, their
+    API tokens are read from the logins when they are needed.
+
+    Args:
+        users (Iterable[Optional[dict]]): Users as kept in the state.
+
+    Returns:
+        List[Optional[dict]]: The login of every user, None for users that
+        are unknown or have logged out.
+    """
+    users = list(users)
+    await prefetch_sessions(user["telegram_id"] for user in users if user)
+    return [
+        await find_session(user["telegram_id"]) if user else None
+        for user in users
+    ]
+
+
+def forget_session(telegram_id: int) -> None:
+    """Drop a Telegram user from the session cache after logging in or out."""
+    session_cache.pop(telegram_id)
+
+
+async def save_session(telegram_id: int, username: str, token: dict) -> None:
+    """
+    Store the API token of a Telegram user, replacing an earlier one.
+
+    Args:
+        telegram_id (int): Telegram user id.
+        username (str): Name of the API user.
+        token (dict): Token as returned by POST /users/token/.
+    """
+    expires_at = token.get("expires_at")
+    await telegram_collection.update_one(
+        {"telegram_id": telegram_id},
+        {
+            "$set": {
+                "username": username,
+                "token": token["token"],
+                "expires_at": (
+                    datetime.datetime.fromisoformat(expires_at)
+                    if expires_at
+                    else None
+                ),
+            }
+        },
+        upsert=True,
+    )
+    forget_session(telegram_id)
+
 
 class UnauthorizedError(Exception):
     pass
@@ -91,37 +206,19 @@ async def handle_login_password(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> int:
     try:
-        response = requests.post(
+        response = await get_client().post(
             f"{config.TELEGRAM_BOT_API_BASE_URL}/users/token/?token_expires=43200",
             data={
                 "username": context.user_data["username"],
                 "password": update.message.text,
             },
-            timeout=TIMEOUT,
         )
 
         if response.status_code == 200:
-            token = response.json()["result"]["token"]
+            token = response.json()["result"]
             user_id = update.effective_user.id
 
-            user = await telegram_collection.find_one({"telegram_id": user_id})
-            if user:
-                await telegram_collection.update_one(
-                    {"telegram_id": user_id},
-                    {
-                        "$set": {
-                            "token": token,
-                            "username": context.user_data["username"],
-                        }
-                    },
-                )
-            else:
-                user_data = {
-                    "username": context.user_data["username"],
-                    "token": token,
-                    "telegram_id": user_id,
-                }
-                await telegram_collection.insert_one(user_data)
+            await save_session(user_id, context.user_data["username"], token)
 
             await update.message.reply_text(
                 f"Login successful!\n\n{get_private_chat_menu_commands()}"
@@ -158,32 +255,27 @@ async def handle_signup_confirm(
             "username": context.user_data["username"],
             "password": context.user_data["password"],
         }
-        response = requests.post(
+        response = await get_client().post(
             f"{config.TELEGRAM_BOT_API_BASE_URL}/users/",
             json=signup_data,
-            timeout=TIMEOUT,
         )
 
         if response.status_code == 200:
-            login_response = requests.post(
+            login_response = await get_client().post(
                 f"{config.TELEGRAM_BOT_API_BASE_URL}/users/token/?token_expires=43200",
                 data={
                     "username": context.user_data["username"],
                     "password": context.user_data["password"],
                 },
-                timeout=TIMEOUT,
             )
 
             if login_response.status_code == 200:
-                token = login_response.json()["result"]["token"]
+                token = login_response.json()["result"]
                 user_id = update.effective_user.id
 
-                user_data = {
-                    "username": context.user_data["username"],
-                    "token": token,
-                    "telegram_id": user_id,
-                }
-                await telegram_collection.insert_one(user_data)
+                await save_session(
+                    user_id, context.user_data["username"], token
+                )
 
                 await update.message.reply_text(
                     f"Signup successful! You are now logged in.\n\n{get_private_chat_menu_commands()}"
@@ -215,10 +307,9 @@ async def get_user(
     if token:
         return await telegram_collection.find_one({"token": token})
     if tg_user_id:
-        return await telegram_collection.find_one({"telegram_id": tg_user_id})
+        return await find_session(tg_user_id)
     if update:
-        user_id = update.effective_user.id
-        return await telegram_collection.find_one({"telegram_id": user_id})
+        return await find_session(update.effective_user.id)
 
 
 def authenticate(func):
@@ -227,8 +318,7 @@ def authenticate(func):
     async def wrapper(
         update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs
     ):
-        user_id = update.effective_user.id
-        user = await telegram_collection.find_one({"telegram_id": user_id})
+        user = await find_session(update.effective_user.id)
         logger.debug(f"User: {user}")
         if user and user.get("token"):
             return await func(
@@ -250,6 +340,7 @@ def authenticate(func):
 async def logout(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user_id = update.effective_user.id
     result = await telegram_collection.delete_many({"telegram_id": user_id})
+    forget_session(user_id)
     if result.deleted_count > 0:
         await update.message.reply_text(
             "You have been logged out successfully.\nPlease /login or /signup to continue."
@@ -1,6 +1,5 @@
 """Category management handlers for the Telegram bot."""
 
-import requests
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import (
     CallbackQueryHandler,
@@ -12,13 +11,11 @@ from telegram.ext import (
 )
 from telegram_bot_pagination import InlineKeyboardPaginator
 
+from bots.telegram.api_helper import get_client
 from bots.telegram.auth import authenticate
 from bots.telegram.utils import private_chat_cancel
 from config.config import TELEGRAM_BOT_API_BASE_URL
 
-# Constants
-TIMEOUT = 10  # seconds
-
 # States for category conversation
 (
     CATEGORY_NAME,
@@ -38,10 +35,9 @@ async def categories_view(
 ) -> None:
     """View the list of categories with pagination."""
     headers = {"token": token}
-    response = requests.get(
+    response = await get_client().get(
         f"{TELEGRAM_BOT_API_BASE_URL}/categories/",
         headers=headers,
-        timeout=TIMEOUT,
     )
 
     if response.status_code == 200:
@@ -143,11 +139,10 @@ async def handle_monthly_budget(
         }
 
         headers = {"token": token}
-        response = requests.post(
+        response = await get_client().post(
             f"{TELEGRAM_BOT_API_BASE_URL}/categories/",
             json=category_data,
             headers=headers,
-            timeout=TIMEOUT,
         )
 
         if response.status_code == 200:
@@ -176,10 +171,9 @@ async def categories_delete(
 ) -> int:
     """Start the category deletion process."""
     headers = {"token": token}
-    response = requests.get(
+    response = await get_client().get(
         f"{TELEGRAM_BOT_API_BASE_URL}/categories/",
         headers=headers,
-        timeout=TIMEOUT,
     )
 
     if response.status_code == 200:
@@ -236,10 +230,9 @@ async def confirm_delete_category(
     elif query.data == "confirm_delete":
         category_name = context.user_data["category_name"]
         headers = {"token": token}
-        response = requests.delete(
+        response = await get_client().delete(
             f"{TELEGRAM_BOT_API_BASE_URL}/categories/{category_name}",
             headers=headers,
-            timeout=TIMEOUT,
         )
 
         if response.status_code == 200:
@@ -267,10 +260,9 @@ async def categories_update(
 ) -> int:
     """Start the category update process."""
     headers = {"token": token}
-    response = requests.get(
+    response = await get_client().get(
         f"{TELEGRAM_BOT_API_BASE_URL}/categories/",
         headers=headers,
-        timeout=TIMEOUT,
     )
 
     if response.status_code == 200:
@@ -326,11 +318,10 @@ async def handle_budget_update(
         category_name = context.user_data["category_name"]
 
         headers = {"token": token}
-        response = requests.put(
+        response = await get_client().put(
             f"{TELEGRAM_BOT_API_BASE_URL}/categories/{category_name}",
             json={"monthly_budget": str(new_budget)},
             headers=headers,
-            timeout=TIMEOUT,
         )
 
         if response.status_code == 200:
@@ -1,9 +1,9 @@
 """Expense management handlers for the Telegram bot."""
 
-from calendar import monthrange
 from datetime import datetime
+from urllib.parse import quote
 
-import requests
+import httpx
 from pytz import timezone  # type: ignore
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import (
@@ -15,15 +15,12 @@ from telegram.ext import (
     filters,
 )
 from telegram_bot_calendar import DetailedTelegramCalendar
-from telegram_bot_pagination import InlineKeyboardPaginator
 
+from bots.telegram.api_helper import get_client
 from bots.telegram.auth import authenticate
 from bots.telegram.utils import private_chat_cancel
 from config.config import MONGO_URI, TELEGRAM_BOT_API_BASE_URL, TIME_ZONE
 
-# Constants
-TIMEOUT = 10  # seconds
-
 # States for conversation
 (
     AMOUNT,
@@ -77,10 +74,9 @@ async def fetch_and_show_categories(
 ) -> None:
     """Fetch and display categories for the user to select."""
     headers = {"token": token}
-    response = requests.get(
+    response = await get_client().get(
         f"{TELEGRAM_BOT_API_BASE_URL}/categories/",
         headers=headers,
-        timeout=TIMEOUT,
     )
     if response.status_code == 200:
         categories = response.json().get("categories", [])
@@ -128,8 +124,8 @@ async def fetch_and_show_currencies(
 ) -> None:
     """Fetch and display currencies for the user to select."""
     headers = {"token": token}
-    response = requests.get(
-        f"{TELEGRAM_BOT_API_BASE_URL}/users/", headers=headers, timeout=TIMEOUT
+    response = await get_client().get(
+        f"{TELEGRAM_BOT_API_BASE_URL}/users/", headers=headers
     )
     if response.status_code == 200:
         currencies = response.json().get("currencies", [])
@@ -168,10 +164,9 @@ async def fetch_and_show_accounts(
 ) -> None:
     """Fetch and display accounts for the user to select."""
     headers = {"token": token}
-    response = requests.get(
+    response = await get_client().get(
         f"{TELEGRAM_BOT_API_BASE_URL}/accounts/",
         headers=headers,
-        timeout=TIMEOUT,
     )
     if response.status_code == 200:
         accounts = response.json().get("accounts", [])
@@ -236,50 +231,24 @@ async def send_budget_alert(
         token: The authentication token
     """
     try:
-        # Get category budget
-        headers = {"token": token}
-        category_response = requests.get(
-            f"{TELEGRAM_BOT_API_BASE_URL}/categories/",
-            headers=headers,
-            timeout=TIMEOUT,
+        # The API sums this month's expenses, converted to the currency
+        name = quote(category, safe="")
+        response = await get_client().get(
+            f"{TELEGRAM_BOT_API_BASE_URL}/categories/{name}/budget-status",
+            params={"currency": currency},
+            headers={"token": token},
         )
 
-        if category_response.status_code != 200:
-            return  # Silently return if we can't get categories
+        if response.status_code != 200:
+            return  # Silently return if the category has no budget status
 
-        categories = category_response.json().get("categories", {})
-        category_budget = float(
-            categories.get(category, {}).get("monthly_budget", 0)
-        )
+        status = response.json()
+        category_budget = status["budget"]
+        total_expenses = status["spent"]
 
         if category_budget == 0:
             return  # No budget set for this category
 
-        # Get current month's expenses
-        today = datetime.now()
-        _, last_day = monthrange(today.year, today.month)
-        month_start = today.replace(day=1).strftime("%Y-%m-%dT%H:%M:%S.%f")
-        month_end = today.replace(day=last_day).strftime(
-            "%Y-%m-%dT%H:%M:%S.%f"
-        )
-
-        expenses_response = requests.get(
-            f"{TELEGRAM_BOT_API_BASE_URL}/expenses/?start_date={month_start}&end_date={month_end}&category={category}",
-            headers=headers,
-            timeout=TIMEOUT,
-        )
-
-        if expenses_response.status_code != 200:
-            return  # Silently return if we can't get expenses
-
-        expenses = expenses_response.json().get("expenses", [])
-        total_expenses = sum(
-            float(exp["amount"])
-            for exp in expenses
-            if exp["currency"] == currency
-            if exp["category"] == category
-        )
-
         # Check if budget is exceeded
         if total_expenses > category_budget:
             percentage_exceeded = (
@@ -305,7 +274,7 @@ async def send_budget_alert(
                     alert_message, parse_mode="Markdown"
                 )
 
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         # Log the error but don't interrupt the user flow
         print(f"Error checking budget alert: {str(e)}")
     except Exception as e:
@@ -336,11 +305,10 @@ async def handle_date_option(
             "date": context.user_data["date"],
         }
         headers = {"token": token}
-        response = requests.post(
+        response = await get_client().post(
             f"{TELEGRAM_BOT_API_BASE_URL}/expenses/",
             json=expense_data,
             headers=headers,
-            timeout=TIMEOUT,
         )
         if response.status_code == 200:
             await query.message.edit_text(
@@ -397,11 +365,10 @@ async def date(
         }
 
         headers = {"token": token}
-        response = requests.post(
+        response = await get_client().post(
             f"{TELEGRAM_BOT_API_BASE_URL}/expenses/",
             json=expense_data,
             headers=headers,
-            timeout=TIMEOUT,
         )
 
         if response.status_code == 200:
@@ -431,31 +398,50 @@ async def expenses_view(
 ) -> None:
     """View the list of expenses with pagination."""
     headers = {"token": token}
-    response = requests.get(
+    page = int(context.args[0]) if context.args else 1
+    items_per_page = 5
+    # next_cursor of every page shown so far, page n starts after
+    # cursors[n - 2]; without it, e.g. after a restart, start over
+    cursors = context.user_data.setdefault("expense_cursors", [])
+    if page < 1 or page - 1 > len(cursors):
+        page = 1
+    params = {"limit": items_per_page}
+    if page > 1:
+        params["cursor"] = cursors[page - 2]
+    response = await get_client().get(
         f"{TELEGRAM_BOT_API_BASE_URL}/expenses/",
+        params=params,
         headers=headers,
-        timeout=TIMEOUT,
     )
     if response.status_code == 200:
-        expenses = response.json()["expenses"]
-        if not expenses:
+        expenses_page = response.json()["expenses"]
+        next_cursor = response.json().get("next_cursor")
+        if not expenses_page:
             await update.message.reply_text("No expenses found.")
             return
 
         # Pagination setup
-        page = int(context.args[0]) if context.args else 1
-        items_per_page = 5
-        paginator = InlineKeyboardPaginator(
-            len(expenses) // items_per_page
-            + (1 if len(expenses) % items_per_page else 0),
-            current_page=page,
-            data_pattern="view_expenses#{page}",
+        del cursors[page - 1 :]
+        pagination_buttons = []
+        if page > 1:
+            pagination_buttons.append(
+                InlineKeyboardButton(
+                    "⬅️", callback_data=f"view_expenses#{page - 1}"
+                )
+            )
+        if next_cursor:
+            cursors.append(next_cursor)
+            pagination_buttons.append(
+                InlineKeyboardButton(
+                    "➡️", callback_data=f"view_expenses#{page + 1}"
+                )
+            )
+        reply_markup = (
+            InlineKeyboardMarkup([pagination_buttons])
+            if pagination_buttons
+            else None
         )
 
-        start_idx = (page - 1) * items_per_page
-        end_idx = start_idx + items_per_page
-        expenses_page = expenses[start_idx:end_idx]
-
         message = "💰 *Your Expenses:*\n\n"
         for expense in expenses_page:
             # Convert date to human-readable format, handling datetime strings with time components
@@ -477,11 +463,11 @@ async def expenses_view(
 
         if update.message:
             await update.message.reply_text(
-                message, parse_mode="Markdown", reply_markup=paginator.markup
+                message, parse_mode="Markdown", reply_markup=reply_markup
             )
         elif update.callback_query:
             await update.callback_query.message.edit_text(
-                message, parse_mode="Markdown", reply_markup=paginator.markup
+                message, parse_mode="Markdown", reply_markup=reply_markup
             )
     else:
         if update.message:
@@ -509,10 +495,9 @@ async def expenses_delete(
 ) -> int:
     """Start the expense deletion process."""
     headers = {"token": token}
-    response = requests.get(
+    response = await get_client().get(
         f"{TELEGRAM_BOT_API_BASE_URL}/expenses/",
         headers=headers,
-        timeout=TIMEOUT,
     )
     if response.status_code == 200:
         expenses = response.json()["expenses"]
@@ -631,10 +616,9 @@ async def confirm_delete(
     elif query.data == "confirm_delete":
         expense_id = context.user_data.get("expense_id")
         headers = {"token": token}
-        response = requests.delete(
+        response = await get_client().delete(
             f"{TELEGRAM_BOT_API_BASE_URL}/expenses/{expense_id}",
             headers=headers,
-            timeout=TIMEOUT,
         )
         if response.status_code == 200:
             await query.message.edit_text(
@@ -656,10 +640,9 @@ async def expenses_delete_all(
 ) -> int:
     """Start the process to delete all expenses."""
     headers = {"token": token}
-    response = requests.get(
+    response = await get_client().get(
         f"{TELEGRAM_BOT_API_BASE_URL}/expenses/",
         headers=headers,
-        timeout=TIMEOUT,
     )
     if response.status_code == 200:
         expenses = response.json()["expenses"]
@@ -697,10 +680,9 @@ async def confirm_delete_all(
 
     if query.data == "confirm_delete_all":
         headers = {"token": token}
-        response = requests.delete(
+        response = await get_client().delete(
             f"{TELEGRAM_BOT_API_BASE_URL}/expenses/all",
             headers=headers,
-            timeout=TIMEOUT,
         )
         if response.status_code == 200:
             await query.message.edit_text(
@@ -720,10 +702,9 @@ async def expenses_update(
 ) -> int:
     """Start the expense update process by showing list of expenses."""
     headers = {"token": token}
-    response = requests.get(
+    response = await get_client().get(
         f"{TELEGRAM_BOT_API_BASE_URL}/expenses/",
         headers=headers,
-        timeout=TIMEOUT,
     )
 
     if response.status_code == 200:
@@ -900,11 +881,10 @@ async def handle_update_value(
     # Update the expense
     headers = {"token": token}
     update_data = {field: new_value}
-    response = requests.put(
+    response = await get_client().put(
         f"{TELEGRAM_BOT_API_BASE_URL}/expenses/{expense_id}",
         json=update_data,
         headers=headers,
-        timeout=TIMEOUT,
     )
 
     message = (
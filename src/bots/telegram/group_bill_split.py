@@ -1,42 +1,45 @@
 import re
-import threading
+import time
 from collections import namedtuple
-from datetime import datetime, timedelta
-from typing import Dict, List, NamedTuple, Union
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Union
 from uuid import uuid4
 
-import requests
 from loguru import logger
 from matplotlib.pylab import f
 from pytz import timezone as pytz_timezone
 from telegram import (
+    Bot,
     InlineKeyboardButton,
     InlineKeyboardMarkup,
+    Message,
     Update,
 )
 from telegram.ext import ContextTypes
 
-from bots.telegram.auth import authenticate, get_user
+from bots.telegram.api_helper import gather_bounded, get_client
+from bots.telegram.auth import authenticate, find_sessions, get_user
 from bots.telegram.reply_handlers import ReplyWaiters
+from bots.telegram.state import (
+    StateMap,
+    StoredState,
+    compact_message,
+    compact_user,
+    restore_message,
+)
+from bots.telegram.timeouts import transaction_timeouts
 from bots.telegram.utils import (
     extract_mentioned_usernames,
     wrap_text_for_markdown_v2,
 )
 from config.config import TELEGRAM_BOT_API_BASE_URL, TIME_ZONE
 
-API_TIMEOUT = 10  # seconds
 TRANSACTION_TIMEOUT = 600  # seconds
 
 ComplexUser = namedtuple("ComplexUser", ["tg_username", "mm_user"])
 
-ONGOING_BILL_SPLIT_TRANSACTIONS: Dict[
-    int, "BillSplitTransaction"
-] = (
-    {}
-)  # Dictionary to track ongoing transactions, group_id: BillSplitTransaction
-
 
-class BillSplitTransaction:
+class BillSplitTransaction(StoredState):
     """Class to represent a bill split transaction.
 
     Attributes:
@@ -48,18 +51,12 @@ class BillSplitTransaction:
         timestamp (str): The timestamp of the transaction.
         description (str): The description of the transaction.
         anchor_update (Update): The corresponding update in tg group chat.
+        anchor_message (Message): The bot's message announcing the transaction.
+        amount_message_id (int): The bot's message asking for the amount.
+        deadline (float): UNIX time the transaction times out at.
         identifier (str): The unique identifier for the transaction.
     """
 
-    # class properties
-    TIMEOUT_THREADS = {str: threading.Timer}  # identifier: Timer
-
-    def __del__(self):
-        """Destructor to cancel the timeout thread if it exists."""
-        if self.identifier in self.__class__.TIMEOUT_THREADS:
-            self.__class__.TIMEOUT_THREADS[self.identifier].cancel()
-            del self.__class__.TIMEOUT_THREADS[self.identifier]
-
     def __init__(
         self,
         participants: Dict[str, Union[Dict, None]],
@@ -100,14 +97,11 @@ class BillSplitTransaction:
         self.anchor_update: Update = (
             anchor_update  # Placeholder for the update object
         )
+        self.anchor_message: Optional[Message] = None
+        self.amount_message_id: Optional[int] = None
+        self.deadline = time.time() + TRANSACTION_TIMEOUT
         self.identifier = str(uuid4())  # Unique identifier for the transaction
 
-        # start the timeout thread
-        self.__class__.TIMEOUT_THREADS[self.identifier] = threading.Timer(
-            TRANSACTION_TIMEOUT, self.__del__
-        )
-        self.__class__.TIMEOUT_THREADS[self.identifier].start()
-
     @property
     def json(self):
         return {
@@ -122,6 +116,109 @@ class BillSplitTransaction:
             "confirmed_states": self.confirmed_states,
         }
 
+    def to_record(self) -> Dict[str, Any]:
+        """Serialize the transaction for the state store."""
+        return {
+            "id": self.identifier,
+            "issuer": [
+                self.issuer.tg_username,
+                compact_user(self.issuer.mm_user),
+            ],
+            "participants": {
+                name: compact_user(participant)
+                for name, participant in self.participants.items()
+            },
+            "confirmed": self.confirmed_states,
+            "amount": self.amount,
+            "category": self.category,
+            "currency": self.currency,
+            "timestamp": self.timestamp,
+            "description": self.description,
+            "anchor": compact_message(
+                self.anchor_update.message if self.anchor_update else None
+            ),
+            "announcement": compact_message(self.anchor_message),
+            "amount_message_id": self.amount_message_id,
+            "deadline": self.deadline,
+        }
+
+    @classmethod
+    def from_record(
+        cls, data: Dict[str, Any], bot: Optional[Bot] = None
+    ) -> "BillSplitTransaction":
+        """Restore a transaction from the state store, bound to bot."""
+        anchor = restore_message(data["anchor"], bot)
+        transaction = cls(
+            participants=data["participants"],
+            issuer=ComplexUser(*data["issuer"]),
+            amount=data["amount"],
+            category=data["category"],
+            currency=data["currency"],
+            timestamp=data["timestamp"],
+            description=data["description"],
+            anchor_update=Update(0, message=anchor) if anchor else None,
+        )
+        transaction.identifier = data["id"]
+        transaction.confirmed_states = data["confirmed"]
+        transaction.anchor_message = restore_message(data["announcement"], bot)
+        transaction.amount_message_id = data["amount_message_id"]
+        transaction.deadline = data["deadline"]
+        return transaction
+
+
+# Ongoing transactions by group id, kept a minute past their timeout so
+# that the expiry still finds them
+ONGOING_BILL_SPLIT_TRANSACTIONS: StateMap[BillSplitTransaction] = StateMap(
+    "bill_splits", BillSplitTransaction, TRANSACTION_TIMEOUT + 60
+)
+
+
+async def end_bill_split(
+    group_id: int, transaction: BillSplitTransaction
+) -> None:
+    """Remove the bill split of a group and cancel its timeout."""
+    await ONGOING_BILL_SPLIT_TRANSACTIONS.remove(group_id)
+    transaction_timeouts.cancel(transaction.identifier)
+
+
+async def expire_bill_split(group_id: int, identifier: str, bot: Bot) -> None:
+    """Cancel a bill split that was not completed in time."""
+    transaction = await ONGOING_BILL_SPLIT_TRANSACTIONS.get(group_id, bot)
+    # The group may have finished it and started another one meanwhile
+    if transaction is None or transaction.identifier != identifier:
+        return
+    # Of several bot processes expiring it, only one announces it
+    if not await ONGOING_BILL_SPLIT_TRANSACTIONS.remove(group_id, transaction):
+        return
+    text = (
+        f"Bill split {transaction.identifier} timed out after "
+        f"{TRANSACTION_TIMEOUT} seconds and has been canceled."
+    )
+    if transaction.anchor_message:
+        await transaction.anchor_message.edit_text(text)
+    else:
+        await transaction.anchor_update.message.reply_text(text)
+
+
+def schedule_bill_split_expiry(
+    group_id: int, transaction: BillSplitTransaction, bot: Bot
+) -> None:
+    """Expire a bill split at its deadline."""
+    identifier = transaction.identifier
+    transaction_timeouts.schedule(
+        identifier,
+        max(0.0, transaction.deadline - time.time()),
+        lambda: expire_bill_split(group_id, identifier, bot),
+    )
+
+
+async def restore_bill_split_timeouts(bot: Bot) -> None:
+    """Schedule the expiry of bill splits stored before a restart."""
+    for group_id, transaction in await ONGOING_BILL_SPLIT_TRANSACTIONS.items(
+        bot
+    ):
+        schedule_bill_split_expiry(int(group_id), transaction, bot)
+
 
 @authenticate
 async def bill_split_entry(
@@ -148,11 +245,10 @@ async def bill_split_entry(
         5. Wait for the user response before proceeding.
     """
     group_id = update.message.chat_id
+    already_in_progress = "A bill split is already in progress in this group. Please complete or cancel it before starting a new one."
 
-    if group_id in ONGOING_BILL_SPLIT_TRANSACTIONS:
-        await update.message.reply_text(
-            "A bill split is already in progress in this group. Please complete or cancel it before starting a new one."
-        )
+    if await ONGOING_BILL_SPLIT_TRANSACTIONS.contains(group_id):
+        await update.message.reply_text(already_in_progress)
         return
 
     mentioned_users = await extract_mentioned_usernames(
@@ -182,8 +278,12 @@ async def bill_split_entry(
         issuer=issuer,
         anchor_update=update,
     )
-    ONGOING_BILL_SPLIT_TRANSACTIONS[group_id] = transaction
-    await update.message.reply_text(
+    # Another bot process may have started one for the group meanwhile
+    if not await ONGOING_BILL_SPLIT_TRANSACTIONS.add(group_id, transaction):
+        await update.message.reply_text(already_in_progress)
+        return
+    schedule_bill_split_expiry(group_id, transaction, context.bot)
+    anchor_message = await update.message.reply_text(
         f"Transaction `{transaction.identifier}` has been created",
         parse_mode="MarkdownV2",
     )
@@ -196,13 +296,21 @@ async def bill_split_entry(
         "Please tell me the amount to be split by replying to this message."
     )
 
-    context.chat_data["amount_request_message_id"] = amount_message.message_id
-    ReplyWaiters[
-        (group_id, amount_message.message_id)
-    ] = bill_split_amount_handler
+    await ONGOING_BILL_SPLIT_TRANSACTIONS.assign(
+        group_id,
+        anchor_message=anchor_message,
+        amount_message_id=amount_message.message_id,
+    )
+    await ReplyWaiters.wait(
+        group_id,
+        amount_message.message_id,
+        bill_split_amount_handler,
+        TRANSACTION_TIMEOUT,
+    )
     return  # Wait for user response before proceeding
 
 
+@ReplyWaiters.register
 async def bill_split_amount_handler(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
@@ -227,8 +335,9 @@ async def bill_split_amount_handler(
         5. Wait for the user response before
     """
     group_id = update.message.chat_id
+    transaction = await ONGOING_BILL_SPLIT_TRANSACTIONS.get(group_id)
 
-    if group_id not in ONGOING_BILL_SPLIT_TRANSACTIONS:
+    if transaction is None:
         await update.message.reply_text(
             "No active bill split transaction in this group."
         )
@@ -237,9 +346,7 @@ async def bill_split_amount_handler(
     # check if the replier is the same user who initiated the bill split
     if (
         update.message.from_user.id
-        != ONGOING_BILL_SPLIT_TRANSACTIONS[group_id].issuer.mm_user[
-            "telegram_id"
-        ]
+        != transaction.issuer.mm_user["telegram_id"]
     ):
         await update.message.reply_text(
             "You are not the issuer of this bill split."
@@ -251,7 +358,7 @@ async def bill_split_amount_handler(
     if (
         update.message.reply_to_message
         and update.message.reply_to_message.message_id
-        == context.chat_data.get("amount_request_message_id")
+        == transaction.amount_message_id
     ):
         amount_text = update.message.text
         try:
@@ -262,7 +369,7 @@ async def bill_split_amount_handler(
             )
             raise e  # raise to external handler
 
-        ONGOING_BILL_SPLIT_TRANSACTIONS[group_id].amount = amount
+        await ONGOING_BILL_SPLIT_TRANSACTIONS.assign(group_id, amount=amount)
 
         await show_select_currency(
             update, context
@@ -291,16 +398,15 @@ async def show_select_currency(
 
     # check if the user is the issuer of the bill split
     group_id = update.message.chat_id
-    if group_id not in ONGOING_BILL_SPLIT_TRANSACTIONS:
+    transaction = await ONGOING_BILL_SPLIT_TRANSACTIONS.get(group_id)
+    if transaction is None:
         await update.message.reply_text(
             "No active bill split transaction in this group."
         )
         return
     if (
         update.message.from_user.id
-        != ONGOING_BILL_SPLIT_TRANSACTIONS[group_id].issuer.mm_user[
-            "telegram_id"
-        ]
+        != transaction.issuer.mm_user["telegram_id"]
     ):
         await update.message.reply_text(
             "You are not the issuer of this bill split."
@@ -308,10 +414,9 @@ async def show_select_currency(
         return
 
     headers = {"token": token}
-    response = requests.get(
+    response = await get_client().get(
         f"{TELEGRAM_BOT_API_BASE_URL}/users/",
         headers=headers,
-        timeout=API_TIMEOUT,
     )
     if response.status_code == 200:
         currencies = response.json().get("currencies", [])
@@ -358,23 +463,23 @@ async def bill_split_currency_selection_handler(
     """
     query = update.callback_query
     group_id = query.message.chat_id
+    transaction = await ONGOING_BILL_SPLIT_TRANSACTIONS.get(
+        group_id, context.bot
+    )
 
-    if group_id not in ONGOING_BILL_SPLIT_TRANSACTIONS:
+    if transaction is None:
         await query.answer("No active bill split transaction in this group.")
         return
 
     # check if the user is the issuer of the bill split
-    if (
-        query.from_user.id
-        != ONGOING_BILL_SPLIT_TRANSACTIONS[group_id].issuer.mm_user[
-            "telegram_id"
-        ]
-    ):
+    if query.from_user.id != transaction.issuer.mm_user["telegram_id"]:
         await query.answer("You are not the issuer of this bill split.")
         return
 
     selected_currency = query.data.removeprefix("currency_bill_split_")
-    ONGOING_BILL_SPLIT_TRANSACTIONS[group_id].currency = selected_currency
+    await ONGOING_BILL_SPLIT_TRANSACTIONS.assign(
+        group_id, currency=selected_currency
+    )
 
     await show_select_category(update, context)
 
@@ -400,26 +505,23 @@ async def show_select_category(
     """
     query = update.callback_query
     group_id = query.message.chat_id
+    transaction = await ONGOING_BILL_SPLIT_TRANSACTIONS.get(
+        group_id, context.bot
+    )
 
-    if group_id not in ONGOING_BILL_SPLIT_TRANSACTIONS:
+    if transaction is None:
         await query.answer("No active bill split transaction in this group.")
         return
 
     # check if the user is the issuer of the bill split
-    if (
-        query.from_user.id
-        != ONGOING_BILL_SPLIT_TRANSACTIONS[group_id].issuer.mm_user[
-            "telegram_id"
-        ]
-    ):
+    if query.from_user.id != transaction.issuer.mm_user["telegram_id"]:
         await query.answer("You are not the issuer of this bill split.")
         return
 
     headers = {"token": token}
-    response = requests.get(
+    response = await get_client().get(
         f"{TELEGRAM_BOT_API_BASE_URL}/categories/",
         headers=headers,
-        timeout=API_TIMEOUT,
     )
     if response.status_code == 200:
         categories = response.json().get("categories", [])
@@ -441,9 +543,7 @@ async def show_select_category(
         for category in categories
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
-    await ONGOING_BILL_SPLIT_TRANSACTIONS[
-        group_id
-    ].anchor_update.message.reply_text(
+    await transaction.anchor_update.message.reply_text(
         "Please select the category for the bill split from the list below:",
         reply_markup=reply_markup,
     )
@@ -470,23 +570,23 @@ async def bill_split_category_selection_handler(
     """
     query = update.callback_query
     group_id = query.message.chat_id
+    transaction = await ONGOING_BILL_SPLIT_TRANSACTIONS.get(
+        group_id, context.bot
+    )
 
-    if group_id not in ONGOING_BILL_SPLIT_TRANSACTIONS:
+    if transaction is None:
         await query.answer("No active bill split transaction in this group.")
         return
 
     # check if the user is the issuer of the bill split
-    if (
-        query.from_user.id
-        != ONGOING_BILL_SPLIT_TRANSACTIONS[group_id].issuer.mm_user[
-            "telegram_id"
-        ]
-    ):
+    if query.from_user.id != transaction.issuer.mm_user["telegram_id"]:
         await query.answer("You are not the issuer of this bill split.")
         return
 
     selected_category = query.data.removeprefix("category_bill_split_")
-    ONGOING_BILL_SPLIT_TRANSACTIONS[group_id].category = selected_category
+    await ONGOING_BILL_SPLIT_TRANSACTIONS.assign(
+        group_id, category=selected_category
+    )
 
     await show_confirm_bill_split(update, context)
 
@@ -509,20 +609,24 @@ async def show_confirm_bill_split(
     """
 
     chat_id = update.callback_query.message.chat_id
+    transaction = await ONGOING_BILL_SPLIT_TRANSACTIONS.get(chat_id)
+    if transaction is None:
+        await update.callback_query.message.reply_text(
+            "No active bill split transaction in this group."
+        )
+        return
 
     # Confirm the amount and proceed with the bill split
     # Instead of replying to the message, send a new message
 
     await update.callback_query.message.reply_text(
-        f"The amount to be split is: {ONGOING_BILL_SPLIT_TRANSACTIONS[chat_id].amount} "
-        + f"{ONGOING_BILL_SPLIT_TRANSACTIONS[chat_id].currency}. "
-        + f"Each participant will pay {ONGOING_BILL_SPLIT_TRANSACTIONS[chat_id].amount / len(ONGOING_BILL_SPLIT_TRANSACTIONS[chat_id].participants)} "
-        # + f"Category: {ONGOING_BILL_SPLIT_TRANSACTIONS[chat_id].category}."
+        f"The amount to be split is: {transaction.amount} "
+        + f"{transaction.currency}. "
+        + f"Each participant will pay {transaction.amount / len(transaction.participants)} "
+        # + f"Category: {transaction.category}."
         + "Please confirm the bill split by clicking the button below."
     )
-    mentioned_users = list(
-        ONGOING_BILL_SPLIT_TRANSACTIONS[chat_id].confirmed_states.keys()
-    )
+    mentioned_users = list(transaction.confirmed_states.keys())
     if not mentioned_users:
         await update.callback_query.message.reply_text(
             "No users mentioned for the bill split."
@@ -568,12 +672,10 @@ async def confirm_bill_split_callback_handler(
     )
     group_id = query.message.chat_id
 
-    if group_id not in ONGOING_BILL_SPLIT_TRANSACTIONS:
+    if not await ONGOING_BILL_SPLIT_TRANSACTIONS.contains(group_id):
         await query.answer("No active bill split transaction in this group.")
         return
 
-    transaction = ONGOING_BILL_SPLIT_TRANSACTIONS[group_id]
-
     # logger.debug(
     #     f"User: {user.username} tried to confirm bill split for {mentioned_username}, "+
     #     f"the states are {transaction.confirmed_states}"
@@ -583,20 +685,29 @@ async def confirm_bill_split_callback_handler(
         await query.answer("You can only confirm your own participation.")
         return
 
-    if mentioned_username not in transaction.confirmed_states:
-        await query.answer("You are not part of this bill split.")
-        return
-
     mmuser = await get_user(tg_user_id=user.id)
     if not mmuser:
         await query.answer(
             "You need to be authenticated to confirm. Please send `/login` or `/signup` in private chat with the bot."
         )
         return
-    else:
-        transaction.participants[mentioned_username] = mmuser
 
-    transaction.confirmed_states[mentioned_username] = True
+    def confirm(transaction: BillSplitTransaction) -> None:
+        if mentioned_username in transaction.confirmed_states:
+            transaction.participants[mentioned_username] = mmuser
+            transaction.confirmed_states[mentioned_username] = True
+
+    # Participants may confirm at the same time, the update retries
+    transaction = await ONGOING_BILL_SPLIT_TRANSACTIONS.update(
+        group_id, confirm, context.bot
+    )
+    if transaction is None:
+        await query.answer("No active bill split transaction in this group.")
+        return
+
+    if mentioned_username not in transaction.confirmed_states:
+        await query.answer("You are not part of this bill split.")
+        return
 
     await query.answer(f"Confirmed: {mentioned_username}")
 
@@ -655,23 +766,23 @@ async def bill_split_proceed_handler(
         2. Process the bill split transaction
     """
     group_id = group_id or update.message.chat_id
+    transaction = await ONGOING_BILL_SPLIT_TRANSACTIONS.get(
+        group_id, context.bot
+    )
 
-    if group_id not in ONGOING_BILL_SPLIT_TRANSACTIONS:
+    if transaction is None:
         await update.message.reply_text(
             "No active bill split transaction in this group."
         )
         return
 
-    transaction = ONGOING_BILL_SPLIT_TRANSACTIONS[group_id]
     update = update if check_status else transaction.anchor_update
 
     if check_status:
         # check if the user is the issuer of the bill split
         if (
             update.message.from_user.id
-            != ONGOING_BILL_SPLIT_TRANSACTIONS[group_id].issuer.mm_user[
-                "telegram_id"
-            ]
+            != transaction.issuer.mm_user["telegram_id"]
         ):
             await update.message.reply_text(
                 "You are not the issuer of this bill split."
@@ -686,8 +797,8 @@ async def bill_split_proceed_handler(
 
     try:
         await process_bill_split(group_id, transaction)
-        assert (
-            group_id not in ONGOING_BILL_SPLIT_TRANSACTIONS
+        assert not await ONGOING_BILL_SPLIT_TRANSACTIONS.contains(
+            group_id
         ), "Transaction not deleted after processing"
         await update.message.reply_text(
             f"Bill split transaction has been successfully processed.\n"
@@ -730,14 +841,14 @@ async def bill_split_status_handler(
     """
 
     group_id = update.message.chat_id
+    transaction = await ONGOING_BILL_SPLIT_TRANSACTIONS.get(group_id)
 
-    if group_id not in ONGOING_BILL_SPLIT_TRANSACTIONS:
+    if transaction is None:
         await update.message.reply_text(
             "No active bill split transaction in this group."
         )
         return
 
-    transaction = ONGOING_BILL_SPLIT_TRANSACTIONS[group_id]
     reply_text = ""
     reply_text += re.sub(
         r"\-", r"\\-", f"Transaction ID: {transaction.identifier}\n"
@@ -751,14 +862,8 @@ async def bill_split_status_handler(
         reply_text += wrap_text_for_markdown_v2(
             f"👤 @{user}: {'Confirmed ✅' if confirmed else 'Not Confirmed ❌'}\n"
         )
-    # when will the transaction timeout, timeout time = transaction.timestamp + TRANSACTION_TIMEOUT
-    timeout_time = datetime.strptime(
-        transaction.timestamp, "%Y-%m-%dT%H:%M:%S.%f"
-    ) + timedelta(seconds=TRANSACTION_TIMEOUT)
-    seconds_to_timeout = (
-        timeout_time - datetime.now().replace(tzinfo=None)
-    ).total_seconds()
-    seconds_to_timeout = int(seconds_to_timeout)
+    # when will the transaction timeout
+    seconds_to_timeout = int(max(0, transaction.deadline - time.time()))
     reply_text += f"\nThis transaction will timeout within {seconds_to_timeout} seconds\n"
     reply_text += wrap_text_for_markdown_v2(
         "If you want to proceed with the bill split, please mention me with command /bill_split_proceed\n"
@@ -785,27 +890,26 @@ async def cancel_bill_split_handler(
     """
 
     group_id = update.message.chat_id
+    transaction = await ONGOING_BILL_SPLIT_TRANSACTIONS.get(group_id)
 
-    if group_id not in ONGOING_BILL_SPLIT_TRANSACTIONS:
+    if transaction is None:
         await update.message.reply_text(
             "No active bill split transaction in this group."
         )
         return
 
-    if group_id in ONGOING_BILL_SPLIT_TRANSACTIONS:
+    if transaction is not None:
         # check if the issuer of cancel command is the same user who initiated the bill split
         if (
             update.message.from_user.id
-            != ONGOING_BILL_SPLIT_TRANSACTIONS[group_id].issuer.mm_user[
-                "telegram_id"
-            ]
+            != transaction.issuer.mm_user["telegram_id"]
         ):
             await update.message.reply_text(
                 "You are not the issuer of this bill split."
             )
             return
 
-        del ONGOING_BILL_SPLIT_TRANSACTIONS[group_id]
+        await end_bill_split(group_id, transaction)
         await update.message.reply_text(
             "Bill split process has been canceled."
         )
@@ -815,6 +919,141 @@ async def cancel_bill_split_handler(
         )
 
 
+async def find_split_account(
+    tg_username: str, participant: Dict, transaction: BillSplitTransaction
+) -> Dict:
+    """Pick the first account of a participant that can pay the split.
+
+    Raises:
+        ValueError: If no account has the currency and enough balance.
+    """
+    response = await get_client().get(
+        f"{TELEGRAM_BOT_API_BASE_URL}/accounts/",
+        headers={"token": participant["token"]},
+    )
+    if response.status_code != 200:
+        raise ValueError(
+            "Failed to fetch accounts for some participants."  # for privacy reasons, do not show the participant
+        )
+    accounts_list = response.json().get("accounts", [])
+    if not accounts_list:
+        raise ValueError(
+            "Some participants have no accounts."  # for privacy reasons, do not show the participant
+        )
+    # Check if any account has the target currency
+    accounts = [
+        account
+        for account in accounts_list
+        if account["currency"] == transaction.currency
+    ]
+    if not accounts:
+        raise ValueError(
+            f"Some participants have no account with currency {transaction.currency}."
+        )
+    # Check if any of them has enough balance
+    for account in accounts:
+        if account["balance"] >= transaction.amount:
+            logger.debug(
+                f"Using account {account['name']} for participant tg user @{tg_username}."
+            )
+            return account
+    logger.error(
+        f"Participant tg user @{tg_username} does not have enough {transaction.currency} balance in their accounts."
+    )
+    raise ValueError(
+        f"Some participants do not have enough {transaction.currency} balance in their accounts."  # for privacy reasons, do not show the participant
+    )
+
+
+async def ensure_split_category(
+    tg_username: str, participant: Dict, transaction: BillSplitTransaction
+) -> bool:
+    """Create the split category for a participant if it is missing.
+
+    Returns:
+        bool: Whether the category had to be created.
+
+    Raises:
+        ValueError: If the categories cannot be fetched or created.
+    """
+    headers = {"token": participant["token"]}
+    response = await get_client().get(
+        f"{TELEGRAM_BOT_API_BASE_URL}/categories/",
+        headers=headers,
+    )
+    if response.status_code != 200:
+        raise ValueError("Failed to fetch categories for some participants.")
+    if transaction.category in (response.json().get("categories") or {}):
+        return False
+
+    logger.debug(
+        f"Creating category {transaction.category} for tg user {tg_username}."
+    )
+    response = await get_client().post(
+        f"{TELEGRAM_BOT_API_BASE_URL}/categories/",
+        headers=headers,
+        json={"name": transaction.category, "monthly_budget": 0},
+    )
+    if response.status_code != 200:
+        logger.error(
+            f"Failed to create category {transaction.category} for participant {tg_username}."
+        )
+        raise ValueError(
+            "Failed to create category for some participants."  # for privacy reasons, do not show the participant
+        )
+    return True
+
+
+async def apply_bill_split(
+    transaction: BillSplitTransaction, accounts: List[Dict]
+) -> None:
+    """Add the shares of all participants as expenses in one API call.
+
+    The API applies all of them or none, and the transaction identifier
+    makes a repeated call return the first result.
+
+    Args:
+        transaction (BillSplitTransaction): The bill split transaction.
+        accounts (List[Dict]): Account paying the share of each participant,
+            in the order of the participants.
+
+    Raises:
+        ValueError: If the API rejects the bill split.
+    """
+    share = transaction.amount / len(transaction.participants)
+    response = await get_client().post(
+        f"{TELEGRAM_BOT_API_BASE_URL}/ledger/multi",
+        headers={
+            "token": transaction.issuer.mm_user["token"],
+            "Idempotency-Key": transaction.identifier,
+        },
+        json={
+            "debits": [
+                {
+                    "amount": share,
+                    "currency": transaction.currency,
+                    "account_name": account["name"],
+                    "token": participant["token"],
+                    "category": transaction.category,
+                    "description": transaction.description,
+                }
+                for participant, account in zip(
+                    transaction.participants.values(), accounts
+                )
+            ],
+            "date": transaction.timestamp,
+        },
+    )
+    if response.status_code != 200:
+        error_detail = response.json().get("detail", "Unknown error")
+        logger.error(
+            f"Failed to apply bill split {transaction.identifier}: {error_detail}"
+        )
+        raise ValueError(
+            f"Failed to create transaction for some participants: {error_detail}"  # for privacy reasons, do not show the participant
+        )
+
+
 async def process_bill_split(
     group_id: int, transaction: BillSplitTransaction
 ) -> None:
@@ -828,6 +1067,9 @@ async def process_bill_split(
     4. If any of previous steps failed, return error message
     5. If all steps passed, proceed with the transaction
 
+    The participants are checked concurrently, then the API adds the
+    expenses of all of them in one transaction.
+
     Args:
         group_id (int): The group ID where the transaction is taking place.
         transaction (BillSplitTransaction): The bill split transaction to process.
@@ -849,138 +1091,39 @@ async def process_bill_split(
             raise ValueError(
                 f"@{', @'.join(participants_not_confirmed)} have not confirmed this transaction."
             )
+        # Stored transactions keep no tokens, read them from the logins
+        issuer, *sessions = await find_sessions(
+            [transaction.issuer.mm_user, *transaction.participants.values()]
+        )
+        if issuer is None or None in sessions:
+            raise ValueError("Some participants are no longer logged in.")
+        transaction.issuer = transaction.issuer._replace(mm_user=issuer)
+        transaction.participants = dict(
+            zip(transaction.participants, sessions)
+        )
+        participants = list(transaction.participants.items())
 
-        # Check if all participants have accounts with the target currency
-        tgusername2account: Dict[
-            str, List[Dict]
-        ] = {}  # mm username: List[Dict], any account with target currency
-        for tg_username, participant in transaction.participants.items():
-            headers = {"token": participant["token"]}
-            response = requests.get(
-                f"{TELEGRAM_BOT_API_BASE_URL}/accounts/",
-                headers=headers,
-                timeout=API_TIMEOUT,
-            )
-            if response.status_code == 200:
-                accounts_list = response.json().get("accounts", [])
-                if not accounts_list:
-                    raise ValueError(
-                        # f"Participant {participant} has no accounts."
-                        "Some participants have no accounts."  # for privacy reasons, do not show the participant
-                    )
-                # Check if any account has the target currency
-                if not any(
-                    account["currency"] == transaction.currency
-                    for account in accounts_list
-                ):
-                    raise ValueError(
-                        f"Participant {participant} has no account with currency {transaction.currency}."
-                    )
-            else:
-                raise ValueError(
-                    # f"Failed to fetch accounts for participant {participant}."
-                    "Failed to fetch accounts for some participants."  # for privacy reasons, do not show the participant
-                )
-            # Store the accounts with the target currency
-            tgusername2account[tg_username] = [
-                account
-                for account in accounts_list
-                if account["currency"] == transaction.currency
-            ]
-
-        # Check if all participants have enough balance in corresponding accounts
-        for tg_username, accounts in tgusername2account.items():
-            if all(
-                account["balance"] < transaction.amount for account in accounts
-            ):
-                logger.error(
-                    f"Participant tg user @{tg_username} does not have enough {transaction.currency} balance in their accounts."
-                )
-                raise ValueError(
-                    # f"Participant {tg_username} does not have enough balance in their accounts."
-                    f"Some participants do not have enough {transaction.currency} balance in their accounts."  # for privacy reasons, do not show the participant
-                )
-            else:
-                # only store the first account with enough balance
-                tgusername2account[tg_username] = [
-                    account
-                    for account in accounts
-                    if account["balance"] >= transaction.amount
-                ][0]
-                logger.debug(
-                    f"Using account {tgusername2account[tg_username]['name']} for participant tg user @{tg_username}."
-                )
+        # Check if all participants have an account that can pay
+        accounts = await gather_bounded(
+            find_split_account(tg_username, participant, transaction)
+            for tg_username, participant in participants
+        )
 
         # Check if all participants have the target category
-        category_creation_flag = False
-        for tg_username, participant in transaction.participants.items():
-            headers = {"token": participant["token"]}
-            response = requests.get(
-                f"{TELEGRAM_BOT_API_BASE_URL}/categories/",
-                headers=headers,
-                timeout=API_TIMEOUT,
-            )
-            if response.status_code == 200:
-                category_list = response.json().get("categories", {})
-                if (
-                    not category_list
-                    or transaction.category not in category_list
-                ):  # Create the category if it doesn't exist
-                    logger.debug(
-                        f"Creating category {transaction.category} for tg user {tg_username}."
-                    )
-                    category_creation_flag = True
-                    response = requests.post(
-                        f"{TELEGRAM_BOT_API_BASE_URL}/categories/",
-                        headers=headers,
-                        json={
-                            "name": transaction.category,
-                            "monthly_budget": 0,
-                        },
-                        timeout=API_TIMEOUT,
-                    )
-                    if response.status_code != 200:
-                        logger.error(
-                            f"Failed to create category {transaction.category} for participant {tg_username}."
-                        )
-                        raise ValueError(
-                            # f"Failed to create category {transaction.category} for participant {tg_username}."
-                            "Failed to create category for some participants."  # for privacy reasons, do not show the participant
-                        )
-        if category_creation_flag:
-            transaction.anchor_update.message.reply_text(
+        created = await gather_bounded(
+            ensure_split_category(tg_username, participant, transaction)
+            for tg_username, participant in participants
+        )
+        if any(created):
+            await transaction.anchor_update.message.reply_text(
                 f"Some participants did not have the category {transaction.category}, so it has been created for them. You can manage your categories in the private chat with me."
             )
 
         # Proceed with the transaction
-        for tg_username, participant in transaction.participants.items():
-            headers = {"token": participant["token"]}
-            response = requests.post(
-                f"{TELEGRAM_BOT_API_BASE_URL}/expenses/",
-                headers=headers,
-                json={
-                    "amount": transaction.amount
-                    / len(transaction.participants),
-                    "description": transaction.description,
-                    "category": transaction.category,
-                    "currency": transaction.currency,
-                    "date": transaction.timestamp,
-                    "account": tgusername2account[tg_username]["name"],
-                },
-                timeout=API_TIMEOUT,
-            )
-            if response.status_code != 200:
-                error_detail = response.json().get("detail", "Unknown error")
-                logger.error(
-                    f"Failed to create transaction for participant {tg_username}: {error_detail}"
-                )
-                raise ValueError(
-                    # f"Failed to create transaction for participant {tg_username}."
-                    f"Failed to create transaction for some participants: {error_detail}"  # for privacy reasons, do not show the participant
-                )  # todo should have rollback mechanism
+        await apply_bill_split(transaction, accounts)
 
         # finally, delete the transaction
-        del ONGOING_BILL_SPLIT_TRANSACTIONS[group_id]
+        await end_bill_split(group_id, transaction)
 
     except Exception as e:
         raise e
@@ -1,33 +1,40 @@
 import re
-import threading
+import time
 from collections import namedtuple
 from datetime import datetime, timedelta
-from typing import Dict, List, NamedTuple, Union
+from typing import Any, Dict, List, NamedTuple, Optional, Union
 from uuid import uuid4
 
-import requests
 from loguru import logger
 from matplotlib.pylab import f
 from pytz import timezone as pytz_timezone
 from telegram import (
+    Bot,
     InlineKeyboardButton,
     InlineKeyboardMarkup,
+    Message,
     Update,
 )
 from telegram.ext import ContextTypes
 from telegram.helpers import escape_markdown
 
-from bots.telegram.auth import authenticate, get_user
+from bots.telegram.api_helper import get_client
+from bots.telegram.auth import authenticate, find_sessions, get_user
 from bots.telegram.reply_handlers import ReplyWaiters
+from bots.telegram.state import (
+    StateMap,
+    StoredState,
+    compact_message,
+    compact_user,
+    restore_message,
+)
+from bots.telegram.timeouts import transaction_timeouts
 from bots.telegram.utils import (
     extract_mentioned_usernames,
     wrap_text_for_markdown_v2,
 )
 from config.config import TELEGRAM_BOT_API_BASE_URL
 
-ONGOING_TRANSFER: Dict[int, "TransferTransaction"] = {}
-
-API_TIMEOUT = 10
 TRANSACTION_TIMEOUT = 600
 
 (
@@ -40,21 +47,13 @@ TRANSACTION_TIMEOUT = 600
 ComplexUser = namedtuple("ComplexUser", ["tg_username", "mm_user"])
 
 
-class TransferTransaction:
+class TransferTransaction(StoredState):
     """
     Class to represent a transfer.
 
     Attributes:
     """
 
-    TIMEOUT_THREADS = {str: threading.Timer}
-
-    def __del__(self):
-        """Destructor to cancel transaction"""
-        if self.identifier in self.__class__.TIMEOUT_THREADS:
-            self.__class__.TIMEOUT_THREADS[self.identifier].cancel()
-            del self.__class__.TIMEOUT_THREADS[self.identifier]
-
     def __init__(
         self,
         issuer: ComplexUser = None,
@@ -76,12 +75,9 @@ class TransferTransaction:
         elif isinstance(recipient, ComplexUser):
             self.confirmed_states = {recipient.tg_username: False}
         self.anchor_update: Update = anchor_update
-
-        # start the timeout thread
-        self.__class__.TIMEOUT_THREADS[self.identifier] = threading.Timer(
-            TRANSACTION_TIMEOUT, self.__del__
-        )
-        self.__class__.TIMEOUT_THREADS[self.identifier].start()
+        self.anchor_message: Optional[Message] = None
+        self.amount_message_id: Optional[int] = None
+        self.deadline = time.time() + TRANSACTION_TIMEOUT
 
     @property
     def json(self):
@@ -92,6 +88,99 @@ class TransferTransaction:
             "recipient": self.recipient,
         }
 
+    def to_record(self) -> Dict[str, Any]:
+        """Serialize the transfer for the state store."""
+        return {
+            "id": self.identifier,
+            "issuer": [
+                self.issuer.tg_username,
+                compact_user(self.issuer.mm_user),
+            ],
+            "recipient": [
+                self.recipient.tg_username,
+                compact_user(self.recipient.mm_user) or None,
+            ],
+            "confirmed": self.confirmed_states,
+            "amount": self.amount,
+            "currency": self.currency,
+            "anchor": compact_message(
+                self.anchor_update.message if self.anchor_update else None
+            ),
+            "announcement": compact_message(self.anchor_message),
+            "amount_message_id": self.amount_message_id,
+            "deadline": self.deadline,
+        }
+
+    @classmethod
+    def from_record(
+        cls, data: Dict[str, Any], bot: Optional[Bot] = None
+    ) -> "TransferTransaction":
+        """Restore a transfer from the state store, bound to bot."""
+        anchor = restore_message(data["anchor"], bot)
+        transfer = cls(
+            issuer=ComplexUser(*data["issuer"]),
+            recipient=ComplexUser(*data["recipient"]),
+            amount=data["amount"],
+            currency=data["currency"],
+            anchor_update=Update(0, message=anchor) if anchor else None,
+        )
+        transfer.identifier = data["id"]
+        transfer.confirmed_states = data["confirmed"]
+        transfer.anchor_message = restore_message(data["announcement"], bot)
+        transfer.amount_message_id = data["amount_message_id"]
+        transfer.deadline = data["deadline"]
+        return transfer
+
+
+# Ongoing transfers by group id, kept a minute past their timeout so that
+# the expiry still finds them
+ONGOING_TRANSFER: StateMap[TransferTransaction] = StateMap(
+    "transfers", TransferTransaction, TRANSACTION_TIMEOUT + 60
+)
+
+
+async def end_transfer(group_id: int, transfer: TransferTransaction) -> None:
+    """Remove the transfer of a group and cancel its timeout."""
+    await ONGOING_TRANSFER.remove(group_id)
+    transaction_timeouts.cancel(transfer.identifier)
+
+
+async def expire_transfer(group_id: int, identifier: str, bot: Bot) -> None:
+    """Cancel a transfer that was not completed in time."""
+    transfer = await ONGOING_TRANSFER.get(group_id, bot)
+    # The group may have finished it and started another one meanwhile
+    if transfer is None or transfer.identifier != identifier:
+        return
+    # Of several bot processes expiring it, only one announces it
+    if not await ONGOING_TRANSFER.remove(group_id, transfer):
+        return
+    text = (
+        f"Transfer {transfer.identifier} timed out after "
+        f"{TRANSACTION_TIMEOUT} seconds and has been canceled."
+    )
+    if transfer.anchor_message:
+        await transfer.anchor_message.edit_text(text)
+    else:
+        await transfer.anchor_update.message.reply_text(text)
+
+
+def schedule_transfer_expiry(
+    group_id: int, transfer: TransferTransaction, bot: Bot
+) -> None:
+    """Expire a transfer at its deadline."""
+    identifier = transfer.identifier
+    transaction_timeouts.schedule(
+        identifier,
+        max(0.0, transfer.deadline - time.time()),
+        lambda: expire_transfer(group_id, identifier, bot),
+    )
+
+
+async def restore_transfer_timeouts(bot: Bot) -> None:
+    """Schedule the expiry of transfers stored before a restart."""
+    for group_id, transfer in await ONGOING_TRANSFER.items(bot):
+        schedule_transfer_expiry(int(group_id), transfer, bot)
+
 
 @authenticate
 async def group_transfer_entry(
@@ -100,11 +189,10 @@ async def group_transfer_entry(
     """Entry point for the group transfer"""
 
     group_id = update.message.chat_id
+    already_in_progress = "A transfer is already in progress in this group. Please complete or cancel it before starting a new one."
 
-    if group_id in ONGOING_TRANSFER:
-        await update.message.reply_text(
-            "A transfer is already in progress in this group. Please complete or cancel it before starting a new one."
-        )
+    if await ONGOING_TRANSFER.contains(group_id):
+        await update.message.reply_text(already_in_progress)
         return
 
     mentioned_users = await extract_mentioned_usernames(
@@ -138,8 +226,12 @@ async def group_transfer_entry(
         anchor_update=update,
     )
 
-    ONGOING_TRANSFER[group_id] = transfer
-    await update.message.reply_text(
+    # Another bot process may have started one for the group meanwhile
+    if not await ONGOING_TRANSFER.add(group_id, transfer):
+        await update.message.reply_text(already_in_progress)
+        return
+    schedule_transfer_expiry(group_id, transfer, context.bot)
+    anchor_message = await update.message.reply_text(
         f"You will transfer to: @{', @'.join(mentioned_users)}"
     )
 
@@ -147,27 +239,33 @@ async def group_transfer_entry(
         "Please enter the amount to transfer by replying to this message."
     )
 
-    context.chat_data["amount_message_id"] = amount_message.message_id
-    ReplyWaiters[
-        (group_id, amount_message.message_id)
-    ] = transfer_amount_handler
+    await ONGOING_TRANSFER.assign(
+        group_id,
+        anchor_message=anchor_message,
+        amount_message_id=amount_message.message_id,
+    )
+    await ReplyWaiters.wait(
+        group_id,
+        amount_message.message_id,
+        transfer_amount_handler,
+        TRANSACTION_TIMEOUT,
+    )
     return
 
 
+@ReplyWaiters.register
 async def transfer_amount_handler(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
     """Handle the amount to be transferred between users"""
 
     group_id = update.message.chat_id
-    if group_id not in ONGOING_TRANSFER:
+    transfer = await ONGOING_TRANSFER.get(group_id)
+    if transfer is None:
         await update.message.reply_text("No active transfer in this group.")
         return
 
-    if (
-        update.message.from_user.id
-        != ONGOING_TRANSFER[group_id].issuer.mm_user["telegram_id"]
-    ):
+    if update.message.from_user.id != transfer.issuer.mm_user["telegram_id"]:
         await update.message.reply_text(
             "You are not the owner of this transfer."
         )
@@ -178,7 +276,7 @@ async def transfer_amount_handler(
     if (
         update.message.reply_to_message
         and update.message.reply_to_message.message_id
-        == context.chat_data.get("amount_message_id")
+        == transfer.amount_message_id
     ):
         amount_text = update.message.text
         try:
@@ -189,7 +287,7 @@ async def transfer_amount_handler(
             )
             raise e
 
-    ONGOING_TRANSFER[group_id].amount = amount
+    await ONGOING_TRANSFER.assign(group_id, amount=amount)
 
     await show_select_currency(
         update, context
@@ -218,25 +316,22 @@ async def show_select_currency(
 
     # check if the user is the issuer of the transfer
     group_id = update.message.chat_id
-    if group_id not in ONGOING_TRANSFER:
+    transfer = await ONGOING_TRANSFER.get(group_id)
+    if transfer is None:
         await update.message.reply_text(
             "No active transfer transaction in this group."
         )
         return
-    if (
-        update.message.from_user.id
-        != ONGOING_TRANSFER[group_id].issuer.mm_user["telegram_id"]
-    ):
+    if update.message.from_user.id != transfer.issuer.mm_user["telegram_id"]:
         await update.message.reply_text(
             "You are not the issuer of this transfer."
         )
         return
 
     headers = {"token": token}
-    response = requests.get(
+    response = await get_client().get(
         f"{TELEGRAM_BOT_API_BASE_URL}/users/",
         headers=headers,
-        timeout=API_TIMEOUT,
     )
     if response.status_code == 200:
         currencies = response.json().get("currencies", [])
@@ -284,20 +379,19 @@ async def transfer_currency_selection_handler(
     query = update.callback_query
     group_id = query.message.chat_id
 
-    if group_id not in ONGOING_TRANSFER:
+    transfer = await ONGOING_TRANSFER.get(group_id)
+
+    if transfer is None:
         await query.answer("No active transfer transaction in this group.")
         return
 
     # check if the user is the issuer of the transfer
-    if (
-        query.from_user.id
-        != ONGOING_TRANSFER[group_id].issuer.mm_user["telegram_id"]
-    ):
+    if query.from_user.id != transfer.issuer.mm_user["telegram_id"]:
         await query.answer("You are not the issuer of this transfer.")
         return
 
     selected_currency = query.data.removeprefix("currency_transfer_")
-    ONGOING_TRANSFER[group_id].currency = selected_currency
+    await ONGOING_TRANSFER.assign(group_id, currency=selected_currency)
 
     await show_confirm_transaction(update, context)
 
@@ -308,12 +402,18 @@ async def show_confirm_transaction(
     """Displays a confirmation message for users in transfer to accept"""
 
     chat_id = update.callback_query.message.chat_id
+    transfer = await ONGOING_TRANSFER.get(chat_id)
+    if transfer is None:
+        await update.callback_query.message.reply_text(
+            "No active transfer in this group."
+        )
+        return
 
     await update.callback_query.message.reply_text(
-        f"The amount to be transfer: {ONGOING_TRANSFER[chat_id].amount} {ONGOING_TRANSFER[chat_id].currency}. "
+        f"The amount to be transfer: {transfer.amount} {transfer.currency}. "
         + "Please confirm the transfer."
     )
-    mentioned_users = list(ONGOING_TRANSFER[chat_id].confirmed_states.keys())
+    mentioned_users = list(transfer.confirmed_states.keys())
     if not mentioned_users:
         await update.callback_query.message.reply_text(
             "No users mentioned for the transfer."
@@ -343,12 +443,12 @@ async def confirm_transfer_handler(
     user = query.from_user
     mentioned_username = query.data.split("_", 1)[1].removeprefix("transfer_")
 
-    if group_id not in ONGOING_TRANSFER:
+    transfer = await ONGOING_TRANSFER.get(group_id)
+
+    if transfer is None:
         await query.answer("No active transfer in this group.")
         return
 
-    transfer = ONGOING_TRANSFER[group_id]
-
     if user.username != mentioned_username:
         await query.answer("You can only confirm yourself.")
 
@@ -366,10 +466,16 @@ async def confirm_transfer_handler(
         await query.answer("Only the recipient can confirm the transfer.")
         return
 
-    transfer.confirmed_states[mentioned_username] = True
-    transfer.recipient = ComplexUser(
-        tg_username=mentioned_username, mm_user=mmuser
-    )
+    def confirm(transfer: TransferTransaction) -> None:
+        transfer.confirmed_states[mentioned_username] = True
+        transfer.recipient = ComplexUser(
+            tg_username=mentioned_username, mm_user=mmuser
+        )
+
+    transfer = await ONGOING_TRANSFER.update(group_id, confirm, context.bot)
+    if transfer is None:
+        await query.answer("No active transfer in this group.")
+        return
 
     await query.answer(f"Confirmed: {mentioned_username}")
 
@@ -409,18 +515,18 @@ async def transfer_handler(
     """Handles the transfer process"""
 
     group_id = group_id or update.message.chat_id
+    transaction = await ONGOING_TRANSFER.get(group_id, context.bot)
 
-    if group_id not in ONGOING_TRANSFER:
+    if transaction is None:
         await update.message.reply_text("No active transfer in this group.")
         return
 
-    transaction = ONGOING_TRANSFER[group_id]
     update = update if check_status else transaction.anchor_update
 
     if check_status:
         if (
             update.message.from_user.id
-            != ONGOING_TRANSFER[group_id].issuer.mm_user["telegram_id"]
+            != transaction.issuer.mm_user["telegram_id"]
         ):
             await update.message.reply_text(
                 "You are not the owner of this transfer."
@@ -429,8 +535,8 @@ async def transfer_handler(
 
     try:
         await process_transfer(group_id, transaction)
-        assert (
-            group_id not in ONGOING_TRANSFER
+        assert not await ONGOING_TRANSFER.contains(
+            group_id
         ), "Transfer not deleted after processing"
         await update.message.reply_text(
             f"Transfer has been successfully processed.\n"
@@ -457,20 +563,25 @@ async def process_transfer(
             transaction.confirmed_states.values()
         ), "Not all participants have confirmed"
 
-        recipient_tg_username, recipient_data = transaction.recipient
-        print(recipient_tg_username, recipient_data)
-        issuer_tg_username, issuer_data = transaction.issuer
+        # Stored transfers keep no tokens, read them from the logins
+        issuer_data, recipient_data = await find_sessions(
+            [transaction.issuer.mm_user, transaction.recipient.mm_user]
+        )
+        recipient_tg_username = transaction.recipient.tg_username
+        if issuer_data is None:
+            raise ValueError(
+                f"@{transaction.issuer.tg_username} is no longer logged in."
+            )
         if not recipient_data or "_id" not in recipient_data:
             raise ValueError(
                 f"Recipient @{recipient_tg_username} has not properly confirmed the transfer."
             )
 
-        def get_accounts_with_currency(transaction, recipient_data):
+        async def get_accounts_with_currency(transaction, recipient_data):
             headers = {"token": recipient_data["token"]}
-            response = requests.get(
+            response = await get_client().get(
                 f"{TELEGRAM_BOT_API_BASE_URL}/accounts/",
                 headers=headers,
-                timeout=API_TIMEOUT,
             )
             if response.status_code == 200:
                 accounts_list = response.json().get("accounts", [])
@@ -499,11 +610,13 @@ async def process_transfer(
             ]
 
         # Get the accounts of the recipient
-        recipient_accounts = get_accounts_with_currency(
+        recipient_accounts = await get_accounts_with_currency(
             transaction, recipient_data
         )
         # Get the accounts of the issuer
-        issuer_accounts = get_accounts_with_currency(transaction, issuer_data)
+        issuer_accounts = await get_accounts_with_currency(
+            transaction, issuer_data
+        )
 
         # Check if all participants have enough balance in corresponding accounts
         def get_accounts_with_enough_balance(accounts):
@@ -532,44 +645,43 @@ async def process_transfer(
         recipient_account = recipient_accounts[0]  # only one account
         issuer_account = get_accounts_with_enough_balance(issuer_accounts)
 
-        # Perform the transfer, reduce the balance of the issuer and increase the balance of the recipient
-        try:
-            # get old balance of the issuer
-            old_balance = issuer_account["balance"]
-            # update the balance of the issuer
-            headers = {"token": issuer_data["token"]}
-            response = requests.put(
-                f"{TELEGRAM_BOT_API_BASE_URL}/accounts/{issuer_account['_id']}",
-                json={"balance": str(old_balance - transaction.amount)},
-                headers=headers,
-                timeout=API_TIMEOUT,
+        # Perform the transfer, the API moves the amount from the issuer to
+        # the recipient atomically, once per transaction identifier
+        response = await get_client().post(
+            f"{TELEGRAM_BOT_API_BASE_URL}/ledger/multi",
+            headers={
+                "token": issuer_data["token"],
+                "Idempotency-Key": transaction.identifier,
+            },
+            json={
+                "debits": [
+                    {
+                        "amount": transaction.amount,
+                        "currency": transaction.currency,
+                        "account_name": issuer_account["name"],
+                    }
+                ],
+                "credits": [
+                    {
+                        "amount": transaction.amount,
+                        "currency": transaction.currency,
+                        "account_name": recipient_account["name"],
+                        "token": recipient_data["token"],
+                    }
+                ],
+            },
+        )
+        if response.status_code != 200:
+            logger.error(
+                f"Failed to apply transfer {transaction.identifier}: "
+                f"{response.json().get('detail', 'Unknown error')}"
             )
-            if response.status_code != 200:
-                raise ValueError(
-                    # f"Failed to update balance of issuer @{issuer_tg_username}."
-                    "Failed to update balance of some participants."  # for privacy reasons, do not show the participant
-                )
-
-            # get old balance of the recipient
-            old_balance = recipient_account["balance"]
-            # update the balance of the recipient
-            headers = {"token": recipient_data["token"]}
-            response = requests.put(
-                f"{TELEGRAM_BOT_API_BASE_URL}/accounts/{recipient_account['_id']}",
-                json={"balance": str(old_balance + transaction.amount)},
-                headers=headers,
-                timeout=API_TIMEOUT,
+            raise ValueError(
+                "Failed to update balance of some participants."  # for privacy reasons, do not show the participant
             )
-            if response.status_code != 200:
-                raise ValueError(
-                    # f"Failed to update balance of recipient @{recipient_tg_username}."
-                    "Failed to update balance of some participants."  # for privacy reasons, do not show the participant
-                )
-        except Exception as e:
-            raise e
 
         # Finally, remove the transaction.
-        del ONGOING_TRANSFER[group_id]
+        await end_transfer(group_id, transaction)
 
     except Exception as e:
         raise e
@@ -580,15 +692,14 @@ async def transfer_status_handler(
 ) -> None:
     """Status of the transfer"""
     group_id = update.message.chat_id
+    transaction = await ONGOING_TRANSFER.get(group_id)
 
-    if group_id not in ONGOING_TRANSFER:
+    if transaction is None:
         await update.message.reply_text(
             "No active transfer transaction in this group."
         )
         return
 
-    transaction = ONGOING_TRANSFER[group_id]
-
     reply_text = ""
     reply_text += f"💵 Amount: {transaction.amount or 'Unknown'} with currency {transaction.currency or 'Unknown'}\n"
     reply_text += f"Created by @{transaction.issuer.tg_username}`\n"
@@ -612,23 +723,24 @@ async def cancel_transfer_handler(
 ) -> None:
     """Cancel the transfer"""
     group_id = update.message.chat_id
+    transfer = await ONGOING_TRANSFER.get(group_id)
 
-    if group_id not in ONGOING_TRANSFER:
+    if transfer is None:
         await update.message.reply_text("No active transfer in this group.")
         return
 
-    if group_id in ONGOING_TRANSFER:
+    if transfer is not None:
         # check if the issuer of cancel command is the same user who initiated the transfer
         if (
             update.message.from_user.id
-            != ONGOING_TRANSFER[group_id].issuer.mm_user["telegram_id"]
+            != transfer.issuer.mm_user["telegram_id"]
         ):
             await update.message.reply_text(
                 "You are not the ownver of this transfer."
             )
             return
 
-        del ONGOING_TRANSFER[group_id]
+        await end_transfer(group_id, transfer)
         await update.message.reply_text("Transfer process has been canceled.")
     else:
         await update.message.reply_text("No active transfers to cancel.")
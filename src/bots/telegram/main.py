@@ -18,9 +18,16 @@ from telegram.ext import (
 )
 
 from api import app
+from api.utils.indexes import BOT_COLLECTIONS, ensure_indexes
 from bots.telegram.accounts import accounts_handlers
 from bots.telegram.analytics import analytics_handlers
-from bots.telegram.auth import auth_handlers, get_user  # Update import
+from bots.telegram.api_helper import close_client, start_client
+from bots.telegram.auth import (  # Update import
+    auth_handlers,
+    get_user,
+    prefetch_sessions,
+    telegram_collection,
+)
 from bots.telegram.categories import categories_handlers
 from bots.telegram.expenses import expenses_handlers
 from bots.telegram.group_bill_split import (
@@ -31,19 +38,23 @@ from bots.telegram.group_bill_split import (
     bill_split_status_handler,
     cancel_bill_split_handler,
     confirm_bill_split_callback_handler,
+    restore_bill_split_timeouts,
 )
 from bots.telegram.group_transfer import (
     cancel_transfer_handler,
     confirm_transfer_handler,
     group_transfer_entry,
+    restore_transfer_timeouts,
     transfer_currency_selection_handler,
 )
 from bots.telegram.receipts import receipts_handlers  # New import
 from bots.telegram.reply_handlers import reply_handler
+from bots.telegram.timeouts import transaction_timeouts
 from bots.telegram.transfers import transfer_conv_handler
 from bots.telegram.utils import (
     get_group_chat_menu_commands,
     get_private_chat_menu_commands,
+    mentioned_user_ids,
     unknown,
 )
 from config import config
@@ -102,6 +113,9 @@ async def group_chat_handler(
     if not context.bot.username in text:
         return
 
+    # Load the logins of everyone involved with one query
+    await prefetch_sessions(mentioned_user_ids(update))
+
     # if is menu command
     if "/menu" in text:
         await update.message.reply_text(get_group_chat_menu_commands())
@@ -141,10 +155,31 @@ async def unknown(update: Update, context: CallbackContext):
     await update.message.reply_text("I don't understand that command.")
 
 
+async def post_init(application: Application) -> None:
+    """Prepare shared resources once the bot has been initialized."""
+    await ensure_indexes(telegram_collection.database, BOT_COLLECTIONS)
+    await start_client()
+    # Bill splits and transfers stored before a restart still time out
+    await restore_bill_split_timeouts(application.bot)
+    await restore_transfer_timeouts(application.bot)
+
+
+async def post_shutdown(application: Application) -> None:
+    """Release shared resources once the bot has stopped."""
+    await transaction_timeouts.shutdown()
+    await close_client()
+
+
 def main() -> None:
     """Initialize and start the bot."""
     token = config.TELEGRAM_BOT_TOKEN
-    application = Application.builder().token(token).build()
+    application = (
+        Application.builder()
+        .token(token)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
     # Register group chat handlers
     application.add_handler(
@@ -1,5 +1,6 @@
+import time
 from functools import cache
-from typing import Callable, Tuple
+from typing import Callable, Dict, Optional
 
 from loguru import logger
 from telegram import Update
@@ -12,59 +13,80 @@ from telegram.ext import (
     filters,
 )
 
+from bots.telegram.state import get_store
+
 
 class ReplyWaiters:
     """
     A class to manage reply waiters for Telegram bot messages.
+
+    Waiters are kept in the shared state store by the name of their
+    handler, so a reply is handled even after a restart or by another bot
+    process. Handlers are registered under their name with register.
     """
 
-    def __init__(self):
-        self.waiters = {
-            Tuple[int, int]: Callable
-        }  # Dictionary to store waiters
+    NAMESPACE = "reply_waiters"
 
-    def __getitem__(self, key):
-        """
-        Get the callback function for a specific chat and message ID.
+    def __init__(self):
+        self.handlers: Dict[str, Callable] = {}  # registered handlers
 
-        :param key: A tuple containing the chat ID and message ID.
-        :return: The callback function associated with the key.
+    def register(self, handler: Callable) -> Callable:
         """
-        return self.waiters.get(key)
+        Register a handler that replies can be waited for with.
 
-    def __setitem__(self, key, value):
+        :param handler: The handler, registered under its name.
+        :return: The handler, so that this can be used as a decorator.
         """
-        Set the callback function for a specific chat and message ID.
+        self.handlers[handler.__name__] = handler
+        return handler
 
-        :param key: A tuple containing the chat ID and message ID.
-        :param value: The callback function to be associated with the key.
-        """
-        self.waiters[key] = value
+    @staticmethod
+    def _key(chat_id: int, message_id: int) -> str:
+        return f"{chat_id}:{message_id}"
 
-    def __delitem__(self, key):
+    async def wait(
+        self, chat_id: int, message_id: int, handler: Callable, ttl: float
+    ) -> None:
         """
-        Delete the callback function for a specific chat and message ID.
+        Wait for a reply to a message and handle it with a handler.
 
-        :param key: A tuple containing the chat ID and message ID.
+        :param chat_id: The chat ID of the message.
+        :param message_id: The message ID.
+        :param handler: A registered handler for the reply.
+        :param ttl: Seconds to wait for the reply.
         """
-        if key in self.waiters:
-            del self.waiters[key]
-
-    def keys(self):
+        if self.handlers.get(handler.__name__) is not handler:
+            raise ValueError(f"{handler.__name__} is not registered")
+        await get_store().put(
+            self.NAMESPACE,
+            self._key(chat_id, message_id),
+            {"handler": handler.__name__},
+            time.time() + ttl,
+        )
+
+    async def get(self, chat_id: int, message_id: int) -> Optional[Callable]:
         """
-        Get all keys in the waiters dictionary.
+        Get the handler waiting for a reply to a message.
 
-        :return: A list of keys in the waiters dictionary.
+        :param chat_id: The chat ID of the message.
+        :param message_id: The message ID.
+        :return: The handler, None if no handler is waiting.
         """
-        return self.waiters.keys()
+        record = await get_store().get(
+            self.NAMESPACE, self._key(chat_id, message_id)
+        )
+        return self.handlers.get(record.data["handler"]) if record else None
 
-    def items(self):
+    async def remove(self, chat_id: int, message_id: int) -> None:
         """
-        Get all items in the waiters dictionary.
+        Stop waiting for a reply to a message.
 
-        :return: A list of items in the waiters dictionary.
+        :param chat_id: The chat ID of the message.
+        :param message_id: The message ID.
         """
-        return self.waiters.items()
+        await get_store().delete(
+            self.NAMESPACE, self._key(chat_id, message_id)
+        )
 
 
 ReplyWaiters = ReplyWaiters()  # singleton
@@ -87,10 +109,11 @@ async def reply_handler(
         f"Chat ID: {chat_id} - Reply to Message ID: {message_id}"
     )  # todo : remove this line after testing
 
-    if (chat_id, message_id) in ReplyWaiters.keys():
+    handler = await ReplyWaiters.get(chat_id, message_id)
+    if handler is not None:
         try:
-            await ReplyWaiters[(chat_id, message_id)](update, context)
-            del ReplyWaiters[(chat_id, message_id)]
+            await handler(update, context)
+            await ReplyWaiters.remove(chat_id, message_id)
         except Exception as e:
             logger.error(f"Error in reply handler: {e}")
 
@@ -0,0 +1,504 @@
+"""
+Shared state of ongoing group conversations.
+
+Bill splits, group transfers and messages waiting for a reply are kept in
+a StateStore as compact records, so they survive a bot restart and can be
+shared by several bot processes answering one token, e.g. behind a webhook.
+TELEGRAM_STATE_STORE selects the backend: "memory" keeps the records in
+this process, "mongo" in the telegram_state collection, where a TTL index
+removes expired records.
+
+Every record has a version. Writes name the version they read and fail
+with StaleStateError when another process has written the record since.
+"""
+
+import copy
+import datetime
+import time
+from abc import ABC, abstractmethod
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generic,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+)
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from telegram import Bot, Message
+
+from config import config
+
+STORES = ("memory", "mongo")
+
+_store: Optional["StateStore"] = None
+
+
+class StaleStateError(Exception):
+    """The record was written by someone else since it was read."""
+
+
+class Record(NamedTuple):
+    """A stored record with its version and expiry time."""
+
+    data: Dict[str, Any]
+    version: int
+    expires_at: float
+
+
+class StateStore(ABC):
+    """Versioned records by namespace and key, removed once they expire."""
+
+    @abstractmethod
+    async def get(self, namespace: str, key: str) -> Optional[Record]:
+        """Get a record, None if there is none or it has expired."""
+
+    @abstractmethod
+    async def put(
+        self,
+        namespace: str,
+        key: str,
+        data: Dict[str, Any],
+        expires_at: float,
+        version: Optional[int] = None,
+    ) -> int:
+        """
+        Write a record.
+
+        Args:
+            namespace (str): Kind of the record.
+            key (str): Key of the record within the namespace.
+            data (dict): Contents of the record.
+            expires_at (float): UNIX time the record expires at.
+            version (int, optional): Version the record was read at, 0 to
+                create it, None to overwrite it unconditionally.
+
+        Returns:
+            int: The new version of the record.
+
+        Raises:
+            StaleStateError: If the record is not at version.
+        """
+
+    @abstractmethod
+    async def delete(
+        self, namespace: str, key: str, version: Optional[int] = None
+    ) -> bool:
+        """Delete a record, if at version; returns whether it was deleted."""
+
+    @abstractmethod
+    async def scan(self, namespace: str) -> List[Tuple[str, Record]]:
+        """Get the keys and records of a namespace that have not expired."""
+
+
+class MemoryStateStore(StateStore):
+    """
+    Records in a dictionary of this process.
+
+    Records are copied in and out like a remote store would serialize
+    them, so state behaves the same with either backend.
+    """
+
+    def __init__(self):
+        self._records: Dict[Tuple[str, str], Record] = {}
+
+    def _current(self, namespace: str, key: str) -> Optional[Record]:
+        record = self._records.get((namespace, key))
+        if record is not None and record.expires_at <= time.time():
+            del self._records[(namespace, key)]
+            return None
+        return record
+
+    async def get(self, namespace: str, key: str) -> Optional[Record]:
+        record = self._current(namespace, key)
+        if record is None:
+            return None
+        return record._replace(data=copy.deepcopy(record.data))
+
+    async def put(
+        self,
+        namespace: str,
+        key: str,
+        data: Dict[str, Any],
+        expires_at: float,
+        version: Optional[int] = None,
+    ) -> int:
+        record = self._current(namespace, key)
+        current = record.version if record else 0
+        if version is not None and version != current:
+            raise StaleStateError(f"{namespace} {key} is not at {version}")
+        self._records[(namespace, key)] = Record(
+            copy.deepcopy(data), current + 1, expires_at
+        )
+        return current + 1
+
+    async def delete(
+        self, namespace: str, key: str, version: Optional[int] = None
+    ) -> bool:
+        record = self._current(namespace, key)
+        if record is None or version not in (None, record.version):
+            return False
+        del self._records[(namespace, key)]
+        return True
+
+    async def scan(self, namespace: str) -> List[Tuple[str, Record]]:
+        records = []
+        for record_namespace, key in list(self._records):
+            if record_namespace == namespace:
+                record = await self.get(namespace, key)
+                if record is not None:
+                    records.append((key, record))
+        return records
+
+
+class MongoStateStore(StateStore):
+    """
+    Records in a MongoDB collection shared by all bot processes.
+
+    Documents hold the namespace, key, data, version and expiry time. The
+    TTL index on expires_at removes them about a minute after they expire,
+    until then reads skip them.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    @staticmethod
+    def _id(namespace: str, key: str) -> str:
+        return f"{namespace}:{key}"
+
+    @staticmethod
+    def _record(document: Dict[str, Any]) -> Record:
+        return Record(
+            document["data"],
+            document["version"],
+            document["expires_at"]
+            .replace(tzinfo=datetime.timezone.utc)
+            .timestamp(),
+        )
+
+    @staticmethod
+    def _now() -> datetime.datetime:
+        return datetime.datetime.now(datetime.timezone.utc)
+
+    async def get(self, namespace: str, key: str) -> Optional[Record]:
+        document = await self.collection.find_one(
+            {
+                "_id": self._id(namespace, key),
+                "expires_at": {"$gt": self._now()},
+            }
+        )
+        return self._record(document) if document else None
+
+    async def put(
+        self,
+        namespace: str,
+        key: str,
+        data: Dict[str, Any],
+        expires_at: float,
+        version: Optional[int] = None,
+    ) -> int:
+        _id = self._id(namespace, key)
+        expires = datetime.datetime.fromtimestamp(
+            expires_at, datetime.timezone.utc
+        )
+        document = {
+            "namespace": namespace,
+            "key": key,
+            "data": data,
+            "expires_at": expires,
+        }
+        if version:
+            result = await self.collection.update_one(
+                {
+                    "_id": _id,
+                    "version": version,
+                    "expires_at": {"$gt": self._now()},
+                },
+                {"$set": {**document, "version": version + 1}},
+            )
+            if result.matched_count != 1:
+                raise StaleStateError(f"{namespace} {key} is not at {version}")
+            return version + 1
+
+        if version is None:
+            stored = await self.collection.find_one_and_update(
+                {"_id": _id},
+                {"$set": document, "$inc": {"version": 1}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            return stored["version"]
+
+        try:
+            await self.collection.insert_one(
+                {"_id": _id, **document, "version": 1}
+            )
+        except DuplicateKeyError as e:
+            # An expired record the TTL monitor has not removed yet
+            result = await self.collection.replace_one(
+                {"_id": _id, "expires_at": {"$lte": self._now()}},
+                {**document, "version": 1},
+            )
+            if result.matched_count != 1:
+                raise StaleStateError(f"{namespace} {key} exists") from e
+        return 1
+
+    async def delete(
+        self, namespace: str, key: str, version: Optional[int] = None
+    ) -> bool:
+        query: Dict[str, Any] = {
+            "_id": self._id(namespace, key),
+            "expires_at": {"$gt": self._now()},
+        }
+        if version is not None:
+            query["version"] = version
+        result = await self.collection.delete_one(query)
+        return result.deleted_count == 1
+
+    async def scan(self, namespace: str) -> List[Tuple[str, Record]]:
+        return [
+            (document["key"], self._record(document))
+            async for document in self.collection.find(
+                {"namespace": namespace, "expires_at": {"$gt": self._now()}}
+            )
+        ]
+
+
+def create_store(kind: str) -> StateStore:
+    """
+    Create the store for the state of ongoing conversations.
+
+    Args:
+        kind (str): "memory" or "mongo".
+
+    Returns:
+        StateStore: The store.
+
+    Raises:
+        ValueError: If the kind is unknown.
+    """
+    if kind == "memory":
+        return MemoryStateStore()
+    if kind == "mongo":
+        # The bot's database, which the auth module connects to
+        from bots.telegram.auth import telegram_collection
+
+        return MongoStateStore(telegram_collection.database.telegram_state)
+    raise ValueError(
+        f"Unknown TELEGRAM_STATE_STORE {kind!r}, "
+        f"expected one of {', '.join(STORES)}"
+    )
+
+
+def get_store() -> StateStore:
+    """Get the shared state store, creating it on first use."""
+    global _store
+    if _store is None:
+        _store = create_store(config.TELEGRAM_STATE_STORE)
+    return _store
+
+
+def set_store(store: Optional[StateStore]) -> None:
+    """Replace the shared state store, None creates it again on next use."""
+    global _store
+    _store = store
+
+
+def compact_message(message: Optional[Message]) -> Optional[Dict[str, Any]]:
+    """The fields of a message needed to reply to or edit it later."""
+    if message is None:
+        return None
+    return {
+        "message_id": message.message_id,
+        "date": int(message.date.timestamp()),
+        "chat": {
+            "id": message.chat.id,
+            "type": message.chat.type,
+            "title": message.chat.title,
+        },
+    }
+
+
+def restore_message(
+    data: Optional[Dict[str, Any]], bot: Optional[Bot]
+) -> Optional[Message]:
+    """Rebuild a message stored with compact_message, bound to bot."""
+    return Message.de_json(dict(data), bot) if data else None
+
+
+def compact_user(mm_user: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    The Telegram id of a logged in bot user.
+
+    API tokens are not stored with the state, they are looked up again
+    with bots.telegram.auth.find_sessions.
+    """
+    if not mm_user:
+        return {}
+    return {"telegram_id": mm_user["telegram_id"]}
+
+
+class StoredState(ABC):
+    """
+    Base of objects kept in a StateMap.
+
+    Subclasses serialize themselves with to_record and from_record.
+    """
+
+    version: int = 0
+    expires_at: float = 0.0
+
+    @abstractmethod
+    def to_record(self) -> Dict[str, Any]:
+        """Serialize the object for the state store."""
+
+    @classmethod
+    @abstractmethod
+    def from_record(
+        cls, data: Dict[str, Any], bot: Optional[Bot] = None
+    ) -> "StoredState":
+        """Restore an object from the state store, bound to bot."""
+
+
+S = TypeVar("S", bound=StoredState)
+
+
+class StateMap(Generic[S]):
+    """
+    Objects of one kind in the shared state store, by key.
+
+    Args:
+        namespace (str): Namespace of the records.
+        kind (Type[StoredState]): Class of the objects.
+        ttl (float): Seconds a record is kept after it is added.
+        store (StateStore, optional): Store to use instead of the shared
+            one.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        kind: Type[S],
+        ttl: float,
+        store: Optional[StateStore] = None,
+    ):
+        self.namespace = namespace
+        self.kind = kind
+        self.ttl = ttl
+        self._store = store
+
+    @property
+    def store(self) -> StateStore:
+        return self._store or get_store()
+
+    def _restore(self, record: Record, bot: Optional[Bot]) -> S:
+        state = self.kind.from_record(record.data, bot)
+        state.version = record.version
+        state.expires_at = record.expires_at
+        return state
+
+    async def get(self, key: Any, bot: Optional[Bot] = None) -> Optional[S]:
+        """Get the object of a key, None if there is none."""
+        record = await self.store.get(self.namespace, str(key))
+        return self._restore(record, bot) if record else None
+
+    async def contains(self, key: Any) -> bool:
+        """Whether a key has an object."""
+        return await self.store.get(self.namespace, str(key)) is not None
+
+    async def add(self, key: Any, state: S) -> bool:
+        """Store a new object, returns False if the key already has one."""
+        expires_at = time.time() + self.ttl
+        try:
+            state.version = await self.store.put(
+                self.namespace, str(key), state.to_record(), expires_at, 0
+            )
+        except StaleStateError:
+            return False
+        state.expires_at = expires_at
+        return True
+
+    async def save(self, key: Any, state: S) -> None:
+        """
+        Store the changes of an object read from this map.
+
+        Raises:
+            StaleStateError: If it was changed or removed meanwhile.
+        """
+        state.version = await self.store.put(
+            self.namespace,
+            str(key),
+            state.to_record(),
+            state.expires_at,
+            state.version,
+        )
+
+    async def update(
+        self,
+        key: Any,
+        change: Callable[[S], Any],
+        bot: Optional[Bot] = None,
+        attempts: int = 5,
+    ) -> Optional[S]:
+        """
+        Change the object of a key, retrying on concurrent writes.
+
+        Args:
+            key: Key of the object.
+            change (Callable): Function changing the object in place, it
+                is called again with a fresh copy after a conflict.
+            bot (Bot, optional): Bot to bind restored messages to.
+            attempts (int): Number of tries before giving up.
+
+        Returns:
+            Optional[StoredState]: The changed object, None if the key has
+            none.
+
+        Raises:
+            StaleStateError: If every attempt conflicted.
+        """
+        for attempt in range(attempts):
+            state = await self.get(key, bot)
+            if state is None:
+                return None
+            change(state)
+            try:
+                await self.save(key, state)
+                return state
+            except StaleStateError:
+                if attempt == attempts - 1:
+                    raise
+        return None
+
+    async def assign(
+        self, key: Any, bot: Optional[Bot] = None, **changes: Any
+    ) -> Optional[S]:
+        """Set attributes of the object of a key, like update."""
+        return await self.update(
+            key, lambda state: state.__dict__.update(changes), bot
+        )
+
+    async def remove(self, key: Any, state: Optional[S] = None) -> bool:
+        """
+        Remove the object of a key.
+
+        With state given, only that version is removed, so of several
+        processes removing it only one succeeds.
+        """
+        return await self.store.delete(
+            self.namespace, str(key), state.version if state else None
+        )
+
+    async def items(self, bot: Optional[Bot] = None) -> List[Tuple[str, S]]:
+        """Get the keys and objects of the map."""
+        return [
+            (key, self._restore(record, bot))
+            for key, record in await self.store.scan(self.namespace)
+        ]
@@ -0,0 +1,139 @@
+"""
+Expiry of pending group transactions on the bot's event loop.
+
+One asyncio task sleeps until the earliest deadline of a heap, so any
+number of pending bill splits and transfers cost one task instead of a
+thread each, and expiry callbacks run on the event loop like handlers.
+"""
+
+import asyncio
+import heapq
+import itertools
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from loguru import logger
+
+Callback = Callable[[], Awaitable[None]]
+
+
+class TimeoutScheduler:
+    """
+    Run callbacks once their timeout elapses, unless cancelled first.
+
+    Scheduling and expiry take O(log n). Cancelled or rescheduled entries
+    stay in the heap until they reach its top and are then skipped.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        self._entries: Dict[Hashable, Tuple[int, float, Callback]] = {}
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def schedule(
+        self, key: Hashable, delay: float, callback: Callback
+    ) -> None:
+        """
+        Run a callback after delay seconds, replacing any timeout of key.
+
+        Must be called from the running event loop.
+
+        Args:
+            key (Hashable): Identifies the timeout for cancel.
+            delay (float): Seconds until the callback runs.
+            callback (Callable[[], Awaitable[None]]): Coroutine function
+                to run on expiry.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + delay
+        sequence = next(self._counter)
+        self._entries[key] = (sequence, deadline, callback)
+        heapq.heappush(self._heap, (deadline, sequence, key))
+        if self._task is None or self._task.done():
+            # A new event per task, so it binds to the current loop
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._run())
+        self._wakeup.set()
+
+    def cancel(self, key: Hashable) -> bool:
+        """Cancel the timeout of key, returns whether one was pending."""
+        return self._entries.pop(key, None) is not None
+
+    def remaining(self, key: Hashable) -> Optional[float]:
+        """Seconds until the timeout of key, None if none is pending."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        return max(0.0, entry[1] - asyncio.get_running_loop().time())
+
+    async def shutdown(self) -> None:
+        """Drop all pending timeouts and stop the scheduler task."""
+        self._entries.clear()
+        self._heap.clear()
+        tasks = [task for task in (self._task, *self._running) if task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+
+    def _pop_due(self, now: float) -> List[Callback]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, sequence, key = heapq.heappop(self._heap)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == sequence:
+                del self._entries[key]
+                due.append(entry[2])
+        # Rebuild once stale entries dominate the heap
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [
+                (deadline, sequence, key)
+                for key, (sequence, deadline, _) in self._entries.items()
+            ]
+            heapq.heapify(self._heap)
+        return due
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self._entries:
+            self._wakeup.clear()
+            for callback in self._pop_due(loop.time()):
+                task = loop.create_task(self._expire(callback))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+            if not self._heap:
+                break
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(), self._heap[0][0] - loop.time()
+                )
+            except asyncio.TimeoutError:
+                pass
+        self._heap.clear()
+
+    @staticmethod
+    async def _expire(callback: Callback) -> None:
+        try:
+            await callback()
+        except Exception:
+            logger.exception("Timeout callback failed")
+
+
+transaction_timeouts = TimeoutScheduler()
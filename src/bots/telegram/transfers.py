@@ -1,4 +1,3 @@
-import requests
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import (
     CallbackQueryHandler,
@@ -9,6 +8,7 @@ from telegram.ext import (
     filters,
 )
 
+from bots.telegram.api_helper import get_client
 from bots.telegram.auth import authenticate
 from bots.telegram.utils import private_chat_cancel
 from config.config import TELEGRAM_BOT_API_BASE_URL
@@ -20,6 +20,7 @@ from config.config import TELEGRAM_BOT_API_BASE_URL
     TRANSFER_CONFIRM,
 ) = range(4)
 
+
 @authenticate
 async def transfer_start(
     update: Update, context: ContextTypes.DEFAULT_TYPE, token: str
@@ -30,7 +31,7 @@ async def transfer_start(
     headers = {"token": token}
 
     # Get account information
-    response = requests.get(
+    response = await get_client().get(
         f"{TELEGRAM_BOT_API_BASE_URL}/accounts/", headers=headers
     )
     # Check that there are available accounts for transfer
@@ -74,7 +75,7 @@ async def select_source(
 
     # Fetch accounts again to list potential destination accounts
     headers = {"token": token}
-    response = requests.get(
+    response = await get_client().get(
         f"{TELEGRAM_BOT_API_BASE_URL}/accounts/", headers=headers
     )
     if response.status_code == 200:
@@ -167,7 +168,7 @@ async def send_confirmed_transfer(
             "amount": context.user_data["amount"],
         }
         headers = {"token": token}
-        response = requests.post(
+        response = await get_client().post(
             f"{TELEGRAM_BOT_API_BASE_URL}/accounts/transfer",
             json=payload,
             headers=headers,
@@ -182,6 +183,7 @@ async def send_confirmed_transfer(
     context.user_data.clear()
     return ConversationHandler.END
 
+
 """
 Handles the account transfer functions.
 """
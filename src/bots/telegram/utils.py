@@ -1,7 +1,7 @@
 """Utility functions for the Telegram bot."""
 
 import re
-from typing import List
+from typing import List, Set
 
 from telegram import MessageEntity, Update
 from telegram.ext import ContextTypes, ConversationHandler
@@ -114,6 +114,19 @@ async def extract_mentioned_usernames(
     return mentioned_users
 
 
+def mentioned_user_ids(update: Update) -> Set[int]:
+    """Telegram ids of the sender and of users mentioned by name."""
+    message = update.message
+    user_ids = {update.effective_user.id}
+    for entity in message.entities or ():
+        # @username mentions carry no id, only text mentions do
+        if entity.type == MessageEntity.TEXT_MENTION and entity.user:
+            user_ids.add(entity.user.id)
+    if message.reply_to_message and message.reply_to_message.from_user:
+        user_ids.add(message.reply_to_message.from_user.id)
+    return user_ids
+
+
 class Singleton(type):
     """A metaclass for creating singleton classes."""
 
@@ -4,14 +4,71 @@ This module contains configuration settings for the Money Manager application.
 """
 
 import os
+import tempfile
 
 MONGO_URI = os.getenv(
     "MONGO_URI",
     "mongodb://localhost:27017",
 )
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "60000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "10000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(
+    os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "30000")
+)
+MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")
+# Seconds startup waits for all indexes to be created before going on
+MONGO_INDEX_TIMEOUT = float(os.getenv("MONGO_INDEX_TIMEOUT", "10"))
+# Run multi-document writes in transactions, requires a replica set
+MONGO_TRANSACTIONS = os.getenv("MONGO_TRANSACTIONS", "false").lower() == "true"
 
 TOKEN_SECRET_KEY = os.getenv("TOKEN_SECRET_KEY", "")
 TOKEN_ALGORITHM = os.getenv("TOKEN_ALGORITHM", "HS256")
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", "60"))
+
+# Answer analytics from the expense_rollups collection instead of scanning
+# expenses; backfill it first with python -m api.utils.rollups rebuild
+ANALYTICS_ROLLUPS = os.getenv("ANALYTICS_ROLLUPS", "false").lower() == "true"
+
+# Worker processes used to render charts; 0 renders in a thread instead
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "2"))
+
+CHART_CACHE_SIZE = int(os.getenv("CHART_CACHE_SIZE", "256"))
+CHART_CACHE_TTL = float(os.getenv("CHART_CACHE_TTL", "3600"))
+# Directory for a second, on-disk chart cache tier; empty disables it
+CHART_CACHE_DIR = os.getenv("CHART_CACHE_DIR", "")
+# Most charts kept in the on-disk tier, the oldest are removed beyond it
+CHART_CACHE_DISK_SIZE = int(os.getenv("CHART_CACHE_DISK_SIZE", "4096"))
+
+# Rows read from MongoDB and written per chunk by streaming exports
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+
+# Background export jobs and how long their files are kept, in seconds.
+# Job state is stored in MongoDB; with several API workers the directory
+# must be shared between them for any worker to serve the files
+EXPORT_JOB_DIR = os.getenv(
+    "EXPORT_JOB_DIR",
+    os.path.join(tempfile.gettempdir(), "money-manager-exports"),
+)
+EXPORT_JOB_WORKERS = int(os.getenv("EXPORT_JOB_WORKERS", "2"))
+EXPORT_JOB_TTL = float(os.getenv("EXPORT_JOB_TTL", "3600"))
+
+# ECB style exchange rate file, empty uses the file bundled with
+# currencyconverter; the API reloads it when it changes, checked every N
+# seconds in the background (0 disables the check)
+CURRENCY_RATES_FILE = os.getenv("CURRENCY_RATES_FILE", "")
+CURRENCY_RATES_CHECK_INTERVAL = float(
+    os.getenv("CURRENCY_RATES_CHECK_INTERVAL", "60")
+)
+
+# Seconds a ledger operation key is remembered, retries within it are
+# answered with the first result instead of moving money again
+LEDGER_KEY_TTL = int(os.getenv("LEDGER_KEY_TTL", str(7 * 24 * 3600)))
+# Seconds a request holds the key of a ledger operation it is applying,
+# after which a retry may take the key over from a request that crashed
+LEDGER_KEY_LEASE = int(os.getenv("LEDGER_KEY_LEASE", "300"))
 
 API_BIND_HOST = os.getenv("API_BIND_HOST", "0.0.0.0")
 API_BIND_PORT = int(os.getenv("API_BIND_PORT", "9999"))
@@ -21,6 +78,37 @@ TELEGRAM_BOT_API_BASE_URL = os.getenv(
     "TELEGRAM_BOT_API_BASE_URL", "http://localhost:9999"
 )
 
+# Shared HTTP client of the bot: timeout per API request in seconds, pooled
+# connections and retries of failed connection attempts
+TELEGRAM_BOT_API_TIMEOUT = float(os.getenv("TELEGRAM_BOT_API_TIMEOUT", "10"))
+TELEGRAM_BOT_API_MAX_CONNECTIONS = int(
+    os.getenv("TELEGRAM_BOT_API_MAX_CONNECTIONS", "20")
+)
+TELEGRAM_BOT_API_RETRIES = int(os.getenv("TELEGRAM_BOT_API_RETRIES", "2"))
+# API calls the bot makes at once for the participants of a group action
+TELEGRAM_BOT_API_CONCURRENCY = int(
+    os.getenv("TELEGRAM_BOT_API_CONCURRENCY", "5")
+)
+# "http" calls the API at TELEGRAM_BOT_API_BASE_URL, "asgi" runs the API app
+# inside the bot process for single-node installs
+TELEGRAM_BOT_API_TRANSPORT = os.getenv("TELEGRAM_BOT_API_TRANSPORT", "http")
+
+# Logged in bot users cached by Telegram id; logins and logouts of this
+# bot process update it at once. A logout in another bot process shows
+# after the TTL, until then that process may still use the revoked token,
+# so keep the TTL short. Expired tokens are never used.
+TELEGRAM_SESSION_CACHE_SIZE = int(
+    os.getenv("TELEGRAM_SESSION_CACHE_SIZE", "10000")
+)
+TELEGRAM_SESSION_CACHE_TTL = float(
+    os.getenv("TELEGRAM_SESSION_CACHE_TTL", "60")
+)
+
+# Where ongoing group bill splits, transfers and reply prompts are kept:
+# "memory" in the bot process, "mongo" to survive restarts and share them
+# between several bot processes
+TELEGRAM_STATE_STORE = os.getenv("TELEGRAM_STATE_STORE", "memory")
+
 TIME_ZONE = os.getenv("TIME_ZONE", "America/New_York")
 
 TELEGRAM_PRIVATE_CHAT_COMMAND_TEXT = """
@@ -0,0 +1,277 @@
+import datetime
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi import HTTPException
+
+from api.utils.aggregations import (
+    aggregate_totals,
+    build_expense_query,
+    check_base_currency,
+    convert_budgets,
+    expense_date_bounds,
+    group_expenses,
+)
+from api.utils.currency import CurrencyService
+from api.utils.plots import (
+    BudgetChartOptions,
+    create_budget_vs_actual,
+    create_monthly_line,
+)
+
+USER_ID = "60d5ec9877c9e9c8c7a8b4e6"
+
+
+class TestBuildExpenseQuery:
+    """Test suite for the build_expense_query function."""
+
+    def test_no_dates(self):
+        assert build_expense_query(USER_ID, None, None) == {"user_id": USER_ID}
+
+    def test_both_dates(self):
+        from_date = datetime.date(2023, 1, 1)
+        to_date = datetime.date(2023, 1, 31)
+        query = build_expense_query(USER_ID, from_date, to_date)
+        assert query["date"] == {
+            "$gte": datetime.datetime.combine(from_date, datetime.time.min),
+            "$lte": datetime.datetime.combine(to_date, datetime.time.max),
+        }
+
+    def test_reversed_dates(self):
+        with pytest.raises(HTTPException) as exc:
+            build_expense_query(
+                USER_ID, datetime.date(2023, 2, 1), datetime.date(2023, 1, 1)
+            )
+        assert exc.value.status_code == 422
+
+
+@pytest.mark.anyio
+class TestAggregateTotals:
+    """Test suite for the MongoDB aggregation helpers."""
+
+    @patch("api.utils.aggregations.expenses_collection")
+    async def test_totals_by_category(self, mock_expenses):
+        mock_expenses.aggregate.return_value.to_list = AsyncMock(
+            return_value=[
+                {"_id": "Food", "total": 12.5},
+                {"_id": "Rent", "total": 800},
+            ]
+        )
+
+        labels, totals = await aggregate_totals(USER_ID, "category")
+
+        assert labels == ["Food", "Rent"]
+        assert totals == [12.5, 800.0]
+        pipeline = mock_expenses.aggregate.call_args[0][0]
+        assert pipeline[0] == {"$match": {"user_id": USER_ID}}
+        assert pipeline[1]["$group"]["_id"] == "$category"
+
+    @patch("api.utils.aggregations.expenses_collection")
+    async def test_totals_by_day(self, mock_expenses):
+        mock_expenses.aggregate.return_value.to_list = AsyncMock(
+            return_value=[]
+        )
+
+        labels, totals = await aggregate_totals(USER_ID, "day")
+
+        assert labels == [] and totals == []
+        pipeline = mock_expenses.aggregate.call_args[0][0]
+        assert pipeline[1]["$group"]["_id"] == {
+            "$dateToString": {"format": "%Y-%m-%d", "date": "$date"}
+        }
+
+    @patch("api.utils.aggregations.expenses_collection")
+    async def test_date_bounds(self, mock_expenses):
+        mock_expenses.aggregate.return_value.to_list = AsyncMock(
+            return_value=[
+                {
+                    "_id": None,
+                    "first": datetime.datetime(2023, 1, 2, 10),
+                    "last": datetime.datetime(2023, 3, 4, 18),
+                }
+            ]
+        )
+
+        assert await expense_date_bounds(USER_ID) == (
+            datetime.date(2023, 1, 2),
+            datetime.date(2023, 3, 4),
+        )
+
+    @patch("api.utils.aggregations.expenses_collection")
+    async def test_date_bounds_no_expenses(self, mock_expenses):
+        mock_expenses.aggregate.return_value.to_list = AsyncMock(
+            return_value=[]
+        )
+        assert await expense_date_bounds(USER_ID) == (None, None)
+
+    @patch("api.utils.aggregations.ANALYTICS_ROLLUPS", True)
+    @patch("api.utils.aggregations.expenses_collection")
+    @patch("api.utils.aggregations.rollups_collection")
+    async def test_totals_from_rollups(self, mock_rollups, mock_expenses):
+        mock_rollups.aggregate.return_value.to_list = AsyncMock(
+            return_value=[{"_id": "2023-01", "total": 30}]
+        )
+
+        labels, totals = await aggregate_totals(
+            USER_ID, "month", from_date=datetime.date(2023, 1, 1)
+        )
+
+        assert (labels, totals) == (["2023-01"], [30.0])
+        mock_expenses.aggregate.assert_not_called()
+        pipeline = mock_rollups.aggregate.call_args[0][0]
+        assert set(pipeline[0]["$match"]) == {"user_id", "day"}
+        assert pipeline[1]["$group"] == {
+            "_id": {"$dateToString": {"format": "%Y-%m", "date": "$day"}},
+            "total": {"$sum": "$total"},
+        }
+
+
+class TestGroupExpenses:
+    """Test suite for the in-memory group_expenses function."""
+
+    expenses = [
+        {
+            "amount": 10,
+            "category": "Food",
+            "date": datetime.datetime(2023, 1, 5),
+        },
+        {
+            "amount": 5,
+            "category": "Food",
+            "date": datetime.datetime(2023, 2, 1),
+        },
+        {
+            "amount": 7,
+            "category": "Bus",
+            "date": datetime.datetime(2023, 2, 1),
+        },
+    ]
+
+    def test_group_by_month(self):
+        assert group_expenses(self.expenses, "month") == (
+            ["2023-01", "2023-02"],
+            [10.0, 12.0],
+        )
+
+    def test_group_by_category(self):
+        assert group_expenses(self.expenses, "category") == (
+            ["Bus", "Food"],
+            [7.0, 15.0],
+        )
+
+    def test_plots_accept_totals(self):
+        buf = create_monthly_line(*group_expenses(self.expenses, "month"))
+        assert buf.getvalue().startswith(b"\x89PNG")
+        buf = create_budget_vs_actual(
+            *group_expenses(self.expenses, "category"),
+            BudgetChartOptions({"Food": {"monthly_budget": 100}}),
+        )
+        assert buf.getvalue().startswith(b"\x89PNG")
+
+
+@pytest.fixture
+def rates(tmp_path):
+    path = tmp_path / "rates.csv"
+    path.write_text("Date,USD,INR\n2023-02-01,1.25,100\n2023-01-02,1.0,80\n")
+    service = CurrencyService(str(path), check_interval=60)
+    with patch("api.utils.aggregations.currency_service", service):
+        yield service
+
+
+@pytest.mark.anyio
+class TestBaseCurrency:
+    """Test suite for totals converted to a base currency."""
+
+    def test_check_base_currency(self, rates):
+        assert check_base_currency(None) is None
+        assert check_base_currency("usd") == "USD"
+        with pytest.raises(HTTPException) as exc:
+            check_base_currency("XYZ")
+        assert exc.value.status_code == 400
+
+    @patch("api.utils.aggregations.expenses_collection")
+    async def test_aggregate_totals(self, mock_expenses, rates):
+        mock_expenses.aggregate.return_value.to_list = AsyncMock(
+            return_value=[
+                {
+                    "_id": {
+                        "label": "Food",
+                        "currency": "INR",
+                        "day": "2023-01-05",
+                    },
+                    "total": 800,
+                },
+                {
+                    "_id": {
+                        "label": "Food",
+                        "currency": "USD",
+                        "day": "2023-02-01",
+                    },
+                    "total": 5,
+                },
+                {
+                    "_id": {
+                        "label": "Bus",
+                        "currency": "EUR",
+                        "day": "2023-02-01",
+                    },
+                    "total": 7,
+                },
+            ]
+        )
+
+        labels, totals = await aggregate_totals(
+            USER_ID, "category", base_currency="EUR"
+        )
+
+        assert labels == ["Bus", "Food"]
+        assert totals == pytest.approx([7.0, 14.0])
+        pipeline = mock_expenses.aggregate.call_args[0][0]
+        assert pipeline[1]["$group"]["_id"]["label"] == "$category"
+        assert pipeline[1]["$group"]["_id"]["currency"] == "$currency"
+
+    def test_group_expenses(self, rates):
+        expenses = [
+            {**expense, "currency": currency}
+            for expense, currency in zip(
+                TestGroupExpenses.expenses, ["INR", "USD", "EUR"]
+            )
+        ]
+        labels, totals = group_expenses(expenses, "month", "USD")
+        assert labels == ["2023-01", "2023-02"]
+        assert totals == pytest.approx([0.125, 5 + 7 * 1.25])
+
+    def test_unsupported_expense_currency(self, rates):
+        expenses = [{**TestGroupExpenses.expenses[0], "currency": "XYZ"}]
+        with pytest.raises(HTTPException) as exc:
+            group_expenses(expenses, "day", "USD")
+        assert exc.value.status_code == 400
+
+    def test_convert_budgets(self, rates):
+        user = {
+            "currencies": ["INR", "USD"],
+            "categories": {
+                # Stored before categories kept their currency
+                "Food": {"monthly_budget": 1000},
+                "Rent": {"monthly_budget": 5, "currency": "USD"},
+            },
+        }
+
+        assert convert_budgets(user, None) == user["categories"]
+        assert convert_budgets(user, "EUR") == {
+            "Food": {"monthly_budget": pytest.approx(10.0)},
+            "Rent": {"monthly_budget": pytest.approx(4.0), "currency": "USD"},
+        }
+        assert user["categories"]["Food"]["monthly_budget"] == 1000
+
+    def test_unsupported_budget_currency(self, rates):
+        user = {
+            "categories": {"Food": {"monthly_budget": 1, "currency": "XYZ"}}
+        }
+        with pytest.raises(HTTPException) as exc:
+            convert_budgets(user, "USD")
+        assert exc.value.status_code == 400
+
+    def test_plot_labels_currency(self):
+        buf = create_monthly_line(["2023-01"], [10.0], None, None, "INR")
+        assert buf.getvalue().startswith(b"\x89PNG")
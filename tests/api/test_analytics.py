@@ -151,6 +151,65 @@ class TestAnalyticsCharts:
         assert response.headers["content-type"] == "image/png"
 
 
+@pytest.mark.anyio
+class TestAnalyticsChartCache:
+    async def test_etag_not_modified(self, async_client_auth: AsyncClient):
+        response = await async_client_auth.get("/analytics/category/bar")
+        assert response.status_code == 200
+        etag = response.headers["etag"]
+
+        response = await async_client_auth.get(
+            "/analytics/category/bar", headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+
+    async def test_etag_changes_after_expense(
+        self, async_client_auth: AsyncClient
+    ):
+        response = await async_client_auth.get("/analytics/category/bar")
+        etag = response.headers["etag"]
+
+        response = await async_client_auth.post(
+            "/expenses/",
+            json={
+                "amount": 1.0,
+                "currency": "USD",
+                "category": "Food",
+                "description": "Chart cache test",
+            },
+        )
+        assert response.status_code == 200
+
+        response = await async_client_auth.get(
+            "/analytics/category/bar", headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+
+
+@pytest.mark.anyio
+class TestAnalyticsBaseCurrency:
+    async def test_base_currency_chart(self, async_client_auth: AsyncClient):
+        response = await async_client_auth.get(
+            "/analytics/category/pie", params={"base_currency": "inr"}
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/png"
+
+        unconverted = await async_client_auth.get("/analytics/category/pie")
+        assert unconverted.headers["etag"] != response.headers["etag"]
+
+    async def test_unsupported_base_currency(
+        self, async_client_auth: AsyncClient
+    ):
+        response = await async_client_auth.get(
+            "/analytics/expense/bar", params={"base_currency": "XYZ"}
+        )
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Unsupported base currency: XYZ"
+
+
 @pytest.mark.anyio
 class TestAnalyticsEdgeCases:
     async def test_invalid_date_format(self, async_client_auth: AsyncClient):
@@ -292,6 +351,17 @@ class TestAnalyticsBudget:
             abs(result - (expected * (monthly_budget / 30))) < 0.01
         )  # Allow small floating point differences
 
+    async def test_budget_in_base_currency(
+        self, async_client_auth: AsyncClient
+    ):
+        """Test budget vs actual with budgets converted to a base currency."""
+        response = await async_client_auth.get(
+            "/analytics/budget/actual-vs-budget",
+            params={"base_currency": "EUR"},
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/png"
+
 
 @pytest.mark.anyio
 class TestAnalyticsDateValidation:
@@ -0,0 +1,114 @@
+import datetime
+import time
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi import HTTPException
+from jose import jwt
+
+from api.utils.auth import (
+    invalidate_token,
+    invalidate_user_tokens,
+    token_cache,
+    verify_token,
+)
+from api.utils.cache import TTLCache
+from config.config import TOKEN_ALGORITHM, TOKEN_SECRET_KEY
+
+
+class TestTTLCache:
+    """Test suite for the TTLCache class."""
+
+    def test_hit_and_miss(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        assert cache.get("a") is None
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_lru_eviction(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert "b" not in cache
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert cache.stats()["evictions"] == 1
+
+    def test_entry_expiry(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1, expires_at=time.time() - 1)
+        assert cache.get("a") is None
+        cache.set("b", 2, expires_at=time.time() + 0.01)
+        time.sleep(0.02)
+        assert cache.get("b") is None
+
+    def test_evict_if(self):
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache.set("a", "user1")
+        cache.set("b", "user2")
+        cache.set("c", "user1")
+        assert cache.evict_if(lambda _, value: value == "user1") == 2
+        assert len(cache) == 1
+
+
+def make_token(user_id: str, minutes: float = 10) -> str:
+    payload = {
+        "sub": user_id,
+        "exp": datetime.datetime.now(datetime.timezone.utc)
+        + datetime.timedelta(minutes=minutes),
+    }
+    return jwt.encode(payload, TOKEN_SECRET_KEY, algorithm=TOKEN_ALGORITHM)
+
+
+@pytest.mark.anyio
+class TestVerifyTokenCache:
+    """Test suite for the token verification cache."""
+
+    @patch("api.utils.auth.tokens_collection")
+    async def test_second_call_is_cached(self, mock_tokens):
+        token = make_token("507f1f77bcf86cd799439011")
+        mock_tokens.find_one = AsyncMock(return_value={"token": token})
+
+        assert await verify_token(token) == "507f1f77bcf86cd799439011"
+        assert await verify_token(token) == "507f1f77bcf86cd799439011"
+        mock_tokens.find_one.assert_called_once()
+        invalidate_token(token)
+
+    @patch("api.utils.auth.tokens_collection")
+    async def test_invalidate_token(self, mock_tokens):
+        token = make_token("507f1f77bcf86cd799439011")
+        mock_tokens.find_one = AsyncMock(return_value={"token": token})
+        await verify_token(token)
+
+        invalidate_token(token)
+        mock_tokens.find_one = AsyncMock(return_value=None)
+        with pytest.raises(HTTPException) as exc:
+            await verify_token(token)
+        assert exc.value.detail == "Token does not exist"
+
+    @patch("api.utils.auth.tokens_collection")
+    async def test_invalidate_user_tokens(self, mock_tokens):
+        token = make_token("507f1f77bcf86cd799439012")
+        mock_tokens.find_one = AsyncMock(return_value={"token": token})
+        await verify_token(token)
+        assert token in token_cache
+
+        invalidate_user_tokens("507f1f77bcf86cd799439012")
+        assert token not in token_cache
+
+    @patch("api.utils.auth.tokens_collection")
+    async def test_stored_expiry_is_honored(self, mock_tokens):
+        token = make_token("507f1f77bcf86cd799439011")
+        mock_tokens.find_one = AsyncMock(
+            return_value={
+                "token": token,
+                "expires_at": datetime.datetime.utcnow()
+                - datetime.timedelta(seconds=1),
+            }
+        )
+        await verify_token(token)
+        assert token not in token_cache
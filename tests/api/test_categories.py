@@ -3,9 +3,11 @@ from unittest.mock import patch
 
 import pytest
 from bson import ObjectId  # Import ObjectId
+from fastapi import HTTPException
 from httpx import AsyncClient
 
 from api.app import app
+from api.routers.categories import month_range
 
 @pytest.fixture
 def mock_db_user_no_categories(monkeypatch):
@@ -54,6 +56,25 @@ class TestCategoryCreation:
         assert response.status_code == 200, response.json()
         assert response.json()["message"] == "Category created successfully"
 
+    async def test_category_currency(self, async_client_auth: AsyncClient):
+        response = await async_client_auth.post(
+            "/categories/",
+            json={"name": "Abroad", "monthly_budget": 80.0, "currency": "inr"},
+        )
+        assert response.status_code == 200, response.json()
+        response = await async_client_auth.get("/categories/Abroad")
+        assert response.json()["category"]["currency"] == "INR"
+        await async_client_auth.delete("/categories/Abroad")
+
+    async def test_category_currency_not_added(
+        self, async_client_auth: AsyncClient
+    ):
+        response = await async_client_auth.post(
+            "/categories/",
+            json={"name": "Abroad", "monthly_budget": 80.0, "currency": "JPY"},
+        )
+        assert response.status_code == 400, response.json()
+
     async def test_duplicate_category(self, async_client_auth: AsyncClient):
         # Try creating the same category again
         response = await async_client_auth.post(
@@ -408,3 +429,92 @@ class TestCategoryBoundaryValues:
         response = await async_client_auth.post("/categories/", json=payload)
         # Expect success if the number is within a valid range.
         assert response.status_code == 200, response.json()
+
+
+class TestMonthRange:
+    def test_month_range(self):
+        assert month_range("2024-02") == (
+            datetime.date(2024, 2, 1),
+            datetime.date(2024, 2, 29),
+        )
+
+    def test_current_month(self):
+        first_day, last_day = month_range(None)
+        assert first_day == datetime.date.today().replace(day=1)
+        assert first_day <= datetime.date.today() <= last_day
+
+    def test_invalid_month(self):
+        with pytest.raises(HTTPException) as exc:
+            month_range("2024-13")
+        assert exc.value.status_code == 422
+
+
+@pytest.mark.anyio
+class TestBudgetStatus:
+    async def test_budget_status(self, async_client_auth: AsyncClient):
+        response = await async_client_auth.post(
+            "/categories/", json={"name": "Budgeted", "monthly_budget": 50.0}
+        )
+        assert response.status_code == 200, response.json()
+        expense_ids = []
+        for amount in (20.0, 40.0):
+            response = await async_client_auth.post(
+                "/expenses/",
+                json={
+                    "amount": amount,
+                    "currency": "USD",
+                    "category": "Budgeted",
+                    "account_name": "Checking",
+                },
+            )
+            assert response.status_code == 200, response.json()
+            expense_ids.append(response.json()["expense"]["_id"])
+
+        try:
+            response = await async_client_auth.get(
+                "/categories/Budgeted/budget-status",
+                params={"currency": "usd"},
+            )
+            assert response.status_code == 200, response.json()
+            status = response.json()
+            assert status["month"] == datetime.date.today().strftime("%Y-%m")
+            assert status["currency"] == "USD"
+            assert status["budget"] == 50.0
+            assert status["spent"] == pytest.approx(60.0)
+            assert status["remaining"] == pytest.approx(-10.0)
+            assert status["percentage"] == pytest.approx(120.0)
+
+            response = await async_client_auth.get(
+                "/categories/Budgeted/budget-status",
+                params={"month": "2000-01"},
+            )
+            assert response.status_code == 200, response.json()
+            assert response.json()["spent"] == 0
+        finally:
+            for expense_id in expense_ids:
+                await async_client_auth.delete(f"/expenses/{expense_id}")
+            await async_client_auth.delete("/categories/Budgeted")
+
+    async def test_budget_status_not_found(
+        self, async_client_auth: AsyncClient
+    ):
+        response = await async_client_auth.get(
+            "/categories/Unknown Budget/budget-status"
+        )
+        assert response.status_code == 404, response.json()
+
+    async def test_budget_status_invalid_month(
+        self, async_client_auth: AsyncClient
+    ):
+        response = await async_client_auth.get(
+            "/categories/Food/budget-status", params={"month": "May"}
+        )
+        assert response.status_code == 422, response.json()
+
+    async def test_budget_status_invalid_currency(
+        self, async_client_auth: AsyncClient
+    ):
+        response = await async_client_auth.get(
+            "/categories/Food/budget-status", params={"currency": "XYZ"}
+        )
+        assert response.status_code == 400, response.json()
@@ -0,0 +1,106 @@
+import datetime
+import os
+import time
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from api.routers.analytics import chart_name, lookup_chart, store_chart
+from api.utils.chart_cache import (
+    _disk_path,
+    _sweep_disk,
+    chart_cache,
+    chart_etag,
+    chart_key,
+    etag_matches,
+    get_chart,
+    put_chart,
+)
+
+USER_ID = "60d5ec9877c9e9c8c7a8b4e6"
+
+
+class TestChartKeys:
+    """Test suite for chart cache keys and ETags."""
+
+    def test_key_includes_version(self):
+        day = datetime.date(2023, 1, 1)
+        assert chart_key(USER_ID, "pie", day, None, 1) != chart_key(
+            USER_ID, "pie", day, None, 2
+        )
+
+    def test_etag_matches(self):
+        etag = chart_etag("key")
+        assert etag_matches(etag, etag)
+        assert etag_matches(f'"other", {etag}', etag)
+        assert etag_matches("*", etag)
+        assert not etag_matches(None, etag)
+        assert not etag_matches('"other"', etag)
+
+
+@pytest.mark.anyio
+class TestChartCache:
+    """Test suite for the chart cache tiers and the analytics lookup."""
+
+    async def test_disk_tier(self, tmp_path):
+        with patch("api.utils.chart_cache.CHART_CACHE_DIR", str(tmp_path)):
+            await put_chart("disk-key", b"png")
+            chart_cache.clear()
+
+            assert await get_chart("disk-key") == b"png"
+            assert chart_cache.get("disk-key") == b"png"
+
+    @patch("api.routers.analytics.get_data_version", new_callable=AsyncMock)
+    async def test_lookup_chart(self, mock_version):
+        mock_version.return_value = 3
+
+        key, cached = await lookup_chart(USER_ID, "pie", None, None, None)
+        assert cached is None
+
+        response = await store_chart(key, b"png")
+        etag = response.headers["etag"]
+
+        _, cached = await lookup_chart(USER_ID, "pie", None, None, None)
+        assert cached.body == b"png"
+
+        _, cached = await lookup_chart(USER_ID, "pie", None, None, etag)
+        assert cached.status_code == 304
+
+        mock_version.return_value = 4
+        _, cached = await lookup_chart(USER_ID, "pie", None, None, etag)
+        assert cached is None
+
+    async def test_disk_tier_is_swept(self, tmp_path):
+        old = tmp_path / "old.png"
+        old.write_bytes(b"png")
+        os.utime(old, (0, 0))
+        with patch(
+            "api.utils.chart_cache.CHART_CACHE_DIR", str(tmp_path)
+        ), patch("api.utils.chart_cache.CHART_CACHE_DISK_SIZE", 2), patch(
+            "api.utils.chart_cache._last_sweep", {"at": 0.0}
+        ):
+            for index in range(3):
+                await put_chart(f"sweep-{index}", b"png")
+                written = time.time() - 10 + index
+                os.utime(_disk_path(f"sweep-{index}"), (written, written))
+            _sweep_disk()
+
+        # Expired charts go first, then the oldest beyond the size
+        assert sorted(os.listdir(tmp_path)) == sorted(
+            os.path.basename(_disk_path(f"sweep-{index}")) for index in (1, 2)
+        )
+
+    @patch("api.routers.analytics.get_data_version", new_callable=AsyncMock)
+    async def test_rates_version_in_key(self, mock_version):
+        mock_version.return_value = 1
+        with patch("api.routers.analytics.currency_service") as service:
+            service.version = 1.0
+            key, _ = await lookup_chart(
+                USER_ID, chart_name("pie", "EUR"), None, None, None
+            )
+            service.version = 2.0
+            newer, _ = await lookup_chart(
+                USER_ID, chart_name("pie", "EUR"), None, None, None
+            )
+
+        assert key != newer
@@ -0,0 +1,100 @@
+import asyncio
+import datetime
+import os
+
+import numpy as np
+import pytest
+
+from api.utils.currency import CurrencyService
+
+RATES = """Date,USD,INR,GBP,
+2024-01-05,1.10,90.0,N/A,
+2024-01-04,1.20,N/A,0.80,
+2024-01-02,1.00,80.0,0.90,
+"""
+
+
+@pytest.fixture
+def rate_file(tmp_path):
+    path = tmp_path / "rates.csv"
+    path.write_text(RATES)
+    return path
+
+
+@pytest.fixture
+def service(rate_file):
+    return CurrencyService(str(rate_file), check_interval=0)
+
+
+class TestCurrencyService:
+    """Test suite for the CurrencyService class."""
+
+    def test_convert(self, service):
+        assert service.convert(110, "USD", "EUR") == pytest.approx(100)
+        assert service.convert(10, "eur", "INR") == pytest.approx(900)
+        assert service.convert(5, "USD", "USD") == 5
+
+    def test_rates_by_date(self, service):
+        date = datetime.date(2024, 1, 4)
+        assert service.convert(12, "USD", "EUR", date) == pytest.approx(10)
+        # Missing days and rates carry the last known rate
+        date = datetime.date(2024, 1, 3)
+        assert service.convert(10, "USD", "EUR", date) == pytest.approx(10)
+        assert service.convert(1, "EUR", "GBP") == pytest.approx(0.8)
+        # Dates out of range use the first or last rates
+        date = datetime.date(2000, 1, 1)
+        assert service.convert(10, "USD", "EUR", date) == pytest.approx(10)
+
+    def test_convert_many(self, service):
+        converted = service.convert_many(
+            [110, 90, 10],
+            ["USD", "INR", "EUR"],
+            "EUR",
+            [None, None, datetime.datetime(2024, 1, 2, 12)],
+        )
+        assert isinstance(converted, np.ndarray)
+        assert converted == pytest.approx([100, 1, 10])
+
+    def test_unsupported_currency(self, service):
+        with pytest.raises(ValueError, match="XYZ is not a supported"):
+            service.convert_many([1, 2], ["USD", "XYZ"], "EUR")
+
+    def test_reload_on_change(self, service, rate_file):
+        assert service.convert(110, "USD", "EUR") == pytest.approx(100)
+        assert not service.reload()
+        version = service.version
+
+        rate_file.write_text("Date,USD\n2024-01-06,2.0\n")
+        stat = os.stat(rate_file)
+        os.utime(rate_file, (stat.st_atime, stat.st_mtime + 1))
+
+        # Conversions only read the loaded rates
+        assert service.convert(110, "USD", "EUR") == pytest.approx(100)
+        assert service.reload()
+        assert service.convert(110, "USD", "EUR") == pytest.approx(55)
+        assert service.currencies == ["EUR", "USD"]
+        # Charts converted at the old rates are no longer looked up
+        assert service.version != version
+
+    @pytest.mark.anyio
+    async def test_watch_for_changes(self, rate_file):
+        service = CurrencyService(str(rate_file), check_interval=0.01)
+        assert service.convert(110, "USD", "EUR") == pytest.approx(100)
+        service.start()
+        try:
+            # A broken file keeps the current rates
+            rate_file.write_text("Date,USD\n")
+            stat = os.stat(rate_file)
+            os.utime(rate_file, (stat.st_atime, stat.st_mtime + 1))
+            await asyncio.sleep(0.05)
+            assert service.convert(110, "USD", "EUR") == pytest.approx(100)
+
+            rate_file.write_text("Date,USD\n2024-01-06,2.0\n")
+            os.utime(rate_file, (stat.st_atime, stat.st_mtime + 2))
+            for _ in range(100):
+                if service.convert(110, "USD", "EUR") != pytest.approx(100):
+                    break
+                await asyncio.sleep(0.01)
+            assert service.convert(110, "USD", "EUR") == pytest.approx(55)
+        finally:
+            await service.shutdown()
@@ -1,10 +1,16 @@
 import datetime
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 from bson import ObjectId
 
-from api.utils.db import calculate_days_in_range, fetch_data
+from api.utils.db import (
+    PoolStatsListener,
+    adjust_balance,
+    calculate_days_in_range,
+    fetch_data,
+    run_transaction,
+)
 
 
 class TestFetchData:
@@ -55,6 +61,62 @@ class TestFetchData:
         mock_expenses.find.assert_called_once_with(expected_query)
 
 
+class TestBalanceUpdates:
+    """Test suite for atomic balance updates."""
+
+    @pytest.mark.anyio
+    @patch("api.utils.db.accounts_collection")
+    async def test_debit_is_guarded(self, mock_accounts):
+        """Test debits only match accounts with a sufficient balance."""
+        mock_accounts.find_one_and_update = AsyncMock(return_value=None)
+        account_id = ObjectId()
+
+        assert await adjust_balance(account_id, -25.0) is None
+
+        query, update = mock_accounts.find_one_and_update.call_args.args
+        assert query == {"_id": account_id, "balance": {"$gte": 25.0}}
+        assert update == {"$inc": {"balance": -25.0}}
+
+    @pytest.mark.anyio
+    @patch("api.utils.db.accounts_collection")
+    async def test_credit_is_not_guarded(self, mock_accounts):
+        """Test credits apply regardless of the balance."""
+        mock_accounts.find_one_and_update = AsyncMock(
+            return_value={"balance": 35.0}
+        )
+        account_id = ObjectId()
+
+        account = await adjust_balance(account_id, 10.0)
+
+        assert account == {"balance": 35.0}
+        query, _ = mock_accounts.find_one_and_update.call_args.args
+        assert query == {"_id": account_id}
+
+    @pytest.mark.anyio
+    @patch("api.utils.db.MONGO_TRANSACTIONS", False)
+    async def test_transaction_disabled(self):
+        """Test no session is started without transaction support."""
+        callback = AsyncMock(return_value="done")
+
+        assert await run_transaction(callback) == "done"
+        callback.assert_awaited_once_with(None)
+
+    @pytest.mark.anyio
+    @patch("api.utils.db.MONGO_TRANSACTIONS", True)
+    @patch("api.utils.db.client")
+    async def test_transaction_retried_by_driver(self, mock_client):
+        """Test the callback runs through with_transaction, which retries."""
+        session = MagicMock()
+        session.__aenter__ = AsyncMock(return_value=session)
+        session.__aexit__ = AsyncMock(return_value=False)
+        session.with_transaction = AsyncMock(return_value="done")
+        mock_client.start_session = AsyncMock(return_value=session)
+        callback = AsyncMock()
+
+        assert await run_transaction(callback) == "done"
+        session.with_transaction.assert_awaited_once_with(callback)
+
+
 class TestCalculateDaysInRange:
     """Test suite for the calculate_days_in_range function."""
 
@@ -117,3 +179,41 @@ class TestCalculateDaysInRange:
         epoch_date = datetime.date(1970, 1, 1)
         expected_days = (to_date - epoch_date).days + 1
         assert days == expected_days
+
+
+class TestPoolStatsListener:
+    """Test suite for the connection pool statistics listener."""
+
+    class Event:
+        address = ("localhost", 27017)
+
+    def test_checked_out_connections(self):
+        """Test checked-out connections are counted per pool."""
+        listener = PoolStatsListener()
+        listener.connection_created(self.Event())
+        listener.connection_checked_out(self.Event())
+        listener.connection_checked_out(self.Event())
+        listener.connection_checked_in(self.Event())
+
+        stats = listener.snapshot()
+        assert stats["checked_out"] == 1
+        assert stats["pools"]["localhost:27017"]["open"] == 1
+        assert stats["pools"]["localhost:27017"]["created"] == 1
+
+    def test_pool_closed(self):
+        """Test closed pools are dropped from the snapshot."""
+        listener = PoolStatsListener()
+        listener.connection_checked_out(self.Event())
+        listener.pool_closed(self.Event())
+
+        stats = listener.snapshot()
+        assert stats["checked_out"] == 0
+        assert stats["pools"] == {}
+
+
+@pytest.mark.anyio
+async def test_pool_stats_endpoint(async_client):
+    """Test the pool statistics endpoint does not require a token."""
+    response = await async_client.get("/health/pool")
+    assert response.status_code == 200
+    assert "checked_out" in response.json()["pool"]
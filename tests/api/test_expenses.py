@@ -1,13 +1,15 @@
 # test_expenses.py
+import asyncio
 import datetime
 from datetime import datetime
-from unittest.mock import patch
+from unittest.mock import AsyncMock, call, patch
 
 import pytest
 from bson import ObjectId
 from fastapi import HTTPException
 from httpx import AsyncClient
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import PyMongoError
 
 import api.routers.expenses
 from config.config import MONGO_URI
@@ -150,7 +152,7 @@ class TestConvertCurrency:
         ), "Conversion should return the original amount if currencies are the same"
 
     # Test case for successful conversion
-    @patch("api.routers.expenses.currency_converter.convert")
+    @patch("api.routers.expenses.currency_service.convert")
     def test_success(self, mock_convert):
         # Mock the currency converter to return a fixed value
         mock_convert.return_value = 85.0
@@ -168,7 +170,7 @@ class TestConvertCurrency:
         ), "Conversion should match the mocked return value"
 
     # Test case for failed conversion (e.g., unsupported currency)
-    @patch("api.routers.expenses.currency_converter.convert")
+    @patch("api.routers.expenses.currency_service.convert")
     def test_failure(self, mock_convert):
         # Simulate an exception being raised during conversion
         mock_convert.side_effect = Exception("Unsupported currency")
@@ -366,6 +368,212 @@ class TestExpenseAdd:
         assert response.status_code == 422
 
 
+@pytest.mark.anyio
+class TestExpenseBulkAdd:
+    @staticmethod
+    async def checking_balance(client: AsyncClient) -> float:
+        response = await client.get("/accounts/")
+        assert response.status_code == 200, response.json()
+        return next(
+            account["balance"]
+            for account in response.json()["accounts"]
+            if account["name"] == "Checking"
+        )
+
+    async def test_valid(self, async_client_auth: AsyncClient):
+        """
+        Test adding a batch of expenses with one balance update.
+        """
+        balance = await self.checking_balance(async_client_auth)
+
+        response = await async_client_auth.post(
+            "/expenses/bulk",
+            json={
+                "expenses": [
+                    {
+                        "amount": 1.5,
+                        "currency": "usd",
+                        "category": "Food",
+                        "description": f"Bulk {i}",
+                        "account_name": "Checking",
+                    }
+                    for i in range(10)
+                ]
+            },
+        )
+        assert response.status_code == 200, response.json()
+        assert response.json()["message"] == "Added 10 of 10 expenses"
+        assert response.json()["errors"] == []
+        assert len(response.json()["expenses"]) == 10
+        assert response.json()["expenses"][0]["currency"] == "USD"
+        assert response.json()["balances"]["Checking"] == pytest.approx(
+            balance - 15
+        )
+
+        new_balance = await self.checking_balance(async_client_auth)
+        assert new_balance == pytest.approx(balance - 15)
+
+    async def test_partial_errors(self, async_client_auth: AsyncClient):
+        """
+        Test that invalid items are reported without failing the batch.
+        """
+        expense = {
+            "amount": 1.0,
+            "currency": "USD",
+            "category": "Food",
+            "account_name": "Checking",
+        }
+        response = await async_client_auth.post(
+            "/expenses/bulk",
+            json={
+                "expenses": [
+                    expense,
+                    {**expense, "currency": "XYZ"},
+                    {**expense, "category": "Nonexistent"},
+                    {**expense, "account_name": "Nonexistent"},
+                    {**expense, "amount": 1e12},
+                ]
+            },
+        )
+        assert response.status_code == 200, response.json()
+        assert response.json()["message"] == "Added 1 of 5 expenses"
+        errors = response.json()["errors"]
+        assert [error["index"] for error in errors] == [1, 2, 3, 4]
+        assert "Currency type is not added" in errors[0]["detail"]
+        assert "Category is not present" in errors[1]["detail"]
+        assert errors[2]["detail"] == "Invalid account type"
+        assert "Insufficient balance" in errors[3]["detail"]
+
+    async def test_too_large(self, async_client_auth: AsyncClient):
+        expense = {"amount": 1.0, "currency": "USD", "category": "Food"}
+        response = await async_client_auth.post(
+            "/expenses/bulk",
+            json={
+                "expenses": [expense]
+                * (api.routers.expenses.MAX_BULK_SIZE + 1)
+            },
+        )
+        assert response.status_code == 422, response.json()
+
+
+ACCOUNTS = {
+    "Checking": {"_id": ObjectId(), "name": "Checking"},
+    "Savings": {"_id": ObjectId(), "name": "Savings"},
+}
+
+
+@pytest.mark.anyio
+@patch("api.utils.db.MONGO_TRANSACTIONS", False)
+class TestInsertExpenses:
+    """Failed batches without transactions undo their writes."""
+
+    @patch("api.routers.expenses.expenses_collection")
+    @patch("api.routers.expenses.adjust_balance", new_callable=AsyncMock)
+    async def test_refund_when_insert_fails(self, mock_adjust, mock_expenses):
+        mock_adjust.side_effect = lambda account_id, amount, session=None: {
+            "balance": 100.0 + amount
+        }
+
+        async def insert_many(docs, session=None):
+            docs[0]["_id"] = ObjectId()
+            raise PyMongoError("connection lost")
+
+        mock_expenses.insert_many = insert_many
+        mock_expenses.delete_many = AsyncMock()
+        docs = [{"amount": 5.0}, {"amount": 7.0}]
+
+        with pytest.raises(PyMongoError):
+            await api.routers.expenses.insert_expenses(
+                "user", docs, ACCOUNTS, {"Checking": 5.0, "Savings": 7.0}
+            )
+
+        mock_expenses.delete_many.assert_awaited_once_with(
+            {"_id": {"$in": [docs[0]["_id"]]}}
+        )
+        assert mock_adjust.await_args_list[2:] == [
+            call(ACCOUNTS["Checking"]["_id"], 5.0),
+            call(ACCOUNTS["Savings"]["_id"], 7.0),
+        ]
+
+    @patch("api.routers.expenses.expenses_collection")
+    @patch("api.routers.expenses.adjust_balance", new_callable=AsyncMock)
+    async def test_guarded_debit(self, mock_adjust, mock_expenses):
+        # Savings was spent by a concurrent request
+        mock_adjust.side_effect = [{"balance": 95.0}, None, {"balance": 100}]
+        mock_expenses.insert_many = AsyncMock()
+
+        with pytest.raises(HTTPException) as e:
+            await api.routers.expenses.insert_expenses(
+                "user",
+                [{"amount": 5.0}],
+                ACCOUNTS,
+                {"Checking": 5.0, "Savings": 7.0},
+            )
+
+        assert e.value.status_code == 400
+        assert e.value.detail == "Insufficient balance in Savings account"
+        mock_expenses.insert_many.assert_not_awaited()
+        assert mock_adjust.await_args_list[2] == call(
+            ACCOUNTS["Checking"]["_id"], 5.0
+        )
+
+
+@pytest.mark.anyio
+class TestExpenseConcurrency:
+    async def test_parallel_expenses_keep_balance(
+        self, async_client_auth: AsyncClient
+    ):
+        """
+        Test that hundreds of parallel expenses never lose a balance update
+        or overdraw the account.
+        """
+        response = await async_client_auth.post(
+            "/accounts/",
+            json={"name": "Stress", "balance": 100.0, "currency": "USD"},
+        )
+        assert response.status_code == 200, response.json()
+        account_id = response.json()["account_id"]
+
+        responses = await asyncio.gather(
+            *(
+                async_client_auth.post(
+                    "/expenses/",
+                    json={
+                        "amount": 1.0,
+                        "currency": "USD",
+                        "category": "Food",
+                        "description": f"Stress {i}",
+                        "account_name": "Stress",
+                    },
+                )
+                for i in range(300)
+            )
+        )
+        statuses = [response.status_code for response in responses]
+        assert statuses.count(200) == 100
+        assert statuses.count(400) == 200
+
+        response = await async_client_auth.get(f"/accounts/{account_id}")
+        assert response.json()["account"]["balance"] == 0
+
+        response = await async_client_auth.get(
+            "/expenses/", params={"account_name": "Stress"}
+        )
+        assert len(response.json()["expenses"]) == 100
+
+        # Deleting them all in parallel refunds every expense exactly once
+        responses = await asyncio.gather(
+            *(
+                async_client_auth.delete(f"/expenses/{expense['_id']}")
+                for expense in response.json()["expenses"]
+            )
+        )
+        assert all(response.status_code == 200 for response in responses)
+
+        response = await async_client_auth.get(f"/accounts/{account_id}")
+        assert response.json()["account"]["balance"] == 100
+
+
 @pytest.mark.anyio
 class TestExpenseGet:
     async def test_all(self, async_client_auth: AsyncClient):
@@ -432,6 +640,126 @@ class TestExpenseGet:
         assert response.status_code == 404, response.json()
         assert response.json()["detail"] == "Expense not found"
 
+    async def test_pagination(self, async_client_auth: AsyncClient):
+        """
+        Test walking all expenses page by page with the returned cursor.
+        """
+        for day in range(1, 4):
+            response = await async_client_auth.post(
+                "/expenses/",
+                json={
+                    "amount": 1.0,
+                    "currency": "USD",
+                    "category": "Food",
+                    "description": f"Page test {day}",
+                    "account_name": "Checking",
+                    "date": datetime(2020, 1, day).isoformat(),
+                },
+            )
+            assert response.status_code == 200, response.json()
+
+        params = {
+            "limit": 2,
+            "from_date": "2020-01-01T00:00:00",
+            "to_date": "2020-01-31T23:59:59",
+            "include_total": "true",
+        }
+        response = await async_client_auth.get("/expenses/", params=params)
+        assert response.status_code == 200, response.json()
+        first_page = response.json()
+        assert first_page["total"] == 3
+        assert len(first_page["expenses"]) == 2
+        assert first_page["next_cursor"]
+
+        params["cursor"] = first_page["next_cursor"]
+        response = await async_client_auth.get("/expenses/", params=params)
+        assert response.status_code == 200, response.json()
+        second_page = response.json()
+        assert len(second_page["expenses"]) == 1
+        assert second_page["next_cursor"] is None
+
+        dates = [
+            expense["date"]
+            for expense in first_page["expenses"] + second_page["expenses"]
+        ]
+        assert dates == sorted(dates, reverse=True)
+
+    async def test_filters_and_fields(self, async_client_auth: AsyncClient):
+        """
+        Test filtering by category and projecting fields.
+        """
+        response = await async_client_auth.post(
+            "/expenses/",
+            json={
+                "amount": 5.0,
+                "currency": "USD",
+                "category": "Transport",
+                "description": "Bus ticket",
+                "account_name": "Checking",
+            },
+        )
+        assert response.status_code == 200, response.json()
+
+        response = await async_client_auth.get(
+            "/expenses/",
+            params={"category": "Transport", "fields": "amount,category"},
+        )
+        assert response.status_code == 200, response.json()
+        expenses = response.json()["expenses"]
+        assert expenses
+        for expense in expenses:
+            assert expense["category"] == "Transport"
+            assert set(expense) == {"_id", "amount", "category", "date"}
+
+    async def test_unknown_field(self, async_client_auth: AsyncClient):
+        response = await async_client_auth.get(
+            "/expenses/", params={"fields": "amount,user_id"}
+        )
+        assert response.status_code == 422, response.json()
+        assert response.json()["detail"] == "Unknown fields: user_id"
+
+    async def test_invalid_cursor(self, async_client_auth: AsyncClient):
+        response = await async_client_auth.get(
+            "/expenses/", params={"cursor": "not-a-cursor"}
+        )
+        assert response.status_code == 400, response.json()
+        assert response.json()["detail"] == "Invalid cursor"
+
+
+class TestExpenseCursor:
+    def test_round_trip(self):
+        expense = {"_id": ObjectId(), "date": datetime(2024, 5, 1, 12, 30)}
+        cursor = api.routers.expenses.encode_cursor(expense)
+        assert api.routers.expenses.decode_cursor(cursor) == (
+            expense["date"],
+            expense["_id"],
+        )
+
+    def test_invalid(self):
+        with pytest.raises(HTTPException) as exc_info:
+            api.routers.expenses.decode_cursor("bm90LWEtY3Vyc29y")
+        assert exc_info.value.status_code == 400
+
+
+class TestBuildListQuery:
+    def test_date_only_upper_bound(self):
+        params = api.routers.expenses.ExpenseListQuery(
+            from_date="2024-05-01", to_date="2024-05-31"
+        )
+        query = api.routers.expenses.build_list_query("user", params)
+        # Expenses later on the last day are included
+        assert query["date"] == {
+            "$gte": datetime(2024, 5, 1),
+            "$lte": datetime(2024, 5, 31, 23, 59, 59, 999999),
+        }
+
+    def test_datetime_upper_bound(self):
+        params = api.routers.expenses.ExpenseListQuery(
+            end_date="2024-05-31T12:00:00"
+        )
+        query = api.routers.expenses.build_list_query("user", params)
+        assert query["date"] == {"$lte": datetime(2024, 5, 31, 12)}
+
 
 @pytest.mark.anyio
 class TestExpenseUpdate:
@@ -823,6 +1151,43 @@ class TestExpenseDeleteAllWithMultipleScenarios:
         updated_balance = response.json()["account"]["balance"]
         assert updated_balance == initial_balance
 
+    async def test_mixed_currencies_single_account(
+        self, async_client_auth: AsyncClient
+    ):
+        """
+        Test that expenses in another currency are refunded converted.
+        """
+        initial_balance = 500.0
+        account_response = await async_client_auth.post(
+            "/accounts/",
+            json={
+                "name": "Checking 812",
+                "balance": initial_balance,
+                "currency": "USD",
+            },
+        )
+        assert account_response.status_code == 200, account_response.json()
+        account_id = account_response.json()["account_id"]
+
+        for currency in ("USD", "EUR", "EUR"):
+            response = await async_client_auth.post(
+                "/expenses/",
+                json={
+                    "amount": 50.0,
+                    "currency": currency,
+                    "category": "Groceries",
+                    "account_name": "Checking 812",
+                },
+            )
+            assert response.status_code == 200, response.json()
+
+        delete_response = await async_client_auth.delete("/expenses/all")
+        assert delete_response.status_code == 200, delete_response.json()
+
+        response = await async_client_auth.get(f"/accounts/{account_id}")
+        updated_balance = response.json()["account"]["balance"]
+        assert updated_balance == pytest.approx(initial_balance)
+
     async def test_many_expenses_single_account(
         self, async_client_auth: AsyncClient
     ):
@@ -976,6 +1341,86 @@ class TestExpenseDeleteAllWithMultipleScenarios:
         assert response.json()["detail"] == "No expenses found to delete"
 
 
+@pytest.mark.anyio
+@patch("api.utils.db.MONGO_TRANSACTIONS", False)
+@patch("api.routers.expenses.bump_data_version", new_callable=AsyncMock)
+@patch("api.routers.expenses.verify_token", new_callable=AsyncMock)
+@patch("api.routers.expenses.accounts_collection")
+@patch("api.routers.expenses.expenses_collection")
+class TestDeleteAllExpenses:
+    """Deleting all expenses without transactions."""
+
+    @staticmethod
+    def setup_mocks(mock_expenses, mock_accounts, mock_token):
+        mock_token.return_value = "user"
+        group_ids = [ObjectId(), ObjectId()]
+        day = datetime(2024, 1, 2)
+        mock_expenses.aggregate.return_value.to_list = AsyncMock(
+            return_value=[
+                {
+                    "_id": {
+                        "account_name": "Checking",
+                        "currency": "USD",
+                        "day": day,
+                        "category": "Food",
+                    },
+                    "total": 12.0,
+                    "count": 2,
+                    "ids": group_ids,
+                }
+            ]
+        )
+
+        async def find(query, session=None):
+            yield {**ACCOUNTS["Checking"], "currency": "USD"}
+
+        mock_accounts.find = find
+        mock_accounts.bulk_write = AsyncMock()
+        return group_ids
+
+    @patch("api.routers.expenses.apply_rollup_deltas", new_callable=AsyncMock)
+    async def test_deletes_summed_expenses(
+        self, mock_rollups, mock_expenses, mock_accounts, mock_token, _
+    ):
+        ids = self.setup_mocks(mock_expenses, mock_accounts, mock_token)
+        mock_expenses.delete_many = AsyncMock(
+            return_value=AsyncMock(deleted_count=2)
+        )
+
+        response = await api.routers.expenses.delete_all_expenses("token")
+
+        assert response == {"message": "2 expenses deleted successfully"}
+        # Expenses added after the aggregation are kept
+        mock_expenses.delete_many.assert_awaited_once_with(
+            {"user_id": "user", "_id": {"$in": ids}}, session=None
+        )
+        refund = mock_accounts.bulk_write.call_args[0][0][0]
+        assert refund._doc == {"$inc": {"balance": 12.0}}
+        mock_rollups.assert_awaited_once_with(
+            "user",
+            {("user", datetime(2024, 1, 2), "Food", "USD"): [-12.0, -2]},
+            session=None,
+        )
+
+    async def test_undo_refunds_when_delete_fails(
+        self, mock_expenses, mock_accounts, mock_token, mock_bump
+    ):
+        self.setup_mocks(mock_expenses, mock_accounts, mock_token)
+        mock_expenses.delete_many = AsyncMock(
+            side_effect=PyMongoError("connection lost")
+        )
+
+        with pytest.raises(PyMongoError):
+            await api.routers.expenses.delete_all_expenses("token")
+
+        refund, undo = [
+            c.args[0][0]._doc for c in mock_accounts.bulk_write.await_args_list
+        ]
+        assert refund == {"$inc": {"balance": 12.0}}
+        assert undo == {"$inc": {"balance": -12.0}}
+        mock_bump.assert_not_awaited()
+
+
 @pytest.mark.anyio
 async def test_currency_conversion(async_client_auth: AsyncClient):
     response = await async_client_auth.post(
@@ -0,0 +1,197 @@
+import asyncio
+import datetime
+import os
+
+import pytest
+from fastapi import HTTPException, Response
+from fastapi.responses import StreamingResponse
+
+from api.utils.export_jobs import (
+    DONE,
+    FAILED,
+    RUNNING,
+    ExportJobManager,
+    job_status,
+)
+
+USER_ID = "60d5ec9877c9e9c8c7a8b4e6"
+
+
+class MockCollection:
+    """In-memory stand-in for the export jobs collection."""
+
+    def __init__(self):
+        self.jobs = {}
+
+    async def insert_one(self, document):
+        self.jobs[document["_id"]] = dict(document)
+
+    async def update_one(self, query, update):
+        if query["_id"] in self.jobs:
+            self.jobs[query["_id"]].update(update["$set"])
+
+    async def find_one(self, query):
+        job = self.jobs.get(query["_id"])
+        if (
+            job is None
+            or job["user_id"] != query["user_id"]
+            or job["expires_at"] <= query["expires_at"]["$gt"]
+        ):
+            return None
+        return dict(job)
+
+
+def make_manager(tmp_path, collection=None):
+    return ExportJobManager(
+        collection or MockCollection(), str(tmp_path), workers=1, ttl=60
+    )
+
+
+async def wait_for(manager, job):
+    while (await manager.get(job["_id"], USER_ID))["status"] not in (
+        DONE,
+        FAILED,
+    ):
+        await asyncio.sleep(0.01)
+    return await manager.get(job["_id"], USER_ID)
+
+
+@pytest.mark.anyio
+class TestExportJobManager:
+    """Test suite for the ExportJobManager class."""
+
+    async def test_job_writes_artifact(self, tmp_path):
+        manager = make_manager(tmp_path)
+
+        async def run():
+            return Response(content=b"%PDF", media_type="application/pdf")
+
+        job = await manager.submit(
+            USER_ID, "pdf", "data.pdf", "application/pdf", run
+        )
+        assert job_status(job)["status"] == "pending"
+        job = await wait_for(manager, job)
+
+        assert job["status"] == DONE
+        with open(job["path"], "rb") as file:
+            assert file.read() == b"%PDF"
+
+    async def test_job_seen_by_other_manager(self, tmp_path):
+        collection = MockCollection()
+        manager = make_manager(tmp_path, collection)
+
+        async def run():
+            return Response(content=b"data")
+
+        job = await wait_for(
+            manager,
+            await manager.submit(
+                USER_ID, "pdf", "data.pdf", "application/pdf", run
+            ),
+        )
+
+        # Another API worker shares the collection and the directory
+        other = make_manager(tmp_path, collection)
+        assert (await other.get(job["_id"], USER_ID))["path"] == job["path"]
+
+    async def test_streaming_artifact(self, tmp_path):
+        manager = make_manager(tmp_path)
+
+        async def rows():
+            yield "a,b\n"
+            yield "1,2\n"
+
+        async def run():
+            return StreamingResponse(rows(), media_type="text/csv")
+
+        job = await manager.submit(USER_ID, "csv", "data.csv", "text/csv", run)
+        job = await wait_for(manager, job)
+
+        with open(job["path"], "rb") as file:
+            assert file.read() == b"a,b\n1,2\n"
+
+    async def test_failed_job(self, tmp_path):
+        manager = make_manager(tmp_path)
+
+        async def run():
+            raise HTTPException(status_code=404, detail="No data found")
+
+        job = await manager.submit(
+            USER_ID, "pdf", "data.pdf", "application/pdf", run
+        )
+        job = await wait_for(manager, job)
+
+        assert job["status"] == FAILED
+        assert job["status_code"] == 404
+        assert job_status(job)["detail"] == "No data found"
+
+    async def test_interrupted_job(self, tmp_path):
+        manager = make_manager(tmp_path)
+        started = asyncio.Event()
+
+        async def run():
+            started.set()
+            await asyncio.sleep(60)
+
+        job = await manager.submit(
+            USER_ID, "pdf", "data.pdf", "application/pdf", run
+        )
+        await started.wait()
+        assert (await manager.get(job["_id"], USER_ID))["status"] == RUNNING
+        await manager.shutdown()
+
+        job = await manager.get(job["_id"], USER_ID)
+        assert job["status"] == FAILED
+        assert job["status_code"] == 503
+
+    async def test_job_of_other_user(self, tmp_path):
+        manager = make_manager(tmp_path)
+
+        async def run():
+            return Response(content=b"")
+
+        job = await manager.submit(
+            USER_ID, "pdf", "data.pdf", "application/pdf", run
+        )
+        assert await manager.get(job["_id"], "someone-else") is None
+        await manager.shutdown()
+
+    async def test_expired_jobs_are_removed(self, tmp_path):
+        collection = MockCollection()
+        manager = make_manager(tmp_path, collection)
+
+        async def run():
+            return Response(content=b"data")
+
+        job = await wait_for(
+            manager,
+            await manager.submit(
+                USER_ID, "pdf", "data.pdf", "application/pdf", run
+            ),
+        )
+        collection.jobs[job["_id"]]["expires_at"] -= datetime.timedelta(
+            seconds=120
+        )
+        os.utime(job["path"], (0, 0))
+        fresh = tmp_path / "fresh.export"
+        fresh.write_bytes(b"new")
+
+        assert await manager.get(job["_id"], USER_ID) is None
+        assert manager.cleanup() == 1
+        assert not os.path.exists(job["path"])
+        assert fresh.exists()
+
+    async def test_sweeper_runs_in_background(self, tmp_path):
+        manager = make_manager(tmp_path)
+        stale = tmp_path / "old.export"
+        stale.write_bytes(b"old")
+        os.utime(stale, (0, 0))
+
+        manager.start()
+        for _ in range(100):
+            if not stale.exists():
+                break
+            await asyncio.sleep(0.01)
+        await manager.shutdown()
+
+        assert not stale.exists()
@@ -1,11 +1,22 @@
+import asyncio
 import datetime
+from io import BytesIO
 
 import pytest
 from bson import ObjectId
 from fastapi import HTTPException
 from fastapi.testclient import TestClient
+from openpyxl import Workbook, load_workbook
 
 from api.app import app
+from api.routers.exports import (
+    create_expense_tables,
+    get_pdf_styles,
+    load_logo,
+    server_timing,
+    stream_expenses_csv,
+    write_expense_cursor_to_sheet,
+)
 from api.utils.db import fetch_data
 
 client = TestClient(app)
@@ -16,10 +27,23 @@ def mock_db(monkeypatch):
     class MockCursor:
         def __init__(self, data):
             self.data = data
+            self.remaining = iter(data)
 
         async def to_list(self, length):
             return self.data
 
+        def batch_size(self, size):
+            return self
+
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            try:
+                return next(self.remaining)
+            except StopIteration:
+                raise StopAsyncIteration from None
+
     class MockCollection:
         def __init__(self, data):
             self.data = data
@@ -79,10 +103,23 @@ def mock_db_no_data(monkeypatch):
     class MockCursor:
         def __init__(self, data):
             self.data = data
+            self.remaining = iter(data)
 
         async def to_list(self, length):
             return self.data
 
+        def batch_size(self, size):
+            return self
+
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            try:
+                return next(self.remaining)
+            except StopIteration:
+                raise StopAsyncIteration from None
+
     class MockCollection:
         def __init__(self, data):
             self.data = data
@@ -109,10 +146,23 @@ def mock_db_no_accounts(monkeypatch):
     class MockCursor:
         def __init__(self, data):
             self.data = data
+            self.remaining = iter(data)
 
         async def to_list(self, length):
             return self.data
 
+        def batch_size(self, size):
+            return self
+
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            try:
+                return next(self.remaining)
+            except StopIteration:
+                raise StopAsyncIteration from None
+
     class MockCollection:
         def __init__(self, data):
             self.data = data
@@ -162,10 +212,23 @@ def mock_db_no_categories(monkeypatch):
     class MockCursor:
         def __init__(self, data):
             self.data = data
+            self.remaining = iter(data)
 
         async def to_list(self, length):
             return self.data
 
+        def batch_size(self, size):
+            return self
+
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            try:
+                return next(self.remaining)
+            except StopIteration:
+                raise StopAsyncIteration from None
+
     class MockCollection:
         def __init__(self, data):
             self.data = data
@@ -452,6 +515,107 @@ class TestCSVExport:
         assert response.status_code == 422
 
 
+class AsyncCursor:
+    def __init__(self, data):
+        self.remaining = iter(data)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self.remaining)
+        except StopIteration:
+            raise StopAsyncIteration from None
+
+
+def make_expenses(count):
+    return [
+        {
+            "_id": ObjectId(),
+            "date": datetime.datetime(2023, 1, day),
+            "amount": day,
+            "currency": "USD",
+            "category": "Food",
+            "account_name": "Checking",
+        }
+        for day in range(1, count + 1)
+    ]
+
+
+@pytest.mark.anyio
+async def test_write_expense_cursor_to_write_only_sheet(monkeypatch):
+    monkeypatch.setattr("api.routers.exports.EXPORT_BATCH_SIZE", 2)
+
+    expenses = make_expenses(5)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title="Expenses")
+
+    await write_expense_cursor_to_sheet(
+        sheet, expenses[0], AsyncCursor(expenses[1:])
+    )
+
+    output = BytesIO()
+    workbook.save(output)
+    rows = list(load_workbook(output).active.values)
+    assert rows[0][0] == "date"
+    assert [row[1] for row in rows[1:]] == [1, 2, 3, 4, 5]
+
+
+@pytest.mark.anyio
+async def test_stream_expenses_csv_chunks(monkeypatch):
+    monkeypatch.setattr("api.routers.exports.EXPORT_BATCH_SIZE", 2)
+
+    expenses = make_expenses(5)
+    chunks = [
+        chunk
+        async for chunk in stream_expenses_csv(
+            expenses[0], AsyncCursor(expenses[1:])
+        )
+    ]
+
+    assert len(chunks) == 3
+    lines = "".join(chunks).splitlines()
+    assert (
+        lines[0]
+        == "date,amount,currency,category,description,account_name,_id"
+    )
+    assert len(lines) == 6
+    assert lines[5].startswith("2023-01-05,5,USD,Food,,Checking,")
+
+
+@pytest.mark.anyio
+async def test_expense_tables_include_every_expense(monkeypatch):
+    monkeypatch.setattr("api.routers.exports.EXPORT_BATCH_SIZE", 2)
+    style = get_pdf_styles()[0]["Normal"]
+
+    expenses = make_expenses(5)
+    tables = await create_expense_tables(
+        expenses[0], AsyncCursor(expenses[1:]), style
+    )
+
+    # Each table repeats the header above its batch of rows
+    assert [len(table._cellvalues) for table in tables] == [3, 3, 2]
+    assert [table._cellvalues[1][1] for table in tables] == [1, 3, 5]
+
+    (empty,) = await create_expense_tables(None, AsyncCursor([]), style)
+    assert len(empty._cellvalues) == 1
+
+
+def test_server_timing_header():
+    assert (
+        server_timing({"fetch": 0.0123, "build": 1.5})
+        == "fetch;dur=12.3, build;dur=1500.0"
+    )
+
+
+def test_pdf_assets_are_cached():
+    assert load_logo() is load_logo()
+    assert get_pdf_styles() is get_pdf_styles()
+    _, width, height = load_logo()
+    assert width > 0 and height > 0
+
+
 @pytest.mark.anyio
 class TestPDFExport:
     async def test_data_to_pdf(self, mock_db, async_client_auth):
@@ -464,6 +628,7 @@ class TestPDFExport:
             response.headers["Content-Disposition"]
             == "attachment; filename=data.pdf"
         )
+        assert "charts;dur=" in response.headers["Server-Timing"]
 
     async def test_data_to_pdf_no_data(
         self, mock_db_no_data, async_client_auth
@@ -541,3 +706,60 @@ class TestPDFExport:
             response.headers["Content-Disposition"]
             == "attachment; filename=data.pdf"
         )
+
+
+@pytest.mark.anyio
+class TestExportJobs:
+    async def wait_for_job(self, async_client_auth, job_id):
+        for _ in range(100):
+            response = await async_client_auth.get(f"/exports/jobs/{job_id}")
+            if response.status_code != 202:
+                return response
+            await asyncio.sleep(0.1)
+        raise AssertionError("Export job did not finish")
+
+    async def test_pdf_job(self, mock_db, async_client_auth):
+        response = await async_client_auth.post(
+            "/exports/jobs",
+            json={"format": "pdf", "from_date": "2023-01-01"},
+        )
+        assert response.status_code == 202
+        assert response.json()["status"] == "pending"
+
+        response = await self.wait_for_job(
+            async_client_auth, response.json()["job_id"]
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/pdf"
+
+    async def test_csv_job(self, mock_db, async_client_auth):
+        response = await async_client_auth.post(
+            "/exports/jobs",
+            json={"format": "csv", "export_type": "expenses"},
+        )
+        response = await self.wait_for_job(
+            async_client_auth, response.json()["job_id"]
+        )
+        assert response.status_code == 200
+        assert response.text.startswith("date,amount")
+
+    async def test_csv_job_without_type(self, mock_db, async_client_auth):
+        response = await async_client_auth.post(
+            "/exports/jobs", json={"format": "csv"}
+        )
+        assert response.status_code == 422
+
+    async def test_failed_job(self, mock_db_no_data, async_client_auth):
+        response = await async_client_auth.post(
+            "/exports/jobs", json={"format": "xlsx"}
+        )
+        response = await self.wait_for_job(
+            async_client_auth, response.json()["job_id"]
+        )
+        assert response.status_code == 404
+        assert response.json()["detail"] == "No data found"
+
+    async def test_unknown_job(self, async_client_auth):
+        response = await async_client_auth.get("/exports/jobs/unknown")
+        assert response.status_code == 404
+        assert response.json()["detail"] == "Export job not found"
@@ -0,0 +1,92 @@
+import asyncio
+import datetime
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from pymongo.errors import OperationFailure
+
+from api.utils.indexes import (
+    API_COLLECTIONS,
+    INDEXES,
+    ensure_indexes,
+    index_stats,
+)
+
+
+def make_db():
+    collections = {}
+
+    def get_collection(name):
+        if name not in collections:
+            collections[name] = MagicMock()
+            collections[name].create_indexes = AsyncMock(
+                return_value=[
+                    index.document["name"] for index in INDEXES[name]
+                ]
+            )
+        return collections[name]
+
+    db = MagicMock()
+    db.__getitem__.side_effect = get_collection
+    return db, collections
+
+
+@pytest.mark.anyio
+class TestIndexes:
+    """Test suite for the index manager."""
+
+    async def test_ensure_api_indexes(self):
+        db, collections = make_db()
+
+        ensured = await ensure_indexes(db, API_COLLECTIONS)
+
+        assert set(ensured) == set(API_COLLECTIONS)
+        assert "telegram_bot" not in collections
+        assert "expires_at_ttl" in ensured["tokens"]
+
+    async def test_ensure_indexes_logs_failures(self):
+        db, collections = make_db()
+        db["accounts"].create_indexes.side_effect = OperationFailure(
+            "duplicate key"
+        )
+
+        ensured = await ensure_indexes(db, ["accounts", "users"])
+
+        assert list(ensured) == ["users"]
+
+    async def test_ensure_indexes_timeout(self):
+        db, _ = make_db()
+
+        async def hang(indexes):
+            await asyncio.sleep(60)
+
+        db["users"].create_indexes.side_effect = hang
+
+        assert await ensure_indexes(db, ["users", "accounts"], 0.05) == {}
+
+    async def test_index_stats(self):
+        db, _ = make_db()
+        since = datetime.datetime(2024, 1, 1)
+        db["users"].aggregate.return_value.to_list = AsyncMock(
+            return_value=[
+                {
+                    "name": "username",
+                    "key": {"username": 1},
+                    "accesses": {"ops": 42, "since": since},
+                }
+            ]
+        )
+
+        stats = await index_stats(db, ["users"])
+
+        db["users"].aggregate.assert_called_once_with([{"$indexStats": {}}])
+        assert stats == {
+            "users": [
+                {
+                    "name": "username",
+                    "key": {"username": 1},
+                    "ops": 42,
+                    "since": since,
+                }
+            ]
+        }
@@ -0,0 +1,461 @@
+import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+from httpx import AsyncClient
+from pymongo.errors import DuplicateKeyError
+
+from api.routers.ledger import LedgerEntry, LedgerOperation, check_balanced
+from api.utils import ledger
+from api.utils.ledger import Posting, apply_postings
+
+USER_ID = "60d5ec9877c9e9c8c7a8b4e6"
+OTHER_USER_ID = "60d5ec9877c9e9c8c7a8b4e7"
+DATE = datetime.datetime(2024, 1, 2, 12)
+
+
+def account(user_id, balance, name="Checking"):
+    return {
+        "_id": ObjectId(),
+        "user_id": user_id,
+        "name": name,
+        "balance": balance,
+        "currency": "USD",
+    }
+
+
+def expense(amount):
+    return {
+        "amount": amount,
+        "currency": "USD",
+        "category": "Food",
+        "description": "Dinner",
+        "date": DATE,
+    }
+
+
+@pytest.fixture
+def collections():
+    with patch.object(
+        ledger, "ledger_collection"
+    ) as mock_ledger, patch.object(
+        ledger, "expenses_collection"
+    ) as mock_expenses, patch.object(
+        ledger, "accounts_collection"
+    ) as mock_accounts, patch.object(
+        ledger, "adjust_balance", new=AsyncMock(return_value={})
+    ) as mock_adjust, patch.object(
+        ledger, "update_rollups", new=AsyncMock()
+    ) as mock_rollups, patch.object(
+        ledger, "bump_data_version", new=AsyncMock()
+    ):
+        mock_ledger.insert_one = AsyncMock(
+            return_value=MagicMock(inserted_id="record")
+        )
+        mock_ledger.update_one = AsyncMock()
+        mock_ledger.delete_one = AsyncMock()
+        mock_ledger.find_one = AsyncMock(return_value=None)
+        mock_ledger.find_one_and_update = AsyncMock(return_value=None)
+        mock_expenses.insert_many = AsyncMock()
+        mock_expenses.delete_many = AsyncMock()
+        mock_accounts.bulk_write = AsyncMock()
+        yield {
+            "ledger": mock_ledger,
+            "expenses": mock_expenses,
+            "accounts": mock_accounts,
+            "adjust": mock_adjust,
+            "rollups": mock_rollups,
+        }
+
+
+@pytest.mark.anyio
+class TestApplyPostings:
+    """Test suite for the apply_postings function."""
+
+    async def test_split(self, collections):
+        first = account(USER_ID, 100)
+        second = account(OTHER_USER_ID, 100)
+
+        result = await apply_postings(
+            USER_ID,
+            "split-1",
+            [
+                Posting(USER_ID, first, -15, expense(15)),
+                Posting(OTHER_USER_ID, second, -15, expense(15)),
+            ],
+        )
+
+        assert collections["adjust"].await_count == 2
+        expenses = collections["expenses"].insert_many.call_args[0][0]
+        assert [e["user_id"] for e in expenses] == [USER_ID, OTHER_USER_ID]
+        assert all(e["account_name"] == "Checking" for e in expenses)
+        assert result["expense_ids"] == [str(e["_id"]) for e in expenses]
+        assert collections["rollups"].await_count == 2
+        # The result is stored for repetitions of the key
+        collections["ledger"].update_one.assert_awaited_once_with(
+            {"_id": "record"}, {"$set": {"result": result}}, session=None
+        )
+
+    async def test_nets_changes_per_account(self, collections):
+        checking = account(USER_ID, 5)
+
+        await apply_postings(
+            USER_ID,
+            "transfer-1",
+            [Posting(USER_ID, checking, -10), Posting(USER_ID, checking, 8)],
+        )
+
+        collections["adjust"].assert_awaited_once_with(checking["_id"], -2)
+        collections["expenses"].insert_many.assert_not_called()
+
+    async def test_insufficient_balance(self, collections):
+        with pytest.raises(HTTPException) as e:
+            await apply_postings(
+                USER_ID,
+                "split-2",
+                [Posting(USER_ID, account(USER_ID, 10, "Cash"), -15)],
+            )
+
+        assert e.value.status_code == 400
+        assert e.value.detail == "Insufficient balance in Cash account"
+        collections["adjust"].assert_not_called()
+        # The key is released for a retry
+        collections["ledger"].delete_one.assert_awaited_once_with(
+            {"_id": "record"}
+        )
+
+    async def test_undoes_applied_changes(self, collections):
+        first = account(USER_ID, 100)
+        second = account(OTHER_USER_ID, 100)
+        # The second debit loses a race against another request
+        collections["adjust"].side_effect = [{}, None, {}]
+
+        with pytest.raises(HTTPException):
+            await apply_postings(
+                USER_ID,
+                "split-3",
+                [
+                    Posting(USER_ID, first, -15, expense(15)),
+                    Posting(OTHER_USER_ID, second, -15, expense(15)),
+                ],
+            )
+
+        collections["adjust"].assert_awaited_with(first["_id"], 15)
+        collections["expenses"].insert_many.assert_not_called()
+        collections["ledger"].delete_one.assert_awaited_once()
+
+    async def test_repeated_key(self, collections):
+        stored = {"message": "Ledger operation applied", "key": "split-4"}
+        collections["ledger"].insert_one.side_effect = DuplicateKeyError(
+            "duplicate key"
+        )
+        collections["ledger"].find_one.return_value = {"result": stored}
+
+        result = await apply_postings(
+            USER_ID, "split-4", [Posting(USER_ID, account(USER_ID, 100), -5)]
+        )
+
+        assert result == stored
+        collections["adjust"].assert_not_called()
+
+    async def test_key_in_progress(self, collections):
+        collections["ledger"].insert_one.side_effect = DuplicateKeyError(
+            "duplicate key"
+        )
+        collections["ledger"].find_one.return_value = {"key": "split-5"}
+
+        with pytest.raises(HTTPException) as e:
+            await apply_postings(
+                USER_ID,
+                "split-5",
+                [Posting(USER_ID, account(USER_ID, 100), -5)],
+            )
+
+        assert e.value.status_code == 409
+        collections["adjust"].assert_not_called()
+        # A failed request must not release a key it does not hold
+        collections["ledger"].delete_one.assert_not_called()
+
+    async def test_takes_over_abandoned_key(self, collections):
+        collections["ledger"].insert_one.side_effect = DuplicateKeyError(
+            "duplicate key"
+        )
+        # The request holding the key crashed and its lease has passed
+        collections["ledger"].find_one_and_update.return_value = {
+            "_id": "abandoned"
+        }
+
+        await apply_postings(
+            USER_ID, "split-6", [Posting(USER_ID, account(USER_ID, 100), -5)]
+        )
+
+        query = collections["ledger"].find_one_and_update.call_args[0][0]
+        assert query["result"] == {"$exists": False}
+        assert "$lte" in query["lease_until"]
+        collections["adjust"].assert_awaited_once()
+        assert collections["ledger"].update_one.call_args[0][0] == {
+            "_id": "abandoned"
+        }
+
+    async def test_without_key(self, collections):
+        await apply_postings(
+            USER_ID, None, [Posting(USER_ID, account(USER_ID, 100), -5)]
+        )
+
+        collections["adjust"].assert_awaited_once()
+        collections["ledger"].insert_one.assert_not_called()
+        collections["ledger"].update_one.assert_not_called()
+
+    async def test_transaction_bulk_write(self, collections):
+        session = MagicMock()
+
+        async def run_transaction(callback):
+            return await callback(session)
+
+        first = account(USER_ID, 100)
+        second = account(OTHER_USER_ID, 0)
+        collections["accounts"].bulk_write.return_value = MagicMock(
+            matched_count=1
+        )
+
+        with patch.object(ledger, "run_transaction", new=run_transaction):
+            with pytest.raises(HTTPException) as e:
+                await apply_postings(
+                    USER_ID,
+                    "transfer-2",
+                    [
+                        Posting(USER_ID, first, -20),
+                        Posting(OTHER_USER_ID, second, 20),
+                    ],
+                )
+
+        # Both accounts in one bulk write, the debit only if covered
+        operations = collections["accounts"].bulk_write.call_args[0][0]
+        assert [op._filter for op in operations] == [
+            {"_id": first["_id"], "balance": {"$gte": 20}},
+            {"_id": second["_id"]},
+        ]
+        assert e.value.status_code == 400
+        collections["adjust"].assert_not_called()
+        # The key is claimed outside of the transaction and released
+        assert "session" not in collections["ledger"].insert_one.call_args[1]
+        collections["ledger"].delete_one.assert_awaited_once_with(
+            {"_id": "record"}
+        )
+
+
+def entry(amount, currency="USD", category=None):
+    return LedgerEntry(amount=amount, currency=currency, category=category)
+
+
+class TestCheckBalanced:
+    """Test suite for the check_balanced function."""
+
+    def test_transfer_nets_to_zero(self):
+        # The 5 USD credited are worth 10 EUR, the currency of the first entry
+        with patch(
+            "api.routers.ledger.currency_service.convert",
+            side_effect=lambda amount, *_: amount * 2,
+        ):
+            check_balanced(
+                LedgerOperation(debits=[entry(10, "EUR")], credits=[entry(5)])
+            )
+
+    def test_uncovered_credit(self):
+        with pytest.raises(HTTPException) as e:
+            check_balanced(
+                LedgerOperation(debits=[entry(10)], credits=[entry(15)])
+            )
+
+        assert e.value.status_code == 400
+        assert e.value.detail == "Credits must be covered by debits"
+
+    def test_credit_only(self):
+        with pytest.raises(HTTPException) as e:
+            check_balanced(LedgerOperation(credits=[entry(5)]))
+
+        assert e.value.status_code == 400
+
+    def test_unmatched_debit(self):
+        with pytest.raises(HTTPException) as e:
+            check_balanced(
+                LedgerOperation(debits=[entry(10)], credits=[entry(5)])
+            )
+
+        assert e.value.status_code == 400
+
+    def test_expenses_may_exceed_credits(self):
+        # Two friends pay back 10 each of a dinner, 10 is their own share
+        check_balanced(
+            LedgerOperation(
+                debits=[
+                    entry(10, category="Food"),
+                    entry(10, category="Food"),
+                ],
+                credits=[entry(10)],
+            )
+        )
+
+
+@pytest.mark.anyio
+class TestLedgerMulti:
+    """Test suite for the POST /ledger/multi endpoint."""
+
+    async def test_missing_key(self, async_client_auth: AsyncClient):
+        response = await async_client_auth.post(
+            "/ledger/multi",
+            json={"debits": [{"amount": 5, "currency": "USD"}]},
+        )
+        assert response.status_code == 422
+
+    async def test_nothing_to_apply(self, async_client_auth: AsyncClient):
+        response = await async_client_auth.post(
+            "/ledger/multi",
+            json={},
+            headers={"Idempotency-Key": "empty"},
+        )
+        assert response.status_code == 400
+
+    async def test_debit_of_other_user(self, async_client_auth: AsyncClient):
+        response = await async_client_auth.post(
+            "/ledger/multi",
+            json={
+                "debits": [
+                    {"amount": 5, "currency": "USD", "user_id": OTHER_USER_ID}
+                ]
+            },
+            headers={"Idempotency-Key": "other-user"},
+        )
+        assert response.status_code == 403
+
+    async def test_uncovered_credit(self, async_client_auth: AsyncClient):
+        response = await async_client_auth.post(
+            "/ledger/multi",
+            json={"credits": [{"amount": 5, "currency": "USD"}]},
+            headers={"Idempotency-Key": "mint"},
+        )
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Credits must be covered by debits"
+
+    async def test_failed_operation_releases_key(
+        self, async_client_auth: AsyncClient
+    ):
+        headers = {"Idempotency-Key": "move-1"}
+
+        def operation(amount):
+            return {
+                "debits": [{"amount": amount, "currency": "USD"}],
+                "credits": [
+                    {
+                        "amount": amount,
+                        "currency": "USD",
+                        "account_name": "Savings",
+                    }
+                ],
+            }
+
+        failed = await async_client_auth.post(
+            "/ledger/multi", json=operation(10**9), headers=headers
+        )
+        retried = await async_client_auth.post(
+            "/ledger/multi", json=operation(5), headers=headers
+        )
+
+        assert failed.status_code == 400
+        assert retried.status_code == 200, retried.json()
+        assert retried.json()["expense_ids"] == []
+
+    async def test_expense_applied_once(self, async_client_auth: AsyncClient):
+        await async_client_auth.post(
+            "/categories/", json={"name": "Ledger", "monthly_budget": 100}
+        )
+        before = await async_client_auth.get("/accounts/")
+        operation = {
+            "debits": [
+                {
+                    "amount": 10,
+                    "currency": "USD",
+                    "category": "Ledger",
+                    "description": "Split dinner",
+                }
+            ]
+        }
+        headers = {"Idempotency-Key": "dinner-1"}
+
+        first = await async_client_auth.post(
+            "/ledger/multi", json=operation, headers=headers
+        )
+        second = await async_client_auth.post(
+            "/ledger/multi", json=operation, headers=headers
+        )
+
+        assert first.status_code == 200, first.json()
+        assert second.json() == first.json()
+        (expense_id,) = first.json()["expense_ids"]
+        response = await async_client_auth.get(f"/expenses/{expense_id}")
+        assert response.json()["category"] == "Ledger"
+
+        after = await async_client_auth.get("/accounts/")
+        balance = {a["name"]: a["balance"] for a in before.json()["accounts"]}[
+            "Checking"
+        ]
+        assert {a["name"]: a["balance"] for a in after.json()["accounts"]}[
+            "Checking"
+        ] == balance - 10
+
+
+@pytest.mark.anyio
+class TestTransferToUser:
+    """Test suite for the POST /users/transfer-to-user endpoint."""
+
+    async def test_retry_answered_first(self, async_client_auth: AsyncClient):
+        user = await async_client_auth.get("/users/")
+        before = await async_client_auth.get("/accounts/")
+
+        def transfer(amount):
+            return async_client_auth.post(
+                "/users/transfer-to-user",
+                json={
+                    "destination_account": user.json()["_id"],
+                    "destination_account_name": "Savings",
+                    "amount": amount,
+                },
+                headers={"Idempotency-Key": "transfer-1"},
+            )
+
+        first = await transfer(20)
+        # The retry is answered although the balance no longer covers it
+        retried = await transfer(10**9)
+
+        assert first.status_code == 200, first.json()
+        assert retried.status_code == 200, retried.json()
+        after = await async_client_auth.get("/accounts/")
+        balances = {a["name"]: a["balance"] for a in before.json()["accounts"]}
+        assert {a["name"]: a["balance"] for a in after.json()["accounts"]} == {
+            **balances,
+            "Checking": balances["Checking"] - 20,
+            "Savings": balances["Savings"] + 20,
+        }
+
+    async def test_without_key_not_recorded(
+        self, async_client_auth: AsyncClient
+    ):
+        from api.utils.db import ledger_collection
+
+        user = await async_client_auth.get("/users/")
+        query = {"user_id": user.json()["_id"]}
+        records = await ledger_collection.count_documents(query)
+
+        response = await async_client_auth.post(
+            "/users/transfer-to-user",
+            json={
+                "destination_account": user.json()["_id"],
+                "destination_account_name": "Savings",
+                "amount": 1,
+            },
+        )
+
+        assert response.status_code == 200, response.json()
+        assert await ledger_collection.count_documents(query) == records
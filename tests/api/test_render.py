@@ -0,0 +1,56 @@
+import pytest
+
+from api.utils.plots import create_category_bar, create_expense_bar
+from api.utils.render import RenderExecutor
+
+
+def failing_chart(*_):
+    raise ValueError("boom")
+
+
+@pytest.mark.anyio
+class TestRenderExecutor:
+    """Test suite for the RenderExecutor class."""
+
+    async def test_render_in_thread(self):
+        executor = RenderExecutor(workers=0)
+        buf = await executor.render(
+            create_expense_bar, ["2023-01-01"], [10.0], None, None
+        )
+
+        assert buf.getvalue().startswith(b"\x89PNG")
+        stats = executor.stats()
+        assert stats["completed"] == 1
+        assert stats["in_flight"] == 0
+        assert stats["avg_render_ms"] > 0
+
+    async def test_render_in_process_pool(self):
+        executor = RenderExecutor(workers=1)
+        try:
+            buf = await executor.render(
+                create_category_bar, ["Food", "Rent"], [5.0, 700.0]
+            )
+        finally:
+            executor.shutdown()
+
+        assert buf.getvalue().startswith(b"\x89PNG")
+        assert executor.stats()["max_in_flight"] == 1
+
+    def test_workers_are_spawned(self):
+        executor = RenderExecutor(workers=1)
+        executor.start()
+        try:
+            # Forking the threaded server process could deadlock
+            context = executor._executor._mp_context
+            assert context.get_start_method() == "spawn"
+        finally:
+            executor.shutdown()
+
+    async def test_render_failure(self):
+        executor = RenderExecutor(workers=0)
+        with pytest.raises(ValueError):
+            await executor.render(failing_chart)
+
+        stats = executor.stats()
+        assert stats["failed"] == 1
+        assert stats["in_flight"] == 0
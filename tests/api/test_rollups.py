@@ -0,0 +1,106 @@
+import datetime
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from api.utils.rollups import rebuild_rollups, rollup_day, update_rollups
+
+USER_ID = "60d5ec9877c9e9c8c7a8b4e6"
+DAY = datetime.datetime(2024, 1, 2)
+
+
+def expense(amount, category="Food", currency="USD", hour=12):
+    return {
+        "amount": amount,
+        "category": category,
+        "currency": currency,
+        "date": DAY.replace(hour=hour),
+    }
+
+
+def test_rollup_day():
+    assert rollup_day(datetime.datetime(2024, 1, 2, 23, 59)) == DAY
+    # Aware dates roll up on their UTC day
+    ist = datetime.timezone(datetime.timedelta(hours=5, minutes=30))
+    assert rollup_day(datetime.datetime(2024, 1, 3, 2, tzinfo=ist)) == DAY
+
+
+@pytest.mark.anyio
+@patch("api.utils.rollups.rollups_collection")
+class TestUpdateRollups:
+    """Test suite for the update_rollups function."""
+
+    async def test_merges_changes(self, mock_rollups):
+        mock_rollups.bulk_write = AsyncMock()
+        mock_rollups.delete_many = AsyncMock()
+
+        await update_rollups(
+            USER_ID,
+            added=[expense(10), expense(5, hour=8), expense(3, "Bus")],
+        )
+
+        operations = mock_rollups.bulk_write.call_args[0][0]
+        changes = {
+            op._filter["category"]: op._doc["$inc"] for op in operations
+        }
+        assert changes == {
+            "Food": {"total": 15.0, "count": 2},
+            "Bus": {"total": 3.0, "count": 1},
+        }
+        assert operations[0]._filter == {
+            "user_id": USER_ID,
+            "day": DAY,
+            "category": "Food",
+            "currency": "USD",
+        }
+        assert all(op._upsert for op in operations)
+        mock_rollups.delete_many.assert_not_called()
+
+    async def test_update_moves_amount(self, mock_rollups):
+        mock_rollups.bulk_write = AsyncMock()
+        mock_rollups.delete_many = AsyncMock()
+
+        await update_rollups(
+            USER_ID, added=[expense(4, "Bus")], removed=[expense(10)]
+        )
+
+        operations = mock_rollups.bulk_write.call_args[0][0]
+        changes = {
+            op._filter["category"]: op._doc["$inc"] for op in operations
+        }
+        assert changes == {
+            "Bus": {"total": 4.0, "count": 1},
+            "Food": {"total": -10.0, "count": -1},
+        }
+        # Emptied rollups are removed
+        mock_rollups.delete_many.assert_awaited_once_with(
+            {"user_id": USER_ID, "count": {"$lte": 0}}, session=None
+        )
+
+    async def test_no_changes(self, mock_rollups):
+        mock_rollups.bulk_write = AsyncMock()
+
+        await update_rollups(
+            USER_ID, added=[expense(10)], removed=[expense(10)]
+        )
+        await update_rollups(USER_ID)
+
+        mock_rollups.bulk_write.assert_not_called()
+
+
+@pytest.mark.anyio
+@patch("api.utils.rollups.expenses_collection")
+@patch("api.utils.rollups.rollups_collection")
+async def test_rebuild_rollups(mock_rollups, mock_expenses):
+    mock_rollups.name = "expense_rollups"
+    mock_rollups.delete_many = AsyncMock()
+    mock_rollups.count_documents = AsyncMock(return_value=3)
+    mock_expenses.aggregate.return_value.to_list = AsyncMock(return_value=[])
+
+    assert await rebuild_rollups(USER_ID) == 3
+
+    mock_rollups.delete_many.assert_awaited_once_with({"user_id": USER_ID})
+    pipeline = mock_expenses.aggregate.call_args[0][0]
+    assert pipeline[0] == {"$match": {"user_id": USER_ID}}
+    assert pipeline[1]["$group"]["count"] == {"$sum": 1}
+    assert pipeline[-1] == {"$merge": {"into": "expense_rollups"}}
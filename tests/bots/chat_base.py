@@ -1,9 +1,18 @@
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
 from telegram import Chat, User
 
+from bots.telegram import auth
+from bots.telegram.state import MemoryStateStore, set_store
+
 
 class DummyMessage:
     def __init__(self, text):
         self.text = text
+        self.message_id = 1
+        self.date = datetime.now(timezone.utc)
         self.chat = Chat(id=12345, type="private")
         self.from_user = User(
             id=12345, first_name="Test", is_bot=False, username="testuser"
@@ -29,3 +38,41 @@ class DummyBot:
 
 class DummyContext:
     bot = DummyBot()
+
+
+def mock_api(method):
+    """Patch an HTTP method of the bot's API client with a fake response."""
+    return patch(
+        f"httpx.AsyncClient.{method}", new=AsyncMock(return_value=MagicMock())
+    )
+
+
+@pytest.fixture
+def state_store():
+    """Keep the state of group conversations in a fresh store."""
+    store = MemoryStateStore()
+    set_store(store)
+    yield store
+    set_store(None)
+
+
+@pytest.fixture
+def logins():
+    """Log Telegram users in through the session cache, without MongoDB."""
+    auth.session_cache.clear()
+
+    def log_in(*sessions):
+        for session in sessions:
+            auth.session_cache.set(session["telegram_id"], dict(session))
+
+    async def no_sessions():
+        return
+        yield
+
+    # Users not logged in through log_in have no session
+    collection = MagicMock()
+    collection.find_one = AsyncMock(return_value=None)
+    collection.find.side_effect = lambda query: no_sessions()
+    with patch.object(auth, "telegram_collection", collection):
+        yield log_in
+    auth.session_cache.clear()
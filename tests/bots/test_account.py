@@ -1,7 +1,7 @@
 from unittest.mock import AsyncMock, patch
 
 import pytest
-from chat_base import DummyContext, DummyUpdate
+from chat_base import DummyContext, DummyUpdate, mock_api
 
 from bots.telegram.accounts import (
     accounts_add,
@@ -49,7 +49,7 @@ async def test_handle_login_password():
     context = DummyContext()
     context.user_data = {"username": "testuser"}
 
-    with patch("requests.post") as mock_post:
+    with mock_api("post") as mock_post:
         mock_post.return_value.status_code = 200
         mock_post.return_value.json.return_value = {
             "result": {"token": "valid_token"}
@@ -95,7 +95,7 @@ async def test_handle_initial_balance():
     context = DummyContext()
     context.user_data = {}
 
-    with patch("requests.get") as mock_get:
+    with mock_api("get") as mock_get:
         mock_get.return_value.status_code = 200
         mock_get.return_value.json.return_value = {
             "currencies": ["USD", "EUR"]
@@ -111,7 +111,7 @@ async def test_accounts_delete():
     update = DummyUpdate("/accounts_delete")
     context = DummyContext()
 
-    with patch("requests.get") as mock_get:
+    with mock_api("get") as mock_get:
         mock_get.return_value.status_code = 200
         mock_get.return_value.json.return_value = {"accounts": []}
         await accounts_delete(update, context)
@@ -139,7 +139,7 @@ async def test_accounts_update():
     update = DummyUpdate("/accounts_update")
     context = DummyContext()
 
-    with patch("requests.get") as mock_get:
+    with mock_api("get") as mock_get:
         mock_get.return_value.status_code = 200
         mock_get.return_value.json.return_value = {"accounts": []}
         await accounts_update(update, context)
@@ -167,7 +167,7 @@ async def test_handle_name_update():
     context = DummyContext()
     context.user_data = {"account_id": "12345"}
 
-    with patch("requests.put") as mock_put:
+    with mock_api("put") as mock_put:
         mock_put.return_value.status_code = 200
         await handle_name_update(update, context)
 
@@ -0,0 +1,76 @@
+import httpx
+import pytest
+from chat_base import mock_api
+
+from bots.telegram.api_helper import (
+    APIHelper,
+    close_client,
+    create_transport,
+    get_client,
+)
+from config import config
+
+EXPENSE = {
+    "amount": 12.5,
+    "description": "Lunch",
+    "category": "Food",
+    "currency": "USD",
+    "account": "Checking",
+    "date": "2024-01-02T12:00:00",
+}
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_shared_client():
+    client = get_client()
+    assert get_client() is client
+
+    await close_client()
+    assert client.is_closed
+    assert get_client() is not client
+    await close_client()
+
+
+def test_create_transport():
+    assert isinstance(create_transport("http"), httpx.AsyncHTTPTransport)
+    assert isinstance(create_transport("asgi"), httpx.ASGITransport)
+    with pytest.raises(ValueError, match="TELEGRAM_BOT_API_TRANSPORT"):
+        create_transport("grpc")
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_asgi_transport(monkeypatch):
+    monkeypatch.setattr(config, "TELEGRAM_BOT_API_TRANSPORT", "asgi")
+    await close_client()
+    try:
+        response = await get_client().get(
+            f"{config.TELEGRAM_BOT_API_BASE_URL}/health/pool"
+        )
+    finally:
+        await close_client()
+
+    # Served by the API app in this process, no server is listening
+    assert response.status_code == 200
+    assert "pool" in response.json()
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_save_expense():
+    with mock_api("post") as mock_post:
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.json.return_value = {"message": "ok"}
+        result = await APIHelper.save_expense("valid_token", dict(EXPENSE))
+
+    assert result == {"success": True, "data": {"message": "ok"}}
+    assert mock_post.call_args.kwargs["json"]["date"].endswith("Z")
+    assert mock_post.call_args.kwargs["headers"]["token"] == "valid_token"
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_save_expense_error():
+    with mock_api("post") as mock_post:
+        mock_post.return_value.status_code = 400
+        mock_post.return_value.json.return_value = {"detail": "Bad account"}
+        result = await APIHelper.save_expense("valid_token", dict(EXPENSE))
+
+    assert result == {"success": False, "message": "Bad account"}
@@ -0,0 +1,148 @@
+import asyncio
+from unittest.mock import MagicMock
+
+import pytest
+from chat_base import DummyUpdate, logins, mock_api, state_store
+
+from bots.telegram.api_helper import gather_bounded
+from bots.telegram.group_bill_split import (
+    ONGOING_BILL_SPLIT_TRANSACTIONS,
+    BillSplitTransaction,
+    ComplexUser,
+    process_bill_split,
+)
+
+GROUP_ID = -100
+
+
+def fake_response(status_code, body):
+    response = MagicMock()
+    response.status_code = status_code
+    response.json.return_value = body
+    return response
+
+
+def session(name):
+    return {"telegram_id": ord(name[0]), "token": f"token-{name}"}
+
+
+def make_transaction(*usernames):
+    transaction = BillSplitTransaction(
+        participants={name: session(name) for name in usernames},
+        issuer=ComplexUser("alice", session("alice")),
+        amount=30.0,
+        category="Food",
+        currency="USD",
+        anchor_update=DummyUpdate("/split"),
+    )
+    transaction.confirmed_states = {name: True for name in usernames}
+    return transaction
+
+
+async def get_accounts_and_categories(url, headers):
+    if url.endswith("/accounts/"):
+        return fake_response(
+            200,
+            {"accounts": [{"name": "Cash", "currency": "USD", "balance": 50}]},
+        )
+    return fake_response(200, {"categories": {"Food": {}}})
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_gather_bounded():
+    running = peak = 0
+
+    async def call(result):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return result
+
+    assert await gather_bounded((call(i) for i in range(6)), limit=2) == [
+        0,
+        1,
+        2,
+        3,
+        4,
+        5,
+    ]
+    assert peak == 2
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_process_bill_split(state_store, logins):
+    logins(session("alice"), session("bob"), session("carol"))
+    assert await ONGOING_BILL_SPLIT_TRANSACTIONS.add(
+        GROUP_ID, make_transaction("alice", "bob", "carol")
+    )
+    # Only the Telegram ids are stored, the tokens come from the logins
+    transaction = await ONGOING_BILL_SPLIT_TRANSACTIONS.get(GROUP_ID)
+    with mock_api("get") as mock_get, mock_api("post") as mock_post:
+        mock_get.side_effect = get_accounts_and_categories
+        mock_post.return_value = fake_response(200, {"expense_ids": []})
+        await process_bill_split(GROUP_ID, transaction)
+
+    assert not await ONGOING_BILL_SPLIT_TRANSACTIONS.contains(GROUP_ID)
+    # All shares are applied by one API call
+    mock_post.assert_called_once()
+    assert mock_post.call_args.args[0].endswith("/ledger/multi")
+    headers = mock_post.call_args.kwargs["headers"]
+    assert headers["Idempotency-Key"] == transaction.identifier
+    debits = mock_post.call_args.kwargs["json"]["debits"]
+    assert [debit["token"] for debit in debits] == [
+        "token-alice",
+        "token-bob",
+        "token-carol",
+    ]
+    for debit in debits:
+        assert debit["amount"] == 10.0
+        assert debit["account_name"] == "Cash"
+        assert debit["category"] == "Food"
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_process_bill_split_rejected(state_store, logins):
+    logins(session("alice"), session("bob"))
+    transaction = make_transaction("alice", "bob")
+    assert await ONGOING_BILL_SPLIT_TRANSACTIONS.add(GROUP_ID, transaction)
+    with mock_api("get") as mock_get, mock_api("post") as mock_post:
+        mock_get.side_effect = get_accounts_and_categories
+        mock_post.return_value = fake_response(
+            400, {"detail": "Insufficient balance in some accounts"}
+        )
+        with pytest.raises(ValueError, match="Insufficient balance"):
+            await process_bill_split(GROUP_ID, transaction)
+
+    # The bill split stays open, so it can be confirmed again
+    stored = await ONGOING_BILL_SPLIT_TRANSACTIONS.get(GROUP_ID)
+    assert stored.identifier == transaction.identifier
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_process_bill_split_missing_account(logins):
+    logins(session("alice"))
+    transaction = make_transaction("alice")
+    with mock_api("get") as mock_get, mock_api("post") as mock_post:
+        mock_get.return_value = fake_response(200, {"accounts": []})
+        with pytest.raises(ValueError, match="no accounts"):
+            await process_bill_split(GROUP_ID, transaction)
+
+    mock_post.assert_not_called()
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_process_bill_split_logged_out(state_store, logins):
+    logins(session("alice"))
+    assert await ONGOING_BILL_SPLIT_TRANSACTIONS.add(
+        GROUP_ID, make_transaction("alice", "bob")
+    )
+    transaction = await ONGOING_BILL_SPLIT_TRANSACTIONS.get(GROUP_ID)
+    with mock_api("get") as mock_get, mock_api("post") as mock_post:
+        with pytest.raises(ValueError, match="no longer logged in"):
+            await process_bill_split(GROUP_ID, transaction)
+
+    mock_get.assert_not_called()
+    mock_post.assert_not_called()
+    await ONGOING_BILL_SPLIT_TRANSACTIONS.remove(GROUP_ID)
@@ -0,0 +1,77 @@
+from unittest.mock import MagicMock
+
+import pytest
+from chat_base import DummyUpdate, logins, mock_api, state_store
+
+from bots.telegram.group_transfer import (
+    ONGOING_TRANSFER,
+    ComplexUser,
+    TransferTransaction,
+    process_transfer,
+)
+
+GROUP_ID = -200
+
+
+def fake_response(status_code, body):
+    response = MagicMock()
+    response.status_code = status_code
+    response.json.return_value = body
+    return response
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_process_transfer(state_store, logins):
+    alice = {"_id": "1", "telegram_id": 1, "token": "token-alice"}
+    bob = {"_id": "2", "telegram_id": 2, "token": "token-bob"}
+    logins(alice, bob)
+    transfer = TransferTransaction(
+        issuer=ComplexUser("alice", alice),
+        recipient=ComplexUser("bob", None),
+        amount=20.0,
+        currency="USD",
+        anchor_update=DummyUpdate("/transfer"),
+    )
+    transfer.recipient = ComplexUser("bob", bob)
+    transfer.confirmed_states = {"bob": True}
+    assert await ONGOING_TRANSFER.add(GROUP_ID, transfer)
+    # Only the Telegram ids are stored, the tokens come from the logins
+    transfer = await ONGOING_TRANSFER.get(GROUP_ID)
+
+    with mock_api("get") as mock_get, mock_api("post") as mock_post:
+        mock_get.return_value = fake_response(
+            200,
+            {
+                "accounts": [
+                    {
+                        "_id": "a",
+                        "name": "Cash",
+                        "currency": "USD",
+                        "balance": 50,
+                    }
+                ]
+            },
+        )
+        mock_post.return_value = fake_response(200, {"expense_ids": []})
+        await process_transfer(GROUP_ID, transfer)
+
+    assert not await ONGOING_TRANSFER.contains(GROUP_ID)
+    # Debit and credit are applied together by one API call
+    mock_post.assert_called_once()
+    assert mock_post.call_args.args[0].endswith("/ledger/multi")
+    assert mock_post.call_args.kwargs["headers"] == {
+        "token": "token-alice",
+        "Idempotency-Key": transfer.identifier,
+    }
+    operation = mock_post.call_args.kwargs["json"]
+    assert operation["debits"] == [
+        {"amount": 20.0, "currency": "USD", "account_name": "Cash"}
+    ]
+    assert operation["credits"] == [
+        {
+            "amount": 20.0,
+            "currency": "USD",
+            "account_name": "Cash",
+            "token": "token-bob",
+        }
+    ]
@@ -1,7 +1,7 @@
 from unittest.mock import AsyncMock, patch
 
 import pytest
-from chat_base import DummyContext, DummyUpdate
+from chat_base import DummyContext, DummyUpdate, mock_api
 
 from bots.telegram.auth import (
     handle_login_password,
@@ -35,7 +35,7 @@ async def test_handle_login_password():
     context = DummyContext()
     context.user_data = {"username": "testuser"}
 
-    with patch("requests.post") as mock_post:
+    with mock_api("post") as mock_post:
         mock_post.return_value.status_code = 200
         mock_post.return_value.json.return_value = {
             "result": {"token": "valid_token"}
@@ -0,0 +1,141 @@
+import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from chat_base import DummyContext, DummyUpdate
+from telegram import MessageEntity, User
+
+from bots.telegram import auth
+from bots.telegram.utils import mentioned_user_ids
+
+SESSION = {"telegram_id": 12345, "username": "testuser", "token": "t0k3n"}
+
+
+class AsyncCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self.documents:
+            yield document
+
+
+@pytest.fixture
+def telegram_collection():
+    auth.session_cache.clear()
+    collection = MagicMock()
+    collection.find_one = AsyncMock(return_value=dict(SESSION))
+    with patch.object(auth, "telegram_collection", collection):
+        yield collection
+    auth.session_cache.clear()
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_authenticate_uses_cache(telegram_collection):
+    handler = AsyncMock(return_value="done")
+    wrapped = auth.authenticate(handler)
+
+    for _ in range(3):
+        assert await wrapped(DummyUpdate("/menu"), DummyContext()) == "done"
+
+    telegram_collection.find_one.assert_awaited_once_with(
+        {"telegram_id": 12345}
+    )
+    assert handler.await_args.kwargs["token"] == "t0k3n"
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_logged_out_users_are_not_cached(telegram_collection):
+    telegram_collection.find_one.return_value = None
+
+    assert await auth.get_user(tg_user_id=12345) is None
+    assert await auth.get_user(tg_user_id=12345) is None
+
+    assert telegram_collection.find_one.await_count == 2
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_logout_forgets_session(telegram_collection):
+    telegram_collection.delete_many = AsyncMock(
+        return_value=MagicMock(deleted_count=1)
+    )
+    await auth.get_user(tg_user_id=12345)
+    assert 12345 in auth.session_cache
+
+    await auth.logout(DummyUpdate("/logout"), DummyContext())
+
+    assert 12345 not in auth.session_cache
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_prefetch_sessions(telegram_collection):
+    auth.session_cache.set(1, {"telegram_id": 1})
+    telegram_collection.find.return_value = AsyncCursor(
+        [{"telegram_id": 2}, {"telegram_id": 3}]
+    )
+
+    await auth.prefetch_sessions([1, 2, 3, 3])
+
+    query = telegram_collection.find.call_args[0][0]
+    assert sorted(query["telegram_id"]["$in"]) == [2, 3]
+    assert await auth.get_user(tg_user_id=3) == {"telegram_id": 3}
+    telegram_collection.find_one.assert_not_called()
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_expired_sessions_are_not_used(telegram_collection):
+    expired = {
+        **SESSION,
+        "expires_at": datetime.datetime.now() - datetime.timedelta(hours=1),
+    }
+    auth.session_cache.set(12345, expired)
+    telegram_collection.find_one.return_value = expired
+    handler = AsyncMock()
+    update = DummyUpdate("/menu")
+
+    await auth.authenticate(handler)(update, DummyContext())
+
+    handler.assert_not_awaited()
+    assert update.message.replied_text == (
+        "Please /login or /signup to continue."
+    )
+    assert 12345 not in auth.session_cache
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_save_session_stores_expiry(telegram_collection):
+    telegram_collection.update_one = AsyncMock()
+    auth.session_cache.set(12345, dict(SESSION))
+
+    await auth.save_session(
+        12345,
+        "testuser",
+        {"token": "n3w", "expires_at": "2024-05-31T12:00:00"},
+    )
+
+    update = telegram_collection.update_one.await_args[0][1]["$set"]
+    assert update == {
+        "username": "testuser",
+        "token": "n3w",
+        "expires_at": datetime.datetime(2024, 5, 31, 12),
+    }
+    assert 12345 not in auth.session_cache
+
+
+def test_mentioned_user_ids():
+    update = DummyUpdate("@test_bot split with Alice")
+    update.message.entities = [
+        MessageEntity(MessageEntity.MENTION, 0, 9),
+        MessageEntity(
+            MessageEntity.TEXT_MENTION,
+            21,
+            5,
+            user=User(id=777, first_name="Alice", is_bot=False),
+        ),
+    ]
+    update.message.reply_to_message = None
+
+    assert mentioned_user_ids(update) == {12345, 777}
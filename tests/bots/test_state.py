@@ -0,0 +1,237 @@
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from chat_base import DummyUpdate, state_store
+
+from bots.telegram.auth import mongodb_client
+from bots.telegram.group_bill_split import BillSplitTransaction, ComplexUser
+from bots.telegram.reply_handlers import ReplyWaiters
+from bots.telegram.state import (
+    MemoryStateStore,
+    MongoStateStore,
+    StaleStateError,
+    StateMap,
+    StateStore,
+    StoredState,
+    create_store,
+)
+
+GROUP_ID = -300
+
+
+def make_transaction():
+    transaction = BillSplitTransaction(
+        participants={"bob": {}, "carol": {}},
+        issuer=ComplexUser(
+            "alice",
+            {"_id": "1", "telegram_id": 7, "token": "token-alice", "x": 1},
+        ),
+        amount=30.0,
+        anchor_update=DummyUpdate("/split"),
+    )
+    transaction.anchor_message = DummyUpdate("created").message
+    return transaction
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_memory_store_versions():
+    store = MemoryStateStore()
+    expires_at = time.time() + 60
+
+    assert await store.put("ns", "a", {"n": 1}, expires_at, 0) == 1
+    # Creating it again fails, so only one of two processes does
+    with pytest.raises(StaleStateError):
+        await store.put("ns", "a", {"n": 2}, expires_at, 0)
+    assert await store.put("ns", "a", {"n": 2}, expires_at, 1) == 2
+    # A write based on an older read fails
+    with pytest.raises(StaleStateError):
+        await store.put("ns", "a", {"n": 3}, expires_at, 1)
+
+    record = await store.get("ns", "a")
+    assert record.data == {"n": 2}
+    assert record.version == 2
+    assert not await store.delete("ns", "a", 1)
+    assert await store.delete("ns", "a", 2)
+    assert await store.get("ns", "a") is None
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_memory_store_expiry():
+    store = MemoryStateStore()
+    await store.put("ns", "old", {}, time.time() - 1)
+    await store.put("ns", "new", {}, time.time() + 60)
+    await store.put("other", "new", {}, time.time() + 60)
+
+    assert await store.get("ns", "old") is None
+    assert [key for key, _ in await store.scan("ns")] == ["new"]
+    # An expired record can be created again
+    assert await store.put("ns", "old", {}, time.time() + 60, 0) == 1
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_memory_store_copies():
+    store = MemoryStateStore()
+    data = {"items": [1]}
+    await store.put("ns", "a", data, time.time() + 60)
+    data["items"].append(2)
+
+    record = await store.get("ns", "a")
+    record.data["items"].append(3)
+    assert (await store.get("ns", "a")).data == {"items": [1]}
+
+
+@pytest.fixture
+def mongo_store():
+    """A MongoStateStore on a collection of its own in the bot's database."""
+    return MongoStateStore(mongodb_client.mmdb.telegram_state_test)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_mongo_store_versions(mongo_store):
+    await mongo_store.collection.delete_many({})
+    expires_at = time.time() + 60
+
+    assert await mongo_store.put("ns", "a", {"n": 1}, expires_at, 0) == 1
+    with pytest.raises(StaleStateError):
+        await mongo_store.put("ns", "a", {"n": 2}, expires_at, 0)
+    assert await mongo_store.put("ns", "a", {"n": 2}, expires_at, 1) == 2
+    with pytest.raises(StaleStateError):
+        await mongo_store.put("ns", "a", {"n": 3}, expires_at, 1)
+    assert await mongo_store.put("ns", "a", {"n": 4}, expires_at) == 3
+
+    record = await mongo_store.get("ns", "a")
+    assert record.data == {"n": 4}
+    assert record.version == 3
+    assert record.expires_at == pytest.approx(expires_at, abs=0.01)
+    assert not await mongo_store.delete("ns", "a", 2)
+    assert await mongo_store.delete("ns", "a", 3)
+    assert await mongo_store.get("ns", "a") is None
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_mongo_store_expiry(mongo_store):
+    await mongo_store.collection.delete_many({})
+    await mongo_store.put("ns", "old", {}, time.time() - 1)
+    await mongo_store.put("ns", "new", {}, time.time() + 60)
+    await mongo_store.put("other", "new", {}, time.time() + 60)
+
+    assert await mongo_store.get("ns", "old") is None
+    assert [key for key, _ in await mongo_store.scan("ns")] == ["new"]
+    # The TTL monitor has not removed the expired record yet
+    assert await mongo_store.put("ns", "old", {}, time.time() + 60, 0) == 1
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_mongo_store_keeps_no_tokens(mongo_store):
+    await mongo_store.collection.delete_many({})
+    transactions = StateMap("test", BillSplitTransaction, 60, mongo_store)
+    transaction = make_transaction()
+    transaction.participants["bob"] = {"telegram_id": 8, "token": "token-bob"}
+
+    assert await transactions.add(GROUP_ID, transaction)
+
+    document = await mongo_store.collection.find_one({"key": str(GROUP_ID)})
+    assert document["data"]["issuer"] == ["alice", {"telegram_id": 7}]
+    assert document["data"]["participants"] == {
+        "bob": {"telegram_id": 8},
+        "carol": {},
+    }
+    assert "token" not in repr(document)
+
+
+def test_abstract_bases():
+    with pytest.raises(TypeError):
+        StateStore()
+    with pytest.raises(TypeError):
+        StoredState()
+
+
+def test_create_store():
+    assert isinstance(create_store("memory"), MemoryStateStore)
+    with pytest.raises(ValueError, match="TELEGRAM_STATE_STORE"):
+        create_store("redis")
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_transaction_round_trip():
+    transactions = StateMap(
+        "test", BillSplitTransaction, 60, MemoryStateStore()
+    )
+    transaction = make_transaction()
+    transaction.confirmed_states["bob"] = True
+    transaction.amount_message_id = 5
+    bot = MagicMock(defaults=None)
+
+    assert await transactions.add(GROUP_ID, transaction)
+    assert not await transactions.add(GROUP_ID, make_transaction())
+    stored = await transactions.get(GROUP_ID, bot)
+
+    assert stored.identifier == transaction.identifier
+    assert stored.amount == 30.0
+    assert stored.deadline == transaction.deadline
+    assert stored.confirmed_states == {"bob": True, "carol": False}
+    assert stored.amount_message_id == 5
+    # Only the Telegram ids of users are kept, no API tokens
+    assert stored.issuer == ComplexUser("alice", {"telegram_id": 7})
+    # Messages are rebuilt bound to the bot, to reply to and edit them
+    assert stored.anchor_update.message.chat.id == 12345
+    assert stored.anchor_message.message_id == 1
+    assert stored.anchor_message.get_bot() is bot
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_update_after_conflict():
+    transactions = StateMap(
+        "test", BillSplitTransaction, 60, MemoryStateStore()
+    )
+    await transactions.add(GROUP_ID, make_transaction())
+
+    first = await transactions.get(GROUP_ID)
+    # Another process writes between the read and the write
+    await transactions.assign(GROUP_ID, category="Food")
+    first.confirmed_states["carol"] = True
+    with pytest.raises(StaleStateError):
+        await transactions.save(GROUP_ID, first)
+
+    def confirm(transaction):
+        transaction.confirmed_states["bob"] = True
+
+    # An update applies the change to the current state instead
+    updated = await transactions.update(GROUP_ID, confirm)
+    assert updated.category == "Food"
+    assert updated.confirmed_states == {"bob": True, "carol": False}
+    assert await transactions.update(GROUP_ID + 1, confirm) is None
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_remove_once():
+    transactions = StateMap(
+        "test", BillSplitTransaction, 60, MemoryStateStore()
+    )
+    await transactions.add(GROUP_ID, make_transaction())
+    first = await transactions.get(GROUP_ID)
+    second = await transactions.get(GROUP_ID)
+
+    # Of two processes expiring the transaction only one succeeds
+    assert await transactions.remove(GROUP_ID, first)
+    assert not await transactions.remove(GROUP_ID, second)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_reply_waiters(state_store):
+    @ReplyWaiters.register
+    async def handle_test_reply(update, context):
+        pass
+
+    async def unregistered(update, context):
+        pass
+
+    await ReplyWaiters.wait(GROUP_ID, 9, handle_test_reply, 60)
+    assert await ReplyWaiters.get(GROUP_ID, 9) is handle_test_reply
+    assert await ReplyWaiters.get(GROUP_ID, 10) is None
+    await ReplyWaiters.remove(GROUP_ID, 9)
+    assert await ReplyWaiters.get(GROUP_ID, 9) is None
+
+    with pytest.raises(ValueError, match="not registered"):
+        await ReplyWaiters.wait(GROUP_ID, 9, unregistered, 60)
@@ -0,0 +1,90 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from chat_base import DummyUpdate, state_store
+
+from bots.telegram import group_bill_split
+from bots.telegram.timeouts import TimeoutScheduler
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_callbacks_run_in_deadline_order():
+    scheduler = TimeoutScheduler()
+    expired = []
+
+    def record(name):
+        async def callback():
+            expired.append(name)
+
+        return callback
+
+    scheduler.schedule("late", 0.06, record("late"))
+    scheduler.schedule("early", 0.02, record("early"))
+    scheduler.schedule("cancelled", 0.01, record("cancelled"))
+    assert scheduler.cancel("cancelled")
+    assert len(scheduler) == 2
+
+    await asyncio.sleep(0.1)
+
+    assert expired == ["early", "late"]
+    assert len(scheduler) == 0
+    await scheduler.shutdown()
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_reschedule_replaces_timeout():
+    scheduler = TimeoutScheduler()
+    first, second = AsyncMock(), AsyncMock()
+
+    scheduler.schedule("key", 0.01, first)
+    scheduler.schedule("key", 0.05, second)
+    assert 0 < scheduler.remaining("key") <= 0.05
+
+    await asyncio.sleep(0.08)
+
+    first.assert_not_awaited()
+    second.assert_awaited_once()
+    assert scheduler.remaining("key") is None
+    await scheduler.shutdown()
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_failing_callback_does_not_stop_scheduler():
+    scheduler = TimeoutScheduler()
+    after = AsyncMock()
+
+    scheduler.schedule("fails", 0.01, AsyncMock(side_effect=RuntimeError))
+    scheduler.schedule("after", 0.03, after)
+    await asyncio.sleep(0.06)
+
+    after.assert_awaited_once()
+    await scheduler.shutdown()
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_expire_bill_split(state_store):
+    bot = MagicMock(edit_message_text=AsyncMock(), defaults=None)
+    transactions = group_bill_split.ONGOING_BILL_SPLIT_TRANSACTIONS
+    transaction = group_bill_split.BillSplitTransaction(
+        participants={},
+        issuer=group_bill_split.ComplexUser("alice", {}),
+        anchor_update=DummyUpdate("/split"),
+    )
+    transaction.anchor_message = DummyUpdate("created").message
+    newer = group_bill_split.BillSplitTransaction(
+        participants={},
+        issuer=group_bill_split.ComplexUser("alice", {}),
+        anchor_update=DummyUpdate("/split"),
+    )
+    await transactions.add(1, transaction)
+
+    await group_bill_split.expire_bill_split(1, transaction.identifier, bot)
+
+    assert not await transactions.contains(1)
+    assert "timed out" in bot.edit_message_text.call_args.kwargs["text"]
+
+    # A newer transaction of the group is left alone
+    await transactions.add(1, newer)
+    await group_bill_split.expire_bill_split(1, transaction.identifier, bot)
+    assert (await transactions.get(1)).identifier == newer.identifier
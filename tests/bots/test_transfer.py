@@ -1,6 +1,6 @@
 from unittest.mock import AsyncMock, patch
 import pytest
-from chat_base import DummyContext, DummyUpdate
+from chat_base import DummyContext, DummyUpdate, mock_api
 from bots.telegram.transfers import (
     transfer_start,
     select_source,
@@ -14,7 +14,7 @@ from bots.telegram.transfers import (
 async def test_transfer_start():
     update = DummyUpdate("/accounts_transfer")
     context = DummyContext()
-    with patch("requests.get") as mock_get:
+    with mock_api("get") as mock_get:
         mock_get.return_value.status_code = 200
         mock_get.return_value.json.return_value = {
             "accounts": [{"_id": "123", "name": "Checking"}]
@@ -27,7 +27,7 @@ async def test_transfer_start():
 async def test_select_source():
     update = DummyUpdate(callback_data="source_123")
     context = DummyContext()
-    with patch("requests.get") as mock_get:
+    with mock_api("get") as mock_get:
         mock_get.return_value.status_code = 200
         mock_get.return_value.json.return_value = {
             "accounts": [{"_id": "456", "name": "Savings"}]
@@ -68,7 +68,7 @@ async def test_send_confirmed_transfer():
         "dest_account": "456",
         "amount": 100.0,
     }
-    with patch("requests.post") as mock_post:
+    with mock_api("post") as mock_post:
         mock_post.return_value.status_code = 200
         await send_confirmed_transfer(update, context, token="valid_token")
     assert "Transfer successful!" in update.callback_query.message.text
@@ -12,7 +12,9 @@ async def test_shutdown_db_client():
     """Test that users.shutdown_db_client() is called during lifespan shutdown."""
     mock_shutdown = AsyncMock()
 
-    with patch("api.routers.users.shutdown_db_client", mock_shutdown):
+    with patch("api.routers.users.shutdown_db_client", mock_shutdown), patch(
+        "api.app.ensure_indexes", AsyncMock()
+    ):
         test_app = FastAPI()
 
         cm = lifespan(test_app)
@@ -22,6 +24,20 @@ async def test_shutdown_db_client():
         mock_shutdown.assert_called_once()
 
 
+@pytest.mark.anyio
+async def test_lifespan_ensures_indexes():
+    """Test that the API indexes are ensured during lifespan startup."""
+    mock_ensure = AsyncMock()
+
+    with patch("api.routers.users.shutdown_db_client", AsyncMock()), patch(
+        "api.app.ensure_indexes", mock_ensure
+    ):
+        cm = lifespan(FastAPI())
+        await cm.__aenter__()
+        mock_ensure.assert_called_once()
+        await cm.__aexit__(None, None, None)
+
+
 @pytest.mark.anyio
 async def test_redirect_to_docs():
     """Test that redirect_to_docs returns a RedirectResponse with the correct URL."""